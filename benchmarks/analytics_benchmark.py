@@ -0,0 +1,152 @@
+"""
+Бенчмарк аналитики с отложенной записью: стоимость record_* для обработчика,
+пропускная способность записи и поведение при переполнении очереди
+
+Клиенты имитируют диалоги: /start, запрос с результатами, выбор меры.
+Для сравнения тот же сценарий выполняется с синхронной записью каждого
+события отдельной транзакцией прямо в обработчике.
+
+Запуск:
+    python -m benchmarks.analytics_benchmark --dialogs 5000 --clients 64
+"""
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+from bot.analytics import OVERFLOW_BLOCK, OVERFLOW_DROP, AnalyticsSink, new_id
+from bot.loop_monitor import LoopLagMonitor
+
+RESULTS = [{'id': i, 'match_score': 1 - i / 10} for i in range(5)]
+
+
+def make_user(user_id: int) -> SimpleNamespace:
+    return SimpleNamespace(id=user_id, username=f'user{user_id}', first_name='Тест', last_name=None,
+                           language_code='ru', is_bot=False)
+
+
+async def dialog(sink: AnalyticsSink, user_id: int, latencies: List[float], pause: float):
+    """События одного диалога; замеряется время, на которое обработчик отдает управление sink"""
+    conversation_id = new_id()
+    started = time.perf_counter()
+    await sink.record_user(make_user(user_id))
+    await sink.record_conversation(conversation_id, user_id, 'START')
+    query_id = await sink.record_query(user_id, f'субсидия на оборудование {user_id}', RESULTS,
+                                       conversation_id=conversation_id)
+    await sink.record_conversation(conversation_id, user_id, 'SEARCH', query_id=query_id, selected_measure_id=1)
+    latencies.append(time.perf_counter() - started)
+    # Остальная работа обработчика (поиск, отправка ответа)
+    await asyncio.sleep(pause)
+
+
+async def run_sink(path: str, dialogs: int, clients: int, pause: float, **options) -> Dict[str, Any]:
+    sink = AnalyticsSink(path, **options)
+    sink.start()
+    monitor = LoopLagMonitor(interval=0.01, window=100_000, warn_threshold=0)
+    monitor.start()
+    latencies: List[float] = []
+
+    async def client(index: int):
+        for user_id in range(index, dialogs, clients):
+            await dialog(sink, user_id, latencies, pause)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    handlers_seconds = time.perf_counter() - started
+    await sink.stop()
+    total_seconds = time.perf_counter() - started
+    await monitor.stop()
+    return {
+        'handlers_s': handlers_seconds,
+        'total_s': total_seconds,
+        'dialog_p50_us': statistics.median(latencies) * 1e6,
+        'dialog_p99_us': sorted(latencies)[int(len(latencies) * 0.99)] * 1e6,
+        'lag_p99_ms': monitor.stats()['p99_ms'],
+        **sink.counters,
+    }
+
+
+class SyncSink(AnalyticsSink):
+    """Запись каждого события своей транзакцией прямо в обработчике"""
+
+    async def _emit(self, events):
+        for event in events:
+            self._write_batch([event])
+        self.counters['written'] += len(events)
+        self.counters['batches'] += len(events)
+
+
+async def run_sync(path: str, dialogs: int, clients: int, pause: float) -> Dict[str, Any]:
+    sink = SyncSink(path)
+    monitor = LoopLagMonitor(interval=0.01, window=100_000, warn_threshold=0)
+    monitor.start()
+    latencies: List[float] = []
+
+    async def client(index: int):
+        for user_id in range(index, dialogs, clients):
+            await dialog(sink, user_id, latencies, pause)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    seconds = time.perf_counter() - started
+    await monitor.stop()
+    sink._close()
+    return {
+        'handlers_s': seconds,
+        'total_s': seconds,
+        'dialog_p50_us': statistics.median(latencies) * 1e6,
+        'dialog_p99_us': sorted(latencies)[int(len(latencies) * 0.99)] * 1e6,
+        'lag_p99_ms': monitor.stats()['p99_ms'],
+        **sink.counters,
+    }
+
+
+def count_rows(path: str) -> Dict[str, int]:
+    connection = sqlite3.connect(path)
+    try:
+        return {table: connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ('users', 'user_queries', 'search_results', 'conversations', 'conversation_messages')}
+    finally:
+        connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dialogs', type=int, default=5000)
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--pause', type=float, default=0.05,
+                        help='остальная работа обработчика на диалог, секунды')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='analytics_bench_') as workdir:
+        scenarios = [
+            ('sync', lambda path: run_sync(path, args.dialogs, args.clients, args.pause)),
+            ('queue', lambda path: run_sink(path, args.dialogs, args.clients, args.pause)),
+            # Маленькая очередь, редкая запись и клиенты без пауз - проверка политик переполнения
+            ('queue/drop', lambda path: run_sink(path, args.dialogs, args.clients, 0, queue_size=200,
+                                                  batch_size=10_000, flush_interval=0.5,
+                                                  overflow=OVERFLOW_DROP)),
+            ('queue/block', lambda path: run_sink(path, args.dialogs, args.clients, 0, queue_size=200,
+                                                   batch_size=100, flush_interval=0.5,
+                                                   overflow=OVERFLOW_BLOCK, block_timeout=0.5)),
+        ]
+        print(f"{'режим':>12} {'обработчики, s':>15} {'до записи, s':>13} {'диалог p50, мкс':>16} "
+              f"{'p99, мкс':>9} {'lag p99, мс':>12} {'записано':>9} {'отброшено':>10} {'пачек':>6}")
+        for name, scenario in scenarios:
+            path = os.path.join(workdir, f'{name.replace("/", "-")}.sqlite3')
+            row = asyncio.run(scenario(path))
+            print(f"{name:>12} {row['handlers_s']:>15.2f} {row['total_s']:>13.2f} {row['dialog_p50_us']:>16.0f} "
+                  f"{row['dialog_p99_us']:>9.0f} {row['lag_p99_ms']:>12.2f} {row['written']:>9} "
+                  f"{row['dropped']:>10} {row['batches']:>6}")
+            if name == 'queue':
+                print(f"{'':>12} строк в базе: {count_rows(path)}")
+
+
+if __name__ == '__main__':
+    main()
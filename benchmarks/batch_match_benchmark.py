@@ -0,0 +1,78 @@
+"""
+Бенчмарк пакетного сопоставления запросов: BatchMatcher против поиска по одному запросу
+
+Запросы - QUERIES с опечатками (как в spelling_benchmark). По одному
+запросу ищется так же, как в DatasetManager.search (BM25 с исправлением
+опечаток, при отсутствии совпадений - эмбеддинги), без кэша. Совпадение -
+доля запросов, для которых списки оценок top-k пакетного поиска и поиска
+по одному запросу равны (порядок равных оценок может отличаться).
+
+Запуск:
+    python -m benchmarks.batch_match_benchmark --sizes 1000 10000 50000 --queries 5000
+"""
+
+import argparse
+import time
+from typing import Dict, List
+
+from benchmarks.spelling_benchmark import typo_queries
+from benchmarks.synthetic import make_dataframe
+from data.batch_matching import BatchMatcher
+from data.embedding_index import EmbeddingIndex, HashingEncoder
+from data.search_engine import FIELD_WEIGHTS, SearchEngine
+from data.spelling import SpellingIndex
+
+
+def run(sizes: List[int], queries: int, top_k: int) -> List[Dict[str, float]]:
+    report = []
+    texts = [typo for _, typo in typo_queries(queries)]
+    for size in sizes:
+        df = make_dataframe(size)
+        engine = SearchEngine.from_dataframe(df, list(FIELD_WEIGHTS))
+        documents = (df['Название'] + ' ' + df['Описание']).tolist()
+        embedding_index = EmbeddingIndex.build(documents, HashingEncoder(), backend='numpy')
+        spelling = SpellingIndex.from_postings(engine.postings)
+        matcher = BatchMatcher(engine, embedding_index, spelling)
+
+        # Кэш исправлений очищается перед каждым прогоном: оба варианта исправляют опечатки заново
+        spelling._cache.clear()
+        started = time.perf_counter()
+        expected = []
+        for text in texts:
+            hits = engine.search(text, top_k, None, spelling) or embedding_index.search(text, top_k)
+            expected.append([round(score, 4) for _, score in hits])
+        loop_seconds = time.perf_counter() - started
+
+        spelling._cache.clear()
+        started = time.perf_counter()
+        positions, scores = matcher.match(texts, top_k)
+        batch_seconds = time.perf_counter() - started
+
+        same = sum(
+            [round(float(score), 4) for position, score in zip(row_positions, row_scores) if position >= 0] == hits
+            for row_positions, row_scores, hits in zip(positions, scores, expected)
+        )
+        report.append({
+            'size': size,
+            'loop_qps': len(texts) / loop_seconds,
+            'batch_qps': len(texts) / batch_seconds,
+            'agreement': same / len(texts),
+        })
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--top-k', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'size':>8} {'по одному, q/s':>15} {'пачкой, q/s':>12} {'ускорение':>10} {'совпадение':>11}")
+    for row in run(args.sizes, args.queries, args.top_k):
+        print(f"{row['size']:>8} {row['loop_qps']:>15.0f} {row['batch_qps']:>12.0f} "
+              f"{row['batch_qps'] / row['loop_qps']:>10.2f} {row['agreement']:>11.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+"""
+Нагрузочный тест диалога: ConversationHandler бота внутри процесса, без сети
+
+Синтетические пользователи проходят /start -> запрос -> select_result ->
+уточняющий вопрос -> /cancel; апдейты проходят тот же путь, что и в боте (ConversationUpdateProcessor,
+setup_conversation_handler, поиск в пуле потоков), а вызовы Bot API
+обслуживает FakeBotRequest. Для каждого размера датасета выводятся:
+    updates/s               - пропускная способность
+    p50/p95/p99, мс         - время обработки апдейта
+    lag p99, мс             - задержка event loop
+    КБ/диалог               - память на активный диалог (tracemalloc, диалоги в состоянии SEARCH)
+
+Режим регрессии: с --baseline результаты сравниваются с сохраненными
+(JSON из --output или --save-baseline); если метрика хуже более чем на
+--tolerance, скрипт завершается с кодом 1. В GitHub Actions таблица
+сравнения добавляется в сводку job ($GITHUB_STEP_SUMMARY).
+
+Запуск:
+    python -m benchmarks.conversation_benchmark --users 2000 --sizes 10 1000 10000 100000
+    python -m benchmarks.conversation_benchmark --sizes 10 1000 --baseline benchmarks/baseline.json
+"""
+
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from telegram import Update
+from telegram.ext import Application
+
+from benchmarks.fake_telegram import BOT_TOKEN, FakeBotRequest, make_callback_update, make_message_update
+from benchmarks.synthetic import QUERIES, make_dataframe
+from bot.analytics import analytics
+from conversation.callbacks import select_data
+from conversation.handlers import setup_conversation_handler
+from bot.loop_monitor import LoopLagMonitor
+from bot.update_processor import ConversationUpdateProcessor
+from data.dataset_manager import dataset_manager
+from data.search_executor import search_executor
+
+STEPS = ('start', 'query', 'select_result', 'consult', 'cancel')
+
+# Метрика -> направление: 1 - больше лучше, -1 - меньше лучше
+METRICS = {
+    'updates_per_second': 1,
+    'p50_ms': -1,
+    'p95_ms': -1,
+    'p99_ms': -1,
+    'lag_p99_ms': -1,
+    'kb_per_conversation': -1,
+}
+# Абсолютный допуск: доли миллисекунды на быстром датасете не считаются регрессией
+SLACK = {
+    'p50_ms': 1.0,
+    'p95_ms': 2.0,
+    'p99_ms': 2.0,
+    'lag_p99_ms': 5.0,
+    'kb_per_conversation': 1.0,
+}
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+class ConversationHarness:
+    """Приложение бота с фейковым Bot API и синтетическими пользователями"""
+
+    def __init__(self, concurrency: int, latency: float):
+        """
+        Args:
+            concurrency: апдейтов в обработке одновременно (CONCURRENT_UPDATES)
+            latency: задержка ответа фейкового Bot API в секундах
+        """
+        self.request = FakeBotRequest(latency=latency)
+        self.app = (
+            Application.builder()
+            .token(BOT_TOKEN)
+            .request(self.request)
+            .get_updates_request(FakeBotRequest())
+            .updater(None)
+            .concurrent_updates(ConversationUpdateProcessor(concurrency))
+            .build()
+        )
+        self.app.add_handler(setup_conversation_handler())
+        self._update_ids = itertools.count(1)
+        self.latencies: Dict[str, List[float]] = {step: [] for step in STEPS}
+        self.busy = 0
+
+    async def start(self):
+        await self.app.initialize()
+        await self.app.start()
+
+    async def stop(self):
+        await self.app.stop()
+        await self.app.shutdown()
+
+    async def send(self, step: str, data: Dict[str, Any]):
+        """Обработка одного апдейта тем же путем, что и в боте; время записывается в latencies"""
+        update = Update.de_json(data, self.app.bot)
+        started = time.perf_counter()
+        await self.app.update_processor.process_update(update, self.app.process_update(update))
+        self.latencies[step].append(time.perf_counter() - started)
+
+    async def open_dialog(self, user_id: int):
+        """/start и запрос: диалог в состоянии SEARCH"""
+        await self.send('start', make_message_update(next(self._update_ids), user_id, '/start'))
+        # Популярные запросы с "хвостом": большая часть запросов не попадает в кэш результатов
+        query = f'{QUERIES[user_id % len(QUERIES)]} регион {user_id % 97}'
+        await self.send('query', make_message_update(next(self._update_ids), user_id, query))
+
+    async def close_dialog(self, user_id: int):
+        """Выбор первого результата, вопрос по нему и /cancel"""
+        results = self.app.user_data[user_id].get('result_ids')
+        if results is None:
+            # Поиск отклонен (пул перегружен или таймаут)
+            self.busy += 1
+        elif results:
+            data = select_data(results[0][0])
+            await self.send('select_result', make_callback_update(next(self._update_ids), user_id, data))
+            await self.send('consult', make_message_update(next(self._update_ids), user_id, 'Какие документы нужны?'))
+        await self.send('cancel', make_message_update(next(self._update_ids), user_id, '/cancel'))
+
+    async def dialog(self, user_id: int):
+        await self.open_dialog(user_id)
+        await self.close_dialog(user_id)
+
+
+async def run_users(harness: ConversationHarness, user_ids: List[int], active: int, action) -> float:
+    """Пользователи с action, не больше active одновременно; время в секундах"""
+    queue = iter(user_ids)
+
+    async def client():
+        for user_id in queue:
+            await action(user_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(min(active, len(user_ids)))))
+    return time.perf_counter() - started
+
+
+async def measure_memory(harness: ConversationHarness, user_ids: List[int], active: int) -> float:
+    """Прирост памяти Python на один открытый диалог, КБ"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        await run_users(harness, user_ids, active, harness.open_dialog)
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    await run_users(harness, user_ids, active, harness.close_dialog)
+    return (after - before) / len(user_ids) / 1024
+
+
+def load_dataset(rows: int, workdir: str):
+    path = os.path.join(workdir, f'measures-{rows}.csv')
+    make_dataframe(rows).to_csv(path, index=False)
+    dataset_manager.data_source = 'local'
+    dataset_manager.snapshot_dir = None
+    started = time.perf_counter()
+    if not dataset_manager.load_dataset(filepath=path):
+        raise RuntimeError(f"Не удалось загрузить датасет из {rows} записей")
+    return time.perf_counter() - started
+
+
+async def run_size(rows: int, workdir: str, users: int, active: int, concurrency: int, latency: float,
+                   memory_users: int) -> Dict[str, Any]:
+    """Прогон для одного размера датасета"""
+    load_seconds = await asyncio.get_running_loop().run_in_executor(None, load_dataset, rows, workdir)
+
+    search_executor.start()
+    analytics.path = os.path.join(workdir, f'analytics-{rows}.sqlite3')
+    analytics.start()
+    harness = ConversationHarness(concurrency, latency)
+    await harness.start()
+    monitor = LoopLagMonitor(interval=0.01, window=100_000, warn_threshold=0)
+    try:
+        # Прогрев: кэши рендеринга и поиска, пул потоков
+        await run_users(harness, list(range(1, min(active, users) + 1)), active, harness.dialog)
+        for values in harness.latencies.values():
+            values.clear()
+        harness.busy = 0
+
+        monitor.start()
+        first_user = 1_000_000
+        seconds = await run_users(harness, list(range(first_user, first_user + users)), active, harness.dialog)
+        lag = monitor.stats()
+        await monitor.stop()
+
+        memory_ids = list(range(2_000_000, 2_000_000 + memory_users))
+        kb_per_conversation = await measure_memory(harness, memory_ids, active)
+    finally:
+        await harness.stop()
+        await analytics.stop()
+        await search_executor.shutdown()
+
+    all_latencies = [value for values in harness.latencies.values() for value in values]
+    return {
+        'rows': rows,
+        'load_s': round(load_seconds, 2),
+        'updates': len(all_latencies),
+        'seconds': round(seconds, 3),
+        'updates_per_second': round(len(all_latencies) / seconds, 1),
+        'p50_ms': round(percentile(all_latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(all_latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(all_latencies, 99) * 1000, 2),
+        'steps_p95_ms': {step: round(percentile(values, 95) * 1000, 2)
+                         for step, values in harness.latencies.items()},
+        'query_mean_ms': round(statistics.fmean(harness.latencies['query']) * 1000, 2),
+        'lag_p99_ms': lag['p99_ms'],
+        'lag_max_ms': lag['max_ms'],
+        'kb_per_conversation': round(kb_per_conversation, 2),
+        'busy': harness.busy,
+        'api_calls': dict(harness.request.calls),
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """
+    Сравнение с базовыми результатами по размерам датасета
+
+    Returns:
+        строки сравнения: размер, метрика, значения, изменение и признак регрессии
+    """
+    by_rows = {row['rows']: row for row in baseline.get('results', [])}
+    rows = []
+    for result in results:
+        base = by_rows.get(result['rows'])
+        if base is None:
+            continue
+        for metric, direction in METRICS.items():
+            old, new = base.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else 0.0
+            if direction > 0:
+                regression = new < old * (1 - tolerance)
+            else:
+                regression = new > old * (1 + tolerance) + SLACK.get(metric, 0.0)
+            rows.append({'rows': result['rows'], 'metric': metric, 'baseline': old, 'current': new,
+                         'change': change, 'regression': regression})
+    return rows
+
+
+def write_summary(results: List[Dict[str, Any]], comparison: List[Dict[str, Any]], tolerance: float):
+    """Markdown-таблица в сводку GitHub Actions"""
+    path = os.environ.get('GITHUB_STEP_SUMMARY')
+    if not path:
+        return
+    lines = ['## Нагрузочный тест диалога', '',
+             '| записей | updates/s | p50, мс | p95, мс | p99, мс | lag p99, мс | КБ/диалог |',
+             '|---:|---:|---:|---:|---:|---:|---:|']
+    for row in results:
+        lines.append(f"| {row['rows']} | {row['updates_per_second']} | {row['p50_ms']} | {row['p95_ms']} | "
+                     f"{row['p99_ms']} | {row['lag_p99_ms']} | {row['kb_per_conversation']} |")
+    if comparison:
+        lines += ['', f'Сравнение с базовыми результатами (допуск {tolerance:.0%}):', '',
+                  '| записей | метрика | база | сейчас | изменение | |', '|---:|---|---:|---:|---:|---|']
+        for row in comparison:
+            mark = '❌ регрессия' if row['regression'] else ''
+            lines.append(f"| {row['rows']} | {row['metric']} | {row['baseline']} | {row['current']} | "
+                         f"{row['change']:+.1%} | {mark} |")
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000, 100000],
+                        help='размеры синтетического датасета')
+    parser.add_argument('--users', type=int, default=2000, help='пользователей в прогоне')
+    parser.add_argument('--active', type=int, default=64, help='одновременно активных пользователей')
+    parser.add_argument('--concurrency', type=int, default=64, help='апдейтов в обработке одновременно')
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка фейкового Bot API, с')
+    parser.add_argument('--memory-users', type=int, default=500, help='открытых диалогов при замере памяти')
+    parser.add_argument('--output', help='сохранить результаты в JSON')
+    parser.add_argument('--save-baseline', help='сохранить результаты как базовые (то же, что --output)')
+    parser.add_argument('--baseline', help='сравнить с базовыми результатами и завершиться с кодом 1 при регрессии')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='допустимое ухудшение метрики, доля')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='conversation_bench_') as workdir:
+        print(f"Ядер CPU: {os.cpu_count()}, пользователей: {args.users}, активных: {args.active}, "
+              f"concurrency: {args.concurrency}")
+        print(f"{'записей':>8} {'загрузка, s':>12} {'updates/s':>10} {'p50, мс':>8} {'p95, мс':>8} "
+              f"{'p99, мс':>8} {'lag p99, мс':>12} {'КБ/диалог':>10} {'отказы':>7}")
+        for rows in args.sizes:
+            result = asyncio.run(run_size(rows, workdir, args.users, args.active, args.concurrency, args.latency,
+                                          args.memory_users))
+            results.append(result)
+            print(f"{rows:>8} {result['load_s']:>12.2f} {result['updates_per_second']:>10.0f} "
+                  f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+                  f"{result['lag_p99_ms']:>12.2f} {result['kb_per_conversation']:>10.1f} {result['busy']:>7}")
+            print(f"{'':>8} p95 по шагам, мс: {result['steps_p95_ms']}")
+
+    report = {
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'options': {key: getattr(args, key) for key in ('users', 'active', 'concurrency', 'latency',
+                                                         'memory_users')},
+        'results': results,
+    }
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    comparison: List[Dict[str, Any]] = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            comparison = compare(results, json.load(f), args.tolerance)
+        regressions = [row for row in comparison if row['regression']]
+        print(f"\nСравнение с {args.baseline} (допуск {args.tolerance:.0%}):")
+        for row in comparison:
+            mark = '  <-- регрессия' if row['regression'] else ''
+            print(f"{row['rows']:>8} {row['metric']:>20} {row['baseline']:>10} -> {row['current']:<10} "
+                  f"{row['change']:+.1%}{mark}")
+    else:
+        regressions = []
+    write_summary(results, comparison, args.tolerance)
+
+    if regressions:
+        print(f"\nРегрессий производительности: {len(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
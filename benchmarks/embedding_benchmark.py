@@ -0,0 +1,58 @@
+"""
+Бенчмарк семантического поиска: задержка запроса по backend'ам в зависимости от размера датасета
+
+recall@k - доля точных top-k (полный перебор numpy), найденных backend'ом;
+приближенные FAISS-индексы включаются только явно (EMBEDDING_BACKEND)
+
+Запуск:
+    python -m benchmarks.embedding_benchmark --sizes 1000 10000 100000 --backends numpy faiss_ivf faiss_hnsw
+"""
+
+import argparse
+import time
+from typing import List
+
+import numpy as np
+
+from benchmarks.search_benchmark import percentile
+from benchmarks.synthetic import QUERIES, make_records
+from data.embedding_index import EmbeddingIndex, HashingEncoder
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--backends', nargs='+', default=['numpy', 'faiss_ivf', 'faiss_hnsw'])
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--top-k', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'size':>8} {'backend':>12} {'build, s':>10} {'p50, мкс':>10} {'p99, мкс':>10} {'recall@k':>9}")
+    for size in args.sizes:
+        records = make_records(size)
+        texts = [f"{r['Название']}. {r['Описание']}. {r['Категория']}. {r['Условия']}" for r in records]
+        encoder = HashingEncoder().fit(texts)
+        matrix = np.vstack([encoder.encode(texts[i:i + 1024]) for i in range(0, len(texts), 1024)])
+        query_vectors = encoder.encode(QUERIES)
+        exact, _ = EmbeddingIndex(encoder, matrix, 'numpy').search_vectors(query_vectors, args.top_k)
+
+        for backend in args.backends:
+            started = time.perf_counter()
+            index = EmbeddingIndex(encoder, matrix, backend)
+            build_seconds = time.perf_counter() - started
+
+            latencies: List[float] = []
+            for i in range(args.iterations):
+                vector = query_vectors[i % len(QUERIES)][None, :]
+                started = time.perf_counter()
+                index.search_vectors(vector, args.top_k)
+                latencies.append((time.perf_counter() - started) * 1e6)
+
+            found, _ = index.search_vectors(query_vectors, args.top_k)
+            recall = np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found.tolist(), exact.tolist())])
+            print(f"{size:>8} {index.backend:>12} {build_seconds:>10.2f} "
+                  f"{percentile(latencies, 50):>10.1f} {percentile(latencies, 99):>10.1f} {recall:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Бенчмарк выполнения поиска вне event loop: задержка loop и пропускная способность
+
+Режимы:
+    inline    - поиск вызывается прямо в корутине (как до executor)
+    threads   - SearchExecutor.search в пуле потоков
+
+Во время прогона LoopLagMonitor с периодом 10 мс измеряет, насколько
+loop опаздывает с обслуживанием таймеров, т.е. других диалогов.
+
+Запуск:
+    python -m benchmarks.executor_benchmark --rows 20000 --requests 4000 --clients 64
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.synthetic import QUERIES, make_dataframe
+from bot.loop_monitor import LoopLagMonitor
+from data.dataset_manager import DatasetManager
+from data.query_cache import QueryCache
+from data.search_executor import SearchExecutor
+
+
+def make_queries(n: int) -> List[str]:
+    """Уникальные запросы, чтобы не попадать в кэш"""
+    return [f'{QUERIES[i % len(QUERIES)]} {i}' for i in range(n)]
+
+
+async def measure(coroutine_factory, concurrency: int) -> Dict[str, float]:
+    """Запуск concurrency корутин-клиентов и измерение времени и задержки loop"""
+    monitor = LoopLagMonitor(interval=0.01, window=100_000, warn_threshold=0)
+    monitor.start()
+    await asyncio.sleep(0.05)
+    monitor.reset()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(coroutine_factory(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await monitor.stop()
+    return {'seconds': elapsed, **monitor.stats()}
+
+
+async def run(manager: DatasetManager, executor: SearchExecutor, requests: int, clients: int) -> List[Dict[str, float]]:
+    queries = make_queries(requests)
+    report = []
+
+    # Каждый клиент (диалог) отправляет следующий запрос после ответа на предыдущий
+    async def inline(client: int):
+        for i in range(client, requests, clients):
+            manager.search(queries[i])
+            await asyncio.sleep(0)
+
+    async def threaded(client: int):
+        for i in range(client, requests, clients):
+            await executor.search(queries[i])
+
+    for mode, factory in (('inline', inline), ('threads', threaded)):
+        result = await measure(factory, clients)
+        report.append({'mode': mode, 'calls': requests, 'per_second': requests / result['seconds'], **result})
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=4000, help='поисковых запросов всего')
+    parser.add_argument('--clients', type=int, default=64, help='одновременных диалогов')
+    parser.add_argument('--threads', type=int, default=0, help='потоков поиска (0 - по числу ядер, до 4)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='executor_bench_') as workdir:
+        dataset_path = os.path.join(workdir, 'measures.csv')
+        make_dataframe(args.rows).to_csv(dataset_path, index=False)
+        manager = DatasetManager(data_source='local', query_cache=QueryCache(max_entries=0))
+        manager.load_dataset(filepath=dataset_path)
+
+        executor = SearchExecutor(manager, threads=args.threads, timeout=0, max_pending=64, queue_timeout=0)
+        executor.start()
+        try:
+            report = asyncio.run(run(manager, executor, args.requests, args.clients))
+        finally:
+            asyncio.run(executor.shutdown())
+
+        print(f"{'режим':>18} {'вызовов':>8} {'время, s':>9} {'вызовов/s':>10} "
+              f"{'lag p50, мс':>12} {'lag p99, мс':>12} {'lag max, мс':>12}")
+        for row in report:
+            print(f"{row['mode']:>18} {row['calls']:>8} {row['seconds']:>9.2f} {row['per_second']:>10.0f} "
+                  f"{row['p50_ms']:>12.2f} {row['p99_ms']:>12.2f} {row['max_ms']:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
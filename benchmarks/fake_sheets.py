@@ -0,0 +1,198 @@
+"""
+Фейковые Google Sheets API и Drive API для локальных тестов загрузчика
+
+Сервер хранит один лист (заголовок и строки) и отвечает на вызовы,
+которые делает GoogleSheetsLoader:
+    GET /drive/v3/files/<id>                         - версия и modifiedTime файла
+    GET /v4/spreadsheets/<id>                        - размеры листов
+    GET /v4/spreadsheets/<id>/values:batchGet        - несколько диапазонов A1 за вызов
+    GET /v4/spreadsheets/<id>/values/<range>         - один диапазон (построчное чтение)
+
+Задержка ответа и отказ (503) настраиваются на лету; все вызовы
+считаются по типу в calls
+"""
+
+import asyncio
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, List, Optional, Tuple
+from urllib.parse import unquote
+
+import pandas as pd
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+from tornado.web import Application, RequestHandler
+
+_RANGE = re.compile(r"^(?:'((?:[^']|'')*)'|([^!]+))!([A-Z]+)(\d+):([A-Z]+)(\d+)$")
+
+# Пустых строк в сетке листа сверх данных (как у реальной таблицы)
+_SPARE_ROWS = 100
+
+
+def column_index(letters: str) -> int:
+    """Номер колонки с 1 по буквенному обозначению (A -> 1, AA -> 27)"""
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index
+
+
+def frame_values(df: pd.DataFrame) -> List[List[Any]]:
+    """Лист в формате values API: заголовок и строки, пустые ячейки - ''"""
+    body = df.astype(object).where(df.notna(), '').values.tolist()
+    return [list(df.columns), *body]
+
+
+class FakeSheetsServer:
+    """HTTP-сервер с одной таблицей из одного листа"""
+
+    def __init__(self, sheet_id: str, sheet_name: str, df: pd.DataFrame, latency: float = 0.0):
+        """
+        Args:
+            sheet_id: ID таблицы
+            sheet_name: название листа
+            df: содержимое листа
+            latency: задержка каждого ответа в секундах
+        """
+        self.sheet_id = sheet_id
+        self.sheet_name = sheet_name
+        self.latency = latency
+        self.failing = False
+        self.version = 0
+        self.modified_time = ''
+        self.values: List[List[Any]] = []
+        self.calls: Counter = Counter()
+        self.port = 0
+        self._server: Optional[HTTPServer] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self.set_frame(df)
+
+    @property
+    def sheets_api_url(self) -> str:
+        return f'http://127.0.0.1:{self.port}/v4'
+
+    @property
+    def drive_api_url(self) -> str:
+        return f'http://127.0.0.1:{self.port}/drive/v3'
+
+    def set_frame(self, df: pd.DataFrame):
+        """Замена содержимого листа (увеличивает версию файла, как правка в Sheets)"""
+        self.values = frame_values(df)
+        self.version += 1
+        self.modified_time = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())
+
+    def _read_range(self, a1: str) -> Tuple[str, List[List[Any]]]:
+        match = _RANGE.match(a1)
+        if not match:
+            raise ValueError(a1)
+        quoted, plain, first_col, first_row, last_col, last_row = match.groups()
+        name = quoted.replace("''", "'") if quoted is not None else plain
+        if name != self.sheet_name:
+            raise ValueError(a1)
+        cols = slice(column_index(first_col) - 1, column_index(last_col))
+        rows = [row[cols] for row in self.values[int(first_row) - 1:int(last_row)]]
+        # Как в API: пустые строки в конце диапазона не возвращаются
+        while rows and not any(v != '' for v in rows[-1]):
+            rows.pop()
+        return a1, rows
+
+    def _make_app(self) -> Application:
+        server = self
+
+        class Handler(RequestHandler):
+            kind = ''
+
+            async def prepare(self):
+                server.calls[self.kind] += 1
+                if server.latency:
+                    await asyncio.sleep(server.latency)
+                if server.failing:
+                    self.set_status(503)
+                    self.finish({'error': {'code': 503, 'message': 'The service is currently unavailable.'}})
+
+        class DriveHandler(Handler):
+            kind = 'revision'
+
+            def get(self, sheet_id: str):
+                if sheet_id != server.sheet_id:
+                    return self.send_error(404)
+                self.write({'version': str(server.version), 'modifiedTime': server.modified_time})
+
+        class MetadataHandler(Handler):
+            kind = 'metadata'
+
+            def get(self, sheet_id: str):
+                if sheet_id != server.sheet_id:
+                    return self.send_error(404)
+                grid = {'rowCount': len(server.values) + _SPARE_ROWS,
+                        'columnCount': len(server.values[0]) if server.values else 0}
+                self.write({'sheets': [{'properties': {'title': server.sheet_name, 'gridProperties': grid}}]})
+
+        class BatchGetHandler(Handler):
+            kind = 'batch_get'
+
+            def get(self, sheet_id: str):
+                if sheet_id != server.sheet_id:
+                    return self.send_error(404)
+                try:
+                    ranges = [server._read_range(a1) for a1 in self.get_arguments('ranges')]
+                except ValueError:
+                    return self.send_error(400)
+                self.write({'spreadsheetId': sheet_id, 'valueRanges': [
+                    {'range': a1, 'majorDimension': 'ROWS', 'values': rows} for a1, rows in ranges
+                ]})
+
+        class ValuesHandler(Handler):
+            kind = 'values_get'
+
+            def get(self, sheet_id: str, a1: str):
+                if sheet_id != server.sheet_id:
+                    return self.send_error(404)
+                try:
+                    a1, rows = server._read_range(unquote(a1))
+                except ValueError:
+                    return self.send_error(400)
+                self.write({'range': a1, 'majorDimension': 'ROWS', 'values': rows})
+
+        return Application([
+            (r'/drive/v3/files/([^/]+)', DriveHandler),
+            (r'/v4/spreadsheets/([^/]+)/values:batchGet', BatchGetHandler),
+            (r'/v4/spreadsheets/([^/]+)/values/(.+)', ValuesHandler),
+            (r'/v4/spreadsheets/([^/]+)', MetadataHandler),
+        ])
+
+    async def start(self, port: int = 0):
+        """Запуск сервера на 127.0.0.1 в текущем event loop (port=0 - свободный порт)"""
+        sockets = bind_sockets(port, '127.0.0.1')
+        self.port = sockets[0].getsockname()[1]
+        self._server = HTTPServer(self._make_app())
+        self._server.add_sockets(sockets)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.stop()
+            await self._server.close_all_connections()
+
+    def start_in_thread(self):
+        """Запуск в отдельном потоке со своим event loop (для синхронного клиента)"""
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name='fake-sheets', daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def stop_thread(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
@@ -0,0 +1,227 @@
+"""
+Фейковый Telegram Bot API для локальных нагрузочных тестов
+
+Сервер отвечает на вызовы бота (getMe, sendMessage, editMessageText, ...)
+правдоподобными JSON-ответами с настраиваемой задержкой и записывает
+все вызовы; вспомогательные функции строят апдейты, которые клиент
+отправляет POST-запросами на webhook бота. FakeBotRequest дает те же
+ответы внутри процесса, без HTTP.
+
+При заданных лимитах сервер, как Telegram, отвечает 429 с retry_after на
+сообщения сверх лимита чата или бота за последнюю секунду
+"""
+
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from telegram.request import BaseRequest, RequestData
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+from tornado.web import Application, RequestHandler
+
+BOT_ID = 123456
+BOT_TOKEN = f'{BOT_ID}:TEST-TOKEN'
+
+
+def make_user(user_id: int) -> Dict[str, Any]:
+    return {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}', 'username': f'user{user_id}'}
+
+
+def make_chat(chat_id: int) -> Dict[str, Any]:
+    return {'id': chat_id, 'type': 'private', 'first_name': f'User{chat_id}'}
+
+
+def make_message_update(update_id: int, chat_id: int, text: str, message_id: int = 1) -> Dict[str, Any]:
+    """Апдейт с текстовым сообщением пользователя (chat_id совпадает с user_id)"""
+    message = {
+        'message_id': message_id,
+        'date': int(time.time()),
+        'chat': make_chat(chat_id),
+        'from': make_user(chat_id),
+        'text': text,
+    }
+    if text.startswith('/'):
+        command = text.split()[0]
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+    return {'update_id': update_id, 'message': message}
+
+
+def make_callback_update(update_id: int, chat_id: int, data: str, message_id: int = 1) -> Dict[str, Any]:
+    """Апдейт с нажатием инлайн-кнопки под сообщением бота"""
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': make_user(chat_id),
+            'chat_instance': str(chat_id),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': make_chat(chat_id),
+                'from': {'id': BOT_ID, 'is_bot': True, 'first_name': 'Bot', 'username': 'test_bot'},
+                'text': 'results',
+            },
+        },
+    }
+
+
+def api_result(method: str, params: Dict[str, Any], message_ids: Iterator[int]) -> Any:
+    """Поле result успешного ответа Bot API на вызов method"""
+    if method == 'getMe':
+        return {'id': BOT_ID, 'is_bot': True, 'first_name': 'Bot', 'username': 'test_bot',
+                'can_join_groups': True, 'can_read_all_group_messages': False,
+                'supports_inline_queries': False}
+    if method in ('sendMessage', 'editMessageText'):
+        chat_id = int(params.get('chat_id', 0))
+        message_id = int(params['message_id']) if 'message_id' in params else next(message_ids)
+        return {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': make_chat(chat_id),
+            'from': {'id': BOT_ID, 'is_bot': True, 'first_name': 'Bot', 'username': 'test_bot'},
+            'text': params.get('text', ''),
+        }
+    # setWebhook, deleteWebhook, answerCallbackQuery, editMessageReplyMarkup и т.д.
+    return True
+
+
+class FakeBotRequest(BaseRequest):
+    """
+    Bot API внутри процесса: запросы бота не уходят в сеть
+
+    Подключается через ApplicationBuilder.request(); вызовы считаются
+    по методам в calls
+    """
+
+    def __init__(self, latency: float = 0.0):
+        """
+        Args:
+            latency: задержка ответа в секундах (имитация сети до Telegram)
+        """
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._message_ids = itertools.count(1000)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None,
+                         pool_timeout=None) -> Tuple[int, bytes]:
+        api_method = url.rsplit('/', 1)[-1]
+        self.calls[api_method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = request_data.parameters if request_data is not None else {}
+        body = {'ok': True, 'result': api_result(api_method, params, self._message_ids)}
+        return 200, json.dumps(body).encode()
+
+
+class FakeTelegramServer:
+    """
+    HTTP-сервер, имитирующий https://api.telegram.org/bot<token>/<method>
+
+    Все вызовы сохраняются в calls в порядке получения
+    """
+
+    def __init__(self, latency: float = 0.0, chat_limit: int = 0, overall_limit: int = 0, retry_after: int = 1):
+        """
+        Args:
+            latency: задержка ответа в секундах (имитация сети до Telegram)
+            chat_limit: сообщений в чат за секунду, сверх которых ответ 429 (0 - без лимита)
+            overall_limit: сообщений бота за секунду, сверх которых ответ 429 (0 - без лимита)
+            retry_after: значение retry_after в ответе 429
+        """
+        self.latency = latency
+        self.chat_limit = chat_limit
+        self.overall_limit = overall_limit
+        self.retry_after = retry_after
+        self._sent_by_chat: Dict[int, Deque[float]] = {}
+        self._sent: Deque[float] = deque()
+        self.flood_errors = 0
+        self.calls: List[Dict[str, Any]] = []
+        self._message_ids = itertools.count(1000)
+        self._server: Optional[HTTPServer] = None
+        self.port = 0
+
+    @property
+    def base_url(self) -> str:
+        """Значение для ApplicationBuilder.base_url / TELEGRAM_API_BASE_URL"""
+        return f'http://127.0.0.1:{self.port}/bot'
+
+    def calls_by_chat(self, method: Optional[str] = None) -> Dict[int, List[Dict[str, Any]]]:
+        """Принятые вызовы (без ответов 429), сгруппированные по chat_id, в порядке получения"""
+        grouped: Dict[int, List[Dict[str, Any]]] = {}
+        for call in self.calls:
+            if (method and call['method'] != method) or call['flooded']:
+                continue
+            chat_id = call['params'].get('chat_id')
+            if chat_id is not None:
+                grouped.setdefault(int(chat_id), []).append(call)
+        return grouped
+
+    def _flooded(self, params: Dict[str, Any]) -> bool:
+        """Проверка лимитов: сообщение учитывается, только если оно принято"""
+        if 'chat_id' not in params or not (self.chat_limit or self.overall_limit):
+            return False
+        now = time.monotonic()
+        chat = self._sent_by_chat.setdefault(int(params['chat_id']), deque())
+        for window in (chat, self._sent):
+            while window and now - window[0] >= 1.0:
+                window.popleft()
+        if (self.chat_limit and len(chat) >= self.chat_limit) or \
+                (self.overall_limit and len(self._sent) >= self.overall_limit):
+            self.flood_errors += 1
+            return True
+        chat.append(now)
+        self._sent.append(now)
+        return False
+
+    def _respond(self, method: str, params: Dict[str, Any]) -> Any:
+        return api_result(method, params, self._message_ids)
+
+    async def start(self, port: int = 0):
+        """Запуск сервера на 127.0.0.1 (port=0 - свободный порт)"""
+        server = self
+
+        class Handler(RequestHandler):
+            async def post(self, token: str, method: str):
+                content_type = self.request.headers.get('Content-Type', '')
+                if content_type.startswith('application/json'):
+                    params = json.loads(self.request.body or b'{}')
+                else:
+                    params = {k: v[0].decode() for k, v in self.request.body_arguments.items()}
+                flooded = server._flooded(params)
+                server.calls.append({'method': method, 'params': params, 'time': time.perf_counter(),
+                                     'flooded': flooded})
+                if server.latency:
+                    await asyncio.sleep(server.latency)
+                self.set_header('Content-Type', 'application/json')
+                if flooded:
+                    self.set_status(429)
+                    self.write(json.dumps({
+                        'ok': False, 'error_code': 429,
+                        'description': f'Too Many Requests: retry after {server.retry_after}',
+                        'parameters': {'retry_after': server.retry_after},
+                    }))
+                    return
+                self.write(json.dumps({'ok': True, 'result': server._respond(method, params)}))
+
+        app = Application([(r'/bot([^/]+)/(\w+)', Handler)])
+        sockets = bind_sockets(port, '127.0.0.1')
+        self.port = sockets[0].getsockname()[1]
+        self._server = HTTPServer(app)
+        self._server.add_sockets(sockets)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.stop()
+            await self._server.close_all_connections()
@@ -0,0 +1,75 @@
+"""
+Бенчмарк загрузки датасета: чтение целиком против потоковой загрузки частями
+
+Каждый режим запускается в отдельном процессе, чтобы пиковый RSS не смешивался.
+
+Запуск:
+    python -m benchmarks.ingest_benchmark --rows 50000 --format csv --chunk-size 5000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import make_dataframe
+
+
+def _run_mode(filepath: str, chunk_size: int) -> dict:
+    """Загрузка в текущем процессе (вызывается в дочернем процессе)"""
+    from data.dataset_manager import DatasetManager
+    from data.streaming import peak_rss_mb
+
+    baseline = peak_rss_mb()
+    manager = DatasetManager(data_source='local', stream_chunk_size=chunk_size)
+    started = time.perf_counter()
+    if not manager.load_dataset(filepath=filepath):
+        raise RuntimeError(f"Не удалось загрузить {filepath}")
+    seconds = time.perf_counter() - started
+    rows = len(manager.dataset)
+    return {
+        'rows': rows,
+        'seconds': round(seconds, 2),
+        'rows_per_second': round(rows / seconds),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'rss_growth_mb': round(peak_rss_mb() - baseline, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--child', nargs=2, metavar=('FILE', 'CHUNK'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_run_mode(args.child[0], int(args.child[1]))))
+        return
+
+    with tempfile.TemporaryDirectory(prefix='ingest_bench_') as workdir:
+        filepath = os.path.join(workdir, f'measures.{args.format}')
+        df = make_dataframe(args.rows)
+        if args.format == 'csv':
+            df.to_csv(filepath, index=False)
+        else:
+            df.to_excel(filepath, index=False)
+        print(f"Файл: {args.rows} строк, {os.path.getsize(filepath) / 2**20:.1f} МБ")
+
+        print(f"{'режим':>12} {'rows/s':>10} {'время, s':>10} {'пик RSS, МБ':>12} {'прирост, МБ':>12}")
+        for mode, chunk_size in (('целиком', 0), ('потоково', args.chunk_size)):
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.ingest_benchmark', '--child', filepath, str(chunk_size)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:>12} {result['rows_per_second']:>10} {result['seconds']:>10} "
+                  f"{result['peak_rss_mb']:>12} {result['rss_growth_mb']:>12}")
+
+
+if __name__ == '__main__':
+    main()
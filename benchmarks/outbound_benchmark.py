@@ -0,0 +1,65 @@
+"""
+Бенчмарк исходящих вызовов: вызовы Bot API на запрос и ответы 429 при всплеске
+
+Бот запускается в webhook-режиме против фейкового Bot API с лимитами
+Telegram (сообщений в чат и на бота за секунду, сверх них - 429).
+Все чаты одновременно отправляют /start и запросы; сравниваются:
+    baseline    - заглушка "Обрабатываю запрос..." отправляется всегда, без ограничения частоты
+    coalesce    - заглушка отправляется, только если поиск дольше PLACEHOLDER_DELAY
+    limiter     - token bucket на чат и на бота (ChatRateLimiter)
+    both        - ограничение частоты и объединение заглушки с ответом
+
+Запуск:
+    python -m benchmarks.outbound_benchmark --chats 60 --rounds 2
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+
+from benchmarks.synthetic import make_dataframe
+from benchmarks.webhook_benchmark import run
+
+SCENARIOS = {
+    'baseline': {'PLACEHOLDER_DELAY': '0', 'RATE_LIMIT_OVERALL': '0'},
+    'coalesce': {'PLACEHOLDER_DELAY': '0.5', 'RATE_LIMIT_OVERALL': '0'},
+    'limiter': {'PLACEHOLDER_DELAY': '0', 'RATE_LIMIT_OVERALL': '30'},
+    'both': {'PLACEHOLDER_DELAY': '0.5', 'RATE_LIMIT_OVERALL': '30'},
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chats', type=int, default=60)
+    parser.add_argument('--rounds', type=int, default=2)
+    parser.add_argument('--rows', type=int, default=5000, help='размер синтетического датасета')
+    parser.add_argument('--latency', type=float, default=0.02, help='задержка фейкового Bot API, с')
+    parser.add_argument('--chat-limit', type=int, default=4, help='лимит фейкового API: сообщений в чат за секунду')
+    parser.add_argument('--overall-limit', type=int, default=35, help='лимит фейкового API: сообщений за секунду')
+    parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument('--settle-timeout', type=float, default=60,
+                        help='сколько ждать доставки результатов (потерянные после 429 не придут)')
+    args = parser.parse_args()
+
+    api_options = {'chat_limit': args.chat_limit, 'overall_limit': args.overall_limit, 'retry_after': 1}
+    with tempfile.TemporaryDirectory(prefix='outbound_bench_') as workdir:
+        dataset_path = os.path.join(workdir, 'measures.csv')
+        make_dataframe(args.rows).to_csv(dataset_path, index=False)
+
+        print(f"Лимиты фейкового API: {args.chat_limit} сообщ./с в чат, {args.overall_limit} сообщ./с на бота")
+        print(f"{'сценарий':>10} {'запросов':>9} {'доставлено':>11} {'вызовов':>8} {'вызовов/запрос':>15} "
+              f"{'ответов 429':>12} {'время, s':>9} {'нарушения порядка':>18}")
+        for name in args.scenarios:
+            result = asyncio.run(run(args.chats, args.rounds, 64, args.latency, dataset_path,
+                                     extra_env=SCENARIOS[name], api_options=api_options,
+                                     settle_timeout=args.settle_timeout))
+            # Вызовы на запрос: сообщения чата за раунд минус приветствие /start
+            per_query = (result['message_calls'] - result['queries']) / result['queries']
+            print(f"{name:>10} {result['queries']:>9} {result['results_delivered']:>11} "
+                  f"{result['message_calls']:>8} {per_query:>15.2f} {result['flood_errors']:>12} "
+                  f"{result['seconds']:>9.2f} {result['ordering_violations']:>18}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Бенчмарк сохранения диалогов: стоимость цикла update_persistence, размер
+хранилища и восстановление после перезапуска
+
+Вызовы повторяют Application.update_persistence: для каждого измененного
+пользователя update_user_data(deepcopy(user_data)) и update_conversation
+через asyncio.gather. Для сравнения тот же сценарий прогоняется через
+PicklePersistence из python-telegram-bot.
+
+Запуск:
+    python -m benchmarks.persistence_benchmark --users 5000 --cycles 5
+"""
+
+import argparse
+import asyncio
+import copy
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+from telegram.ext import PersistenceInput, PicklePersistence
+
+from benchmarks.synthetic import QUERIES, make_dataframe
+from bot.persistence import SQLitePersistence
+from data.dataset_manager import DatasetManager
+
+CONVERSATION = 'support_search'
+
+
+def make_user_data(manager: DatasetManager, users: int) -> Dict[int, Dict[str, Any]]:
+    """user_data в том виде, в каком его оставляют обработчики после поиска"""
+    data = {}
+    for user_id in range(1, users + 1):
+        query = QUERIES[user_id % len(QUERIES)]
+        data[user_id] = {
+            'user_query': query,
+            'query_timestamp': datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc),
+            'result_ids': manager.search_ids(query, top_k=50),
+            'results_page': 0,
+            'search_message_id': 1000 + user_id,
+            'search_filters': {'categories': ['Финансы'], 'statuses': [], 'max_amount': None,
+                               'min_amount': None, 'deadline_after': None},
+        }
+    return data
+
+
+async def run_cycles(persistence, user_data: Dict[int, Dict[str, Any]], cycles: int,
+                     dirty_fraction: float) -> Dict[str, float]:
+    """Циклы update_persistence: время на loop и время до окончания записи"""
+    dirty = list(user_data)[:max(1, int(len(user_data) * dirty_fraction))]
+    loop_times, total_times = [], []
+    for cycle in range(cycles):
+        for user_id in dirty:
+            user_data[user_id]['search_message_id'] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(persistence.update_user_data(user_id, copy.deepcopy(user_data[user_id])) for user_id in dirty),
+            *(persistence.update_conversation(CONVERSATION, (user_id, user_id), 1 + cycle % 2) for user_id in dirty),
+        )
+        loop_times.append(time.perf_counter() - started)
+        write_task = getattr(persistence, '_write_task', None)
+        if write_task is not None:
+            await write_task
+        total_times.append(time.perf_counter() - started)
+    return {'loop_ms': statistics.median(loop_times) * 1000, 'total_ms': statistics.median(total_times) * 1000}
+
+
+async def restore(path: str, manager: DatasetManager, user_data: Dict[int, Dict[str, Any]]) -> Dict[str, float]:
+    """Перезапуск: чтение состояний диалогов и ленивая загрузка каждого пользователя"""
+    persistence = SQLitePersistence(path, manager=manager)
+    started = time.perf_counter()
+    conversations = await persistence.get_conversations(CONVERSATION)
+    conversations_ms = (time.perf_counter() - started) * 1000
+
+    latencies, mismatches = [], 0
+    for user_id, expected in user_data.items():
+        restored: Dict[str, Any] = {}
+        started = time.perf_counter()
+        await persistence.refresh_user_data(user_id, restored)
+        latencies.append(time.perf_counter() - started)
+        if ([tuple(ref) for ref in restored.get('result_ids', [])] != [tuple(ref) for ref in expected['result_ids']]
+                or restored.get('query_timestamp') != expected['query_timestamp']
+                or restored.get('search_message_id') != expected['search_message_id']):
+            mismatches += 1
+    await persistence.flush()
+    return {
+        'conversations': len(conversations),
+        'conversations_ms': conversations_ms,
+        'user_p50_ms': statistics.median(latencies) * 1000,
+        'mismatches': mismatches,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--cycles', type=int, default=5)
+    parser.add_argument('--dirty', type=float, default=0.2, help='доля пользователей, измененных за цикл')
+    parser.add_argument('--pickle-users', type=int, default=500,
+                        help='пользователей для PicklePersistence (пишет файл целиком на каждый вызов)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='persistence_bench_') as workdir:
+        dataset_path = os.path.join(workdir, 'measures.csv')
+        make_dataframe(args.rows).to_csv(dataset_path, index=False)
+        manager = DatasetManager(data_source='local')
+        manager.load_dataset(filepath=dataset_path)
+
+        sqlite_path = os.path.join(workdir, 'persistence.sqlite3')
+        pickle_path = os.path.join(workdir, 'persistence.pickle')
+
+        async def sqlite_run():
+            persistence = SQLitePersistence(sqlite_path, manager=manager)
+            user_data = make_user_data(manager, args.users)
+            for user_id in user_data:
+                await persistence.refresh_user_data(user_id, {})
+            # Первая запись всех пользователей, затем циклы с частью измененных
+            await run_cycles(persistence, user_data, 1, 1.0)
+            result = await run_cycles(persistence, user_data, args.cycles, args.dirty)
+            await persistence.flush()
+            return result, user_data
+
+        async def pickle_run():
+            persistence = PicklePersistence(pickle_path, store_data=PersistenceInput(
+                bot_data=False, chat_data=False, callback_data=False))
+            user_data = make_user_data(manager, args.pickle_users)
+            await run_cycles(persistence, user_data, 1, 1.0)
+            result = await run_cycles(persistence, user_data, args.cycles, args.dirty)
+            await persistence.flush()
+            return result
+
+        sqlite_result, user_data = asyncio.run(sqlite_run())
+        pickle_result = asyncio.run(pickle_run())
+        sqlite_size = sum(os.path.getsize(os.path.join(workdir, name)) for name in os.listdir(workdir)
+                          if name.startswith('persistence.sqlite3'))
+        restored = asyncio.run(restore(sqlite_path, manager, user_data))
+
+        dirty_sqlite = int(args.users * args.dirty)
+        dirty_pickle = int(args.pickle_users * args.dirty)
+        print(f"{'backend':>8} {'польз.':>7} {'изменено':>9} {'loop, мс':>9} {'запись, мс':>11} {'байт/польз.':>12}")
+        print(f"{'sqlite':>8} {args.users:>7} {dirty_sqlite:>9} {sqlite_result['loop_ms']:>9.1f} "
+              f"{sqlite_result['total_ms']:>11.1f} {sqlite_size / args.users:>12.0f}")
+        print(f"{'pickle':>8} {args.pickle_users:>7} {dirty_pickle:>9} {pickle_result['loop_ms']:>9.1f} "
+              f"{pickle_result['total_ms']:>11.1f} {os.path.getsize(pickle_path) / args.pickle_users:>12.0f}")
+        print(f"\nПерезапуск: {restored['conversations']} диалогов за {restored['conversations_ms']:.1f} мс, "
+              f"ленивая загрузка пользователя p50 {restored['user_p50_ms']:.3f} мс, "
+              f"расхождений: {restored['mismatches']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Бенчмарк полнотекстового поиска: задержка запроса (p50/p99) в зависимости от размера датасета
+
+Запуск:
+    python -m benchmarks.search_benchmark --sizes 1000 10000 50000
+"""
+
+import argparse
+import statistics
+import time
+from typing import Dict, List, Sequence
+
+from benchmarks.synthetic import QUERIES, make_dataframe
+from data.search_engine import FIELD_WEIGHTS, SearchEngine
+
+
+def percentile(samples: Sequence[float], q: float) -> float:
+    """Перцентиль q (0..100) по отсортированной выборке"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(sizes: List[int], iterations: int, top_k: int) -> List[Dict[str, float]]:
+    """
+    Прогон бенчмарка по списку размеров датасета
+
+    Returns:
+        строки отчета: размер, время построения, p50/p99/среднее в микросекундах
+    """
+    report = []
+    for size in sizes:
+        df = make_dataframe(size)
+
+        started = time.perf_counter()
+        engine = SearchEngine.from_dataframe(df, list(FIELD_WEIGHTS))
+        build_seconds = time.perf_counter() - started
+
+        latencies = []
+        for i in range(iterations):
+            query = QUERIES[i % len(QUERIES)]
+            started = time.perf_counter()
+            engine.search(query, top_k)
+            latencies.append((time.perf_counter() - started) * 1e6)
+
+        report.append({
+            'size': size,
+            'build_s': build_seconds,
+            'p50_us': percentile(latencies, 50),
+            'p99_us': percentile(latencies, 99),
+            'mean_us': statistics.fmean(latencies),
+        })
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--top-k', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'size':>8} {'build, s':>10} {'p50, мкс':>10} {'p99, мкс':>10} {'mean, мкс':>10}")
+    for row in run(args.sizes, args.iterations, args.top_k):
+        print(f"{row['size']:>8} {row['build_s']:>10.2f} {row['p50_us']:>10.1f} {row['p99_us']:>10.1f} "
+              f"{row['mean_us']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
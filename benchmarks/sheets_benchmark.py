@@ -0,0 +1,126 @@
+"""
+Бенчмарк загрузки датасета из Google Sheets против фейкового API
+
+Сценарии (DatasetManager с GoogleSheetsLoader):
+    initial     - первая загрузка: ревизия, размеры листа, batchGet
+    unchanged   - фоновая проверка и перезагрузка без изменений в таблице
+    edited      - правка нескольких строк: скачивание и инкрементальное обновление
+    restart     - перезапуск бота без изменений: данные из кэша, без скачивания
+    api_down    - перезапуск при недоступном API (503): последний кэш
+    api_slow    - перезапуск при API медленнее таймаута: последний кэш
+Для сравнения лист читается построчно (один values.get на строку, как
+при обходе строк через gspread); время оценивается по выборке строк.
+
+Запуск:
+    python -m benchmarks.sheets_benchmark --rows 5000 --latency 0.02
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+from typing import Any, Callable, Dict
+
+from benchmarks.fake_sheets import FakeSheetsServer
+from benchmarks.synthetic import make_dataframe
+from data.dataset_manager import DatasetManager
+from data.sheets_loader import GoogleSheetsLoader, column_letter
+
+SHEET_ID = 'test-sheet'
+SHEET_NAME = 'measures_sheet'
+LOAD_KWARGS = {'sheet_id': SHEET_ID, 'sheet_name': SHEET_NAME}
+
+
+def make_manager(server: FakeSheetsServer, cache_dir: str, timeout: float, batch_rows: int) -> DatasetManager:
+    loader = GoogleSheetsLoader(SHEET_ID, SHEET_NAME, credentials_file='', cache_dir=cache_dir, timeout=timeout,
+                                batch_rows=batch_rows, sheets_api_url=server.sheets_api_url,
+                                drive_api_url=server.drive_api_url)
+    return DatasetManager(data_source='google_sheets', sheets_loader=loader)
+
+
+def measure(server: FakeSheetsServer, manager: DatasetManager, action: Callable[[], Any]) -> Dict[str, Any]:
+    server.calls.clear()
+    started = time.perf_counter()
+    action()
+    return {
+        'seconds': time.perf_counter() - started,
+        'calls': dict(server.calls),
+        'version': manager.version,
+        'rows': manager.state.size if manager.state else 0,
+        'loader': dict(manager.sheets_loader.counters),
+    }
+
+
+def refresh(manager: DatasetManager):
+    """Как DatasetRefresher: проверка источника, затем перестроение в случае изменений"""
+    if manager.source_changed(**LOAD_KWARGS):
+        manager.publish(manager.build_state(**LOAD_KWARGS))
+
+
+def row_by_row(server: FakeSheetsServer, loader: GoogleSheetsLoader, rows: int) -> float:
+    """Построчное чтение первых rows строк; время в секундах"""
+    last_column = column_letter(len(server.values[0]))
+    started = time.perf_counter()
+    for row in range(1, rows + 1):
+        loader._get(f'{loader.sheets_api_url}/spreadsheets/{SHEET_ID}/values/'
+                    f"'{SHEET_NAME}'!A{row}:{last_column}{row}", [])
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.02, help='задержка ответа фейкового API, с')
+    parser.add_argument('--batch-rows', type=int, default=1000, help='строк в одном диапазоне batchGet')
+    parser.add_argument('--timeout', type=float, default=1.0, help='таймаут запроса загрузчика, с')
+    parser.add_argument('--edits', type=int, default=10, help='строк, изменяемых в сценарии edited')
+    parser.add_argument('--sample', type=int, default=200, help='строк в выборке построчного чтения')
+    args = parser.parse_args()
+    # Ответы 503 и таймауты в сценариях ожидаемы
+    logging.getLogger('tornado.access').setLevel(logging.CRITICAL)
+
+    df = make_dataframe(args.rows)
+    server = FakeSheetsServer(SHEET_ID, SHEET_NAME, df, latency=args.latency)
+    server.start_in_thread()
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory(prefix='sheets_bench_') as cache_dir:
+            manager = make_manager(server, cache_dir, args.timeout, args.batch_rows)
+            results['initial'] = measure(server, manager, lambda: manager.load_dataset(**LOAD_KWARGS))
+            results['unchanged'] = measure(server, manager, lambda: refresh(manager))
+
+            edited = df.copy()
+            edited.loc[:args.edits - 1, 'Описание'] = edited.loc[:args.edits - 1, 'Описание'] + ' (обновлено)'
+            server.set_frame(edited)
+            results['edited'] = measure(server, manager, lambda: refresh(manager))
+
+            restarted = make_manager(server, cache_dir, args.timeout, args.batch_rows)
+            results['restart'] = measure(server, restarted, lambda: restarted.load_dataset(**LOAD_KWARGS))
+
+            server.failing = True
+            down = make_manager(server, cache_dir, args.timeout, args.batch_rows)
+            results['api_down'] = measure(server, down, lambda: down.load_dataset(**LOAD_KWARGS))
+            server.failing = False
+
+            server.latency = args.timeout * 2
+            slow = make_manager(server, cache_dir, args.timeout, args.batch_rows)
+            results['api_slow'] = measure(server, slow, lambda: slow.load_dataset(**LOAD_KWARGS))
+            server.latency = args.latency
+
+            server.calls.clear()
+            sample = min(args.sample, args.rows)
+            naive_seconds = row_by_row(server, manager.sheets_loader, sample) * (args.rows + 1) / sample
+    finally:
+        server.stop_thread()
+
+    print(f"{'сценарий':>10} {'время, s':>9} {'версия':>7} {'строк':>6}  вызовы API")
+    for name, row in results.items():
+        calls = ', '.join(f'{kind}={count}' for kind, count in sorted(row['calls'].items()))
+        print(f"{name:>10} {row['seconds']:>9.3f} {row['version']:>7} {row['rows']:>6}  {calls}")
+    print(f"\nпострочное чтение: {args.rows + 1} вызовов values.get, ~{naive_seconds:.1f} s "
+          f"(оценка по {sample} строкам)")
+    print(f"счетчики загрузчика (api_slow): {results['api_slow']['loader']}")
+
+
+if __name__ == '__main__':
+    main()
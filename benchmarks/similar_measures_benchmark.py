@@ -0,0 +1,95 @@
+"""
+Бенчмарк графа похожих мер: построение, инкрементальное обновление и поиск соседей
+
+Для каждого размера каталога:
+    build        - полное построение SimilarityGraph (в одном потоке и в --threads потоков)
+    update       - apply_changes после изменения 1% мер против полного построения
+    lookup       - похожие меры из графа (related) против расчета по всему каталогу
+                   на каждый запрос (произведение вектора меры на матрицу и argpartition)
+
+Запуск:
+    python -m benchmarks.similar_measures_benchmark --sizes 1000 10000 --k 8 --threads 4
+"""
+
+import argparse
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_dataframe
+from data.dataset_delta import diff_datasets, row_hashes
+from data.embedding_index import EmbeddingIndex, HashingEncoder
+from data.similar_measures import CATEGORY_WEIGHT, SimilarityGraph
+
+LOOKUPS = 2000
+
+
+def _brute_force(matrix: np.ndarray, categories: np.ndarray, position: int, k: int) -> np.ndarray:
+    """Соседи одной меры расчетом по всему каталогу"""
+    scores = (1 - CATEGORY_WEIGHT) * (matrix @ matrix[position])
+    scores += CATEGORY_WEIGHT * (categories == categories[position])
+    scores[position] = -np.inf
+    top = np.argpartition(scores, len(scores) - k)[-k:]
+    return top[np.argsort(-scores[top])]
+
+
+def run(sizes: List[int], k: int, threads: int) -> List[Dict[str, float]]:
+    report = []
+    rng = np.random.default_rng(0)
+    for size in sizes:
+        df = make_dataframe(size)
+        encoder = HashingEncoder()
+        index = EmbeddingIndex.build((df['Название'] + ' ' + df['Описание']).tolist(), encoder, backend='numpy')
+        categories = pd.factorize(df['Категория'])[0]
+        row = {'size': size}
+
+        started = time.perf_counter()
+        graph = SimilarityGraph.build(index.matrix, categories, k)
+        row['build_s'] = time.perf_counter() - started
+        started = time.perf_counter()
+        SimilarityGraph.build(index.matrix, categories, k, threads)
+        row['build_threads_s'] = time.perf_counter() - started
+
+        # 1% мер с измененным описанием
+        changed = df.copy()
+        edited = rng.choice(size, max(1, size // 100), replace=False)
+        changed.loc[edited, 'Описание'] = changed.loc[edited, 'Описание'] + ' дополнительные условия'
+        delta = diff_datasets(df['id'].tolist(), row_hashes(df), changed['id'].tolist(), row_hashes(changed))
+        texts = (changed['Название'] + ' ' + changed['Описание']).tolist()
+        updated_index = index.apply_changes({p: texts[p] for p in delta.new_rows}, delta.moved, delta.size)
+        started = time.perf_counter()
+        graph.apply_changes(delta, updated_index.matrix, categories, threads)
+        row['update_s'] = time.perf_counter() - started
+
+        positions = rng.integers(0, size, LOOKUPS).tolist()
+        started = time.perf_counter()
+        for position in positions:
+            graph.related(position, k)
+        row['graph_us'] = (time.perf_counter() - started) / LOOKUPS * 1e6
+        started = time.perf_counter()
+        for position in positions:
+            _brute_force(index.matrix, categories, position, k)
+        row['brute_us'] = (time.perf_counter() - started) / LOOKUPS * 1e6
+        report.append(row)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--k', type=int, default=8)
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(f"{'size':>8} {'build, s':>9} {f'x{args.threads} потоков, s':>16} {'update 1%, s':>13} "
+          f"{'граф, мкс':>10} {'по каталогу, мкс':>17}")
+    for row in run(args.sizes, args.k, args.threads):
+        print(f"{row['size']:>8} {row['build_s']:>9.2f} {row['build_threads_s']:>16.2f} {row['update_s']:>13.2f} "
+              f"{row['graph_us']:>10.1f} {row['brute_us']:>17.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Бенчмарк холодного старта: полная загрузка xlsx с построением индексов против снапшота
+
+Запуск:
+    python -m benchmarks.snapshot_benchmark --sizes 1000 10000 50000
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import make_dataframe
+from data.dataset_manager import DatasetManager
+
+
+def timed_load(filepath: str, snapshot_dir: str) -> float:
+    """Время load_dataset на новом экземпляре менеджера (секунды)"""
+    manager = DatasetManager(data_source='local', snapshot_dir=snapshot_dir)
+    started = time.perf_counter()
+    if not manager.load_dataset(filepath=filepath):
+        raise RuntimeError(f"Не удалось загрузить {filepath}")
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    print(f"{'size':>8} {'xlsx + индексы, s':>18} {'снапшот, s':>12} {'ускорение':>10}")
+    for size in args.sizes:
+        workdir = tempfile.mkdtemp(prefix='snapshot_bench_')
+        try:
+            filepath = os.path.join(workdir, 'measures.xlsx')
+            make_dataframe(size).to_excel(filepath, index=False)
+            snapshot_dir = os.path.join(workdir, 'snapshot')
+
+            cold = timed_load(filepath, snapshot_dir)
+            warm = timed_load(filepath, snapshot_dir)
+            print(f"{size:>8} {cold:>18.2f} {warm:>12.3f} {cold / warm:>9.0f}x")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
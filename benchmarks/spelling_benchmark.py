@@ -0,0 +1,113 @@
+"""
+Бенчмарк исправления опечаток: построение индекса, время исправления и полнота поиска
+
+Запросы с опечатками получаются из QUERIES случайной правкой (пропуск,
+замена, вставка или перестановка букв) в каждом слове длиннее 4 букв.
+Полнота - доля запросов с опечаткой, чей top-k пересекается с top-k
+исходного запроса; сравнивается поиск без индекса опечаток и с ним.
+Для сравнения приведено время наивного нечеткого поиска: расстояние
+до каждого слова каждой строки датасета (оценка по выборке строк).
+
+Запуск:
+    python -m benchmarks.spelling_benchmark --sizes 1000 10000 50000
+"""
+
+import argparse
+import random
+import time
+from typing import Dict, List
+
+from benchmarks.search_benchmark import percentile
+from benchmarks.synthetic import QUERIES, make_dataframe
+from data.search_engine import FIELD_WEIGHTS, SearchEngine
+from data.spelling import SpellingIndex, within_one_edit
+from data.text_processing import tokenize
+
+_LETTERS = 'абвгдежзийклмнопрстуфхцчшщыэюя'
+
+
+def misspell(word: str, rng: random.Random) -> str:
+    """Одна случайная правка в слове"""
+    i = rng.randrange(1, len(word) - 1)
+    kind = rng.choice(('delete', 'replace', 'insert', 'swap'))
+    if kind == 'delete':
+        return word[:i] + word[i + 1:]
+    if kind == 'replace':
+        return word[:i] + rng.choice(_LETTERS) + word[i + 1:]
+    if kind == 'insert':
+        return word[:i] + rng.choice(_LETTERS) + word[i:]
+    return word[:i - 1] + word[i] + word[i - 1] + word[i + 1:]
+
+
+def typo_queries(count: int, seed: int = 7) -> List[tuple]:
+    """Пары (исходный запрос, запрос с опечатками)"""
+    rng = random.Random(seed)
+    pairs = []
+    for i in range(count):
+        query = QUERIES[i % len(QUERIES)]
+        words = [misspell(word, rng) if len(word) > 4 else word for word in tokenize(query)]
+        pairs.append((query, ' '.join(words)))
+    return pairs
+
+
+def run(sizes: List[int], queries: int, top_k: int, naive_sample: int) -> List[Dict[str, float]]:
+    report = []
+    pairs = typo_queries(queries)
+    for size in sizes:
+        df = make_dataframe(size)
+        engine = SearchEngine.from_dataframe(df, list(FIELD_WEIGHTS))
+
+        started = time.perf_counter()
+        spelling = SpellingIndex.from_postings(engine.postings)
+        build_seconds = time.perf_counter() - started
+
+        latencies, plain_hits, corrected_hits = [], 0, 0
+        for query, typo in pairs:
+            expected = {position for position, _ in engine.search(query, top_k)}
+            plain_hits += bool(expected & {position for position, _ in engine.search(typo, top_k)})
+            spelling._cache.clear()
+            started = time.perf_counter()
+            spelling.expand(typo)
+            latencies.append((time.perf_counter() - started) * 1e6)
+            corrected_hits += bool(expected & {position for position, _ in engine.search(typo, top_k, None, spelling)})
+
+        # Наивный нечеткий поиск: одно слово запроса против всех слов выборки строк
+        sample = df.head(naive_sample)
+        texts = (sample['Название'] + ' ' + sample['Описание']).tolist()
+        started = time.perf_counter()
+        for text in texts:
+            for word in tokenize(text):
+                within_one_edit('субсидя', word)
+        naive_ms = (time.perf_counter() - started) * 1e3 * size / len(texts)
+
+        report.append({
+            'size': size,
+            'terms': len(spelling.terms),
+            'build_s': build_seconds,
+            'p50_us': percentile(latencies, 50),
+            'p99_us': percentile(latencies, 99),
+            'recall_plain': plain_hits / len(pairs),
+            'recall_spelling': corrected_hits / len(pairs),
+            'naive_ms': naive_ms,
+        })
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--queries', type=int, default=600)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--naive-sample', type=int, default=500, help='строк в выборке наивного поиска')
+    args = parser.parse_args()
+
+    print(f"{'size':>8} {'термов':>7} {'build, s':>9} {'p50, мкс':>9} {'p99, мкс':>9} "
+          f"{'полнота':>8} {'с испр.':>8} {'наивно, мс':>11}")
+    for row in run(args.sizes, args.queries, args.top_k, args.naive_sample):
+        print(f"{row['size']:>8} {row['terms']:>7} {row['build_s']:>9.3f} {row['p50_us']:>9.1f} "
+              f"{row['p99_us']:>9.1f} {row['recall_plain']:>8.2f} {row['recall_spelling']:>8.2f} "
+              f"{row['naive_ms']:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Бенчмарк времени запуска бота: от старта процесса до готовности принимать апдейты
+
+Сценарии (python -m bot.main отдельным процессом):
+    replica  - новый экземпляр в webhook-режиме: загрузка датасета из файла
+               (со снапшотом индексов, как при повторном запуске), регистрация
+               webhook; готов, когда вызван setWebhook и порт слушается
+    worker   - перезапуск рабочего процесса многопроцессного режима: датасет
+               из снапшота диспетчера; готов, когда открыт Unix-сокет
+Для каждого сценария выводится медиана и максимум по --runs запускам,
+а также отчет о фазах запуска последнего прогона (STARTUP_REPORT_PATH).
+
+Запуск:
+    python -m benchmarks.startup_benchmark --rows 10000 --runs 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from benchmarks.fake_telegram import FakeTelegramServer
+from benchmarks.synthetic import make_dataframe
+from benchmarks.webhook_benchmark import _free_port, _listening, bot_environment, wait_for
+from data.dataset_manager import DatasetManager
+
+
+def _socket_ready(path: str) -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX) as sock:
+            sock.connect(path)
+            return True
+    except OSError:
+        return False
+
+
+async def start_once(env: Dict[str, str], ready) -> float:
+    """Запуск бота до готовности; время в секундах"""
+    report_path = env.get('STARTUP_REPORT_PATH')
+    if report_path and os.path.exists(report_path):
+        os.unlink(report_path)
+    started = time.perf_counter()
+    bot = subprocess.Popen([sys.executable, '-W', 'ignore', '-m', 'bot.main'], env=env)
+    try:
+        if not await wait_for(lambda: ready() or bot.poll() is not None, timeout=300, interval=0.005):
+            raise RuntimeError("Бот не запустился")
+        if bot.poll() is not None:
+            raise RuntimeError(f"Бот завершился при запуске с кодом {bot.returncode}")
+        elapsed = time.perf_counter() - started
+        if report_path:
+            # Отчет дописывается после фоновой загрузки датасета
+            await wait_for(lambda: any(phase['name'] == 'dataset'
+                                       for phase in _read_report(report_path).get('phases', [])),
+                           timeout=60, interval=0.05)
+        return elapsed
+    finally:
+        bot.send_signal(signal.SIGTERM)
+        try:
+            bot.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            bot.kill()
+
+
+async def run(rows: int, runs: int) -> Dict[str, Any]:
+    report: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory(prefix='startup_bench_') as workdir:
+        dataset_path = os.path.join(workdir, 'measures.csv')
+        make_dataframe(rows).to_csv(dataset_path, index=False)
+        snapshot_dir = os.path.join(workdir, 'snapshot')
+        manager = DatasetManager(data_source='local')
+        manager.load_dataset(filepath=dataset_path)
+        manager.export_snapshot(snapshot_dir)
+        startup_report = os.path.join(workdir, 'startup.json')
+
+        api = FakeTelegramServer()
+        await api.start()
+        try:
+            port = _free_port()
+            replica_env = {
+                **bot_environment(api, port, 64, dataset_path),
+                'INDEX_SNAPSHOT_DIR': os.path.join(workdir, 'replica-snapshot'),
+                'METRICS_PORT': '0',
+                'STARTUP_REPORT_PATH': startup_report,
+            }
+
+            def webhook_ready() -> bool:
+                return any(call['method'] == 'setWebhook' for call in api.calls) and _listening(port)
+
+            # Первый запуск строит снапшот индексов, последующие читают его
+            await start_once(replica_env, webhook_ready)
+            samples: List[float] = []
+            for _ in range(runs):
+                api.calls.clear()
+                samples.append(await start_once(replica_env, webhook_ready))
+            report['replica'] = {'samples': samples, 'phases': _read_report(startup_report)}
+
+            socket_path = os.path.join(workdir, 'worker.sock')
+            worker_env = {
+                **replica_env,
+                'WORKER_INDEX': '0',
+                'WORKER_SOCKET': socket_path,
+                'WORKER_SNAPSHOT_DIR': snapshot_dir,
+            }
+            samples = []
+            for _ in range(runs):
+                samples.append(await start_once(worker_env, lambda: _socket_ready(socket_path)))
+            report['worker'] = {'samples': samples, 'phases': _read_report(startup_report)}
+        finally:
+            await api.stop()
+    return report
+
+
+def _read_report(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.rows, args.runs))
+    print(f"{'сценарий':>9} {'медиана, s':>11} {'макс, s':>8}")
+    for name, row in report.items():
+        print(f"{name:>9} {statistics.median(row['samples']):>11.3f} {max(row['samples']):>8.3f}")
+    for name, row in report.items():
+        phases = row['phases'].get('phases', [])
+        if phases:
+            print(f"\nфазы запуска ({name}):")
+            for phase in phases:
+                print(f"    {phase['name']:<28} {phase['seconds']:>7.3f} s")
+
+
+if __name__ == '__main__':
+    main()
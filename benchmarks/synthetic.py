@@ -0,0 +1,64 @@
+"""
+Генерация синтетического датасета мер поддержки для бенчмарков
+"""
+
+import random
+from typing import Any, Dict, List
+
+import pandas as pd
+
+CATEGORIES = ['Финансы', 'Инновации', 'Экспорт', 'Сельское хозяйство', 'Образование', 'Строительство']
+STATUSES = ['Активна', 'Завершена']
+
+_SUBJECTS = [
+    'малого бизнеса', 'индивидуальных предпринимателей', 'сельхозпроизводителей', 'экспортеров',
+    'технологических стартапов', 'фермерских хозяйств', 'социальных предприятий', 'ремесленников',
+    'производителей оборудования', 'IT-компаний', 'молодых предпринимателей', 'самозанятых',
+]
+_KINDS = ['Субсидия', 'Грант', 'Льготный кредит', 'Компенсация затрат', 'Поручительство', 'Лизинг']
+_PURPOSES = [
+    'на открытие бизнеса', 'на закупку оборудования', 'на модернизацию производства',
+    'на выход на зарубежные рынки', 'на обучение сотрудников', 'на аренду помещений',
+    'на развитие сельского хозяйства', 'на цифровизацию', 'на строительство объектов',
+]
+_CONDITIONS = [
+    'Стаж ИП не менее 6 мес.', 'Оборот менее 10 млн руб.', 'Собственное обеспечение 30%',
+    'Наличие земельного участка', 'Инновационный продукт', 'Регистрация в регионе',
+]
+QUERIES = [
+    'гранты для ИП', 'сельское хозяйство', 'субсидия на оборудование', 'льготный кредит',
+    'поддержка экспорта', 'хочу открыть кафе', 'стартап инновации', 'обучение сотрудников',
+    'аренда помещения', 'самозанятые', 'компенсация затрат на модернизацию', 'лизинг техники',
+]
+
+
+def make_records(n: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    Генерация n синтетических мер поддержки
+
+    Args:
+        n: количество записей
+        seed: зерно генератора для воспроизводимости
+
+    Returns:
+        список записей в формате колонок датасета
+    """
+    rng = random.Random(seed)
+    records = []
+    for i in range(1, n + 1):
+        kind, subject, purpose = rng.choice(_KINDS), rng.choice(_SUBJECTS), rng.choice(_PURPOSES)
+        records.append({
+            'id': i,
+            'Название': f'{kind} для {subject} {purpose}',
+            'Описание': f'{kind} {purpose} для {subject}. Программа {i} регионального фонда поддержки',
+            'Категория': rng.choice(CATEGORIES),
+            'Размер поддержки': f'до {rng.randint(1, 50) * 100} 000 руб.',
+            'Условия': rng.choice(_CONDITIONS),
+            'Статус': rng.choice(STATUSES),
+        })
+    return records
+
+
+def make_dataframe(n: int, seed: int = 42) -> pd.DataFrame:
+    """Синтетический датасет в виде DataFrame"""
+    return pd.DataFrame(make_records(n, seed))
@@ -0,0 +1,211 @@
+"""
+Нагрузочный тест webhook-режима: фейковый клиент Telegram отправляет апдейты POST-запросами
+
+Бот запускается отдельным процессом (python -m bot.main, BOT_MODE=webhook)
+против фейкового Bot API с задержкой ответа. Каждый чат отправляет
+последовательность "/start" + запрос с порядковым номером; после прогона
+проверяется, что ответы в каждом чате пришли в порядке отправки, а бот
+по SIGTERM дорабатывает принятые апдейты и завершается.
+
+С --workers бот запускается в многопроцессном режиме (WORKERS=N):
+диспетчер распределяет чаты по рабочим процессам, и пропускная
+способность должна расти с числом процессов до числа ядер.
+
+Запуск:
+    python -m benchmarks.webhook_benchmark --chats 200 --rounds 3 --concurrency 1 64
+    python -m benchmarks.webhook_benchmark --concurrency 64 --workers 1 2 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+
+from benchmarks.fake_telegram import BOT_TOKEN, FakeTelegramServer, make_message_update
+from benchmarks.synthetic import QUERIES, make_dataframe
+
+_MARKER = re.compile(r'#(\d+)')
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _listening(port: int) -> bool:
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=0.1):
+            return True
+    except OSError:
+        return False
+
+
+def bot_environment(api: FakeTelegramServer, port: int, concurrency: int, dataset_path: str,
+                    workers: int = 1) -> Dict[str, str]:
+    """Переменные окружения для запуска бота в webhook-режиме против фейкового API"""
+    return {
+        **os.environ,
+        'BOT_TOKEN': BOT_TOKEN,
+        'TELEGRAM_API_BASE_URL': api.base_url,
+        'BOT_MODE': 'webhook',
+        'WEBHOOK_LISTEN': '127.0.0.1',
+        'WEBHOOK_PORT': str(port),
+        'WEBHOOK_URL': f'http://127.0.0.1:{port}',
+        'CONCURRENT_UPDATES': str(concurrency),
+        'WORKERS': str(workers),
+        # Фейковый API без лимитов: измеряется пропускная способность обработки, а не лимиты Telegram
+        'RATE_LIMIT_OVERALL': '0',
+        'DATA_SOURCE': 'local',
+        'LOCAL_DATASET_PATH': dataset_path,
+        'INDEX_SNAPSHOT_DIR': '',
+        'DATASET_WATCH_INTERVAL': '0',
+        'DATASET_REFRESH_INTERVAL': '0',
+        'PERSISTENCE_PATH': os.path.join(os.path.dirname(dataset_path), f'persistence-{port}.sqlite3'),
+        'ANALYTICS_DB_PATH': os.path.join(os.path.dirname(dataset_path), f'analytics-{port}.sqlite3'),
+        'LOG_LEVEL': 'WARNING',
+    }
+
+
+async def wait_for(predicate, timeout: float, interval: float = 0.01) -> bool:
+    """Ожидание условия с таймаутом"""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(interval)
+    return True
+
+
+def check_ordering(api: FakeTelegramServer, chats: List[int], rounds: int) -> int:
+    """
+    Проверка порядка ответов внутри каждого чата
+
+    Returns:
+        количество чатов, где порядок нарушен
+    """
+    violations = 0
+    by_chat = api.calls_by_chat('sendMessage')
+    for chat_id in chats:
+        markers = []
+        for call in by_chat.get(chat_id, []):
+            match = _MARKER.search(call['params'].get('text', ''))
+            if match:
+                markers.append(int(match.group(1)))
+        if markers != list(range(rounds)):
+            violations += 1
+    return violations
+
+
+def delivered_results(api: FakeTelegramServer) -> int:
+    """Количество доставленных сообщений с результатами (отправка или редактирование заглушки)"""
+    return sum(1 for call in api.calls
+               if call['method'] in ('sendMessage', 'editMessageText') and not call['flooded']
+               and call['params'].get('text', '').startswith('✅'))
+
+
+async def run(chats: int, rounds: int, concurrency: int, latency: float, dataset_path: str,
+              workers: int = 1, extra_env: Optional[Dict[str, str]] = None,
+              api_options: Optional[Dict[str, Any]] = None, settle_timeout: float = 300) -> Dict[str, float]:
+    """
+    Один прогон: все чаты параллельно, апдейты внутри чата - последовательно
+
+    Args:
+        extra_env: дополнительные настройки бота
+        api_options: параметры FakeTelegramServer (лимиты, retry_after)
+        settle_timeout: сколько ждать доставки всех результатов после отправки апдейтов
+    """
+    api = FakeTelegramServer(latency=latency, **(api_options or {}))
+    await api.start()
+    port = _free_port()
+    bot = subprocess.Popen([sys.executable, '-W', 'ignore', '-m', 'bot.main'],
+                           env={**bot_environment(api, port, concurrency, dataset_path, workers), **(extra_env or {})})
+    try:
+        # Бот готов, когда зарегистрировал webhook и слушает порт
+        ready = await wait_for(
+            lambda: any(call['method'] == 'setWebhook' for call in api.calls) and _listening(port),
+            timeout=300, interval=0.1,
+        )
+        if not ready:
+            raise RuntimeError("Бот не запустил webhook")
+
+        url = f'http://127.0.0.1:{port}/telegram'
+        chat_ids = list(range(1_000_001, 1_000_001 + chats))
+        update_ids = iter(range(1, chats * rounds * 2 + 1))
+        http = AsyncHTTPClient(max_clients=100)
+
+        async def client(chat_id: int):
+            for i in range(rounds):
+                for text in ('/start', f'{QUERIES[(chat_id + i) % len(QUERIES)]} #{i}'):
+                    body = json.dumps(make_message_update(next(update_ids), chat_id, text))
+                    await http.fetch(HTTPRequest(url, method='POST', body=body,
+                                                 headers={'Content-Type': 'application/json'}))
+
+        # Каждый запрос завершается сообщением с результатами
+        started = time.perf_counter()
+        await asyncio.gather(*(client(chat_id) for chat_id in chat_ids))
+        completed = await wait_for(lambda: delivered_results(api) >= chats * rounds, timeout=settle_timeout)
+        elapsed = time.perf_counter() - started
+
+        # Плавная остановка: бот должен завершиться сам в пределах SHUTDOWN_DRAIN_TIMEOUT
+        bot.send_signal(signal.SIGTERM)
+        exit_code = await asyncio.get_running_loop().run_in_executor(None, bot.wait, 60)
+    finally:
+        if bot.poll() is None:
+            bot.kill()
+        await api.stop()
+
+    messages = [call for call in api.calls if call['method'] in ('sendMessage', 'editMessageText')]
+    return {
+        'updates': chats * rounds * 2,
+        'queries': chats * rounds,
+        'completed': completed,
+        'results_delivered': delivered_results(api),
+        'message_calls': sum(1 for call in messages if not call['flooded']),
+        'flood_errors': api.flood_errors,
+        'seconds': elapsed,
+        'updates_per_second': chats * rounds * 2 / elapsed,
+        'ordering_violations': check_ordering(api, chat_ids, rounds),
+        'exit_code': exit_code,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chats', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--rows', type=int, default=5000, help='размер синтетического датасета')
+    parser.add_argument('--latency', type=float, default=0.02, help='задержка фейкового Bot API, с')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 64])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1],
+                        help='количество рабочих процессов (1 - один процесс без диспетчера)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='webhook_bench_') as workdir:
+        dataset_path = os.path.join(workdir, 'measures.csv')
+        make_dataframe(args.rows).to_csv(dataset_path, index=False)
+
+        print(f"Ядер CPU: {os.cpu_count()}")
+        print(f"{'процессов':>10} {'concurrency':>12} {'updates':>8} {'время, s':>9} {'updates/s':>10} "
+              f"{'нарушения порядка':>18} {'код выхода':>11}")
+        for workers in args.workers:
+            for concurrency in args.concurrency:
+                result = asyncio.run(run(args.chats, args.rounds, concurrency, args.latency, dataset_path, workers))
+                status = '' if result['completed'] else ' (не все апдейты обработаны)'
+                print(f"{workers:>10} {concurrency:>12} {result['updates']:>8} {result['seconds']:>9.2f} "
+                      f"{result['updates_per_second']:>10.0f} {result['ordering_violations']:>18} "
+                      f"{result['exit_code']:>11}{status}")
+
+
+if __name__ == '__main__':
+    main()
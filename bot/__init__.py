@@ -1,8 +1,22 @@
 """
 Основной модуль бота
+
+Имена загружаются при первом обращении: python -m bot.main и рабочие
+процессы импортируют только то, что нужно точке входа (см. data/__init__.py)
 """
 
-from .main import main
-from .conversation import ConversationState, setup_conversation_handler
+import importlib
+
+_EXPORTS = {
+    'main': '.main',
+    'ConversationState': '.conversation',
+    'setup_conversation_handler': '.conversation',
+}
 
 __all__ = ['main', 'ConversationState', 'setup_conversation_handler']
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
@@ -0,0 +1,416 @@
+"""
+Аналитика диалогов с отложенной записью: запросы, результаты, диалоги, сообщения и отзывы
+
+Обработчики только кладут события в ограниченную asyncio-очередь;
+фоновая задача собирает их в пачки и записывает многострочными
+INSERT в отдельном потоке. Пачка сбрасывается при достижении
+batch_size или через flush_interval после первого события.
+
+Таблицы повторяют docs/database/schema.sql; локально используется
+SQLite, в продакшене на месте _write_batch - вставка в Postgres
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Политики переполнения очереди: отбросить событие или ждать места не дольше block_timeout
+OVERFLOW_DROP = 'drop'
+OVERFLOW_BLOCK = 'block'
+
+# SQLite ограничивает количество параметров в одном запросе
+_MAX_SQL_VARIABLES = 999
+
+# Таблица -> (колонки, окончание INSERT для повторной записи той же строки)
+_TABLES: Dict[str, Tuple[Tuple[str, ...], str]] = {
+    'users': (
+        ('id', 'username', 'first_name', 'last_name', 'language_code', 'is_bot', 'created_at', 'last_active_at'),
+        "ON CONFLICT(id) DO UPDATE SET username = excluded.username, first_name = excluded.first_name,"
+        " last_name = excluded.last_name, language_code = excluded.language_code,"
+        " last_active_at = excluded.last_active_at",
+    ),
+    'user_queries': (
+        ('id', 'user_id', 'query_text', 'metadata', 'results_count', 'created_at'),
+        "",
+    ),
+    'search_results': (
+        ('id', 'query_id', 'measure_id', 'relevance_score', 'rank_position', 'created_at'),
+        "ON CONFLICT(query_id, measure_id) DO NOTHING",
+    ),
+    'conversations': (
+        ('id', 'user_id', 'query_id', 'selected_measure_id', 'current_state', 'is_active', 'started_at', 'ended_at'),
+        "ON CONFLICT(id) DO UPDATE SET query_id = COALESCE(excluded.query_id, query_id),"
+        " selected_measure_id = COALESCE(excluded.selected_measure_id, selected_measure_id),"
+        " current_state = excluded.current_state, is_active = excluded.is_active,"
+        " ended_at = COALESCE(excluded.ended_at, ended_at)",
+    ),
+    'conversation_messages': (
+        ('id', 'conversation_id', 'message_type', 'message_text', 'intent', 'created_at'),
+        "",
+    ),
+    'feedback': (
+        ('id', 'user_id', 'conversation_id', 'rating', 'comment', 'created_at'),
+        "ON CONFLICT(conversation_id) DO UPDATE SET rating = excluded.rating, comment = excluded.comment",
+    ),
+}
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS users ("
+    " id INTEGER PRIMARY KEY, username TEXT, first_name TEXT NOT NULL, last_name TEXT, language_code TEXT,"
+    " is_bot INTEGER DEFAULT 0, created_at TEXT, last_active_at TEXT)",
+    "CREATE TABLE IF NOT EXISTS user_queries ("
+    " id TEXT PRIMARY KEY, user_id INTEGER NOT NULL, query_text TEXT NOT NULL, metadata TEXT DEFAULT '{}',"
+    " results_count INTEGER DEFAULT 0, created_at TEXT)",
+    "CREATE INDEX IF NOT EXISTS idx_queries_user ON user_queries (user_id)",
+    "CREATE TABLE IF NOT EXISTS search_results ("
+    " id TEXT PRIMARY KEY, query_id TEXT NOT NULL, measure_id INTEGER NOT NULL, relevance_score REAL NOT NULL,"
+    " rank_position INTEGER NOT NULL, created_at TEXT, UNIQUE (query_id, measure_id))",
+    "CREATE INDEX IF NOT EXISTS idx_results_measure ON search_results (measure_id)",
+    "CREATE TABLE IF NOT EXISTS conversations ("
+    " id TEXT PRIMARY KEY, user_id INTEGER NOT NULL, query_id TEXT, selected_measure_id INTEGER,"
+    " current_state TEXT DEFAULT 'START', is_active INTEGER DEFAULT 1, started_at TEXT, ended_at TEXT)",
+    "CREATE INDEX IF NOT EXISTS idx_conversations_user ON conversations (user_id)",
+    "CREATE TABLE IF NOT EXISTS conversation_messages ("
+    " id TEXT PRIMARY KEY, conversation_id TEXT NOT NULL, message_type TEXT NOT NULL, message_text TEXT,"
+    " intent TEXT, created_at TEXT)",
+    "CREATE INDEX IF NOT EXISTS idx_messages_conversation ON conversation_messages (conversation_id)",
+    "CREATE TABLE IF NOT EXISTS feedback ("
+    " id TEXT PRIMARY KEY, user_id INTEGER NOT NULL, conversation_id TEXT UNIQUE,"
+    " rating INTEGER NOT NULL CHECK (rating BETWEEN 1 AND 5), comment TEXT, created_at TEXT)",
+)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def new_id() -> str:
+    """Идентификатор записи (UUID генерируется на стороне бота, чтобы связать события без запроса к БД)"""
+    return str(uuid.uuid4())
+
+
+class AnalyticsSink:
+    """
+    Неблокирующий приемник событий аналитики
+
+    До start() и после stop() события игнорируются, поэтому обработчики
+    вызывают record_* без проверок
+    """
+
+    def __init__(
+        self,
+        path: str = '',
+        queue_size: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 2.0,
+        overflow: str = OVERFLOW_DROP,
+        block_timeout: float = 0.05,
+    ):
+        """
+        Args:
+            path: файл базы SQLite
+            queue_size: максимум событий в очереди
+            batch_size: размер пачки, при котором запись выполняется сразу
+            flush_interval: максимальная задержка записи события в секундах
+            overflow: политика переполнения очереди (OVERFLOW_DROP или OVERFLOW_BLOCK)
+            block_timeout: время ожидания места в очереди для OVERFLOW_BLOCK
+        """
+        self.path = path
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._db: Optional[ThreadPoolExecutor] = None
+        self._connection: Optional[sqlite3.Connection] = None
+        self.counters: Dict[str, int] = {
+            'enqueued': 0,
+            'dropped': 0,
+            'written': 0,
+            'batches': 0,
+            'write_errors': 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._writer is not None
+
+    @property
+    def pending(self) -> int:
+        """Событий в очереди, еще не записанных в базу"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        """Запуск фоновой записи в текущем event loop"""
+        if self._writer is not None or not self.path:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._db = ThreadPoolExecutor(max_workers=1, thread_name_prefix='analytics')
+        self._writer = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"Аналитика пишется в {self.path} (очередь {self.queue_size}, пачка {self.batch_size})")
+
+    async def stop(self):
+        """Запись оставшихся событий и остановка"""
+        if self._writer is None:
+            return
+        writer, self._writer = self._writer, None
+        await self._queue.put(None)
+        await writer
+        await asyncio.get_running_loop().run_in_executor(self._db, self._close)
+        self._db.shutdown(wait=True)
+        logger.info(f"Аналитика остановлена: {self.counters}")
+
+    # --- Очередь ---
+
+    async def _emit(self, events: List[Tuple[str, tuple]]):
+        """
+        Постановка событий в очередь по политике переполнения (без обращений к БД)
+
+        При политике OVERFLOW_DROP события одного вызова (запрос и его результаты)
+        принимаются или отбрасываются вместе, чтобы в базе не появлялись
+        результаты без запроса
+        """
+        if self._writer is None:
+            return
+        if self._queue.maxsize - self._queue.qsize() >= len(events):
+            for event in events:
+                self._queue.put_nowait(event)
+            self.counters['enqueued'] += len(events)
+            return
+        if self.overflow != OVERFLOW_BLOCK:
+            self.counters['dropped'] += len(events)
+            return
+
+        # Обратное давление: обработчик ждет освобождения очереди не дольше block_timeout на событие
+        for i, event in enumerate(events):
+            try:
+                await asyncio.wait_for(self._queue.put(event), self.block_timeout)
+            except asyncio.TimeoutError:
+                self.counters['dropped'] += len(events) - i
+                return
+            self.counters['enqueued'] += 1
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        batch: List[Tuple[str, tuple]] = []
+        deadline = 0.0
+        stopping = False
+        while not stopping:
+            timeout = max(0.0, deadline - loop.time()) if batch else None
+            try:
+                event = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                event = ...
+            if event is None:
+                stopping = True
+            elif event is not ...:
+                if not batch:
+                    deadline = loop.time() + self.flush_interval
+                batch.append(event)
+                # Забираем уже накопившиеся события без ожидания
+                while len(batch) < self.batch_size and not self._queue.empty():
+                    event = self._queue.get_nowait()
+                    if event is None:
+                        stopping = True
+                        break
+                    batch.append(event)
+
+            if batch and (stopping or len(batch) >= self.batch_size or loop.time() >= deadline):
+                await self._flush(batch)
+                batch = []
+
+    async def _flush(self, batch: List[Tuple[str, tuple]]):
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._db, self._write_batch, batch)
+        except Exception as e:
+            self.counters['write_errors'] += 1
+            logger.error(f"Не удалось записать {len(batch)} событий аналитики: {e}")
+            return
+        self.counters['written'] += len(batch)
+        self.counters['batches'] += 1
+
+    # --- Запись (только в потоке self._db) ---
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                connection.execute(statement)
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _write_batch(self, batch: Sequence[Tuple[str, tuple]]):
+        """Одна транзакция на пачку, многострочный INSERT на таблицу"""
+        rows_by_table: Dict[str, List[tuple]] = {}
+        for table, row in batch:
+            rows_by_table.setdefault(table, []).append(row)
+
+        connection = self._connect()
+        with connection:
+            # Порядок таблиц: родительские записи раньше зависимых
+            for table, (columns, conflict) in _TABLES.items():
+                rows = rows_by_table.get(table)
+                if not rows:
+                    continue
+                placeholders = f"({', '.join('?' * len(columns))})"
+                per_statement = max(1, _MAX_SQL_VARIABLES // len(columns))
+                for start in range(0, len(rows), per_statement):
+                    chunk = rows[start : start + per_statement]
+                    connection.execute(
+                        f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+                        f"{', '.join([placeholders] * len(chunk))} {conflict}",
+                        [value for row in chunk for value in row],
+                    )
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    # --- События ---
+
+    async def record_user(self, user: Any):
+        """Пользователь Telegram (создается или обновляется last_active_at)"""
+        now = _now()
+        await self._emit(
+            [
+                (
+                    'users',
+                    (
+                        user.id,
+                        user.username,
+                        user.first_name or '',
+                        user.last_name,
+                        user.language_code,
+                        int(bool(user.is_bot)),
+                        now,
+                        now,
+                    ),
+                )
+            ]
+        )
+
+    async def record_conversation(
+        self,
+        conversation_id: str,
+        user_id: int,
+        state: str,
+        query_id: Optional[str] = None,
+        selected_measure_id: Optional[int] = None,
+        ended: bool = False,
+    ):
+        """Начало диалога или смена его состояния"""
+        now = _now()
+        await self._emit(
+            [
+                (
+                    'conversations',
+                    (
+                        conversation_id,
+                        user_id,
+                        query_id,
+                        selected_measure_id,
+                        state,
+                        int(not ended),
+                        now,
+                        now if ended else None,
+                    ),
+                )
+            ]
+        )
+
+    async def record_query(
+        self,
+        user_id: int,
+        query_text: str,
+        results: List[Dict[str, Any]],
+        conversation_id: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        Запрос пользователя, показанные результаты и сообщение в диалоге
+
+        Returns:
+            id запроса для связи с диалогом
+        """
+        query_id, now = new_id(), _now()
+        events = [
+            (
+                'user_queries',
+                (
+                    query_id,
+                    user_id,
+                    query_text,
+                    json.dumps(metadata or {}, ensure_ascii=False),
+                    len(results),
+                    now,
+                ),
+            )
+        ]
+        events.extend(
+            (
+                'search_results',
+                (
+                    new_id(),
+                    query_id,
+                    result['id'],
+                    round(min(max(float(result.get('match_score', 0.0)), 0.0), 1.0), 4),
+                    rank,
+                    now,
+                ),
+            )
+            for rank, result in enumerate(results, 1)
+        )
+        if conversation_id:
+            events.append(('conversation_messages', (new_id(), conversation_id, 'user', query_text, 'search', now)))
+        await self._emit(events)
+        return query_id
+
+    async def record_message(
+        self, conversation_id: str, message_text: str, intent: Optional[str] = None, message_type: str = 'user'
+    ):
+        """Сообщение в диалоге с распознанным намерением (уточняющий вопрос по мере)"""
+        await self._emit(
+            [
+                (
+                    'conversation_messages',
+                    (
+                        new_id(),
+                        conversation_id,
+                        message_type,
+                        message_text,
+                        intent,
+                        _now(),
+                    ),
+                )
+            ]
+        )
+
+    async def record_feedback(
+        self, user_id: int, rating: int, conversation_id: Optional[str] = None, comment: Optional[str] = None
+    ):
+        """Оценка диалога пользователем (1-5)"""
+        await self._emit([('feedback', (new_id(), user_id, conversation_id, rating, comment, _now()))])
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, 'queued': self._queue.qsize() if self._queue is not None else 0}
+
+
+# Глобальный приемник аналитики для обработчиков
+analytics = AnalyticsSink()
@@ -0,0 +1,215 @@
+"""
+Офлайн-сопоставление журнала запросов с текущей версией датасета мер поддержки
+
+Запросы читаются потоком из CSV (колонка --column) или JSONL (ключ --column),
+сопоставляются пачками векторизованным поиском (data.batch_matching) в
+пуле процессов и так же потоком пишутся в CSV или JSONL (по расширению
+--output) в исходном порядке. Одинаковые запросы внутри пачки ищутся
+один раз. В памяти одновременно не больше 2 * processes пачек, поэтому
+размер входного файла не ограничен.
+
+Датасет загружается так же, как ботом (DATA_SOURCE, LOCAL_DATASET_PATH,
+снапшот INDEX_SNAPSHOT_DIR), либо из готового снапшота (--snapshot).
+
+Запуск:
+    python -m bot.batch_match --input queries.csv --output matches.jsonl --top-k 5
+    python -m bot.batch_match --input queries.jsonl --output matches.csv --processes 8
+"""
+
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+from bot.main import configure_dataset_manager, dataset_load_kwargs, setup_logging
+from config.settings import settings
+from data.batch_matching import BatchMatcher, init_worker, worker_match
+from data.dataset_manager import DatasetState, dataset_manager
+
+logger = logging.getLogger(__name__)
+
+# Интервал записи прогресса в лог (запросов)
+PROGRESS_EVERY = 100_000
+
+
+def read_queries(path: str, column: str) -> Iterator[str]:
+    """
+    Потоковое чтение запросов из CSV или JSONL
+
+    Args:
+        path: путь к файлу (.jsonl/.ndjson - JSON по строке, иначе CSV с заголовком)
+        column: колонка CSV или ключ JSON с текстом запроса
+    """
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.endswith(('.jsonl', '.ndjson')):
+            for line in f:
+                if line.strip():
+                    yield str(json.loads(line).get(column) or '')
+        else:
+            reader = csv.DictReader(f)
+            if reader.fieldnames is None or column not in reader.fieldnames:
+                raise ValueError(f"В {path} нет колонки '{column}'")
+            for row in reader:
+                yield row[column] or ''
+
+
+class MatchWriter:
+    """Потоковая запись результатов: CSV (строка на совпадение) или JSONL (строка на запрос)"""
+
+    def __init__(self, path: str, state: DatasetState):
+        self.state = state
+        self.jsonl = path.endswith(('.jsonl', '.ndjson'))
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._csv = None
+        if not self.jsonl:
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(['query', 'rank', 'id', 'title', 'score'])
+
+    def write(self, queries: List[str], positions: np.ndarray, scores: np.ndarray):
+        engine = self.state.search_engine
+        rows = []
+        for query, row_positions, row_scores in zip(queries, positions.tolist(), scores.astype(np.float64).round(4).tolist()):
+            matches = [(engine.doc_ids[position], engine.titles[position], score)
+                       for position, score in zip(row_positions, row_scores) if position >= 0]
+            if self.jsonl:
+                record = {'query': query,
+                          'matches': [{'id': doc_id, 'title': title, 'score': score}
+                                      for doc_id, title, score in matches]}
+                rows.append(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+            elif matches:
+                rows.extend([query, rank, doc_id, title, score]
+                            for rank, (doc_id, title, score) in enumerate(matches, 1))
+            else:
+                rows.append([query, '', '', '', ''])
+        # Пачка пишется одним вызовом
+        if self.jsonl:
+            self._file.writelines(rows)
+        else:
+            self._csv.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+def load_state(snapshot_dir: Optional[str]) -> Optional[DatasetState]:
+    """Загрузка датасета как в боте или из готового снапшота"""
+    configure_dataset_manager()
+    if snapshot_dir:
+        success = dataset_manager.load_snapshot(snapshot_dir)
+    else:
+        success = dataset_manager.load_dataset(**dataset_load_kwargs())
+    return dataset_manager.state if success else None
+
+
+def run(input_path: str, output_path: str, column: str, top_k: int, batch_size: int, processes: int,
+        snapshot_dir: Optional[str] = None) -> int:
+    """
+    Сопоставление всех запросов входного файла
+
+    Returns:
+        количество обработанных запросов
+    """
+    state = load_state(snapshot_dir)
+    if state is None:
+        raise RuntimeError("Не удалось загрузить датасет")
+
+    workdir = None
+    pool = None
+    matcher = None
+    if processes > 1:
+        # Рабочие процессы отображают в память снапшот опубликованной версии
+        if snapshot_dir is None:
+            workdir = tempfile.TemporaryDirectory(prefix='batch_match_')
+            snapshot_dir = workdir.name
+            if not dataset_manager.export_snapshot(snapshot_dir):
+                raise RuntimeError("Не удалось записать снапшот для рабочих процессов")
+        pool = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+            initargs=(os.path.abspath(snapshot_dir), settings.EMBEDDING_MODEL),
+        )
+    else:
+        matcher = BatchMatcher(state.search_engine, state.embedding_index, state.spelling)
+
+    writer = MatchWriter(output_path, state)
+    pending: deque = deque()
+    total = 0
+    started = time.perf_counter()
+    next_progress = PROGRESS_EVERY
+
+    def flush_one():
+        nonlocal total, next_progress
+        queries, inverse, result = pending.popleft()
+        positions, scores = result.result() if pool is not None else result
+        writer.write(queries, positions[inverse], scores[inverse])
+        total += len(queries)
+        if total >= next_progress:
+            next_progress += PROGRESS_EVERY
+            logger.info(f"Обработано запросов: {total} ({total / (time.perf_counter() - started):.0f}/с)")
+
+    try:
+        queries_iter = read_queries(input_path, column)
+        while True:
+            queries = list(islice(queries_iter, batch_size))
+            if not queries:
+                break
+            # Повторяющиеся запросы журнала ищутся один раз на пачку
+            unique = list(dict.fromkeys(queries))
+            index = {query: i for i, query in enumerate(unique)}
+            inverse = np.fromiter((index[query] for query in queries), dtype=np.int64, count=len(queries))
+            if pool is not None:
+                pending.append((queries, inverse, pool.submit(worker_match, unique, top_k)))
+                if len(pending) >= 2 * processes:
+                    flush_one()
+            else:
+                pending.append((queries, inverse, matcher.match(unique, top_k)))
+                flush_one()
+        while pending:
+            flush_one()
+    finally:
+        writer.close()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if workdir is not None:
+            workdir.cleanup()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Сопоставлено запросов: {total} за {elapsed:.1f} с ({total / max(elapsed, 1e-9):.0f}/с), "
+                f"результаты: {output_path}")
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', required=True, help='CSV или JSONL с запросами')
+    parser.add_argument('--output', required=True, help='файл результатов (.jsonl - JSON по строке, иначе CSV)')
+    parser.add_argument('--column', default='query', help='колонка CSV или ключ JSON с текстом запроса')
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=4096, help='запросов в пачке')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                        help='рабочих процессов (1 - в текущем процессе)')
+    parser.add_argument('--snapshot', default=None, help='каталог готового снапшота вместо загрузки источника')
+    args = parser.parse_args()
+
+    setup_logging()
+    try:
+        run(args.input, args.output, args.column, args.top_k, args.batch_size, args.processes, args.snapshot)
+    except (OSError, ValueError, RuntimeError) as e:
+        logger.error(f"Ошибка пакетного сопоставления: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Метрика задержки event loop: насколько позже запланированного просыпается таймер
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """
+    Фоновая задача, которая засыпает на interval и измеряет опоздание пробуждения
+
+    Опоздание - время, в течение которого loop был занят синхронным кодом
+    (обработчиком, парсингом, поиском без executor) и не мог обслуживать
+    остальные диалоги
+    """
+
+    def __init__(self, interval: float = 0.1, window: int = 600, warn_threshold: float = 0.05):
+        """
+        Args:
+            interval: период измерения в секундах
+            window: количество последних измерений для перцентилей
+            warn_threshold: задержка в секундах, при которой пишется предупреждение (0 - не писать)
+        """
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self._samples: deque = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+        self.max_lag = 0.0
+
+    def start(self):
+        """Запуск измерений в текущем event loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._samples.append(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+            if self.warn_threshold and lag > self.warn_threshold:
+                logger.warning(f"Event loop был заблокирован {lag * 1000:.0f} мс")
+
+    def reset(self):
+        """Сброс накопленных измерений"""
+        self._samples.clear()
+        self.max_lag = 0.0
+
+    def percentile(self, q: float) -> float:
+        """Перцентиль q (0..100) задержки в секундах по окну измерений"""
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+    def stats(self) -> Dict[str, Any]:
+        """Задержка loop в миллисекундах: последняя, p50, p99 по окну и максимум с запуска"""
+        return {
+            'samples': len(self._samples),
+            'last_ms': round(self._samples[-1] * 1000, 2) if self._samples else 0.0,
+            'p50_ms': round(self.percentile(50) * 1000, 2),
+            'p99_ms': round(self.percentile(99) * 1000, 2),
+            'max_ms': round(self.max_lag * 1000, 2),
+        }
@@ -1,105 +1,523 @@
+import asyncio
 import logging
-from telegram.ext import Application
+import os
+import shutil
+import signal
+import tempfile
 
+# Отчет о запуске импортируется первым: отсчет фаз начинается до тяжелых зависимостей
+from bot.startup import startup
 from config.settings import settings
+
+if settings.STARTUP_IMPORT_PROFILE:
+    startup.track_imports()
+
+from telegram import Bot, Update
+from telegram.ext import Application
+
 from data.dataset_manager import dataset_manager
-from bot.conversation.handlers import setup_conversation_handler  # <-- НОВОЕ
+from data.dataset_refresher import DatasetRefresher
+from data.metrics import metrics
+from data.embedding_index import create_encoder
+from data.query_cache import QueryCache
+from data.search_executor import search_executor
+from data.sheets_loader import GoogleSheetsLoader
+from conversation.handlers import setup_conversation_handler  # <-- НОВОЕ
+from bot.analytics import analytics
+from bot.loop_monitor import LoopLagMonitor
+from bot.metrics_server import start_metrics_server
+from bot.outbound import ChatRateLimiter, create_request, reply_coalescer
+from bot.persistence import SQLitePersistence
+from bot.profiler import profiler
+from bot.update_processor import ConversationUpdateProcessor
+from bot.workers import WorkerServer, WorkerSupervisor, create_webhook_server
 
 
 def setup_logging() -> None:
     """Настройка логирования"""
+    # Логи рабочих процессов пишутся в общий поток - помечаем номер процесса
+    process = f"worker {settings.WORKER_INDEX} - " if settings.WORKER_SOCKET else ""
     logging.basicConfig(
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        level=getattr(logging, settings.LOG_LEVEL)
+        format=f"%(asctime)s - {process}%(name)s - %(levelname)s - %(message)s", level=getattr(logging, settings.LOG_LEVEL)
     )
     logging.getLogger("httpx").setLevel(logging.WARNING)
 
 
+def dataset_load_kwargs() -> dict:
+    """Аргументы загрузки датасета в зависимости от источника данных"""
+    if settings.DATA_SOURCE == 'google_sheets':
+        return {'sheet_id': settings.GOOGLE_SHEET_ID, 'sheet_name': settings.GOOGLE_SHEET_NAME}
+    return {'filepath': settings.LOCAL_DATASET_PATH}
+
+
+def configure_dataset_manager() -> None:
+    """Настройка менеджера датасета в зависимости от источника данных"""
+    dataset_manager.data_source = settings.DATA_SOURCE
+    dataset_manager.encoder = create_encoder(settings.EMBEDDING_MODEL)
+    dataset_manager.embedding_backend = settings.EMBEDDING_BACKEND
+    dataset_manager.snapshot_dir = settings.INDEX_SNAPSHOT_DIR or None
+    dataset_manager.stream_chunk_size = settings.DATASET_CHUNK_SIZE
+    dataset_manager.compact_storage = settings.DATASET_COMPACT_STORAGE
+    dataset_manager.similar_k = settings.SIMILAR_MEASURES_K
+    dataset_manager.similar_threads = settings.SIMILAR_BUILD_THREADS or os.cpu_count() or 1
+    dataset_manager.query_cache = QueryCache(
+        max_entries=settings.QUERY_CACHE_SIZE,
+        max_bytes=int(settings.QUERY_CACHE_MAX_MB * 2**20),
+        ttl=settings.QUERY_CACHE_TTL,
+    )
+    if settings.DATA_SOURCE == 'google_sheets':
+        dataset_manager.sheets_loader = GoogleSheetsLoader(
+            settings.GOOGLE_SHEET_ID,
+            settings.GOOGLE_SHEET_NAME,
+            credentials_file=settings.GOOGLE_CREDENTIALS_FILE,
+            api_key=settings.GOOGLE_API_KEY,
+            cache_dir=settings.GOOGLE_SHEETS_CACHE_DIR,
+            timeout=settings.GOOGLE_SHEETS_TIMEOUT,
+            batch_rows=settings.GOOGLE_SHEETS_BATCH_ROWS,
+            sheets_api_url=settings.GOOGLE_SHEETS_API_URL,
+            drive_api_url=settings.GOOGLE_DRIVE_API_URL,
+        )
+
+
 def load_dataset() -> bool:
     """Загрузка датасета мер поддержки"""
     logger = logging.getLogger(__name__)
-    
+
     try:
         logger.info("Начало загрузки датасета мер поддержки...")
-        
-        # Конфигурируем менеджер в зависимости от источника данных
-        dataset_manager.data_source = settings.DATA_SOURCE
-        
-        # Загружаем датасет
-        if settings.DATA_SOURCE == 'google_sheets':
-            success = dataset_manager.load_dataset(
-                sheet_id=settings.GOOGLE_SHEET_ID,
-                sheet_name=settings.GOOGLE_SHEET_NAME
-            )
-        else:  # local
-            success = dataset_manager.load_dataset(
-                filepath=settings.LOCAL_DATASET_PATH
-            )
-        
+        configure_dataset_manager()
+
+        # Рабочий процесс берет датасет из снапшота диспетчера, а не из источника
+        if settings.WORKER_SOCKET:
+            success = dataset_manager.load_snapshot(settings.WORKER_SNAPSHOT_DIR)
+        else:
+            success = dataset_manager.load_dataset(**dataset_load_kwargs())
+
         if success:
             info = dataset_manager.get_dataset_info()
             logger.info(f"Датасет успешно загружен. Записей: {info['rows']}, Колонок: {info['columns']}")
-            
+
             # Логируем сэмпл данных для проверки
             sample = dataset_manager.get_sample_data(2)
             if sample:
                 logger.debug(f"Сэмпл данных: {sample}")
-            
+
             return True
         else:
             logger.error("Не удалось загрузить датасет")
             return False
-            
+
     except Exception as e:
         logger.error(f"Ошибка при загрузке датасета: {e}")
         return False
 
 
+async def load_dataset_in_background(application: Application) -> None:
+    """Загрузка датасета в пуле потоков после запуска приложения, затем фоновое обновление"""
+    with startup.phase('dataset'):
+        await asyncio.get_running_loop().run_in_executor(None, load_dataset)
+    await start_dataset_refresher(application)
+
+
+async def start_dataset_loading(application: Application) -> None:
+    """
+    Фоновая загрузка датасета (DATASET_BACKGROUND_LOAD): бот принимает апдейты
+    сразу, поиск и восстановление сохраненных результатов ждут загрузки
+    """
+    if not settings.DATASET_BACKGROUND_LOAD:
+        await start_dataset_refresher(application)
+        return
+    loading = asyncio.get_running_loop().create_task(load_dataset_in_background(application))
+    application.bot_data['dataset_loading'] = loading
+    search_executor.loading = loading
+
+
+async def start_dataset_refresher(application: Application) -> None:
+    """Запуск фонового обновления датасета после инициализации приложения"""
+    # В рабочих процессах датасет обновляет диспетчер
+    if settings.WORKER_SOCKET or not (settings.DATASET_WATCH_INTERVAL or settings.DATASET_REFRESH_INTERVAL):
+        return
+
+    refresher = DatasetRefresher(
+        dataset_manager,
+        dataset_load_kwargs(),
+        refresh_interval=settings.DATASET_REFRESH_INTERVAL,
+        watch_interval=settings.DATASET_WATCH_INTERVAL or settings.DATASET_REFRESH_INTERVAL,
+    )
+    refresher.start()
+    application.bot_data['dataset_refresher'] = refresher
+
+
+async def stop_dataset_refresher(application: Application) -> None:
+    """Остановка фоновой загрузки и обновления датасета"""
+    loading = application.bot_data.pop('dataset_loading', None)
+    if loading is not None and not loading.done():
+        # Поток загрузки доработает сам; отменяется только запуск обновления после нее
+        loading.cancel()
+    refresher = application.bot_data.pop('dataset_refresher', None)
+    if refresher is not None:
+        await refresher.stop()
+
+
+async def start_search_executor(application: Application) -> None:
+    """Запуск пула поиска и измерения задержки event loop"""
+    search_executor.threads = settings.SEARCH_THREADS
+    search_executor.timeout = settings.SEARCH_TIMEOUT
+    search_executor.queue_timeout = settings.SEARCH_QUEUE_TIMEOUT
+    search_executor.max_pending = settings.SEARCH_MAX_PENDING
+    search_executor.load_wait = settings.DATASET_LOAD_WAIT
+    search_executor.start()
+
+    monitor = LoopLagMonitor(interval=settings.LOOP_LAG_INTERVAL, warn_threshold=settings.LOOP_LAG_WARN_MS / 1000)
+    monitor.start()
+    application.bot_data['loop_monitor'] = monitor
+
+
+async def stop_search_executor(application: Application) -> None:
+    """Остановка пула поиска и измерения задержки"""
+    monitor = application.bot_data.pop('loop_monitor', None)
+    if monitor is not None:
+        logging.info(f"Задержка event loop: {monitor.stats()}")
+        await monitor.stop()
+    rate_limiter = application.bot.rate_limiter
+    if isinstance(rate_limiter, ChatRateLimiter):
+        logging.info(f"Исходящие вызовы: {rate_limiter.stats()}, заглушки: {reply_coalescer.counters}")
+    await search_executor.shutdown()
+
+
+async def start_analytics(application: Application) -> None:
+    """Запуск фоновой записи аналитики"""
+    analytics.path = settings.ANALYTICS_DB_PATH
+    analytics.queue_size = settings.ANALYTICS_QUEUE_SIZE
+    analytics.batch_size = settings.ANALYTICS_BATCH_SIZE
+    analytics.flush_interval = settings.ANALYTICS_FLUSH_INTERVAL
+    analytics.overflow = settings.ANALYTICS_OVERFLOW
+    analytics.start()
+
+
+def metrics_port() -> int:
+    """Порт эндпоинта метрик процесса: у рабочих процессов свой порт после порта диспетчера"""
+    if not settings.METRICS_PORT:
+        return 0
+    return settings.METRICS_PORT + 1 + settings.WORKER_INDEX if settings.WORKER_SOCKET else settings.METRICS_PORT
+
+
+def register_process_gauges() -> None:
+    """Gauge, вычисляемые при чтении метрик: версия датасета, очереди, пулы"""
+    metrics.gauge('dataset_version', 'Опубликованная версия датасета').set_function(lambda: dataset_manager.version)
+    metrics.gauge('dataset_rows', 'Записей в опубликованной версии датасета').set_function(
+        lambda: dataset_manager.state.size if dataset_manager.state else 0
+    )
+    pending = metrics.gauge('search_executor_pending', 'Задач поиска в работе', ('pool',))
+    pending.labels('threads').set_function(lambda: search_executor.pending('threads'))
+    metrics.gauge('analytics_pending', 'Событий аналитики в очереди').set_function(lambda: analytics.pending)
+    metrics.gauge('analytics_dropped', 'Событий аналитики, отброшенных при переполнении').set_function(
+        lambda: analytics.counters['dropped']
+    )
+
+
+async def start_metrics(application: Application) -> None:
+    """Эндпоинт метрик и профилировщика, gauge процесса"""
+    register_process_gauges()
+    processor = application.update_processor
+    if isinstance(processor, ConversationUpdateProcessor):
+        metrics.gauge('updates_active', 'Апдейтов в обработке').set_function(lambda: processor.active)
+    monitor = application.bot_data.get('loop_monitor')
+    if monitor is not None:
+        metrics.gauge('event_loop_lag_p99_seconds', 'Задержка event loop, p99 по окну измерений').set_function(
+            lambda: monitor.percentile(99)
+        )
+
+    port = metrics_port()
+    if port:
+        server = start_metrics_server(metrics, profiler, port, settings.METRICS_LISTEN, startup)
+        if server is not None:
+            application.bot_data['metrics_server'] = server
+    if settings.PROFILER_ENABLED:
+        profiler.start(settings.PROFILER_INTERVAL)
+    else:
+        profiler.interval = settings.PROFILER_INTERVAL
+
+
+async def stop_metrics(application: Application) -> None:
+    server = application.bot_data.pop('metrics_server', None)
+    if server is not None:
+        server.stop()
+    profiler.stop()
+
+
+async def start_background_tasks(application: Application) -> None:
+    await start_dataset_loading(application)
+    await start_search_executor(application)
+    await start_analytics(application)
+    await start_metrics(application)
+
+
+async def stop_background_tasks(application: Application) -> None:
+    await stop_metrics(application)
+    await stop_dataset_refresher(application)
+    await stop_search_executor(application)
+    # Обработчики уже завершены: в очереди только события, которые осталось записать
+    await analytics.stop()
+
+
+def create_telegram_request():
+    """Общий пул соединений к Bot API с настройками из settings"""
+    return create_request(
+        pool_size=settings.TELEGRAM_POOL_SIZE,
+        pool_timeout=settings.TELEGRAM_POOL_TIMEOUT,
+        connect_timeout=settings.TELEGRAM_CONNECT_TIMEOUT,
+        read_timeout=settings.TELEGRAM_READ_TIMEOUT,
+        write_timeout=settings.TELEGRAM_WRITE_TIMEOUT,
+        http_version=settings.TELEGRAM_HTTP_VERSION,
+    )
+
+
 def create_application() -> Application:
     """Создание и настройка приложения бота"""
-    
+
     if not settings.is_valid:
         logging.error("BOT_TOKEN не установлен. Добавьте его в .env файл")
         raise ValueError("BOT_TOKEN не установлен")
-    
-    # Загружаем датасет перед созданием приложения
-    if not load_dataset():
-        logging.warning("Датасет не загружен, но продолжаем запуск бота")
-    
-    # Создаем Application
-    application = Application.builder().token(settings.BOT_TOKEN).build()
-    
+
+    # Загружаем датасет перед созданием приложения, если он не загружается в фоне
+    if not settings.DATASET_BACKGROUND_LOAD:
+        with startup.phase('dataset'):
+            if not load_dataset():
+                logging.warning("Датасет не загружен, но продолжаем запуск бота")
+
+    # Создаем Application: апдейты разных диалогов обрабатываются параллельно
+    builder = (
+        Application.builder()
+        .token(settings.BOT_TOKEN)
+        .base_url(settings.TELEGRAM_API_BASE_URL)
+        .request(create_telegram_request())
+        .concurrent_updates(ConversationUpdateProcessor(max(1, settings.CONCURRENT_UPDATES)))
+        .post_init(start_background_tasks)
+        .post_shutdown(stop_background_tasks)
+    )
+    if settings.RATE_LIMIT_OVERALL:
+        builder = builder.rate_limiter(
+            ChatRateLimiter(
+                overall_rate=settings.RATE_LIMIT_OVERALL,
+                chat_rate=settings.RATE_LIMIT_CHAT,
+                chat_burst=settings.RATE_LIMIT_CHAT_BURST,
+                group_per_minute=settings.RATE_LIMIT_GROUP_PER_MINUTE,
+                max_retries=settings.RATE_LIMIT_MAX_RETRIES,
+            )
+        )
+    reply_coalescer.delay = settings.PLACEHOLDER_DELAY
+    if settings.WORKER_SOCKET:
+        # Апдейты приходят от диспетчера через WorkerServer
+        builder = builder.updater(None)
+    persistent = bool(settings.PERSISTENCE_PATH)
+    if persistent:
+        persistence = SQLitePersistence(settings.PERSISTENCE_PATH, update_interval=settings.PERSISTENCE_UPDATE_INTERVAL)
+        # Сохраненные результаты восстанавливаются по id меры - после загрузки датасета
+        persistence.wait_ready = search_executor.wait_loaded
+        builder = builder.persistence(persistence)
+    application = builder.build()
+
     # Настраиваем ConversationHandler
-    conversation_handler = setup_conversation_handler()
+    conversation_handler = setup_conversation_handler(persistent=persistent)
     application.add_handler(conversation_handler)
-    
+
     logging.info(f"Бот {settings.BOT_NAME} инициализирован с ConversationHandler")
     return application
 
 
+async def start_updates(app: Application) -> None:
+    """Запуск получения апдейтов в режиме, выбранном в настройках"""
+    if settings.WORKER_SOCKET:
+        worker_server = WorkerServer(app, settings.WORKER_SOCKET, dataset_manager)
+        await worker_server.start()
+        app.bot_data['worker_server'] = worker_server
+    elif settings.BOT_MODE == 'webhook':
+        if not settings.WEBHOOK_URL:
+            raise ValueError("Для режима webhook нужно указать WEBHOOK_URL")
+        await app.updater.start_webhook(
+            listen=settings.WEBHOOK_LISTEN,
+            port=settings.WEBHOOK_PORT,
+            url_path=settings.WEBHOOK_PATH,
+            webhook_url=f"{settings.WEBHOOK_URL.rstrip('/')}/{settings.WEBHOOK_PATH}",
+            secret_token=settings.WEBHOOK_SECRET_TOKEN or None,
+            max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        logging.info(f"Webhook слушает {settings.WEBHOOK_LISTEN}:{settings.WEBHOOK_PORT}/{settings.WEBHOOK_PATH}")
+    elif settings.BOT_MODE == 'polling':
+        await app.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+    else:
+        raise ValueError(f"Неизвестный режим BOT_MODE: {settings.BOT_MODE}")
+
+
+async def wait_for_stop_signal() -> None:
+    """Ожидание SIGINT/SIGTERM"""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:  # Windows
+            pass
+    await stop_event.wait()
+
+
+async def shutdown_gracefully(app: Application) -> None:
+    """
+    Плавная остановка: прекращаем прием апдейтов, даем обработать уже
+    принятые (не дольше SHUTDOWN_DRAIN_TIMEOUT), затем останавливаем приложение
+    """
+    if app.updater and app.updater.running:
+        await app.updater.stop()
+
+    worker_server = app.bot_data.pop('worker_server', None)
+    if worker_server is not None:
+        await worker_server.stop(settings.SHUTDOWN_DRAIN_TIMEOUT)
+
+    processor = app.update_processor
+    if isinstance(processor, ConversationUpdateProcessor):
+        await processor.drain(settings.SHUTDOWN_DRAIN_TIMEOUT)
+
+    if app.running:
+        await app.stop()
+
+
+def worker_environment() -> dict:
+    """Окружение рабочих процессов: потоки поиска делятся между процессами"""
+    env = dict(os.environ)
+    if not settings.SEARCH_THREADS:
+        env['SEARCH_THREADS'] = str(max(1, (os.cpu_count() or 1) // settings.WORKERS))
+    return env
+
+
+async def run_dispatcher() -> None:
+    """
+    Многопроцессный режим: диспетчер загружает датасет, записывает снапшот,
+    запускает рабочие процессы и распределяет между ними апдейты webhook
+    """
+    if settings.BOT_MODE != 'webhook' or not settings.WEBHOOK_URL:
+        raise ValueError("Для WORKERS > 1 нужен режим webhook и WEBHOOK_URL")
+    if not settings.is_valid:
+        raise ValueError("BOT_TOKEN не установлен")
+
+    # Рабочие процессы поднимают датасет из снапшота, поэтому диспетчер загружает его до их запуска
+    with startup.phase('dataset'):
+        if not load_dataset():
+            logging.warning("Датасет не загружен, рабочие процессы будут запущены с тестовыми данными")
+
+    runtime_dir = tempfile.mkdtemp(prefix='bot-workers-')
+    snapshot_dir = os.path.join(runtime_dir, 'snapshot')
+    with startup.phase('snapshot'):
+        if not dataset_manager.export_snapshot(snapshot_dir):
+            raise RuntimeError("Не удалось подготовить снапшот датасета для рабочих процессов")
+
+    supervisor = WorkerSupervisor(settings.WORKERS, runtime_dir, snapshot_dir, env=worker_environment())
+    server = None
+    refresher = None
+    metrics_server = None
+    try:
+        with startup.phase('workers'):
+            await supervisor.start()
+
+        register_process_gauges()
+        if settings.METRICS_PORT:
+            metrics_server = start_metrics_server(metrics, profiler, settings.METRICS_PORT, settings.METRICS_LISTEN, startup)
+
+        server = create_webhook_server(supervisor, settings.WEBHOOK_PATH, settings.WEBHOOK_SECRET_TOKEN)
+        server.listen(settings.WEBHOOK_PORT, address=settings.WEBHOOK_LISTEN)
+        async with Bot(settings.BOT_TOKEN, base_url=settings.TELEGRAM_API_BASE_URL, request=create_telegram_request()) as bot:
+            await bot.set_webhook(
+                url=f"{settings.WEBHOOK_URL.rstrip('/')}/{settings.WEBHOOK_PATH}",
+                secret_token=settings.WEBHOOK_SECRET_TOKEN or None,
+                max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=Update.ALL_TYPES,
+            )
+
+        if settings.DATASET_WATCH_INTERVAL or settings.DATASET_REFRESH_INTERVAL:
+
+            async def publish_to_workers(state) -> None:
+                exported = await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    dataset_manager.export_snapshot,
+                    snapshot_dir,
+                )
+                if exported:
+                    await supervisor.broadcast_reload()
+
+            refresher = DatasetRefresher(
+                dataset_manager,
+                dataset_load_kwargs(),
+                refresh_interval=settings.DATASET_REFRESH_INTERVAL,
+                watch_interval=settings.DATASET_WATCH_INTERVAL or settings.DATASET_REFRESH_INTERVAL,
+                on_publish=publish_to_workers,
+            )
+            refresher.start()
+
+        startup.mark_ready()
+        logging.info(
+            f"Диспетчер запущен: {settings.WORKERS} рабочих процессов, webhook "
+            f"{settings.WEBHOOK_LISTEN}:{settings.WEBHOOK_PORT}/{settings.WEBHOOK_PATH}"
+        )
+        await wait_for_stop_signal()
+        logging.info("Получен сигнал остановки")
+    finally:
+        if server is not None:
+            server.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+        profiler.stop()
+        if refresher is not None:
+            await refresher.stop()
+        await supervisor.stop(settings.SHUTDOWN_DRAIN_TIMEOUT + 10)
+        logging.info(f"Диспетчер остановлен: {supervisor.stats()}")
+        shutil.rmtree(runtime_dir, ignore_errors=True)
+
+
 async def main() -> None:
     """Основная функция запуска бота"""
-    
+
     setup_logging()
-    
+    startup.record('imports', startup.started)
+    startup.report_path = settings.STARTUP_REPORT_PATH
+
+    if settings.WORKERS > 1:
+        await run_dispatcher()
+        return
+
     try:
-        app = create_application()
-        
-        logging.info("Бот запущен. Нажмите Ctrl+C для остановки...")
-        
-        # Запускаем бота
-        await app.initialize()
-        await app.start()
-        await app.updater.start_polling()
-        
-        # Бесконечный цикл
-        await app.idle()
-        
+        with startup.phase('application'):
+            app = create_application()
     except Exception as e:
         logging.error(f"Ошибка при запуске бота: {e}")
         raise
 
+    # Тот же порядок, что у Application.run_polling/run_webhook: post_init и
+    # post_shutdown при ручном запуске сами не вызываются
+    with startup.phase('initialize'):
+        await app.initialize()
+    try:
+        with startup.phase('background_tasks'):
+            if app.post_init:
+                await app.post_init(app)
+        await app.start()
+        try:
+            with startup.phase('updates'):
+                await start_updates(app)
+            startup.mark_ready()
+            mode = f"worker {settings.WORKER_INDEX}" if settings.WORKER_SOCKET else settings.BOT_MODE
+            logging.info(f"Бот запущен в режиме {mode}. Нажмите Ctrl+C для остановки...")
+            await wait_for_stop_signal()
+            logging.info("Получен сигнал остановки")
+        finally:
+            await shutdown_gracefully(app)
+            if app.post_stop:
+                await app.post_stop(app)
+    finally:
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())
@@ -0,0 +1,123 @@
+"""
+Локальный HTTP-эндпоинт метрик и управления профилировщиком
+
+    GET  /metrics                         - метрики в текстовом формате Prometheus
+    GET  /profiler                        - состояние профилировщика и самые частые функции (JSON)
+    POST /profiler/start?interval=&duration=  - запуск выборки (секунды; duration=0 - до stop)
+    POST /profiler/stop                   - остановка
+    GET  /profiler/collapsed?limit=       - свернутые стеки для flamegraph.pl / speedscope
+    GET  /startup                         - отчет о запуске: фазы и время импорта модулей (JSON)
+
+По умолчанию сервер слушает только 127.0.0.1: профилировщик раскрывает
+внутреннее устройство процесса.
+"""
+
+import json
+import logging
+from typing import Optional
+
+from tornado.httpserver import HTTPServer
+from tornado.web import Application as WebApplication, RequestHandler
+
+from bot.profiler import SamplingProfiler
+from bot.startup import StartupTimer
+from data.metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _MetricsHandler(RequestHandler):
+    def initialize(self, registry: MetricsRegistry):
+        self.registry = registry
+
+    def get(self):
+        self.set_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+        self.write(self.registry.render())
+
+
+class _StartupHandler(RequestHandler):
+    def initialize(self, startup: StartupTimer):
+        self.startup = startup
+
+    def get(self):
+        self.set_header('Content-Type', 'application/json; charset=utf-8')
+        self.write(json.dumps(self.startup.report(), ensure_ascii=False))
+
+
+class _ProfilerHandler(RequestHandler):
+    def initialize(self, profiler: SamplingProfiler):
+        self.profiler = profiler
+
+    def _write_json(self, data):
+        self.set_header('Content-Type', 'application/json; charset=utf-8')
+        self.write(json.dumps(data, ensure_ascii=False))
+
+    def get(self, action: Optional[str] = None):
+        if action == 'collapsed':
+            self.set_header('Content-Type', 'text/plain; charset=utf-8')
+            self.write(self.profiler.collapsed(int(self.get_argument('limit', '0'))))
+            return
+        if action:
+            self.set_status(404)
+            return
+        self._write_json({**self.profiler.stats(), 'top': self.profiler.top_functions()})
+
+    def post(self, action: Optional[str] = None):
+        if action == 'start':
+            try:
+                interval = float(self.get_argument('interval', '0')) or None
+                duration = float(self.get_argument('duration', '0'))
+            except ValueError:
+                self.set_status(400)
+                return
+            if interval is not None and interval <= 0:
+                self.set_status(400)
+                return
+            started = self.profiler.start(interval, duration)
+            self.set_status(200 if started else 409)
+        elif action == 'stop':
+            stopped = self.profiler.stop()
+            self.set_status(200 if stopped else 409)
+        else:
+            self.set_status(404)
+            return
+        self._write_json(self.profiler.stats())
+
+
+def create_metrics_server(
+    registry: MetricsRegistry, profiler: SamplingProfiler, startup: Optional[StartupTimer] = None
+) -> HTTPServer:
+    """HTTP-сервер метрик (запускается вызовом listen)"""
+    handlers = [
+        (r'/metrics/?', _MetricsHandler, {'registry': registry}),
+        (r'/profiler/?', _ProfilerHandler, {'profiler': profiler}),
+        (r'/profiler/(\w+)/?', _ProfilerHandler, {'profiler': profiler}),
+    ]
+    if startup is not None:
+        handlers.append((r'/startup/?', _StartupHandler, {'startup': startup}))
+    return HTTPServer(WebApplication(handlers, log_function=lambda handler: None))
+
+
+def start_metrics_server(
+    registry: MetricsRegistry,
+    profiler: SamplingProfiler,
+    port: int,
+    address: str = '127.0.0.1',
+    startup: Optional[StartupTimer] = None,
+) -> Optional[HTTPServer]:
+    """
+    Запуск сервера метрик на текущем event loop
+
+    Returns:
+        сервер или None, если порт занят (бот продолжает работу без эндпоинта)
+    """
+    server = create_metrics_server(registry, profiler, startup)
+    try:
+        server.listen(port, address=address)
+    except OSError as e:
+        logger.warning(f"Эндпоинт метрик не запущен на {address}:{port}: {e}")
+        return None
+    logger.info(f"Метрики: http://{address}:{port}/metrics")
+    return server
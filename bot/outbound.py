@@ -0,0 +1,360 @@
+"""
+Исходящие вызовы Bot API: ограничение частоты, объединение заглушки с ответом и пул соединений
+
+ChatRateLimiter подключается к Application как BaseRateLimiter и
+применяется ко всем вызовам context.bot: сообщения в чат проходят через
+token bucket чата и общий token bucket бота, поэтому всплеск нагрузки
+растягивается во времени, а не превращается в ответы 429. Если 429 все же
+пришел, вызов повторяется после retry_after.
+
+ReplyCoalescer откладывает сообщение-заглушку ("Обрабатываю запрос...")
+на delay: если ответ готов раньше, вместо отправки заглушки и ее
+редактирования выполняется одна отправка.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+from telegram import Message
+from telegram.error import BadRequest, RetryAfter
+from telegram.ext import BaseRateLimiter
+from telegram.request import BaseRequest, HTTPXRequest, RequestData
+
+from data.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Простой bucket чата удаляется, когда он полностью восполнился; проверка раз в N вызовов
+_SWEEP_EVERY = 1000
+
+API_SECONDS = metrics.histogram('telegram_api_seconds', 'Время HTTP-вызовов Bot API', ('method',))
+API_CALLS = metrics.counter('telegram_api_calls_total', 'Вызовы Bot API по HTTP-коду ответа', ('method', 'status'))
+RATE_LIMIT_WAIT_SECONDS = metrics.histogram(
+    'telegram_rate_limit_wait_seconds', 'Ожидание токенов ограничителя частоты перед вызовом'
+)
+RETRY_AFTER = metrics.counter('telegram_retry_after_total', 'Ответы 429 от Bot API')
+
+
+class TokenBucket:
+    """
+    Token bucket: capacity токенов, восполнение rate токенов в секунду
+
+    Ожидающие получают токены в порядке очереди (asyncio.Lock - FIFO)
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def idle(self) -> bool:
+        """Bucket полон и никто не ждет - его можно удалить без изменения поведения"""
+        now = time.monotonic()
+        self._refill(now)
+        return self._tokens >= self.capacity and not self._lock.locked() and now >= self._paused_until
+
+    def pause(self, seconds: float):
+        """Запрет выдачи токенов на seconds (ответ 429 с retry_after)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self) -> float:
+        """
+        Получение одного токена
+
+        Returns:
+            время ожидания в секундах
+        """
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                delay = max(self._paused_until - now, (1 - self._tokens) / self.rate if self._tokens < 1 else 0.0)
+                if delay <= 0:
+                    self._tokens -= 1
+                    return waited
+                await asyncio.sleep(delay)
+                waited += delay
+
+
+class ChatRateLimiter(BaseRateLimiter):
+    """
+    Ограничение частоты исходящих сообщений по лимитам Telegram
+
+    Вызовы с chat_id (sendMessage, editMessageText, ...) ждут токен своего
+    чата, затем общий токен бота; остальные вызовы (answerCallbackQuery,
+    getMe, setWebhook) выполняются без ожидания
+    """
+
+    def __init__(
+        self,
+        overall_rate: float = 30,
+        chat_rate: float = 1,
+        chat_burst: int = 3,
+        group_per_minute: int = 20,
+        max_retries: int = 3,
+    ):
+        """
+        Args:
+            overall_rate: сообщений в секунду на бота
+            chat_rate: сообщений в секунду в личный чат
+            chat_burst: сколько сообщений подряд можно отправить в личный чат без ожидания
+            group_per_minute: сообщений в минуту в группу
+            max_retries: повторов вызова после 429
+        """
+        self.overall_rate = overall_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_per_minute = group_per_minute
+        self.max_retries = max_retries
+        self._overall: Optional[TokenBucket] = None
+        self._chats: Dict[Union[int, str], TokenBucket] = {}
+        self._calls = 0
+        self.counters: Dict[str, Any] = {
+            'requests': 0,
+            'throttled': 0,
+            'wait_seconds': 0.0,
+            'retry_after': 0,
+        }
+
+    async def initialize(self) -> None:
+        # Общий лимит без серий: за любую секунду уходит не больше overall_rate + 1 сообщений
+        self._overall = TokenBucket(self.overall_rate, 1)
+
+    async def shutdown(self) -> None:
+        self._chats.clear()
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Группы и каналы (отрицательный id или @username) ограничены в минуту
+            try:
+                is_group = int(chat_id) < 0
+            except ValueError:
+                is_group = True
+            if is_group:
+                bucket = TokenBucket(self.group_per_minute / 60, self.group_per_minute)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _sweep(self):
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.idle]:
+            del self._chats[chat_id]
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Any],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        chat_id = data.get('chat_id')
+        if chat_id is None:
+            return await callback(*args, **kwargs)
+
+        self._calls += 1
+        if self._calls % _SWEEP_EVERY == 0:
+            self._sweep()
+
+        self.counters['requests'] += 1
+        chat_bucket = self._chat_bucket(chat_id)
+        for attempt in range(self.max_retries + 1):
+            # Сначала токен чата: чат, упершийся в свой лимит, не держит общие токены
+            waited = await chat_bucket.acquire() + await self._overall.acquire()
+            RATE_LIMIT_WAIT_SECONDS.observe(waited)
+            if waited:
+                self.counters['throttled'] += 1
+                self.counters['wait_seconds'] += waited
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self.counters['retry_after'] += 1
+                RETRY_AFTER.inc()
+                retry_after = float(e.retry_after)
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"Telegram ограничил частоту ({endpoint}, чат {chat_id}): " f"повтор через {retry_after} с")
+                chat_bucket.pause(retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, 'wait_seconds': round(self.counters['wait_seconds'], 3), 'chats': len(self._chats)}
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest с метриками времени и кодов ответа по методам Bot API"""
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout=BaseRequest.DEFAULT_NONE,
+        write_timeout=BaseRequest.DEFAULT_NONE,
+        connect_timeout=BaseRequest.DEFAULT_NONE,
+        pool_timeout=BaseRequest.DEFAULT_NONE,
+    ) -> Tuple[int, bytes]:
+        api_method = url.rsplit('/', 1)[-1]
+        status = 'error'
+        started = time.perf_counter()
+        try:
+            code, payload = await super().do_request(
+                url,
+                method,
+                request_data,
+                read_timeout=read_timeout,
+                write_timeout=write_timeout,
+                connect_timeout=connect_timeout,
+                pool_timeout=pool_timeout,
+            )
+            status = str(code)
+            return code, payload
+        finally:
+            API_SECONDS.labels(api_method).observe(time.perf_counter() - started)
+            API_CALLS.labels(api_method, status).inc()
+
+
+def create_request(
+    pool_size: int,
+    pool_timeout: float,
+    connect_timeout: float,
+    read_timeout: float,
+    write_timeout: float,
+    http_version: str = '1.1',
+) -> HTTPXRequest:
+    """
+    Общий пул HTTP-соединений для вызовов Bot API
+
+    Размер пула ограничивает число одновременных запросов к Telegram;
+    pool_timeout - сколько вызов ждет свободное соединение при всплеске
+    (по умолчанию в PTB 1 с, после чего вызов завершается ошибкой)
+    """
+    return InstrumentedRequest(
+        connection_pool_size=pool_size,
+        pool_timeout=pool_timeout,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        write_timeout=write_timeout,
+        http_version=http_version,
+    )
+
+
+class DeferredReply:
+    """
+    Заглушка ответа на сообщение, отправляемая только если ответ не готов за delay
+
+    resolve() до отправки заглушки отменяет ее и отправляет ответ одним
+    вызовом; после отправки - редактирует заглушку. При delay <= 0
+    заглушка отправляется сразу
+    """
+
+    def __init__(self, coalescer: 'ReplyCoalescer', message: Message, text: str, delay: float, **kwargs):
+        self._coalescer = coalescer
+        self._message = message
+        self._text = text
+        self._kwargs = kwargs
+        self._delay = delay
+        # Запрос заглушки уже ушел в Telegram (или уйдет сразу): отменять его нельзя, только дождаться
+        self._sending = delay <= 0
+        self._resolved = False
+        self._task = asyncio.get_running_loop().create_task(self._send_later())
+
+    @property
+    def resolved(self) -> bool:
+        """Ответ вместо заглушки уже отправлен (или отправляется)"""
+        return self._resolved
+
+    async def _send_later(self) -> Message:
+        if self._delay > 0:
+            await asyncio.sleep(self._delay)
+        self._sending = True
+        self._coalescer.counters['placeholders'] += 1
+        return await self._message.reply_text(self._text, **self._kwargs)
+
+    def cancel(self):
+        """Отмена заглушки, если она еще не отправлена (ответ будет отправлен отдельно)"""
+        if not self._sending:
+            self._task.cancel()
+
+    async def resolve(self, text: str, **kwargs) -> Message:
+        """
+        Ответ вместо заглушки
+
+        Args:
+            text: текст ответа
+            **kwargs: параметры reply_text / edit_text (parse_mode, reply_markup)
+
+        Returns:
+            сообщение с ответом
+        """
+        self._resolved = True
+        if not self._sending:
+            self._task.cancel()
+            self._coalescer.counters['coalesced'] += 1
+            return await self._message.reply_text(text, **kwargs)
+
+        try:
+            placeholder = await self._task
+        except Exception as e:
+            logger.warning(f"Заглушка не отправлена: {e}")
+            return await self._message.reply_text(text, **kwargs)
+
+        try:
+            edited = await placeholder.edit_text(text, **kwargs)
+            self._coalescer.counters['edited'] += 1
+            return edited if isinstance(edited, Message) else placeholder
+        except BadRequest as e:
+            logger.warning(f"Не удалось обновить сообщение: {e}")
+            return await self._message.reply_text(text, **kwargs)
+
+    async def fail(self, text: str, **kwargs):
+        """
+        Сообщение об ошибке вместо заглушки, если ответ так и не был отправлен
+
+        Вызывается в finally обработчика: ошибки отправки только логируются,
+        чтобы не подменить исключение обработчика
+        """
+        if self._resolved:
+            return
+        try:
+            await self.resolve(text, **kwargs)
+        except Exception as e:
+            logger.warning(f"Не удалось заменить заглушку сообщением об ошибке: {e}")
+
+
+class ReplyCoalescer:
+    """Создание отложенных заглушек с общей задержкой и счетчиками"""
+
+    def __init__(self, delay: float = 0.5):
+        """
+        Args:
+            delay: через сколько секунд без ответа отправляется заглушка (0 и меньше - сразу)
+        """
+        self.delay = delay
+        self.counters: Dict[str, int] = {
+            'placeholders': 0,
+            'coalesced': 0,
+            'edited': 0,
+        }
+
+    def defer(self, message: Message, text: str, **kwargs) -> DeferredReply:
+        """Заглушка ответа на message (kwargs - параметры reply_text)"""
+        return DeferredReply(self, message, text, self.delay, **kwargs)
+
+
+# Глобальный экземпляр для обработчиков
+reply_coalescer = ReplyCoalescer()
@@ -0,0 +1,315 @@
+"""
+Сохранение диалогов между перезапусками бота в SQLite (режим WAL)
+
+user_data загружается лениво - при первом апдейте пользователя после
+запуска, а состояния ConversationHandler (несколько байт на диалог)
+читаются при старте целиком. Изменения накапливаются в памяти и
+записываются одной транзакцией за цикл Application.update_persistence
+в отдельном потоке, поэтому на обработку апдейта запись не влияет.
+
+Результаты поиска и так хранятся в user_data ранжированным списком пар
+(id меры, оценка); выбранная мера сохраняется парой и при загрузке
+восстанавливается по текущей версии датасета, а не сериализуется целиком
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from data.dataset_manager import DatasetManager, dataset_manager
+
+logger = logging.getLogger(__name__)
+
+# Ключи user_data с одним результатом поиска
+RESULT_KEYS = ('selected_result',)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS user_data ("
+    " user_id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS conversations ("
+    " name TEXT NOT NULL, key TEXT NOT NULL, state TEXT NOT NULL, updated_at REAL NOT NULL,"
+    " PRIMARY KEY (name, key)) WITHOUT ROWID",
+)
+
+
+def _result_ref(result: Dict[str, Any]) -> list:
+    return [result['id'], round(float(result.get('match_score', 0.0)), 4)]
+
+
+def encode_user_data(data: Dict[str, Any]) -> Optional[str]:
+    """
+    Компактная сериализация user_data в JSON
+
+    Выбранный результат заменяется парой [id, оценка], datetime - строкой ISO;
+    значения, которые нельзя представить в JSON, не сохраняются
+
+    Returns:
+        JSON-строка или None, если сохранять нечего
+    """
+    record = {}
+    for key, value in data.items():
+        try:
+            if key in RESULT_KEYS and isinstance(value, dict):
+                value = {'$result': _result_ref(value)}
+            elif isinstance(value, datetime):
+                value = {'$datetime': value.isoformat()}
+            json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError, KeyError):
+            logger.debug(f"Значение user_data[{key!r}] не сохраняется: {type(value).__name__}")
+            continue
+        record[key] = value
+    if not record:
+        return None
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+
+
+def decode_user_data(payload: str, manager: DatasetManager) -> Dict[str, Any]:
+    """
+    Восстановление user_data; результаты поиска берутся из текущей версии датасета
+
+    Args:
+        payload: JSON из encode_user_data
+        manager: менеджер датасета для восстановления результатов по id
+
+    Returns:
+        словарь user_data (меры, удаленные из датасета, пропускаются)
+    """
+    data = {}
+    for key, value in json.loads(payload).items():
+        if isinstance(value, dict):
+            if '$results' in value:
+                # Список результатов целиком сохранялся до постраничного показа; теперь это result_ids
+                continue
+            if '$result' in value:
+                results = manager.results_by_ids([tuple(value['$result'])])
+                if not results:
+                    continue
+                value = results[0]
+            elif '$datetime' in value:
+                value = datetime.fromisoformat(value['$datetime'])
+        data[key] = value
+    return data
+
+
+class SQLitePersistence(BasePersistence):
+    """
+    Persistence для ConversationHandler и user_data на SQLite
+
+    Все обращения к базе выполняются в одном выделенном потоке
+    """
+
+    def __init__(self, path: str, update_interval: float = 5.0, manager: DatasetManager = dataset_manager):
+        """
+        Args:
+            path: путь к файлу базы
+            update_interval: период записи накопленных изменений в секундах
+            manager: менеджер датасета для восстановления результатов поиска
+        """
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.path = path
+        self.manager = manager
+        self._db = ThreadPoolExecutor(max_workers=1, thread_name_prefix='persistence')
+        self._connection: Optional[sqlite3.Connection] = None
+        # Пользователи, чьи данные уже подняты из базы (или которых в базе нет)
+        self._loaded: Set[int] = set()
+        self._loading: Dict[int, asyncio.Future] = {}
+        # Изменения до записи: None - удалить запись
+        self._dirty_users: Dict[int, Optional[Dict[str, Any]]] = {}
+        self._dirty_conversations: Dict[Tuple[str, str], Optional[object]] = {}
+        self._write_task: Optional[asyncio.Task] = None
+        # Ожидание фоновой загрузки датасета перед восстановлением результатов (None - не ждать)
+        self.wait_ready: Optional[Callable[[], Awaitable[Any]]] = None
+        self.counters: Dict[str, int] = {
+            'batches': 0,
+            'users_loaded': 0,
+            'users_written': 0,
+            'conversations_written': 0,
+            'write_errors': 0,
+        }
+
+    # --- Работа с базой (только в потоке self._db) ---
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL: запись не блокирует чтение; NORMAL - fsync только при checkpoint
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                connection.execute(statement)
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _read_conversations(self, name: str) -> Dict[tuple, object]:
+        rows = self._connect().execute("SELECT key, state FROM conversations WHERE name = ?", (name,))
+        return {tuple(json.loads(key)): json.loads(state) for key, state in rows}
+
+    def _read_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT data FROM user_data WHERE user_id = ?", (user_id,)).fetchone()
+        return decode_user_data(row[0], self.manager) if row else None
+
+    def _write_batch(self, users: Dict[int, Optional[Dict[str, Any]]],
+                     conversations: Dict[Tuple[str, str], Optional[object]]):
+        now = time.time()
+        upserts, deletes = [], []
+        for user_id, data in users.items():
+            payload = encode_user_data(data) if data else None
+            if payload is None:
+                deletes.append((user_id,))
+            else:
+                upserts.append((user_id, payload, now))
+
+        states = [(name, key, json.dumps(state), now)
+                  for (name, key), state in conversations.items() if state is not None]
+        ended = [(name, key) for (name, key), state in conversations.items() if state is None]
+
+        connection = self._connect()
+        with connection:
+            connection.executemany("INSERT OR REPLACE INTO user_data VALUES (?, ?, ?)", upserts)
+            connection.executemany("DELETE FROM user_data WHERE user_id = ?", deletes)
+            connection.executemany("INSERT OR REPLACE INTO conversations VALUES (?, ?, ?, ?)", states)
+            connection.executemany("DELETE FROM conversations WHERE name = ? AND key = ?", ended)
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def _load_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        if self.wait_ready is not None:
+            await self.wait_ready()
+        return await self._in_db_thread(self._read_user, user_id)
+
+    async def _in_db_thread(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._db, fn, *args)
+
+    # --- Пакетная запись ---
+
+    def _schedule_write(self):
+        """
+        Запись изменений после текущего цикла update_persistence
+
+        Application вызывает update_* через asyncio.gather, поэтому задача,
+        созданная в первом вызове, выполнится после остальных вызовов цикла
+        и запишет их одной транзакцией
+        """
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.get_running_loop().create_task(self._write_pending())
+
+    async def _write_pending(self):
+        while self._dirty_users or self._dirty_conversations:
+            users, self._dirty_users = self._dirty_users, {}
+            conversations, self._dirty_conversations = self._dirty_conversations, {}
+            try:
+                await self._in_db_thread(self._write_batch, users, conversations)
+            except Exception as e:
+                # Возвращаем изменения, не затирая более новые, и повторим в следующем цикле
+                self.counters['write_errors'] += 1
+                logger.error(f"Не удалось сохранить диалоги: {e}")
+                self._dirty_users = {**users, **self._dirty_users}
+                self._dirty_conversations = {**conversations, **self._dirty_conversations}
+                return
+            self.counters['batches'] += 1
+            self.counters['users_written'] += len(users)
+            self.counters['conversations_written'] += len(conversations)
+
+    # --- Интерфейс BasePersistence ---
+
+    async def get_user_data(self) -> Dict[int, Dict[str, Any]]:
+        # Данные пользователей поднимаются лениво в refresh_user_data
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, Dict[str, Any]]:
+        return {}
+
+    async def get_bot_data(self) -> Dict[str, Any]:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[tuple, object]:
+        conversations = await self._in_db_thread(self._read_conversations, name)
+        logger.info(f"Восстановлено диалогов '{name}': {len(conversations)}")
+        return conversations
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        self._dirty_conversations[(name, json.dumps(list(key)))] = new_state
+        self._schedule_write()
+
+    async def update_user_data(self, user_id: int, data: Dict[str, Any]) -> None:
+        # Данные не поднимались - обработчик их не видел и не менял (апдейт без обработчика)
+        if user_id not in self._loaded:
+            return
+        self._dirty_users[user_id] = data
+        self._schedule_write()
+
+    async def update_chat_data(self, chat_id: int, data: Dict[str, Any]) -> None:
+        pass
+
+    async def update_bot_data(self, data: Dict[str, Any]) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._dirty_users[user_id] = None
+        self._schedule_write()
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[str, Any]) -> None:
+        if user_id in self._loaded:
+            return
+
+        # Параллельные апдейты одного пользователя ждут одну загрузку
+        loading = self._loading.get(user_id)
+        if loading is None:
+            loading = self._loading[user_id] = asyncio.ensure_future(self._load_user(user_id))
+            try:
+                stored = await loading
+            except Exception as e:
+                # Пользователь не отмечается загруженным: пустые данные не затрут сохраненные
+                logger.error(f"Не удалось загрузить данные пользователя {user_id}: {e}")
+                return
+            finally:
+                del self._loading[user_id]
+            self._loaded.add(user_id)
+            if stored:
+                self.counters['users_loaded'] += 1
+                for key, value in stored.items():
+                    user_data.setdefault(key, value)
+        else:
+            await asyncio.wait([loading])
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[str, Any]) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict[str, Any]) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """Запись оставшихся изменений и закрытие базы (вызывается при остановке Application)"""
+        if self._write_task is not None:
+            await self._write_task
+        await self._write_pending()
+        await self._in_db_thread(self._close)
+        self._db.shutdown(wait=True)
+        logger.info(f"Диалоги сохранены: {self.counters}")
@@ -0,0 +1,149 @@
+"""
+Сэмплирующий профилировщик, включаемый во время работы бота
+
+Фоновый поток раз в interval снимает стеки всех потоков процесса
+(sys._current_frames) и считает одинаковые стеки. Код бота не
+инструментируется, поэтому накладные расходы определяются только
+частотой выборки. Отчет - "свернутые" стеки (формат flamegraph.pl и
+speedscope): строка "поток;файл:функция;... количество".
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Глубина стека в выборке: глубже - только общая часть вызовов asyncio/PTB
+MAX_DEPTH = 64
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """Профилировщик процесса; start/stop можно вызывать многократно"""
+
+    def __init__(self, interval: float = 0.005):
+        """
+        Args:
+            interval: период выборки в секундах
+        """
+        self.interval = interval
+        self._samples: Counter = Counter()
+        self._sample_count = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._started_at = 0.0
+        self._duration = 0.0
+        self._deadline = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: Optional[float] = None, duration: float = 0) -> bool:
+        """
+        Запуск выборки; накопленные стеки сбрасываются
+
+        Args:
+            interval: период выборки (None - текущий)
+            duration: автоматическая остановка через duration секунд (0 - до stop())
+
+        Returns:
+            False если профилировщик уже запущен
+        """
+        if self.running:
+            return False
+        if interval:
+            self.interval = interval
+        with self._lock:
+            self._samples.clear()
+            self._sample_count = 0
+        self._stop.clear()
+        self._started_at = time.monotonic()
+        self._deadline = self._started_at + duration if duration else 0.0
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Профилировщик запущен: выборка каждые {self.interval * 1000:.1f} мс" + (f", на {duration} с" if duration else "")
+        )
+        return True
+
+    def stop(self) -> bool:
+        """
+        Остановка выборки (накопленные стеки сохраняются до следующего start)
+
+        Returns:
+            False если профилировщик не был запущен
+        """
+        if not self.running:
+            return False
+        self._stop.set()
+        self._thread.join()
+        logger.info(f"Профилировщик остановлен: {self._sample_count} выборок за {self._duration:.1f} с")
+        return True
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            if self._deadline and time.monotonic() >= self._deadline:
+                break
+            if len(names) != threading.active_count():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                stacks.append(';'.join(reversed(stack)))
+            with self._lock:
+                self._samples.update(stacks)
+                self._sample_count += 1
+        self._duration = time.monotonic() - self._started_at
+
+    def collapsed(self, limit: int = 0) -> str:
+        """
+        Свернутые стеки, самые частые первыми
+
+        Args:
+            limit: максимум строк (0 - все)
+        """
+        with self._lock:
+            items = self._samples.most_common(limit or None)
+        return ''.join(f"{stack} {count}\n" for stack, count in items)
+
+    def top_functions(self, limit: int = 20) -> Dict[str, int]:
+        """Функции на вершине стека (где поток находился в момент выборки)"""
+        leaves: Counter = Counter()
+        with self._lock:
+            samples = list(self._samples.items())
+        for stack, count in samples:
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return dict(leaves.most_common(limit))
+
+    def stats(self) -> Dict[str, Any]:
+        duration = time.monotonic() - self._started_at if self.running else self._duration
+        return {
+            'running': self.running,
+            'interval_ms': round(self.interval * 1000, 2),
+            'samples': self._sample_count,
+            'duration_s': round(duration, 2),
+            'stacks': len(self._samples),
+        }
+
+
+# Глобальный экземпляр для HTTP-эндпоинта метрик
+profiler = SamplingProfiler()
@@ -0,0 +1,220 @@
+"""
+Отчет о запуске процесса бота: фазы инициализации и время импорта модулей
+
+Фазы (interpreter, imports, application, initialize, updates, dataset...)
+замеряются всегда и публикуются в логе, метриках startup_phase_seconds
+и на эндпоинте /startup. Время каждого модуля (как python -X importtime:
+собственное и с вложенными импортами) собирается только при
+STARTUP_IMPORT_PROFILE: загрузчики модулей оборачиваются на время импорта.
+
+Модуль импортируется точкой входа первым, до тяжелых зависимостей.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from data.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+STARTUP_PHASE_SECONDS = metrics.gauge('startup_phase_seconds', 'Длительность фаз запуска процесса', ('phase',))
+STARTUP_READY_SECONDS = metrics.gauge('startup_ready_seconds', 'Время от запуска процесса до приема апдейтов')
+
+
+def _process_age() -> Optional[float]:
+    """Секунды с запуска процесса (Linux, точность 10 мс; None на других системах)"""
+    try:
+        with open('/proc/self/stat') as f:
+            # Поле 22 (starttime) считается после имени процесса в скобках
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class _TimedLoader:
+    """Загрузчик-обертка: время exec_module записывается в ImportTimer"""
+
+    def __init__(self, loader, timer: 'ImportTimer', name: str):
+        self._loader = loader
+        self._timer = timer
+        self._name = name
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        spec = module.__spec__
+        self._timer._enter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timer._exit(self._name)
+            # После импорта модуль видит исходный загрузчик
+            if spec is not None:
+                spec.loader = self._loader
+            module.__loader__ = self._loader
+
+    def __getattr__(self, attribute):
+        return getattr(self._loader, attribute)
+
+
+class ImportTimer:
+    """Время импорта модулей: собственное и с вложенными импортами (по потокам)"""
+
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+        self._local = threading.local()
+
+    def install(self):
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        # Спецификацию находят остальные поисковики, подменяется только загрузчик
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module') and hasattr(spec.loader, 'create_module'):
+            spec.loader = _TimedLoader(spec.loader, self, fullname)
+        return spec
+
+    def _enter(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        # [начало, время вложенных импортов]
+        stack.append([time.perf_counter(), 0.0])
+
+    def _exit(self, name: str):
+        stack = self._local.stack
+        started, nested = stack.pop()
+        cumulative = time.perf_counter() - started
+        if stack:
+            stack[-1][1] += cumulative
+        self.records.append({
+            'module': name,
+            'self_ms': round((cumulative - nested) * 1000, 2),
+            'cumulative_ms': round(cumulative * 1000, 2),
+            'depth': len(stack),
+            'thread': threading.current_thread().name,
+        })
+
+    def top(self, limit: int = 30) -> List[Dict[str, Any]]:
+        """Самые долгие импорты по времени с вложенными"""
+        return sorted(self.records, key=lambda record: -record['cumulative_ms'])[:limit]
+
+    def packages(self) -> Dict[str, float]:
+        """Время импорта верхнеуровневых пакетов (pandas, telegram, ...) в мс"""
+        totals: Dict[str, float] = {}
+        for record in self.records:
+            if record['depth'] == 0:
+                package = record['module'].split('.', 1)[0]
+                totals[package] = round(totals.get(package, 0.0) + record['cumulative_ms'], 2)
+        return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+class StartupTimer:
+    """Фазы запуска процесса; отсчет - от импорта модуля (плюс время интерпретатора до него)"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.interpreter_seconds = _process_age()
+        self.phases: List[Dict[str, Any]] = []
+        self.ready_seconds: Optional[float] = None
+        self.imports: Optional[ImportTimer] = None
+        self.report_path = ''
+        if self.interpreter_seconds is not None:
+            self._add('interpreter', -self.interpreter_seconds, self.interpreter_seconds)
+
+    def track_imports(self):
+        """Замер времени каждого следующего импорта (STARTUP_IMPORT_PROFILE)"""
+        if self.imports is None:
+            self.imports = ImportTimer()
+            self.imports.install()
+
+    def _offset(self) -> float:
+        return self.interpreter_seconds or 0.0
+
+    def _add(self, name: str, start: float, seconds: float):
+        self.phases.append({'name': name, 'start': round(start + self._offset(), 4), 'seconds': round(seconds, 4)})
+        STARTUP_PHASE_SECONDS.labels(name).set(seconds)
+
+    def record(self, name: str, started: float):
+        """
+        Фаза, начавшаяся в started (time.perf_counter) и закончившаяся сейчас
+
+        Фазы после готовности (фоновая загрузка датасета) дописываются в отчет
+        """
+        now = time.perf_counter()
+        self._add(name, started - self.started, now - started)
+        if self.ready_seconds is not None:
+            logger.info(f"Фаза запуска {name}: {now - started:.3f} с")
+            self.write()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Замер блока как фазы запуска"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, started)
+
+    def mark_ready(self):
+        """Процесс принимает апдейты: итог в лог, метрики и файл отчета"""
+        self.ready_seconds = time.perf_counter() - self.started + self._offset()
+        STARTUP_READY_SECONDS.set(self.ready_seconds)
+        phases = ', '.join(f"{phase['name']} {phase['seconds']:.3f}" for phase in self.phases)
+        logger.info(f"Готов к приему апдейтов за {self.ready_seconds:.3f} с ({phases})")
+        if self.imports is not None:
+            slowest = ', '.join(f"{name} {ms:.0f} мс" for name, ms in list(self.imports.packages().items())[:8])
+            logger.info(f"Импорт пакетов: {slowest}")
+        self.write()
+
+    def report(self) -> Dict[str, Any]:
+        report: Dict[str, Any] = {
+            'pid': os.getpid(),
+            'ready_seconds': round(self.ready_seconds, 4) if self.ready_seconds is not None else None,
+            'phases': list(self.phases),
+            # Модули, уже загруженные процессом: для сравнения с ожидаемым ленивым набором
+            'heavy_modules_loaded': [name for name in ('pandas', 'openpyxl', 'faiss', 'sentence_transformers', 'torch')
+                                     if name in sys.modules],
+        }
+        if self.imports is not None:
+            report['import_packages_ms'] = self.imports.packages()
+            report['imports'] = self.imports.top()
+        return report
+
+    def write(self):
+        """Запись отчета в report_path (атомарно, ошибки только логируются)"""
+        if not self.report_path:
+            return
+        tmp_path = f"{self.report_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.report(), f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.report_path)
+        except OSError as e:
+            logger.warning(f"Не удалось записать отчет о запуске {self.report_path}: {e}")
+
+
+# Отчет о запуске текущего процесса
+startup = StartupTimer()
@@ -0,0 +1,127 @@
+"""
+Параллельная обработка апдейтов с сохранением порядка внутри диалога
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from data.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+UPDATE_SECONDS = metrics.histogram('update_seconds', 'Время обработки апдейта, включая ожидание предыдущих апдейтов диалога')
+
+
+def conversation_key(update: object) -> Optional[Hashable]:
+    """
+    Ключ диалога, совпадающий с ключом ConversationHandler (per_chat=True, per_user=True)
+
+    Returns:
+        (chat_id, user_id) или None, если апдейт не относится к диалогу
+    """
+    if not isinstance(update, Update):
+        return None
+    chat, user = update.effective_chat, update.effective_user
+    if chat is None and user is None:
+        return None
+    return (chat.id if chat else None, user.id if user else None)
+
+
+class ConversationUpdateProcessor(BaseUpdateProcessor):
+    """
+    Обработчик апдейтов: до max_concurrent_updates апдейтов одновременно,
+    но апдейты одного диалога выполняются строго по очереди в порядке
+    поступления, поэтому состояние ConversationHandler не гоняется
+
+    Порядок сохраняется, потому что задачи создаются Application в порядке
+    очереди, а семафор и asyncio.Lock пропускают ожидающих в порядке FIFO.
+    Блокировка диалога берется до семафора, поэтому место в семафоре
+    занимают только апдейты, которые могут выполняться прямо сейчас
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # Ключ диалога -> (блокировка, количество апдейтов, ожидающих или выполняющихся)
+        self._locks: Dict[Hashable, list] = {}
+        self._active = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.processed = 0
+        # Вызывается после обработки каждого апдейта, в том числе завершившейся ошибкой
+        self.on_processed: Optional[Callable[[object], None]] = None
+
+    @property
+    def active(self) -> int:
+        """Количество апдейтов в обработке"""
+        return self._active
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:  # type: ignore[misc]
+        """
+        Обработка апдейта: сначала очередь диалога, затем общий семафор
+
+        Апдейты, ожидающие предыдущих апдейтов своего диалога, не занимают
+        места в семафоре и не задерживают апдейты других диалогов
+        """
+        started = time.perf_counter()
+        self._active += 1
+        self._idle.clear()
+        key = conversation_key(update)
+        try:
+            if key is None:
+                async with self._semaphore:
+                    await self.do_process_update(update, coroutine)
+                return
+
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [asyncio.Lock(), 0]
+            entry[1] += 1
+            try:
+                async with entry[0]:
+                    async with self._semaphore:
+                        await self.do_process_update(update, coroutine)
+            finally:
+                entry[1] -= 1
+                if not entry[1]:
+                    # Блокировки освобожденных диалогов не накапливаются
+                    del self._locks[key]
+        finally:
+            UPDATE_SECONDS.observe(time.perf_counter() - started)
+            self.processed += 1
+            self._active -= 1
+            if not self._active:
+                self._idle.set()
+            if self.on_processed is not None:
+                self.on_processed(update)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        await coroutine
+
+    async def drain(self, timeout: float) -> int:
+        """
+        Ожидание завершения апдейтов, уже взятых в обработку
+
+        Args:
+            timeout: максимальное время ожидания в секундах
+
+        Returns:
+            количество апдейтов, не завершившихся за timeout
+        """
+        if self._active:
+            logger.info(f"Ожидание завершения {self._active} апдейтов (до {timeout} с)")
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Не дождались завершения {self._active} апдейтов")
+        return self._active
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,502 @@
+"""
+Многопроцессный режим: диспетчер webhook и рабочие процессы, разделенные по пользователям
+
+Диспетчер принимает POST-запросы Telegram, по id пользователя выбирает
+рабочий процесс и передает ему тело апдейта через Unix-сокет. Все апдейты
+одного пользователя попадают в один процесс, поэтому состояние
+ConversationHandler (ключ (chat_id, user_id)) и user_data остаются
+локальными для процесса, а порядок апдейтов сохраняется: у каждого
+процесса одно соединение, и апдейты читаются из него по очереди.
+
+Датасет загружается один раз диспетчером и записывается в снапшот;
+рабочие процессы отображают его массивы в память (см. IndexStore) и
+перечитывают снапшот по команде диспетчера после обновления датасета.
+
+Гарантия доставки: диспетчер отвечает Telegram 200, когда апдейт записан
+в сокет процесса, и хранит его до подтверждения - процесс присылает
+подтверждение после обработки апдейта. Если процесс завершился аварийно,
+неподтвержденные апдейты передаются перезапущенному процессу заново в
+исходном порядке, до новых апдейтов. Апдейт теряется только вместе с
+диспетчером; апдейт, обработка которого прервалась падением процесса,
+может быть обработан повторно (доставка "хотя бы один раз"). Если
+процесс недоступен или копит больше max_unconfirmed неподтвержденных
+апдейтов, Telegram получает 503 и повторяет доставку сам.
+
+Формат кадра: длина полезной нагрузки (4 байта, big-endian), тип кадра (1 байт), нагрузка.
+Нагрузка кадров апдейта и подтверждения начинается с номера апдейта (8 байт, big-endian)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import signal
+import struct
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from telegram import Update
+from telegram.ext import Application
+from tornado.httpserver import HTTPServer
+from tornado.web import Application as WebApplication, RequestHandler
+
+from bot.update_processor import ConversationUpdateProcessor
+from data.dataset_manager import DatasetManager
+
+logger = logging.getLogger(__name__)
+
+FRAME_UPDATE = 1
+FRAME_RELOAD = 2
+# Подтверждение обработки апдейта (от процесса диспетчеру)
+FRAME_ACK = 3
+
+_HEADER = struct.Struct('>IB')
+_SEQUENCE = struct.Struct('>Q')
+
+# Поля апдейта, в которых Telegram передает пользователя
+_USER_FIELDS = ('from', 'user')
+
+
+def shard_key(data: Dict[str, Any]) -> int:
+    """
+    Ключ распределения апдейта: id пользователя, иначе id чата, иначе update_id
+
+    Пользователь берется из вложенного объекта апдейта (message.from,
+    callback_query.from, poll_answer.user, ...), поэтому все диалоги одного
+    пользователя, в том числе в разных чатах, обрабатывает один процесс
+
+    Args:
+        data: апдейт в виде JSON-словаря, как его присылает Telegram
+
+    Returns:
+        целочисленный ключ
+    """
+    chat_id = None
+    for value in data.values():
+        if not isinstance(value, dict):
+            continue
+        for name in _USER_FIELDS:
+            user = value.get(name)
+            if isinstance(user, dict) and 'id' in user:
+                return user['id']
+        chat = value.get('chat') or (value.get('message') or {}).get('chat')
+        if chat_id is None and isinstance(chat, dict) and 'id' in chat:
+            chat_id = chat['id']
+    if chat_id is not None:
+        return chat_id
+    return data.get('update_id', 0)
+
+
+def shard_for(data: Dict[str, Any], workers: int) -> int:
+    """Номер рабочего процесса для апдейта (остаток от деления неотрицателен и для id групп)"""
+    return shard_key(data) % workers
+
+
+def pack_frame(kind: int, payload: bytes) -> bytes:
+    return _HEADER.pack(len(payload), kind) + payload
+
+
+async def write_frame(writer: asyncio.StreamWriter, kind: int, payload: bytes):
+    writer.write(pack_frame(kind, payload))
+    # Обратное давление: если процесс не успевает читать, диспетчер ждет
+    await writer.drain()
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[tuple]:
+    """
+    Returns:
+        (тип кадра, нагрузка) или None, если соединение закрыто
+    """
+    try:
+        length, kind = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+        return kind, await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
+
+
+# --- Рабочий процесс ---
+
+
+class WorkerServer:
+    """
+    Прием апдейтов рабочим процессом от диспетчера
+
+    Апдейты кладутся в update_queue приложения, дальше их обрабатывает
+    ConversationUpdateProcessor как в обычном режиме и сообщает о завершении
+    обработки - тогда диспетчер получает подтверждение апдейта
+    """
+
+    def __init__(self, application: Application, socket_path: str, manager: DatasetManager):
+        """
+        Args:
+            application: инициализированное приложение бота
+            socket_path: путь к Unix-сокету, который слушает процесс
+            manager: менеджер датасета для перезагрузки снапшота
+        """
+        self.application = application
+        self.socket_path = socket_path
+        self.manager = manager
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.Task] = set()
+        self._reload: Optional[asyncio.Task] = None
+        # id(апдейт в обработке) -> (номер апдейта, соединение диспетчера)
+        self._unacknowledged: Dict[int, Tuple[int, asyncio.StreamWriter]] = {}
+        # Подтверждение после обработки; без ConversationUpdateProcessor - сразу после приема
+        self._ack_processed = False
+        self.received = 0
+
+    async def start(self):
+        processor = self.application.update_processor
+        if isinstance(processor, ConversationUpdateProcessor):
+            processor.on_processed = self._processed
+            self._ack_processed = True
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._serve, path=self.socket_path)
+
+    @staticmethod
+    def _acknowledge(writer: asyncio.StreamWriter, sequence: int):
+        # Диспетчер уже закрыл соединение при остановке - подтверждение не нужно
+        if not writer.is_closing():
+            writer.write(pack_frame(FRAME_ACK, _SEQUENCE.pack(sequence)))
+
+    def _processed(self, update: object):
+        entry = self._unacknowledged.pop(id(update), None)
+        if entry is not None:
+            self._acknowledge(entry[1], entry[0])
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                frame = await read_frame(reader)
+                if frame is None:
+                    break
+                kind, payload = frame
+                if kind == FRAME_UPDATE:
+                    self.received += 1
+                    sequence = _SEQUENCE.unpack_from(payload)[0]
+                    try:
+                        update = Update.de_json(json.loads(payload[_SEQUENCE.size:]), self.application.bot)
+                    except Exception as e:
+                        logger.error(f"Не удалось разобрать апдейт: {e}")
+                        # Повторная доставка не поможет
+                        self._acknowledge(writer, sequence)
+                        continue
+                    if self._ack_processed:
+                        self._unacknowledged[id(update)] = (sequence, writer)
+                    else:
+                        self._acknowledge(writer, sequence)
+                    await self.application.update_queue.put(update)
+                elif kind == FRAME_RELOAD:
+                    self._schedule_reload(payload.decode())
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    def _schedule_reload(self, snapshot_dir: str):
+        # Запросы на перезагрузку во время загрузки схлопываются: снапшот один и тот же
+        if self._reload is None or self._reload.done():
+            self._reload = asyncio.get_running_loop().create_task(self._reload_snapshot(snapshot_dir))
+
+    async def _reload_snapshot(self, snapshot_dir: str):
+        try:
+            state = await asyncio.get_running_loop().run_in_executor(
+                None, self.manager.build_snapshot_state, snapshot_dir,
+            )
+        except Exception as e:
+            logger.error(f"Не удалось перезагрузить снапшот {snapshot_dir}: {e}")
+            return
+        self.manager.publish(state)
+
+    async def stop(self, timeout: float):
+        """
+        Прекращение приема: новые соединения не принимаются, текущие
+        дочитываются до закрытия диспетчером (не дольше timeout)
+        """
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        if self._connections:
+            done, pending = await asyncio.wait(set(self._connections), timeout=timeout)
+            for task in pending:
+                task.cancel()
+        if self._reload is not None:
+            await asyncio.wait([self._reload], timeout=timeout)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+# --- Диспетчер ---
+
+
+class WorkerProcess:
+    """Рабочий процесс с соединением диспетчера; перезапускается при аварийном завершении"""
+
+    def __init__(self, index: int, socket_path: str, env: Dict[str, str]):
+        self.index = index
+        self.socket_path = socket_path
+        self.env = env
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.ready = asyncio.Event()
+        # Кадры в сокет пишутся по одному, иначе они могут перемешаться
+        self.lock = asyncio.Lock()
+        # Апдейты, переданные процессу и еще не обработанные им: номер -> нагрузка кадра
+        self.unconfirmed: 'OrderedDict[int, bytes]' = OrderedDict()
+        self._sequence = 0
+        self._acks: Optional[asyncio.Task] = None
+        self.dispatched = 0
+        self.replayed = 0
+        self.restarts = 0
+
+    async def spawn(self, ready_timeout: float):
+        self.ready.clear()
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, *(f'-W{option}' for option in sys.warnoptions), '-m', 'bot.main', env=self.env,
+        )
+        await self.connect(ready_timeout)
+        logger.info(f"Рабочий процесс {self.index} запущен (pid {self.process.pid})")
+
+    async def connect(self, ready_timeout: float):
+        """
+        Соединение с сокетом процесса и повторная передача неподтвержденных апдейтов
+
+        Новые апдейты ждут блокировку, поэтому уходят после повторно переданных
+        """
+        async with self.lock:
+            deadline = time.monotonic() + ready_timeout
+            while True:
+                if self.process is not None and self.process.returncode is not None:
+                    raise RuntimeError(f"Рабочий процесс {self.index} завершился при запуске "
+                                       f"с кодом {self.process.returncode}")
+                try:
+                    reader, self.writer = await asyncio.open_unix_connection(self.socket_path)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"Рабочий процесс {self.index} не открыл сокет за {ready_timeout} с")
+                    await asyncio.sleep(0.1)
+            self._acks = asyncio.get_running_loop().create_task(self._read_acks(reader))
+            if self.unconfirmed:
+                logger.warning(f"Рабочему процессу {self.index} повторно передаются "
+                               f"неподтвержденные апдейты: {len(self.unconfirmed)}")
+                for payload in list(self.unconfirmed.values()):
+                    await write_frame(self.writer, FRAME_UPDATE, payload)
+                self.replayed += len(self.unconfirmed)
+        self.ready.set()
+
+    async def _read_acks(self, reader: asyncio.StreamReader):
+        while True:
+            frame = await read_frame(reader)
+            if frame is None:
+                return
+            kind, payload = frame
+            if kind == FRAME_ACK:
+                self.unconfirmed.pop(_SEQUENCE.unpack(payload)[0], None)
+
+    async def send(self, kind: int, payload: bytes):
+        async with self.lock:
+            if self.writer is None:
+                raise ConnectionError("соединение с процессом закрыто")
+            await write_frame(self.writer, kind, payload)
+
+    async def send_update(self, body: bytes):
+        """Передача апдейта; он хранится до подтверждения обработки процессом"""
+        async with self.lock:
+            if self.writer is None:
+                raise ConnectionError("соединение с процессом закрыто")
+            self._sequence += 1
+            sequence = self._sequence
+            payload = self.unconfirmed[sequence] = _SEQUENCE.pack(sequence) + body
+            try:
+                await write_frame(self.writer, FRAME_UPDATE, payload)
+            except (ConnectionError, OSError):
+                # Апдейт вернется от Telegram повторно (503), повторная передача не нужна
+                del self.unconfirmed[sequence]
+                raise
+
+    async def close(self):
+        """Закрытие соединения (процесс дочитывает принятые кадры)"""
+        self.ready.clear()
+        if self.writer is not None:
+            async with self.lock:
+                self.writer.close()
+                try:
+                    await self.writer.wait_closed()
+                except (ConnectionError, OSError):
+                    pass
+            self.writer = None
+        if self._acks is not None:
+            self._acks.cancel()
+            self._acks = None
+
+
+class WorkerSupervisor:
+    """
+    Запуск, наблюдение и остановка рабочих процессов, распределение апдейтов
+    """
+
+    def __init__(self, workers: int, runtime_dir: str, snapshot_dir: str, env: Optional[Dict[str, str]] = None,
+                 ready_timeout: float = 300, dispatch_timeout: float = 10, restart_delay: float = 1,
+                 max_unconfirmed: int = 1000):
+        """
+        Args:
+            workers: количество рабочих процессов
+            runtime_dir: каталог для Unix-сокетов
+            snapshot_dir: снапшот датасета, который загружают процессы
+            env: переменные окружения процессов (по умолчанию окружение диспетчера)
+            ready_timeout: время на запуск процесса в секундах
+            dispatch_timeout: сколько апдейт ждет перезапускаемый процесс, прежде чем
+                Telegram получит 503 и повторит доставку
+            restart_delay: пауза перед перезапуском упавшего процесса
+            max_unconfirmed: максимум апдейтов процесса без подтверждения обработки;
+                сверх него Telegram получает 503 и повторяет доставку позже
+        """
+        self.snapshot_dir = snapshot_dir
+        self.ready_timeout = ready_timeout
+        self.dispatch_timeout = dispatch_timeout
+        self.restart_delay = restart_delay
+        self.max_unconfirmed = max_unconfirmed
+        base_env = dict(env if env is not None else os.environ)
+        self.workers: List[WorkerProcess] = []
+        for index in range(workers):
+            socket_path = os.path.join(runtime_dir, f'worker-{index}.sock')
+            self.workers.append(WorkerProcess(index, socket_path, {
+                **base_env,
+                'WORKERS': '0',
+                'WORKER_INDEX': str(index),
+                'WORKER_SOCKET': socket_path,
+                'WORKER_SNAPSHOT_DIR': snapshot_dir,
+            }))
+        self._watchers: List[asyncio.Task] = []
+        self._stopping = False
+        self.rejected = 0
+
+    async def start(self):
+        """Запуск всех процессов; возвращается, когда каждый открыл сокет"""
+        await asyncio.gather(*(worker.spawn(self.ready_timeout) for worker in self.workers))
+        loop = asyncio.get_running_loop()
+        self._watchers = [loop.create_task(self._watch(worker)) for worker in self.workers]
+
+    async def _watch(self, worker: WorkerProcess):
+        while True:
+            code = await worker.process.wait()
+            if self._stopping:
+                return
+            logger.error(f"Рабочий процесс {worker.index} завершился с кодом {code}, перезапуск")
+            await worker.close()
+            await asyncio.sleep(self.restart_delay)
+            try:
+                await worker.spawn(self.ready_timeout)
+                worker.restarts += 1
+            except Exception as e:
+                logger.error(f"Не удалось перезапустить рабочий процесс {worker.index}: {e}")
+
+    async def dispatch(self, data: Dict[str, Any], body: bytes) -> bool:
+        """
+        Передача апдейта процессу его пользователя
+
+        Returns:
+            False, если процесс недоступен (апдейт нужно доставить повторно);
+            True - апдейт будет обработан, в том числе после перезапуска процесса
+        """
+        worker = self.workers[shard_for(data, len(self.workers))]
+        if not worker.ready.is_set():
+            try:
+                await asyncio.wait_for(worker.ready.wait(), self.dispatch_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+        if len(worker.unconfirmed) >= self.max_unconfirmed:
+            logger.warning(f"Рабочий процесс {worker.index} не подтвердил {len(worker.unconfirmed)} апдейтов")
+            self.rejected += 1
+            return False
+        try:
+            await worker.send_update(body)
+        except (ConnectionError, OSError) as e:
+            logger.warning(f"Апдейт не передан рабочему процессу {worker.index}: {e}")
+            self.rejected += 1
+            return False
+        worker.dispatched += 1
+        return True
+
+    async def broadcast_reload(self):
+        """Команда всем процессам перечитать снапшот датасета"""
+        payload = self.snapshot_dir.encode()
+        for worker in self.workers:
+            if worker.ready.is_set():
+                try:
+                    await worker.send(FRAME_RELOAD, payload)
+                except (ConnectionError, OSError) as e:
+                    logger.warning(f"Рабочий процесс {worker.index} не получил команду перезагрузки: {e}")
+
+    async def stop(self, timeout: float):
+        """
+        Плавная остановка: соединения закрываются после записи принятых апдейтов,
+        процессы получают SIGTERM и дорабатывают свои очереди (не дольше timeout)
+        """
+        self._stopping = True
+        for watcher in self._watchers:
+            watcher.cancel()
+        await asyncio.gather(*(worker.close() for worker in self.workers))
+
+        running = [worker.process for worker in self.workers
+                   if worker.process is not None and worker.process.returncode is None]
+        for process in running:
+            process.send_signal(signal.SIGTERM)
+        if running:
+            done, pending = await asyncio.wait([asyncio.ensure_future(p.wait()) for p in running], timeout=timeout)
+            if pending:
+                logger.warning(f"Рабочих процессов не завершилось за {timeout} с: {len(pending)}, принудительная остановка")
+                for process in running:
+                    if process.returncode is None:
+                        process.kill()
+                        await process.wait()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'dispatched': [worker.dispatched for worker in self.workers],
+            'unconfirmed': [len(worker.unconfirmed) for worker in self.workers],
+            'replayed': sum(worker.replayed for worker in self.workers),
+            'restarts': sum(worker.restarts for worker in self.workers),
+            'rejected': self.rejected,
+        }
+
+
+class _WebhookHandler(RequestHandler):
+    SUPPORTED_METHODS = ('POST',)
+
+    def initialize(self, supervisor: WorkerSupervisor, secret_token: str):
+        self.supervisor = supervisor
+        self.secret_token = secret_token
+
+    async def post(self):
+        if self.secret_token and self.request.headers.get('X-Telegram-Bot-Api-Secret-Token') != self.secret_token:
+            self.set_status(403)
+            return
+        try:
+            data = json.loads(self.request.body)
+        except ValueError:
+            self.set_status(400)
+            return
+        if not isinstance(data, dict):
+            self.set_status(400)
+            return
+        delivered = await self.supervisor.dispatch(data, self.request.body)
+        self.set_status(200 if delivered else 503)
+
+    def log_exception(self, typ, value, tb):
+        logger.error(f"Ошибка при приеме апдейта: {value}")
+
+
+def create_webhook_server(supervisor: WorkerSupervisor, url_path: str, secret_token: str = '') -> HTTPServer:
+    """HTTP-сервер диспетчера: принимает апдейты по url_path и передает их процессам"""
+    application = WebApplication(
+        [(rf"/{url_path.strip('/')}/?", _WebhookHandler, {'supervisor': supervisor, 'secret_token': secret_token})],
+        log_function=lambda handler: None,
+    )
+    return HTTPServer(application, xheaders=True)
@@ -8,25 +8,150 @@ load_dotenv()
 @dataclass
 class Settings:
     """Класс для хранения настроек бота"""
-    
+
     # Токен бота Telegram
     BOT_TOKEN: str = os.getenv("BOT_TOKEN", "")
-    
+
     # Настройки логирования
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
-    
+
     # Название бота (для логов)
     BOT_NAME: str = "Smart Support Bot"
-    
+
+    # Режим получения апдейтов: 'polling' или 'webhook'
+    BOT_MODE: str = os.getenv("BOT_MODE", "polling")
+    # Webhook: публичный URL, по которому Telegram отправляет апдейты, и адрес локального сервера
+    WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", "")
+    WEBHOOK_LISTEN: str = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+    WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8443"))
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "telegram")
+    WEBHOOK_SECRET_TOKEN: str = os.getenv("WEBHOOK_SECRET_TOKEN", "")
+    # Максимум одновременных HTTPS-соединений Telegram к webhook (1-100)
+    WEBHOOK_MAX_CONNECTIONS: int = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "100"))
+    # Адрес Bot API (для локальных тестов - фейковый сервер)
+    TELEGRAM_API_BASE_URL: str = os.getenv("TELEGRAM_API_BASE_URL", "https://api.telegram.org/bot")
+
+    # Пул HTTP-соединений к Bot API: размер и таймауты (секунды); pool_timeout - ожидание
+    # свободного соединения при всплеске исходящих вызовов
+    TELEGRAM_POOL_SIZE: int = int(os.getenv("TELEGRAM_POOL_SIZE", "64"))
+    TELEGRAM_POOL_TIMEOUT: float = float(os.getenv("TELEGRAM_POOL_TIMEOUT", "10"))
+    TELEGRAM_CONNECT_TIMEOUT: float = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", "5"))
+    TELEGRAM_READ_TIMEOUT: float = float(os.getenv("TELEGRAM_READ_TIMEOUT", "10"))
+    TELEGRAM_WRITE_TIMEOUT: float = float(os.getenv("TELEGRAM_WRITE_TIMEOUT", "10"))
+    TELEGRAM_HTTP_VERSION: str = os.getenv("TELEGRAM_HTTP_VERSION", "1.1")
+    # Лимиты исходящих сообщений (RATE_LIMIT_OVERALL=0 - без ограничения): сообщений в секунду
+    # на бота, в секунду в личный чат с допустимой серией подряд, в минуту в группу
+    RATE_LIMIT_OVERALL: float = float(os.getenv("RATE_LIMIT_OVERALL", "30"))
+    RATE_LIMIT_CHAT: float = float(os.getenv("RATE_LIMIT_CHAT", "1"))
+    RATE_LIMIT_CHAT_BURST: int = int(os.getenv("RATE_LIMIT_CHAT_BURST", "3"))
+    RATE_LIMIT_GROUP_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_GROUP_PER_MINUTE", "20"))
+    RATE_LIMIT_MAX_RETRIES: int = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "3"))
+    # Через сколько секунд без результатов отправляется сообщение "Обрабатываю запрос..."
+    PLACEHOLDER_DELAY: float = float(os.getenv("PLACEHOLDER_DELAY", "0.5"))
+
+    # Количество апдейтов, обрабатываемых параллельно (1 - последовательно);
+    # апдейты одного диалога всегда обрабатываются по порядку
+    CONCURRENT_UPDATES: int = int(os.getenv("CONCURRENT_UPDATES", "64"))
+    # Время на завершение апдейтов в обработке при остановке бота (секунды)
+    SHUTDOWN_DRAIN_TIMEOUT: float = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "30"))
+
+    # Многопроцессный режим (только webhook): количество рабочих процессов, между которыми
+    # диспетчер распределяет апдейты по id пользователя (0 или 1 - один процесс)
+    WORKERS: int = int(os.getenv("WORKERS", "0"))
+    # Заполняются диспетчером для рабочих процессов: номер, Unix-сокет и снапшот датасета
+    WORKER_INDEX: int = int(os.getenv("WORKER_INDEX", "0"))
+    WORKER_SOCKET: str = os.getenv("WORKER_SOCKET", "")
+    WORKER_SNAPSHOT_DIR: str = os.getenv("WORKER_SNAPSHOT_DIR", "")
+
     # Настройки датасета
     DATA_SOURCE: str = os.getenv("DATA_SOURCE", "local")  # 'local' или 'google_sheets'
     GOOGLE_SHEET_ID: str = os.getenv("GOOGLE_SHEET_ID", "")
     GOOGLE_SHEET_NAME: str = os.getenv("GOOGLE_SHEET_NAME", "measures_sheet")
     LOCAL_DATASET_PATH: str = os.getenv("LOCAL_DATASET_PATH", "data/sample_dataset.xlsx")
-    
+
+    # Семантический поиск: 'hashing' (локальный энкодер) или имя модели sentence-transformers
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "hashing")
+    # Backend индекса эмбеддингов: 'auto' (точный numpy), 'numpy', 'faiss_ivf' или 'faiss_hnsw'
+    # (FAISS - приближенный поиск, включается только явно)
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "auto")
+
+    # Каталог снапшотов датасета и индексов (пустая строка - снапшоты отключены)
+    INDEX_SNAPSHOT_DIR: str = os.getenv("INDEX_SNAPSHOT_DIR", "data/.index_snapshot")
+
+    # Фоновое обновление датасета: проверка изменения файла и безусловная перезагрузка (секунды, 0 - отключено)
+    DATASET_WATCH_INTERVAL: float = float(os.getenv("DATASET_WATCH_INTERVAL", "30"))
+    DATASET_REFRESH_INTERVAL: float = float(os.getenv("DATASET_REFRESH_INTERVAL", "0"))
+
+    # Потоковая загрузка локального файла частями по N строк (0 - файл читается целиком)
+    DATASET_CHUNK_SIZE: int = int(os.getenv("DATASET_CHUNK_SIZE", "0"))
+
+    # Загрузка датасета в фоне после запуска приема апдейтов: поиск ждет загрузки
+    # не дольше DATASET_LOAD_WAIT секунд (false - загрузка до запуска бота)
+    DATASET_BACKGROUND_LOAD: bool = os.getenv("DATASET_BACKGROUND_LOAD", "true").lower() in ("1", "true", "yes")
+    DATASET_LOAD_WAIT: float = float(os.getenv("DATASET_LOAD_WAIT", "30"))
+
+    # Компактное хранение датасета: коды категорий и упакованный текст вместо object-колонок
+    DATASET_COMPACT_STORAGE: bool = os.getenv("DATASET_COMPACT_STORAGE", "true").lower() in ("1", "true", "yes")
+
+    # Граф похожих мер: соседей на меру (0 - отключен) и потоки построения (0 - по числу ядер)
+    SIMILAR_MEASURES_K: int = int(os.getenv("SIMILAR_MEASURES_K", "8"))
+    SIMILAR_BUILD_THREADS: int = int(os.getenv("SIMILAR_BUILD_THREADS", "0"))
+
+    # Кэш результатов поиска: количество записей (0 - отключен), объем в МБ и время жизни в секундах
+    QUERY_CACHE_SIZE: int = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+    QUERY_CACHE_MAX_MB: float = float(os.getenv("QUERY_CACHE_MAX_MB", "16"))
+    QUERY_CACHE_TTL: float = float(os.getenv("QUERY_CACHE_TTL", "600"))
+
+    # Поиск вне event loop: потоки для запросов (0 - по числу ядер, до 4)
+    SEARCH_THREADS: int = int(os.getenv("SEARCH_THREADS", "0"))
+    # Таймаут одного поиска и ожидание места в насыщенном пуле (секунды)
+    SEARCH_TIMEOUT: float = float(os.getenv("SEARCH_TIMEOUT", "5"))
+    SEARCH_QUEUE_TIMEOUT: float = float(os.getenv("SEARCH_QUEUE_TIMEOUT", "1"))
+    # Максимум задач поиска в работе
+    SEARCH_MAX_PENDING: int = int(os.getenv("SEARCH_MAX_PENDING", "64"))
+
+    # Измерение задержки event loop: период (секунды) и порог предупреждения (мс, 0 - без предупреждений)
+    LOOP_LAG_INTERVAL: float = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+    LOOP_LAG_WARN_MS: float = float(os.getenv("LOOP_LAG_WARN_MS", "100"))
+
+    # Сохранение диалогов между перезапусками: файл SQLite (пустая строка - отключено)
+    # и период пакетной записи изменений в секундах
+    PERSISTENCE_PATH: str = os.getenv("PERSISTENCE_PATH", "data/.persistence.sqlite3")
+    PERSISTENCE_UPDATE_INTERVAL: float = float(os.getenv("PERSISTENCE_UPDATE_INTERVAL", "5"))
+
+    # Аналитика запросов и диалогов: файл SQLite (пустая строка - отключена), размер очереди,
+    # размер пачки, максимальная задержка записи (секунды) и политика переполнения ('drop' или 'block')
+    ANALYTICS_DB_PATH: str = os.getenv("ANALYTICS_DB_PATH", "data/.analytics.sqlite3")
+    ANALYTICS_QUEUE_SIZE: int = int(os.getenv("ANALYTICS_QUEUE_SIZE", "10000"))
+    ANALYTICS_BATCH_SIZE: int = int(os.getenv("ANALYTICS_BATCH_SIZE", "500"))
+    ANALYTICS_FLUSH_INTERVAL: float = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "2"))
+    ANALYTICS_OVERFLOW: str = os.getenv("ANALYTICS_OVERFLOW", "drop")
+
+    # Эндпоинт метрик Prometheus и профилировщика (0 - отключен); рабочие процессы
+    # слушают METRICS_PORT + 1 + номер процесса
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "9464"))
+    METRICS_LISTEN: str = os.getenv("METRICS_LISTEN", "127.0.0.1")
+    # Период выборки профилировщика (секунды) и запуск выборки при старте
+    PROFILER_INTERVAL: float = float(os.getenv("PROFILER_INTERVAL", "0.005"))
+    PROFILER_ENABLED: bool = os.getenv("PROFILER_ENABLED", "false").lower() in ("1", "true", "yes")
+    # Отчет о запуске: время каждого импортируемого модуля (как python -X importtime)
+    # и файл, в который записывается отчет (пустая строка - не записывать)
+    STARTUP_IMPORT_PROFILE: bool = os.getenv("STARTUP_IMPORT_PROFILE", "false").lower() in ("1", "true", "yes")
+    STARTUP_REPORT_PATH: str = os.getenv("STARTUP_REPORT_PATH", "")
+
     # Путь к credentials для Google Sheets
     GOOGLE_CREDENTIALS_FILE: str = os.getenv("GOOGLE_CREDENTIALS_FILE", "credentials.json")
-    
+    # Ключ API для публичных таблиц (если нет credentials)
+    GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
+    # Кэш последней загруженной таблицы (пустая строка - отключен), таймаут запроса (секунды)
+    # и строк в одном диапазоне batchGet
+    GOOGLE_SHEETS_CACHE_DIR: str = os.getenv("GOOGLE_SHEETS_CACHE_DIR", "data/.sheets_cache")
+    GOOGLE_SHEETS_TIMEOUT: float = float(os.getenv("GOOGLE_SHEETS_TIMEOUT", "10"))
+    GOOGLE_SHEETS_BATCH_ROWS: int = int(os.getenv("GOOGLE_SHEETS_BATCH_ROWS", "5000"))
+    # Базовые URL API (переопределяются для локального фейкового сервера)
+    GOOGLE_SHEETS_API_URL: str = os.getenv("GOOGLE_SHEETS_API_URL", "https://sheets.googleapis.com/v4")
+    GOOGLE_DRIVE_API_URL: str = os.getenv("GOOGLE_DRIVE_API_URL", "https://www.googleapis.com/drive/v3")
+
     @property
     def is_valid(self) -> bool:
         """Проверка, что все обязательные настройки заполнены"""
@@ -1,8 +1,20 @@
 """
 Модуль для управления диалогами (ConversationHandler)
+
+Имена загружаются при первом обращении (см. data/__init__.py)
 """
 
-from .states import ConversationState
-from .handlers import setup_conversation_handler
+import importlib
+
+_EXPORTS = {
+    'ConversationState': '.states',
+    'setup_conversation_handler': '.handlers',
+}
 
 __all__ = ['ConversationState', 'setup_conversation_handler']
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
@@ -0,0 +1,101 @@
+"""
+Компактная кодировка callback_data кнопок результатов
+
+Telegram ограничивает callback_data 64 байтами, поэтому кнопки несут
+короткий префикс и id меры в base36 (строковые id - как есть, с
+апострофом; не помещающиеся - хешем через '#'). Мера по id находится
+через индекс id датасета, а не поиском в сохраненных результатах:
+    s:<id>   - выбор меры из результатов поиска
+    r:<id>   - выбор похожей меры из карточки
+    p:<n>    - страница результатов поиска
+"""
+
+from typing import Any, Optional
+
+from data.dataset_delta import IdDigest, id_digest, normalize_id
+
+CALLBACK_DATA_LIMIT = 64
+
+SELECT_PREFIX = 's:'
+SIMILAR_PREFIX = 'r:'
+PAGE_PREFIX = 'p:'
+# Кнопки сообщений, отправленных до перехода на компактную кодировку
+_LEGACY_SELECT_PREFIX = 'select_result_'
+
+_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def _base36(value: int) -> str:
+    if value < 0:
+        return '-' + _base36(-value)
+    digits = []
+    while True:
+        value, digit = divmod(value, 36)
+        digits.append(_DIGITS[digit])
+        if not value:
+            return ''.join(reversed(digits))
+
+
+def encode_id(measure_id: Any) -> str:
+    """
+    Id меры для callback_data: целые (и 169.0) - base36, остальные - строкой с апострофом,
+    длинные строки - хешем с '#' (мера находится по IdDigest в индексе id)
+    """
+    measure_id = normalize_id(measure_id)
+    if isinstance(measure_id, int) and not isinstance(measure_id, bool):
+        return _base36(measure_id)
+    digest = id_digest(measure_id)
+    if digest is not None:
+        return f"#{digest.value}"
+    return f"'{measure_id}"
+
+
+def decode_id(token: str) -> Any:
+    """
+    Обратное преобразование encode_id
+
+    Raises:
+        ValueError: токен не является закодированным id
+    """
+    if token.startswith("'"):
+        return token[1:]
+    if token.startswith('#'):
+        return IdDigest(token[1:])
+    return int(token, 36)
+
+
+def select_data(measure_id: Any, similar: bool = False) -> str:
+    """callback_data кнопки выбора меры (similar - похожая мера из карточки), не длиннее CALLBACK_DATA_LIMIT"""
+    return (SIMILAR_PREFIX if similar else SELECT_PREFIX) + encode_id(measure_id)
+
+
+def page_data(page: int) -> str:
+    """callback_data кнопки страницы результатов"""
+    return PAGE_PREFIX + str(page)
+
+
+def parse_select(data: str) -> Optional[Any]:
+    """
+    Id меры из callback_data кнопки выбора
+
+    Returns:
+        id меры (IdDigest для длинного id) или None, если это не кнопка выбора
+    """
+    try:
+        if data.startswith((SELECT_PREFIX, SIMILAR_PREFIX)):
+            return decode_id(data[len(SELECT_PREFIX):])
+        if data.startswith(_LEGACY_SELECT_PREFIX):
+            return int(data[len(_LEGACY_SELECT_PREFIX):])
+    except ValueError:
+        pass
+    return None
+
+
+def parse_page(data: str) -> Optional[int]:
+    """Номер страницы из callback_data (None - не кнопка страницы)"""
+    if not data.startswith(PAGE_PREFIX):
+        return None
+    try:
+        return int(data[len(PAGE_PREFIX):])
+    except ValueError:
+        return None
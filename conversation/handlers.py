@@ -1,236 +1,474 @@
+import functools
 import logging
+import time
+from datetime import date
+from typing import Awaitable, Callable, Optional, Tuple
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import (
-    ConversationHandler, 
-    CommandHandler, 
-    MessageHandler, 
-    filters, 
-    CallbackContext, 
-    CallbackQueryHandler
+    ConversationHandler,
+    CommandHandler,
+    MessageHandler,
+    filters,
+    CallbackContext,
+    CallbackQueryHandler,
+    ContextTypes,
 )
 
-from bot.conversation.states import ConversationState
+from conversation.states import ConversationState
+from data.answer_cards import INTENT_FIELDS, route_question
 from data.dataset_manager import dataset_manager
+from data.facets import CATEGORY_FACET, FacetFilter
+from data.search_executor import SearchOverloaded, SearchTimeout, search_executor
+from conversation.callbacks import SIMILAR_PREFIX, parse_page, parse_select
+from conversation.rendering import ACTIVE_STATUS, QUICK_AMOUNT_LIMIT, RESULTS_PAGE_SIZE, message_renderer
+from bot.analytics import analytics, new_id
+from bot.outbound import DeferredReply, reply_coalescer
+from data.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+# Длина ранжированного списка результатов поиска (показывается по RESULTS_PAGE_SIZE на странице)
+SEARCH_MAX_RESULTS = 50
+
+# Имя ConversationHandler (ключ состояний в persistence)
+CONVERSATION_NAME = "support_search"
+
+BUSY_TEXT = "⚠️ Сейчас много запросов, поиск не успел выполниться. Повторите запрос через несколько секунд."
+ERROR_TEXT = "⚠️ Не удалось выполнить поиск. Повторите запрос или начните заново командой /start."
+
+HANDLER_SECONDS = metrics.histogram('handler_seconds', 'Время обработчиков диалога', ('handler',))
+TRANSITIONS = metrics.counter(
+    'conversation_transitions_total', 'Переходы между состояниями диалога', ('from_state', 'to_state')
+)
+CONSULT_QUESTIONS = metrics.counter('consult_questions_total', 'Уточняющие вопросы по мерам по разделу карточки', ('intent',))
+SIMILAR_SELECTIONS = metrics.counter('similar_measure_selections_total', 'Переходы к похожей мере из карточки')
+
+
+def state_name(value: Optional[int]) -> str:
+    """Имя состояния по значению, которое вернул обработчик"""
+    if value is None:
+        return 'SAME'
+    if value == ConversationHandler.END:
+        return 'END'
+    return ConversationState(value).name
+
+
+def instrumented(callback: Callable[..., Awaitable[Optional[int]]], from_state: str) -> Callable:
+    """
+    Обработчик с метриками: время выполнения и переход from_state -> возвращенное состояние
+
+    Args:
+        callback: обработчик ConversationHandler
+        from_state: состояние, в котором зарегистрирован обработчик
+            ('NEW' - точка входа, 'ANY' - fallback)
+    """
+    timer = HANDLER_SECONDS.labels(callback.__name__)
+
+    @functools.wraps(callback)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[int]:
+        started = time.perf_counter()
+        try:
+            new_state = await callback(update, context)
+        finally:
+            timer.observe(time.perf_counter() - started)
+        TRANSITIONS.labels(from_state, state_name(new_state)).inc()
+        return new_state
+
+    return wrapper
+
+
+async def track_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE, state: str, **fields) -> None:
+    """Смена состояния диалога в аналитике (только постановка события в очередь)"""
+    conversation_id = context.user_data.get('conversation_id')
+    if conversation_id:
+        await analytics.record_conversation(conversation_id, update.effective_user.id, state, **fields)
+
+
+async def find_measures(user_query: str, filters: Optional[FacetFilter] = None) -> Optional[list]:
+    """
+    Поиск в пуле потоков, чтобы не блокировать другие диалоги
+
+    Returns:
+        ранжированные пары (id меры, оценка) или None, если пул перегружен или поиск не уложился в таймаут
+    """
+    try:
+        return await search_executor.search_ids(user_query, top_k=SEARCH_MAX_RESULTS, filters=filters)
+    except (SearchOverloaded, SearchTimeout) as e:
+        logger.warning(f"Поиск не выполнен: {e}")
+        return None
+
+
+def store_results(context: ContextTypes.DEFAULT_TYPE, ranked: list) -> list:
+    """
+    Сохранение ранжированного списка id и переход на первую страницу
+
+    Returns:
+        результаты первой страницы
+    """
+    context.user_data['result_ids'] = ranked
+    context.user_data['results_page'] = 0
+    return page_results(context)[0]
+
+
+def page_results(context: ContextTypes.DEFAULT_TYPE) -> Tuple[list, int, int]:
+    """
+    Результаты текущей страницы: восстанавливаются по срезу сохраненных id
+
+    Returns:
+        (результаты страницы, смещение страницы, всего результатов)
+    """
+    ranked = context.user_data.get('result_ids') or []
+    pages = max(1, -(-len(ranked) // RESULTS_PAGE_SIZE))
+    page = min(max(context.user_data.get('results_page', 0), 0), pages - 1)
+    offset = page * RESULTS_PAGE_SIZE
+    results = dataset_manager.results_by_ids([tuple(item) for item in ranked[offset : offset + RESULTS_PAGE_SIZE]])
+    return results, offset, len(ranked)
+
+
+def render_results_page(context: ContextTypes.DEFAULT_TYPE) -> Tuple[str, InlineKeyboardMarkup]:
+    """Текст и клавиатура текущей страницы результатов"""
+    results, offset, total = page_results(context)
+    return message_renderer.search_results(
+        context.user_data.get('user_query', ''), results, get_search_filters(context), offset, total
+    )
+
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
     Обработчик команды /start - начало диалога
-    
+
     Returns:
         ConversationState.START - переход в состояние ожидания запроса
     """
-    user = update.effective_user
-    
-    # Проверяем загружен ли датасет
-    dataset_info = dataset_manager.get_dataset_info()
-    dataset_status = "✅" if dataset_info.get('status') == 'loaded' else "⚠️"
-    
-    welcome_text = (
-        f"👋 Привет, {user.first_name}!\n\n"
-        f"Я — ваш умный помощник по мерам государственной поддержки бизнеса.\n"
-        f"{dataset_status} База мер поддержки: {dataset_info.get('rows', 0)} записей\n\n"
-        "🔍 **Как я могу помочь?**\n"
-        "Просто опишите свою ситуацию, и я найду подходящие меры поддержки.\n\n"
-        "📝 **Примеры запросов:**\n"
-        "• \"Хочу открыть кафе, какие есть программы?\"\n"
-        "• \"Ищу поддержку для сельского хозяйства\"\n"
-        "• \"Какие есть гранты для ИП?\"\n\n"
-        "⬇️ *Опишите ваш запрос ниже...*"
-    )
-    
-    await update.message.reply_text(
-        welcome_text,
-        parse_mode="Markdown",
-        reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("❓ Примеры запросов", callback_data="show_examples")],
-            [InlineKeyboardButton("📊 Статистика базы", callback_data="show_stats")]
-        ])
-    )
-    
+    # Общая часть приветствия готовится один раз на версию датасета
+    welcome_text, reply_markup = message_renderer.welcome(update.effective_user.first_name)
+
+    await update.message.reply_text(welcome_text, parse_mode="Markdown", reply_markup=reply_markup)
+
     # Очищаем данные предыдущего диалога
     context.user_data.clear()
-    
+
+    context.user_data['conversation_id'] = new_id()
+    await analytics.record_user(update.effective_user)
+    await track_conversation(update, context, ConversationState.START.name)
+
     return ConversationState.START.value
 
 
 async def handle_user_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
     Обработка запроса пользователя в состоянии START
-    
+
     Returns:
         ConversationState.SEARCH - переход к поиску и отображению результатов
     """
     user_query = update.message.text.strip()
     user = update.effective_user
-    
+
     if not user_query:
         await update.message.reply_text(
             "Пожалуйста, опишите ваш запрос. Например: \"Какие есть программы поддержки малого бизнеса?\""
         )
         return ConversationState.START.value
-    
-    logger.info(f"Пользователь {user.id} ({user.username}): '{user_query}'")
-    
+
+    # Ленивое форматирование: строка не собирается, если уровень INFO отключен
+    logger.info("Пользователь %s (%s): '%s'", user.id, user.username, user_query)
+
     # Сохраняем запрос в контексте
     context.user_data['user_query'] = user_query
     context.user_data['query_timestamp'] = update.message.date
-    
-    # Имитируем поиск (заглушка для следующей задачи)
-    # В задаче 2.3 здесь будет реальный поиск
-    mock_results = [
-        {"id": 1, "title": "Грант для начинающих предпринимателей", "match_score": 0.95},
-        {"id": 2, "title": "Субсидия на открытие бизнеса", "match_score": 0.87},
-        {"id": 3, "title": "Льготный кредит для малого бизнеса", "match_score": 0.78}
-    ]
-    
-    context.user_data['search_results'] = mock_results
-    
-    # Отправляем сообщение о начале поиска
-    search_message = await update.message.reply_text(
+
+    # Сообщение о начале поиска отправляется, только если поиск не уложился в задержку
+    # заглушки; иначе результаты придут одним сообщением вместо отправки и редактирования
+    placeholder = reply_coalescer.defer(
+        update.message,
         f"🔍 Ищу подходящие меры поддержки по запросу:\n\"{user_query[:100]}{'...' if len(user_query) > 100 else ''}\"\n\n"
         "⏳ *Обрабатываю запрос...*",
-        parse_mode="Markdown"
+        parse_mode="Markdown",
     )
-    
-    # Сохраняем ID сообщения для возможного редактирования
-    context.user_data['search_message_id'] = search_message.message_id
-    
-    # Имитация обработки (задержка для реалистичности)
-    import asyncio
-    await asyncio.sleep(1)
-    
-    # Переходим к отображению результатов
-    return await show_search_results(update, context)
 
+    try:
+        # Поиск по инвертированному индексу датасета; новый запрос сбрасывает фильтры
+        context.user_data.pop('search_filters', None)
+        context.user_data.pop('search_message_id', None)
+        ranked = await find_measures(user_query)
+        if ranked is None:
+            await placeholder.resolve(BUSY_TEXT)
+            return ConversationState.START.value
+
+        # Хранится только ранжированный список id; страницы восстанавливаются по нему
+        first_page = store_results(context, ranked)
+
+        query_id = await analytics.record_query(
+            user.id,
+            user_query,
+            first_page,
+            conversation_id=context.user_data.get('conversation_id'),
+            metadata={'total': len(ranked)},
+        )
+        await track_conversation(update, context, ConversationState.SEARCH.name, query_id=query_id)
+
+        # Переходим к отображению результатов
+        return await show_search_results(update, context, placeholder)
+    finally:
+        # Поиск или отрисовка завершились ошибкой - заглушка не должна остаться без ответа
+        await placeholder.fail(ERROR_TEXT)
+
+
+def get_search_filters(context: ContextTypes.DEFAULT_TYPE) -> FacetFilter:
+    """Текущий фасетный фильтр пользователя"""
+    return FacetFilter.from_dict(context.user_data.get('search_filters'))
 
-async def show_search_results(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+
+async def show_search_results(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, placeholder: Optional[DeferredReply] = None
+) -> int:
     """
     Отображение результатов поиска
-    
+
+    Args:
+        placeholder: заглушка "Обрабатываю запрос...", которую заменяют результаты
+
     Returns:
         ConversationState.SEARCH - остаемся в состоянии отображения результатов
     """
-    user_query = context.user_data.get('user_query', '')
-    search_results = context.user_data.get('search_results', [])
-    
-    if not search_results:
-        await update.message.reply_text(
+    if not context.user_data.get('result_ids'):
+        text = (
             "😕 По вашему запросу не найдено подходящих мер поддержки.\n\n"
             "Попробуйте изменить формулировку или уточнить запрос.\n"
             "Например: \"поддержка для сельского хозяйства\" или \"гранты для ИП\""
         )
+        if placeholder is not None:
+            await placeholder.resolve(text)
+        else:
+            await update.message.reply_text(text)
         return ConversationState.START.value
-    
-    # Формируем сообщение с результатами
-    results_text = f"✅ Нашёл {len(search_results)} подходящих мер по запросу:\n\"{user_query[:80]}{'...' if len(user_query) > 80 else ''}\"\n\n"
-    
-    for i, result in enumerate(search_results, 1):
-        results_text += f"{i}. **{result['title']}**\n"
-        if 'description' in result:
-            results_text += f"   {result['description'][:100]}...\n"
-        results_text += f"   📊 Совпадение: {result.get('match_score', 0)*100:.0f}%\n\n"
-    
-    results_text += "👇 *Выберите наиболее подходящий вариант:*"
-    
-    # Создаем инлайн-кнопки для выбора результата
-    keyboard = []
-    for i, result in enumerate(search_results, 1):
-        keyboard.append([
-            InlineKeyboardButton(
-                f"{i}. {result['title'][:30]}{'...' if len(result['title']) > 30 else ''}",
-                callback_data=f"select_result_{result['id']}"
-            )
-        ])
-    
-    keyboard.append([
-        InlineKeyboardButton("🔄 Новый поиск", callback_data="new_search"),
-        InlineKeyboardButton("❌ Отмена", callback_data="cancel_search")
-    ])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    # Отправляем или обновляем сообщение с результатами
-    if 'search_message_id' in context.user_data:
-        try:
-            await context.bot.edit_message_text(
-                chat_id=update.effective_chat.id,
-                message_id=context.user_data['search_message_id'],
-                text=results_text,
-                parse_mode="Markdown",
-                reply_markup=reply_markup
-            )
-        except Exception as e:
-            logger.warning(f"Не удалось обновить сообщение: {e}")
-            await update.message.reply_text(results_text, parse_mode="Markdown", reply_markup=reply_markup)
+
+    results_text, reply_markup = render_results_page(context)
+
+    # Отправляем результаты вместо заглушки (или редактируем уже отправленную заглушку)
+    if placeholder is not None:
+        message = await placeholder.resolve(results_text, parse_mode="Markdown", reply_markup=reply_markup)
     else:
-        await update.message.reply_text(results_text, parse_mode="Markdown", reply_markup=reply_markup)
-    
+        message = await update.message.reply_text(results_text, parse_mode="Markdown", reply_markup=reply_markup)
+
+    # Сохраняем ID сообщения для возможного редактирования
+    context.user_data['search_message_id'] = message.message_id
+
+    return ConversationState.SEARCH.value
+
+
+async def handle_facet_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """
+    Обработка кнопок фасетных фильтров: переключение фильтра и повторный поиск
+
+    Returns:
+        ConversationState.SEARCH - остаемся в состоянии отображения результатов
+    """
+    query = update.callback_query
+    await query.answer()
+
+    callback_data = query.data
+    filters = get_search_filters(context)
+
+    if callback_data == "facet_menu_cat":
+        # Меню категорий со счетчиками с учетом остальных фильтров
+        without_category = FacetFilter.from_dict({**filters.as_dict(), 'categories': []})
+        counts = dataset_manager.facet_counts(without_category).get(CATEGORY_FACET, {})
+        keyboard = [
+            [
+                InlineKeyboardButton(
+                    f"{'✅ ' if value in filters.categories else ''}{value} ({counts.get(value, 0)})",
+                    callback_data=f"facet_cat_{code}",
+                )
+            ]
+            for code, value in enumerate(dataset_manager.facet_values(CATEGORY_FACET))
+        ]
+        keyboard.append([InlineKeyboardButton("⬅️ Назад к результатам", callback_data="facet_back")])
+        await query.edit_message_reply_markup(reply_markup=InlineKeyboardMarkup(keyboard))
+        return ConversationState.SEARCH.value
+
+    if callback_data.startswith("facet_cat_"):
+        values = dataset_manager.facet_values(CATEGORY_FACET)
+        code = int(callback_data.rsplit("_", 1)[1])
+        if code < len(values):
+            value = values[code]
+            categories = tuple(c for c in filters.categories if c != value)
+            if value not in filters.categories:
+                categories += (value,)
+            filters = FacetFilter.from_dict({**filters.as_dict(), 'categories': list(categories)})
+    elif callback_data == "facet_active":
+        statuses = [] if filters.statuses else [ACTIVE_STATUS]
+        filters = FacetFilter.from_dict({**filters.as_dict(), 'statuses': statuses})
+    elif callback_data == "facet_amount":
+        max_amount = None if filters.max_amount is not None else QUICK_AMOUNT_LIMIT
+        filters = FacetFilter.from_dict({**filters.as_dict(), 'max_amount': max_amount})
+    elif callback_data == "facet_deadline":
+        deadline_after = None if filters.deadline_after else date.today().isoformat()
+        filters = FacetFilter.from_dict({**filters.as_dict(), 'deadline_after': deadline_after})
+    elif callback_data == "facet_reset":
+        filters = FacetFilter()
+
+    context.user_data['search_filters'] = filters.as_dict()
+
+    # Повторный поиск с фильтром: маска применяется к оценкам до отбора top-k
+    user_query = context.user_data.get('user_query', '')
+    ranked = await find_measures(user_query, filters)
+    if ranked is None:
+        await query.message.reply_text(BUSY_TEXT)
+        return ConversationState.SEARCH.value
+    first_page = store_results(context, ranked)
+    await analytics.record_query(
+        update.effective_user.id,
+        user_query,
+        first_page,
+        conversation_id=context.user_data.get('conversation_id'),
+        metadata={'source': 'facet', 'filters': filters.as_dict(), 'total': len(ranked)},
+    )
+
+    results_text, reply_markup = render_results_page(context)
+    try:
+        await query.edit_message_text(results_text, parse_mode="Markdown", reply_markup=reply_markup)
+    except Exception as e:
+        logger.warning(f"Не удалось обновить сообщение: {e}")
+
+    return ConversationState.SEARCH.value
+
+
+async def handle_results_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """
+    Переход на другую страницу результатов: страница собирается из среза сохраненных id
+
+    Returns:
+        ConversationState.SEARCH - остаемся в состоянии отображения результатов
+    """
+    query = update.callback_query
+    await query.answer()
+
+    page = parse_page(query.data)
+    if page is None or not context.user_data.get('result_ids'):
+        return ConversationState.SEARCH.value
+    context.user_data['results_page'] = page
+
+    results_text, reply_markup = render_results_page(context)
+    try:
+        await query.edit_message_text(results_text, parse_mode="Markdown", reply_markup=reply_markup)
+    except Exception as e:
+        logger.warning(f"Не удалось обновить сообщение: {e}")
     return ConversationState.SEARCH.value
 
 
 async def handle_result_selection(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
     Обработка выбора результата пользователем
-    
+
     Returns:
-        ConversationState.CONSULT - переход к детальной консультации
+        ConversationState.CONSULT - переход к консультации по выбранной мере
     """
     query = update.callback_query
     await query.answer()
-    
+
     callback_data = query.data
-    
-    if callback_data.startswith("select_result_"):
-        result_id = int(callback_data.split("_")[2])
-        
-        # Находим выбранный результат
-        search_results = context.user_data.get('search_results', [])
-        selected_result = next((r for r in search_results if r['id'] == result_id), None)
-        
-        if selected_result:
-            context.user_data['selected_result'] = selected_result
-            
-            # Заглушка для детальной информации (будет в задаче 3.1)
-            await query.edit_message_text(
-                f"✅ Вы выбрали: **{selected_result['title']}**\n\n"
-                f"📋 *Подготовка детальной информации...*\n\n"
-                f"💡 Вы можете задавать вопросы по этой мере поддержки.\n"
-                f"Например: \"Какие документы нужны?\" или \"Какой размер поддержки?\"\n\n"
-                "⬇️ *Задайте ваш вопрос ниже...*",
-                parse_mode="Markdown"
-            )
-            
-            # Возвращаем состояние CONSULT (будет реализовано в задаче 3.1)
-            # Пока вернемся в SEARCH
+    result_id = parse_select(callback_data)
+
+    if result_id is not None:
+        # Мера находится по индексу id датасета (результат поиска или похожая мера из карточки)
+        results = dataset_manager.results_by_ids([(result_id, 0.0)])
+
+        if not results:
+            # Кнопка из сообщения, отправленного до обновления датасета: меры уже нет
+            page = context.user_data.get('results_page', 0) if context.user_data.get('result_ids') else None
+            text, reply_markup = message_renderer.measure_unavailable(page)
+            await query.edit_message_text(text, parse_mode="Markdown", reply_markup=reply_markup)
             return ConversationState.SEARCH.value
-    
+
+        # Id из индекса (для длинного id в callback_data приходит только его хеш)
+        selected = results[0]
+        context.user_data['selected_result'] = selected
+        await track_conversation(update, context, ConversationState.CONSULT.name, selected_measure_id=selected['id'])
+        if callback_data.startswith(SIMILAR_PREFIX):
+            SIMILAR_SELECTIONS.inc()
+
+        # Обзорная карточка меры подготовлена при загрузке датасета
+        text, reply_markup = message_renderer.consult_card(selected['id'])
+        await query.edit_message_text(text, parse_mode="Markdown", reply_markup=reply_markup)
+        return ConversationState.CONSULT.value
+
     elif callback_data == "new_search":
-        await query.edit_message_text(
-            "🔄 Начинаем новый поиск.\n\n"
-            "⬇️ *Опишите ваш запрос ниже...*",
-            parse_mode="Markdown"
-        )
+        await track_conversation(update, context, ConversationState.START.name)
+        await query.edit_message_text("🔄 Начинаем новый поиск.\n\n" "⬇️ *Опишите ваш запрос ниже...*", parse_mode="Markdown")
         return ConversationState.START.value
-    
+
     elif callback_data == "cancel_search":
+        await track_conversation(update, context, 'END', ended=True)
         await query.edit_message_text(
-            "❌ Поиск отменен.\n\n"
-            "Используйте /start для начала нового диалога.",
-            parse_mode="Markdown"
+            "❌ Поиск отменен.\n\n" "Используйте /start для начала нового диалога.", parse_mode="Markdown"
         )
         return ConversationHandler.END
-    
+
     return ConversationState.SEARCH.value
 
 
+async def handle_consult_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """
+    Уточняющий вопрос по выбранной мере в состоянии CONSULT
+
+    Вопрос сопоставляется с разделами карточки (документы, размер, условия,
+    срок, контакты); ответ - готовый текст раздела
+
+    Returns:
+        ConversationState.CONSULT - остаемся в консультации
+    """
+    selected_result = context.user_data.get('selected_result')
+    if not selected_result:
+        await update.message.reply_text("Сначала выберите меру поддержки в результатах поиска или опишите запрос.")
+        return ConversationState.START.value
+
+    question = update.message.text.strip()
+    intents = route_question(question)
+    CONSULT_QUESTIONS.labels(intents[0] if intents else 'unknown').inc()
+
+    text, reply_markup = message_renderer.consult_answer(selected_result['id'], intents)
+    await update.message.reply_text(text, parse_mode="Markdown", reply_markup=reply_markup)
+
+    conversation_id = context.user_data.get('conversation_id')
+    if conversation_id:
+        await analytics.record_message(conversation_id, question, ','.join(intents) or 'unknown')
+    return ConversationState.CONSULT.value
+
+
+async def handle_consult_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """
+    Кнопки разделов карточки и возврат к результатам в состоянии CONSULT
+
+    Returns:
+        ConversationState.CONSULT или ConversationState.SEARCH (возврат к результатам)
+    """
+    query = update.callback_query
+    await query.answer()
+
+    if query.data == "consult_back":
+        results_text, reply_markup = render_results_page(context)
+        await query.edit_message_text(results_text, parse_mode="Markdown", reply_markup=reply_markup)
+        await track_conversation(update, context, ConversationState.SEARCH.name)
+        return ConversationState.SEARCH.value
+
+    intent = query.data[len("consult_") :]
+    selected_result = context.user_data.get('selected_result')
+    if intent not in INTENT_FIELDS or not selected_result:
+        return ConversationState.CONSULT.value
+
+    CONSULT_QUESTIONS.labels(intent).inc()
+    text, reply_markup = message_renderer.consult_answer(selected_result['id'], (intent,))
+    await query.message.reply_text(text, parse_mode="Markdown", reply_markup=reply_markup)
+    return ConversationState.CONSULT.value
+
+
 async def handle_callback_examples(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик для кнопки примеров запросов"""
     query = update.callback_query
     await query.answer()
-    
+
     if query.data == "show_examples":
         examples_text = (
             "📝 **Примеры запросов для поиска:**\n\n"
@@ -243,74 +481,74 @@ async def handle_callback_examples(update: Update, context: ContextTypes.DEFAULT
             "• \"Меры поддержки в IT-сфере\"\n\n"
             "💡 *Чем конкретнее запрос, тем точнее результаты!*"
         )
-        
+
         await query.message.reply_text(examples_text, parse_mode="Markdown")
-    
+
     elif query.data == "show_stats":
-        dataset_info = dataset_manager.get_dataset_info()
-        
-        if dataset_info.get('status') == 'loaded':
-            stats_text = (
-                "📊 **Статистика базы мер поддержки:**\n\n"
-                f"• Всего записей: {dataset_info.get('rows', 0)}\n"
-                f"• Категорий: {len(set(dataset_info.get('categories', [])))}\n"
-                f"• Последнее обновление: {dataset_info.get('last_loaded', 'неизвестно')}\n\n"
-                f"📂 *Колонки в базе:*\n{', '.join(dataset_info.get('column_names', []))}"
-            )
-        else:
-            stats_text = "⚠️ База данных не загружена или пуста."
-        
+        # Статистика пересчитывается только после перезагрузки датасета
+        stats_text = message_renderer.stats()
+
         await query.message.reply_text(stats_text, parse_mode="Markdown")
 
 
 async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обработчик команды отмены /cancel"""
-    await update.message.reply_text(
-        "❌ Диалог прерван.\n\n"
-        "Используйте /start для начала нового поиска."
-    )
-    
+    await update.message.reply_text("❌ Диалог прерван.\n\n" "Используйте /start для начала нового поиска.")
+
+    await track_conversation(update, context, 'END', ended=True)
+
     # Очищаем данные пользователя
     context.user_data.clear()
-    
+
     return ConversationHandler.END
 
 
-def setup_conversation_handler() -> ConversationHandler:
+def setup_conversation_handler(persistent: bool = False) -> ConversationHandler:
     """
     Создание и настройка ConversationHandler
-    
+
+    Args:
+        persistent: сохранять состояния диалогов в persistence приложения
+
     Returns:
         Настроенный ConversationHandler
     """
     logger.info("Настройка ConversationHandler...")
-    
+
     # Создаем ConversationHandler
+    start, search = ConversationState.START.name, ConversationState.SEARCH.name
+    consult = ConversationState.CONSULT.name
     conversation_handler = ConversationHandler(
-        entry_points=[CommandHandler('start', start_command)],
-        
+        entry_points=[CommandHandler('start', instrumented(start_command, 'NEW'))],
         states={
             ConversationState.START.value: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_user_query),
-                CallbackQueryHandler(handle_callback_examples, pattern="^(show_examples|show_stats)$")
+                MessageHandler(filters.TEXT & ~filters.COMMAND, instrumented(handle_user_query, start)),
+                CallbackQueryHandler(instrumented(handle_callback_examples, start), pattern="^(show_examples|show_stats)$"),
             ],
-            
             ConversationState.SEARCH.value: [
-                CallbackQueryHandler(handle_result_selection)
+                CallbackQueryHandler(instrumented(handle_facet_callback, search), pattern="^facet_"),
+                CallbackQueryHandler(instrumented(handle_results_page, search), pattern="^p:"),
+                CallbackQueryHandler(instrumented(handle_result_selection, search)),
+            ],
+            ConversationState.CONSULT.value: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, instrumented(handle_consult_question, consult)),
+                CallbackQueryHandler(instrumented(handle_consult_callback, consult), pattern="^consult_"),
+                # Новый поиск, отмена и выбор другой меры из сообщения с результатами
+                CallbackQueryHandler(instrumented(handle_result_selection, consult)),
             ],
         },
-        
         fallbacks=[
-            CommandHandler('cancel', cancel_command),
-            CommandHandler('start', start_command)
+            CommandHandler('cancel', instrumented(cancel_command, 'ANY')),
+            CommandHandler('start', instrumented(start_command, 'ANY')),
         ],
-        
         # Настройки ConversationHandler
         allow_reentry=True,  # Разрешаем повторный вход в диалог
-        per_chat=True,       # Отдельный диалог для каждого чата
-        per_user=True,       # Отдельный диалог для каждого пользователя
-        per_message=False,   # Не привязываем к сообщениям
+        per_chat=True,  # Отдельный диалог для каждого чата
+        per_user=True,  # Отдельный диалог для каждого пользователя
+        per_message=False,  # Не привязываем к сообщениям
+        name=CONVERSATION_NAME,
+        persistent=persistent,
     )
-    
+
     logger.info(f"ConversationHandler настроен с состояниями: {[s.name for s in ConversationState]}")
     return conversation_handler
@@ -0,0 +1,390 @@
+"""
+Подготовленные сообщения бота: фрагменты результатов, /start, статистика и консультация
+
+Фрагменты мер (строки результата, кнопки) и статические сообщения строятся
+один раз на опубликованную версию датасета; сообщение с результатами
+собирается из готовых частей через str.join
+"""
+
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from data.dataset_manager import DatasetManager, DatasetState, dataset_manager
+from data.facets import AMOUNT_LIMITS, CATEGORY_FACET, STATUS_FACET, FacetFilter, format_amount
+from data.metrics import metrics
+from conversation.callbacks import page_data, select_data
+
+# Статус и сумма для кнопок быстрых фильтров
+ACTIVE_STATUS = 'Активна'
+QUICK_AMOUNT_LIMIT = AMOUNT_LIMITS[0]
+
+# Максимум готовых сообщений с результатами на версию датасета (вытесняются давно не использованные)
+MESSAGE_CACHE_SIZE = 1024
+
+RENDER_SECONDS = metrics.histogram('render_seconds', 'Время подготовки текста и клавиатуры сообщения', ('view',))
+
+# Строки оценки совпадения для 0..100%
+_SCORE_LINES = tuple(f"   📊 Совпадение: {percent}%\n\n" for percent in range(101))
+
+_RESULTS_FOOTER = "👇 *Выберите наиболее подходящий вариант:*"
+
+_START_MARKUP = InlineKeyboardMarkup(
+    [
+        [InlineKeyboardButton("❓ Примеры запросов", callback_data="show_examples")],
+        [InlineKeyboardButton("📊 Статистика базы", callback_data="show_stats")],
+    ]
+)
+
+_RESULTS_ACTIONS_ROW = (
+    InlineKeyboardButton("🔄 Новый поиск", callback_data="new_search"),
+    InlineKeyboardButton("❌ Отмена", callback_data="cancel_search"),
+)
+_NEW_SEARCH_ROW = (InlineKeyboardButton("🔄 Новый поиск", callback_data="new_search"),)
+
+# Кнопки разделов карточки меры в состоянии CONSULT (callback_data: consult_<намерение из INTENT_FIELDS>)
+_CONSULT_ROWS = (
+    (
+        InlineKeyboardButton("📄 Документы", callback_data="consult_documents"),
+        InlineKeyboardButton("💰 Размер", callback_data="consult_amount"),
+    ),
+    (
+        InlineKeyboardButton("📋 Условия", callback_data="consult_conditions"),
+        InlineKeyboardButton("📅 Срок подачи", callback_data="consult_deadline"),
+    ),
+    (
+        InlineKeyboardButton("📞 Контакты", callback_data="consult_contacts"),
+        InlineKeyboardButton("⬅️ К результатам", callback_data="consult_back"),
+    ),
+)
+CONSULT_MARKUP = InlineKeyboardMarkup([*_CONSULT_ROWS, _NEW_SEARCH_ROW])
+
+# Кнопок "похожие меры" под обзорной карточкой (callback_data: r:<id>)
+SIMILAR_BUTTONS = 3
+
+# Результатов на странице поиска
+RESULTS_PAGE_SIZE = 5
+
+_CONSULT_HINT = (
+    "\n\n💡 Вы можете задавать вопросы по этой мере поддержки.\n"
+    "Например: \"Какие документы нужны?\" или \"Какой размер поддержки?\"\n\n"
+    "⬇️ *Задайте ваш вопрос ниже...*"
+)
+CONSULT_UNKNOWN_TEXT = (
+    "🤔 Не понял вопрос. Я могу рассказать о документах, размере поддержки, "
+    "условиях, сроке подачи и контактах - выберите раздел кнопкой или спросите иначе."
+)
+CONSULT_MISSING_TEXT = "⚠️ Эта мера больше не найдена в базе. Начните новый поиск."
+UNAVAILABLE_TEXT = (
+    "⚠️ Эта мера больше недоступна: база обновилась, и ее удалили или заменили.\n\n"
+    "Вернитесь к результатам или начните новый поиск."
+)
+
+
+def _mark(enabled) -> str:
+    """Отметка включенного фильтра на кнопке"""
+    return "✅ " if enabled else ""
+
+
+def _quoted_query(user_query: str) -> str:
+    return f"\"{user_query[:80]}{'...' if len(user_query) > 80 else ''}\""
+
+
+def _remember(cache: 'OrderedDict[Any, Any]', key: Any, value: Any):
+    """Запись в кэш LRU: при переполнении вытесняется давно не использованная запись"""
+    cache[key] = value
+    if len(cache) > MESSAGE_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+class MessageRenderer:
+    """
+    Кэш отрисованных сообщений, привязанный к опубликованному состоянию датасета
+
+    Все обработчики выполняются в потоке event loop, поэтому блокировки не нужны
+    """
+
+    def __init__(self, manager: DatasetManager):
+        """
+        Args:
+            manager: менеджер датасета, чье состояние определяет актуальность кэша
+        """
+        self.manager = manager
+        self._state: Optional[DatasetState] = None
+        # id меры -> " **Название**\n   описание...\n"
+        self._snippets: Dict[Any, str] = {}
+        # (номер, id меры) -> ряд с кнопкой выбора
+        self._result_rows: Dict[Tuple[int, Any], Tuple[InlineKeyboardButton, ...]] = {}
+        self._filter_rows: Dict[FacetFilter, List[Tuple[InlineKeyboardButton, ...]]] = {}
+        # (запрос, (id, %), фильтр, смещение, всего) -> (текст, клавиатура)
+        self._messages: 'OrderedDict[tuple, Tuple[str, InlineKeyboardMarkup]]' = OrderedDict()
+        self._welcome_body: Optional[str] = None
+        self._stats: Optional[Tuple[date, str]] = None
+        # id меры -> клавиатура обзорной карточки с похожими мерами
+        self._consult_markups: 'OrderedDict[Any, InlineKeyboardMarkup]' = OrderedDict()
+
+    def _sync(self) -> Optional[DatasetState]:
+        """Сброс кэша при публикации нового состояния датасета"""
+        state = self.manager.state
+        if state is not self._state:
+            self._state = state
+            self._snippets.clear()
+            self._result_rows.clear()
+            self._messages.clear()
+            self._consult_markups.clear()
+            self._welcome_body = None
+            self._stats = None
+        return state
+
+    def _snippet(self, result: Dict[str, Any]) -> str:
+        snippet = self._snippets.get(result['id'])
+        if snippet is None:
+            snippet = f" **{result['title']}**\n"
+            if result.get('description'):
+                snippet += f"   {result['description'][:100]}...\n"
+            self._snippets[result['id']] = snippet
+        return snippet
+
+    def _result_row(self, rank: int, result: Dict[str, Any]) -> Tuple[InlineKeyboardButton, ...]:
+        key = (rank, result['id'])
+        row = self._result_rows.get(key)
+        if row is None:
+            title = result['title']
+            row = (
+                InlineKeyboardButton(
+                    f"{rank}. {title[:30]}{'...' if len(title) > 30 else ''}", callback_data=select_data(result['id'])
+                ),
+            )
+            self._result_rows[key] = row
+        return row
+
+    def filter_rows(self, filters: FacetFilter) -> List[Tuple[InlineKeyboardButton, ...]]:
+        """Ряды кнопок фасетных фильтров под результатами поиска"""
+        rows = self._filter_rows.get(filters)
+        if rows is None:
+            rows = [
+                (
+                    InlineKeyboardButton(f"{_mark(filters.categories)}🗂 Категория", callback_data="facet_menu_cat"),
+                    InlineKeyboardButton(f"{_mark(filters.statuses)}Активные", callback_data="facet_active"),
+                ),
+                (
+                    InlineKeyboardButton(
+                        f"{_mark(filters.max_amount is not None)}💰 ≤ {format_amount(QUICK_AMOUNT_LIMIT)}",
+                        callback_data="facet_amount",
+                    ),
+                    InlineKeyboardButton(f"{_mark(filters.deadline_after)}📅 Прием открыт", callback_data="facet_deadline"),
+                ),
+            ]
+            if not filters.is_empty:
+                rows.append((InlineKeyboardButton("♻️ Сбросить фильтры", callback_data="facet_reset"),))
+            self._filter_rows[filters] = rows
+        return rows
+
+    @staticmethod
+    def _page_row(offset: int, total: int) -> Tuple[InlineKeyboardButton, ...]:
+        """Кнопки соседних страниц результатов"""
+        page = offset // RESULTS_PAGE_SIZE
+        row = []
+        if page > 0:
+            row.append(InlineKeyboardButton("◀️ Назад", callback_data=page_data(page - 1)))
+        if offset + RESULTS_PAGE_SIZE < total:
+            row.append(InlineKeyboardButton("Далее ▶️", callback_data=page_data(page + 1)))
+        return tuple(row)
+
+    @RENDER_SECONDS.labels('search_results').timed
+    def search_results(
+        self, user_query: str, search_results: list, filters: FacetFilter, offset: int = 0, total: Optional[int] = None
+    ) -> Tuple[str, InlineKeyboardMarkup]:
+        """
+        Текст и клавиатура сообщения с одной страницей результатов поиска
+
+        Args:
+            search_results: результаты страницы
+            offset: номер первого результата страницы в общем списке (с 0)
+            total: длина всего списка результатов (None - только эта страница)
+
+        Returns:
+            (текст сообщения, InlineKeyboardMarkup)
+        """
+        self._sync()
+        total = len(search_results) if total is None else total
+        scores = tuple((result['id'], round(result.get('match_score', 0) * 100)) for result in search_results)
+        key = (user_query[:81], scores, filters, offset, total)
+        message = self._messages.get(key)
+        if message is not None:
+            self._messages.move_to_end(key)
+            return message
+
+        filters_line = f"🔎 Фильтры: {filters.describe()}\n\n" if not filters.is_empty else ""
+
+        if not search_results:
+            text = (
+                f"😕 С выбранными фильтрами ничего не найдено по запросу:\n\"{user_query[:80]}\"\n\n"
+                f"{filters_line}"
+                "Измените или сбросьте фильтры."
+            )
+            markup = InlineKeyboardMarkup([*self.filter_rows(filters), _NEW_SEARCH_ROW])
+        else:
+            pages = -(-total // RESULTS_PAGE_SIZE)
+            page_line = f" (страница {offset // RESULTS_PAGE_SIZE + 1} из {pages})" if pages > 1 else ""
+            parts = [
+                f"✅ Нашёл {total} подходящих мер{page_line} по запросу:\n{_quoted_query(user_query)}\n\n",
+                filters_line,
+            ]
+            rows = []
+            for rank, (result, (_, percent)) in enumerate(zip(search_results, scores), offset + 1):
+                parts.append(f"{rank}.")
+                parts.append(self._snippet(result))
+                parts.append(_SCORE_LINES[min(max(percent, 0), 100)])
+                rows.append(self._result_row(rank, result))
+            parts.append(_RESULTS_FOOTER)
+
+            text = ''.join(parts)
+            page_row = self._page_row(offset, total)
+            markup = InlineKeyboardMarkup(
+                [*rows, *([page_row] if page_row else []), *self.filter_rows(filters), _RESULTS_ACTIONS_ROW]
+            )
+
+        _remember(self._messages, key, (text, markup))
+        return text, markup
+
+    def _consult_markup(self, measure_id: Any) -> InlineKeyboardMarkup:
+        """Клавиатура обзорной карточки: разделы и похожие меры из графа датасета"""
+        self._sync()
+        markup = self._consult_markups.get(measure_id)
+        if markup is None:
+            similar_rows = [
+                (
+                    InlineKeyboardButton(
+                        f"🔗 {result['title'][:30]}{'...' if len(result['title']) > 30 else ''}",
+                        callback_data=select_data(result['id'], similar=True),
+                    ),
+                )
+                for result in self.manager.similar_measures(measure_id, SIMILAR_BUTTONS)
+            ]
+            markup = InlineKeyboardMarkup([*_CONSULT_ROWS, *similar_rows, _NEW_SEARCH_ROW]) if similar_rows else CONSULT_MARKUP
+            _remember(self._consult_markups, measure_id, markup)
+        else:
+            self._consult_markups.move_to_end(measure_id)
+        return markup
+
+    def consult_card(self, measure_id: Any) -> Tuple[str, InlineKeyboardMarkup]:
+        """
+        Обзорная карточка выбранной меры с подсказкой о вопросах
+
+        Returns:
+            (текст сообщения, клавиатура разделов и похожих мер)
+        """
+        card = self.manager.answer_card(measure_id)
+        if card is None:
+            return CONSULT_MISSING_TEXT, InlineKeyboardMarkup([_NEW_SEARCH_ROW])
+        return card + _CONSULT_HINT, self._consult_markup(measure_id)
+
+    @staticmethod
+    def measure_unavailable(page: Optional[int]) -> Tuple[str, InlineKeyboardMarkup]:
+        """
+        Сообщение о мере, которой нет в текущей версии датасета (кнопка из старого сообщения)
+
+        Args:
+            page: страница сохраненных результатов для возврата (None - результатов нет)
+
+        Returns:
+            (текст сообщения, клавиатура возврата к результатам и нового поиска)
+        """
+        if page is None:
+            return CONSULT_MISSING_TEXT, InlineKeyboardMarkup([_NEW_SEARCH_ROW])
+        return UNAVAILABLE_TEXT, InlineKeyboardMarkup(
+            [
+                (InlineKeyboardButton("⬅️ К результатам", callback_data=page_data(page)),),
+                _NEW_SEARCH_ROW,
+            ]
+        )
+
+    def consult_answer(self, measure_id: Any, intents: Tuple[str, ...]) -> Tuple[str, InlineKeyboardMarkup]:
+        """
+        Ответ на уточняющий вопрос: готовый раздел карточки меры
+
+        Args:
+            measure_id: id выбранной меры
+            intents: разделы из route_question (пусто - вопрос не распознан)
+
+        Returns:
+            (текст сообщения, клавиатура разделов)
+        """
+        if not intents:
+            return CONSULT_UNKNOWN_TEXT, CONSULT_MARKUP
+        answer = self.manager.answer_card(measure_id, intents)
+        if answer is None:
+            return CONSULT_MISSING_TEXT, InlineKeyboardMarkup([_NEW_SEARCH_ROW])
+        return answer, CONSULT_MARKUP
+
+    @RENDER_SECONDS.labels('welcome').timed
+    def welcome(self, first_name: str) -> Tuple[str, InlineKeyboardMarkup]:
+        """
+        Приветствие /start: общая часть строится один раз на версию датасета
+
+        Returns:
+            (текст сообщения, InlineKeyboardMarkup)
+        """
+        state = self._sync()
+        if self._welcome_body is None:
+            dataset_status = "✅" if state is not None else "⚠️"
+            rows = state.size if state is not None else 0
+            self._welcome_body = (
+                f"Я — ваш умный помощник по мерам государственной поддержки бизнеса.\n"
+                f"{dataset_status} База мер поддержки: {rows} записей\n\n"
+                "🔍 **Как я могу помочь?**\n"
+                "Просто опишите свою ситуацию, и я найду подходящие меры поддержки.\n\n"
+                "📝 **Примеры запросов:**\n"
+                "• \"Хочу открыть кафе, какие есть программы?\"\n"
+                "• \"Ищу поддержку для сельского хозяйства\"\n"
+                "• \"Какие есть гранты для ИП?\"\n\n"
+                "⬇️ *Опишите ваш запрос ниже...*"
+            )
+        return f"👋 Привет, {first_name}!\n\n{self._welcome_body}", _START_MARKUP
+
+    @RENDER_SECONDS.labels('stats').timed
+    def stats(self) -> str:
+        """Текст статистики базы (пересчитывается при смене версии датасета или даты)"""
+        self._sync()
+        today = date.today()
+        if self._stats is not None and self._stats[0] == today:
+            return self._stats[1]
+
+        dataset_info = self.manager.get_dataset_info()
+        if dataset_info.get('status') == 'loaded':
+            facets = dataset_info.get('facets', {})
+            categories = facets.get(CATEGORY_FACET, {})
+            statuses = facets.get(STATUS_FACET, {})
+            parts = [
+                "📊 **Статистика базы мер поддержки:**\n\n",
+                f"• Всего записей: {dataset_info.get('rows', 0)}\n",
+                f"• Категорий: {len(dataset_info.get('categories', []))}\n",
+                f"• Прием заявок открыт: {facets.get('open_deadline', 0)}\n",
+                f"• Последнее обновление: {dataset_info.get('last_loaded', 'неизвестно')}\n",
+            ]
+            if categories:
+                parts.append("\n🗂 *По категориям:*\n")
+                parts.append(
+                    "\n".join(f"• {name}: {count}" for name, count in sorted(categories.items(), key=lambda item: -item[1]))
+                )
+                parts.append("\n")
+            if statuses:
+                parts.append("\n📌 *По статусам:*\n")
+                parts.append("\n".join(f"• {name}: {count}" for name, count in statuses.items()))
+                parts.append("\n")
+            parts.append(
+                f"\n📂 *Колонки в базе:*\n" f"{', '.join(dataset_info.get('columns_info', {}).get('column_names', []))}"
+            )
+            text = ''.join(parts)
+        else:
+            text = "⚠️ База данных не загружена или пуста."
+
+        self._stats = (today, text)
+        return text
+
+
+# Глобальный кэш сообщений для обработчиков
+message_renderer = MessageRenderer(dataset_manager)
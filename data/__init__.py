@@ -1,7 +1,21 @@
-
 #Модуль для работы с данными мер поддержки
 
+# Имена пакета загружаются при первом обращении: импорт data.metrics или
+# data.spelling не должен тянуть DatasetManager и его зависимости
+import importlib
+
+_EXPORTS = {
+    'DatasetManager': '.dataset_manager',
+    'DatasetState': '.dataset_manager',
+    'dataset_manager': '.dataset_manager',
+    'DatasetRefresher': '.dataset_refresher',
+    'FacetFilter': '.facets',
+}
+
+__all__ = ['DatasetManager', 'DatasetState', 'DatasetRefresher', 'FacetFilter', 'dataset_manager']
 
-from .dataset_manager import DatasetManager, dataset_manager
 
-__all__ = ['DatasetManager', 'dataset_manager']
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
@@ -0,0 +1,240 @@
+"""
+Карточки ответов по мерам поддержки и маршрутизация уточняющих вопросов
+
+В состоянии CONSULT пользователь спрашивает о выбранной мере ("Какие
+документы нужны?", "Какой размер поддержки?"). Ответы готовятся при
+загрузке датасета: для каждой меры - обзорная карточка и ссылки на
+разделы по полям INTENT_FIELDS. Одинаковые значения полей (типовые
+условия, контакты фонда) дают один общий объект строки раздела.
+Вопрос сопоставляется с разделом регулярными выражениями, собранными
+один раз при импорте модуля; ответ - поиск по позиции меры, без
+обращения к DataFrame и форматирования строк. При инкрементальном
+обновлении датасета рендерятся только карточки затронутых мер.
+"""
+
+import logging
+import math
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .dataset_delta import DatasetDelta
+
+logger = logging.getLogger(__name__)
+
+# Намерение -> колонка датасета
+INTENT_FIELDS: Dict[str, str] = {
+    'documents': 'Список документов',
+    'conditions': 'Условия',
+    'amount': 'Размер поддержки',
+    'deadline': 'Срок подачи',
+    'contacts': 'Контакты',
+}
+
+INTENT_TITLES: Dict[str, str] = {
+    'documents': '📄 Список документов',
+    'conditions': '📋 Условия получения',
+    'amount': '💰 Размер поддержки',
+    'deadline': '📅 Срок подачи',
+    'contacts': '📞 Контакты',
+}
+
+# Ключевые слова намерений в порядке приоритета; вопрос может относиться к нескольким разделам
+INTENT_PATTERNS: Tuple[Tuple[str, str], ...] = (
+    ('documents', r'документ|справк|бумаг|выписк|заявлени|анкет|пакет|что (?:нужно|надо|необходимо) '
+                  r'(?:подать|предоставить|приложить|собрать)'),
+    ('contacts', r'контакт|телефон|позвонить|звонить|почт|e-?mail|емейл|адрес|сайт|куда (?:обращ|идти|писать)|'
+                 r'связат|консультант|горяч'),
+    ('deadline', r'срок|до какого|дедлайн|успе|крайн|дат[аеуы]\b|при[её]м заяв|подать заявк'),
+    ('conditions', r'услови|требовани|кто может|подхож|подойд|могу ли|можно ли|критери|получател|'
+                   r'претендова|ограничени|обязательств|софинансир|залог|обеспечени'),
+    ('amount', r'размер|сумм|максим|минимал|лимит|объ[её]м|денег|деньги|рубл|млн|тыс|процент|ставк'),
+)
+# Общие вопросительные слова учитываются, только если других признаков нет:
+# "сколько документов" - про документы, "сколько дают" - про размер
+WEAK_INTENT_PATTERNS: Tuple[Tuple[str, str], ...] = (
+    ('amount', r'сколько'),
+    ('deadline', r'когда'),
+)
+
+_INTENT_RULES = tuple((intent, re.compile(pattern, re.IGNORECASE)) for intent, pattern in INTENT_PATTERNS)
+_WEAK_INTENT_RULES = tuple((intent, re.compile(pattern, re.IGNORECASE)) for intent, pattern in WEAK_INTENT_PATTERNS)
+
+# Символы разметки Markdown, экранируемые в значениях полей
+_MARKDOWN_SPECIAL = re.compile(r'([_*`\[])')
+
+# Длина описания в обзорной карточке
+OVERVIEW_DESCRIPTION_LENGTH = 400
+
+
+def route_question(text: str) -> Tuple[str, ...]:
+    """
+    Разделы карточки, о которых спрашивает вопрос
+
+    Args:
+        text: вопрос пользователя
+
+    Returns:
+        намерения в порядке приоритета (пусто - вопрос не распознан)
+    """
+    intents = tuple(intent for intent, rule in _INTENT_RULES if rule.search(text))
+    if intents:
+        return intents
+    return tuple(intent for intent, rule in _WEAK_INTENT_RULES if rule.search(text))[:1]
+
+
+def _escape(value: str) -> str:
+    return _MARKDOWN_SPECIAL.sub(r'\\\1', value)
+
+
+def _bold(value: str) -> str:
+    """Жирный текст: внутри сущности Markdown экранирование не работает, символы разметки удаляются"""
+    return f"*{_MARKDOWN_SPECIAL.sub('', value)}*"
+
+
+def _field_value(value: Any) -> str:
+    """Значение ячейки как текст (NaN, None и пустые строки -> '')"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    return str(value).strip()
+
+
+def _render(titles: Sequence[str], descriptions: Sequence[str], fields: Dict[str, Optional[Sequence[Any]]],
+            section_texts: Dict[Tuple[str, str], str]) -> Tuple[List[str], Dict[str, List[str]]]:
+    """
+    Обзорные карточки и тексты разделов по позициям
+
+    Args:
+        titles: названия мер
+        descriptions: описания мер
+        fields: колонка INTENT_FIELDS -> значения по позициям (None - колонки нет в датасете)
+        section_texts: (намерение, значение) -> текст раздела; пополняется новыми текстами
+
+    Returns:
+        (обзорные карточки, намерение -> тексты разделов)
+    """
+    size = len(titles)
+    missing = {
+        intent: f"*{INTENT_TITLES[intent]}*\nВ базе нет этих сведений по выбранной мере. "
+                "Уточните их у организатора программы."
+        for intent in INTENT_FIELDS
+    }
+
+    sections: Dict[str, List[str]] = {}
+    values_by_intent: Dict[str, List[str]] = {}
+    for intent, column in INTENT_FIELDS.items():
+        values = fields.get(column)
+        if values is None:
+            sections[intent] = [missing[intent]] * size
+            values_by_intent[intent] = [''] * size
+            continue
+        texts = []
+        plain = []
+        for value in values:
+            value = _field_value(value)
+            plain.append(value)
+            if not value:
+                texts.append(missing[intent])
+                continue
+            key = (intent, value)
+            text = section_texts.get(key)
+            if text is None:
+                text = section_texts[key] = f"*{INTENT_TITLES[intent]}*\n{_escape(value)}"
+            texts.append(text)
+        sections[intent] = texts
+        values_by_intent[intent] = plain
+
+    overviews = []
+    for position in range(size):
+        description = _field_value(descriptions[position])
+        if len(description) > OVERVIEW_DESCRIPTION_LENGTH:
+            description = description[:OVERVIEW_DESCRIPTION_LENGTH].rstrip() + '...'
+        parts = [f"✅ {_bold(_field_value(titles[position]))}\n"]
+        if description:
+            parts.append(f"\n{_escape(description)}\n")
+        for intent in INTENT_FIELDS:
+            value = values_by_intent[intent][position]
+            if value:
+                parts.append(f"\n*{INTENT_TITLES[intent]}:* {_escape(value)}")
+        overviews.append(''.join(parts))
+    return overviews, sections
+
+
+class AnswerCards:
+    """Готовые ответы по разделам для каждой меры датасета (по позиции в индексе)"""
+
+    def __init__(self, overviews: List[str], sections: Dict[str, List[str]]):
+        """
+        Args:
+            overviews: обзорная карточка каждой меры
+            sections: намерение -> текст раздела для каждой меры
+        """
+        self.overviews = overviews
+        self.sections = sections
+
+    @property
+    def size(self) -> int:
+        return len(self.overviews)
+
+    @classmethod
+    def build(cls, titles: Sequence[str], descriptions: Sequence[str],
+              fields: Dict[str, Optional[Sequence[Any]]]) -> 'AnswerCards':
+        """
+        Построение карточек
+
+        Args:
+            titles: названия мер
+            descriptions: описания мер
+            fields: колонка INTENT_FIELDS -> значения по позициям (None - колонки нет в датасете)
+        """
+        # Общие значения полей - один объект строки на все меры
+        section_texts: Dict[Tuple[str, str], str] = {}
+        cards = cls(*_render(titles, descriptions, fields, section_texts))
+        logger.info(f"Карточки ответов построены: {cards.size} мер, уникальных разделов {len(section_texts)}")
+        return cards
+
+    def apply_changes(self, delta: DatasetDelta, titles: Sequence[str], descriptions: Sequence[str],
+                      fields: Dict[str, Optional[Sequence[Any]]]) -> 'AnswerCards':
+        """
+        Карточки новой версии датасета; текущие не изменяются (copy-on-write)
+
+        Рендерятся только добавленные и измененные меры, карточки перенесенных
+        мер переставляются, остальные переходят в новые списки по срезу
+
+        Args:
+            delta: результат diff_datasets
+            titles: названия мер на позициях sorted(delta.new_rows)
+            descriptions: описания мер на тех же позициях
+            fields: колонка INTENT_FIELDS -> значения на тех же позициях
+
+        Returns:
+            новый AnswerCards
+        """
+        positions = sorted(delta.new_rows)
+        overviews, sections = _render(titles, descriptions, fields, {})
+
+        def patch(current: List[str], rendered: List[str]) -> List[str]:
+            values = current[:delta.size] + [''] * max(0, delta.size - len(current))
+            for position, source in delta.moved.items():
+                values[position] = current[source]
+            for position, value in zip(positions, rendered):
+                values[position] = value
+            return values
+
+        return AnswerCards(patch(self.overviews, overviews),
+                           {intent: patch(self.sections[intent], sections[intent]) for intent in INTENT_FIELDS})
+
+    def overview(self, position: int) -> str:
+        """Обзорная карточка меры"""
+        return self.overviews[position]
+
+    def answer(self, position: int, intents: Sequence[str]) -> str:
+        """
+        Ответ по разделам карточки
+
+        Args:
+            position: позиция меры в индексе
+            intents: намерения из route_question (непустые)
+        """
+        if len(intents) == 1:
+            return self.sections[intents[0]][position]
+        return '\n\n'.join(self.sections[intent][position] for intent in intents)
@@ -0,0 +1,198 @@
+"""
+Пакетное сопоставление запросов с мерами поддержки (офлайн-прогон журналов запросов)
+
+Логика та же, что у DatasetManager.search: BM25 с исправлением опечаток,
+для запросов без совпадений по словам - семантический поиск. Но оценки
+считаются сразу для пачки запросов:
+    - BM25: разреженная матрица "запрос x терм" (idf и вес исправления)
+      умножается на матрицу постингов "терм x документ" по термам: строка
+      постингов каждого терма пачки добавляется внешним произведением
+      сразу ко всем запросам с этим термом (цикл по термам, а не по запросам);
+    - эмбеддинги: векторы всех запросов пачки без совпадений - одно
+      матричное произведение с матрицей документов (search_vectors).
+Пачка делится на блоки так, чтобы матрица оценок занимала не больше
+SCORE_CELLS ячеек, поэтому память не зависит от размера пачки.
+
+Рабочие процессы загружают индексы из снапшота (np.load с mmap_mode='r')
+и разделяют страницы page cache между собой.
+"""
+
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .embedding_index import EmbeddingIndex, create_encoder
+from .index_store import IndexStore
+from .search_engine import BM25_K1, SearchEngine
+from .spelling import SpellingIndex
+from .text_processing import analyze
+
+logger = logging.getLogger(__name__)
+
+# Максимум ячеек плотной матрицы оценок BM25 на блок (float32: 16M ячеек - 64 МБ)
+SCORE_CELLS = 16 * 2**20
+# Длина отрезка строки оценок для порога отбора top-k
+TOP_K_CHUNK = 64
+
+
+class BatchMatcher:
+    """Векторизованный поиск для пачек запросов по индексам одной версии датасета"""
+
+    def __init__(self, search_engine: SearchEngine, embedding_index: Optional[EmbeddingIndex] = None,
+                 spelling: Optional[SpellingIndex] = None, score_cells: int = SCORE_CELLS):
+        """
+        Args:
+            search_engine: инвертированный индекс
+            embedding_index: индекс эмбеддингов для запросов без совпадений (None - без него)
+            spelling: индекс опечаток (None - термы запроса без исправлений)
+            score_cells: максимум ячеек матрицы оценок на блок запросов
+        """
+        self.search_engine = search_engine
+        self.embedding_index = embedding_index
+        self.spelling = spelling
+        self.score_cells = score_cells
+
+        # Постинги в CSR: строка матрицы "терм x документ" - срез docs/impacts
+        vocabulary, self.offsets, self.docs, self.impacts = search_engine.to_csr()
+        self.term_ids = {term: i for i, term in enumerate(vocabulary)}
+        frequencies = np.diff(self.offsets)
+        size = search_engine.size
+        # idf каждого терма, как SearchEngine._idf
+        self.idf = np.log1p((size - frequencies + 0.5) / (frequencies + 0.5))
+
+    @property
+    def size(self) -> int:
+        return self.search_engine.size
+
+    def _query_terms(self, queries: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Разреженная матрица запросов: ненулевые элементы (строка, терм, коэффициент)
+
+        Returns:
+            (строки int64, термы int64, коэффициенты float64, максимум оценки каждого запроса)
+        """
+        rows: List[int] = []
+        terms: List[int] = []
+        weights: List[float] = []
+        max_scores = np.zeros(len(queries), dtype=np.float64)
+        for row, query in enumerate(queries):
+            if self.spelling is not None:
+                variants = self.spelling.expand(query)
+            else:
+                variants = {term: [(term, 1.0)] for term in analyze(query)}
+            max_score = 0.0
+            for alternatives in variants.values():
+                best = 0.0
+                for term, weight in alternatives:
+                    term_id = self.term_ids.get(term)
+                    if term_id is None:
+                        continue
+                    idf = self.idf[term_id]
+                    best = max(best, idf)
+                    rows.append(row)
+                    terms.append(term_id)
+                    weights.append(idf * weight)
+                max_score += best * (BM25_K1 + 1)
+            max_scores[row] = max_score
+        return (np.asarray(rows, dtype=np.int64), np.asarray(terms, dtype=np.int64),
+                np.asarray(weights, dtype=np.float64), max_scores)
+
+    def _bm25_block(self, queries: Sequence[str], top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """BM25 для блока запросов: произведение разреженных матриц и отбор top-k по строкам"""
+        m, n = len(queries), self.size
+        k = min(top_k, n)
+        positions = np.full((m, k), -1, dtype=np.int64)
+        scores = np.zeros((m, k), dtype=np.float32)
+        rows, terms, weights, max_scores = self._query_terms(queries)
+        if not len(rows) or not k:
+            return positions, scores
+
+        # Повторы (запрос, терм) - разные слова запроса исправлены в один терм - складываются,
+        # элементы упорядочиваются по терму
+        keys, inverse = np.unique(terms * m + rows, return_inverse=True)
+        weights = np.bincount(inverse, weights=weights).astype(np.float32)
+        terms, rows = np.divmod(keys, m)
+
+        # Произведение по термам (сумма внешних произведений): строка постингов терма
+        # добавляется сразу ко всем запросам блока с этим термом
+        width = -(-n // TOP_K_CHUNK) * TOP_K_CHUNK
+        matrix = np.zeros((m, width), dtype=np.float32)
+        unique_terms, starts = np.unique(terms, return_index=True)
+        bounds = np.append(starts, len(terms)).tolist()
+        for i, term in enumerate(unique_terms.tolist()):
+            term_rows, coefficients = rows[bounds[i]:bounds[i + 1]], weights[bounds[i]:bounds[i + 1]]
+            start, stop = self.offsets[term], self.offsets[term + 1]
+            docs, impacts = self.docs[start:stop], self.impacts[start:stop]
+            matrix[np.ix_(term_rows, docs)] += coefficients[:, None] * impacts[None, :]
+
+        # Порог отбора: k-й по величине максимум среди отрезков строки не больше k-й оценки
+        # строки (k отрезков дают k разных оценок не ниже него); дальше сортируются только
+        # оценки не ниже порога, а не вся матрица
+        threshold = np.full(m, np.finfo(np.float32).tiny, dtype=np.float32)
+        chunk_max = matrix.reshape(m, -1, TOP_K_CHUNK).max(axis=2)
+        if chunk_max.shape[1] >= k:
+            np.maximum(threshold, np.partition(chunk_max, -k, axis=1)[:, -k], out=threshold)
+        candidate_rows, candidate_docs = np.nonzero(matrix >= threshold[:, None])
+        values = matrix[candidate_rows, candidate_docs]
+
+        # По убыванию оценки внутри строки, при равенстве - по позиции; первые k каждой строки
+        order = np.lexsort((candidate_docs, -values, candidate_rows))
+        candidate_rows, candidate_docs, values = candidate_rows[order], candidate_docs[order], values[order]
+        rank = np.arange(len(order)) - np.searchsorted(candidate_rows, candidate_rows)
+        keep = rank < k
+        candidate_rows, rank = candidate_rows[keep], rank[keep]
+        positions[candidate_rows, rank] = candidate_docs[keep]
+        scores[candidate_rows, rank] = np.minimum(values[keep] / max_scores[candidate_rows], 1.0)
+        return positions, scores
+
+    def match(self, queries: Sequence[str], top_k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Поиск для пачки запросов
+
+        Args:
+            queries: тексты запросов
+            top_k: количество результатов на запрос
+
+        Returns:
+            (позиции документов (m, k) int64, оценки (m, k) float32) по убыванию оценки;
+            позиция -1 - результата нет
+        """
+        queries = list(queries)
+        k = min(top_k, self.size)
+        positions = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.zeros((len(queries), k), dtype=np.float32)
+        if not queries or not k:
+            return positions, scores
+
+        block = max(1, self.score_cells // self.size)
+        for start in range(0, len(queries), block):
+            stop = start + block
+            positions[start:stop], scores[start:stop] = self._bm25_block(queries[start:stop], k)
+
+        # Запросы без совпадений по словам - семантический поиск одним матричным произведением
+        missing = np.flatnonzero(positions[:, 0] < 0)
+        if len(missing) and self.embedding_index is not None and self.embedding_index.size:
+            vectors = self.embedding_index.encoder.encode([queries[i] for i in missing])
+            semantic_positions, semantic_scores = self.embedding_index.search_vectors(vectors, k)
+            valid = (semantic_positions >= 0) & (semantic_scores > 0)
+            positions[missing, :semantic_positions.shape[1]] = np.where(valid, semantic_positions, -1)
+            scores[missing, :semantic_scores.shape[1]] = np.where(valid, semantic_scores, 0.0)
+        return positions, scores
+
+
+# Сопоставитель рабочего процесса, загруженный из снапшота
+_worker_matcher: Optional[BatchMatcher] = None
+
+
+def init_worker(snapshot_dir: str, model_name: str):
+    """Инициализатор рабочего процесса: индексы из снапшота отображаются в память"""
+    global _worker_matcher
+    _, search_engine, embedding_index = IndexStore(snapshot_dir).load_indexes(create_encoder(model_name))
+    spelling = SpellingIndex.from_postings(search_engine.postings)
+    _worker_matcher = BatchMatcher(search_engine, embedding_index, spelling)
+
+
+def worker_match(queries: List[str], top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Пачка запросов в рабочем процессе (см. BatchMatcher.match)"""
+    return _worker_matcher.match(queries, top_k)
@@ -0,0 +1,454 @@
+"""
+Компактное типизированное хранение таблицы мер поддержки
+
+Вместо колонок pandas dtype=object (отдельный Python str на каждую ячейку):
+    - малокардинальные колонки (Категория, Статус) - категориальные коды;
+    - длинный текст - один буфер UTF-8 со смещениями на колонку;
+    - 'Размер поддержки' дополнительно разбирается в числовой min/max в рублях;
+    - 'Срок подачи' - в даты datetime64[D].
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .dataset_delta import DatasetDelta
+from .lazy import lazy_module
+
+pd = lazy_module('pandas')
+
+logger = logging.getLogger(__name__)
+
+AMOUNT_COLUMN = 'Размер поддержки'
+DEADLINE_COLUMN = 'Срок подачи'
+
+# Колонки, которые всегда хранятся категориальными кодами
+CATEGORY_COLUMNS = ('Категория', 'Статус')
+# Остальные текстовые колонки становятся категориальными, если уникальных
+# значений не больше этой доли строк
+CATEGORY_MAX_UNIQUE_FRACTION = 0.5
+
+_AMOUNT_NUMBER = re.compile(r'(\d[\d\s ]*(?:[.,]\d+)?)\s*(млрд|млн|тыс)?', re.IGNORECASE)
+_AMOUNT_MULTIPLIERS = {'тыс': 1e3, 'млн': 1e6, 'млрд': 1e9}
+_DEADLINE_DATE = re.compile(r'(\d{1,2})\.(\d{1,2})\.(\d{2,4})|(\d{4})-(\d{2})-(\d{2})')
+
+
+def pack_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Упаковка строк в один буфер UTF-8 со смещениями
+
+    Returns:
+        (буфер uint8, смещения int64 длины len(values) + 1)
+    """
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def unpack_strings(buffer: np.ndarray, offsets: np.ndarray) -> List[str]:
+    """Распаковка строк из буфера UTF-8 со смещениями"""
+    raw = buffer.tobytes()
+    bounds = offsets.tolist()
+    return [raw[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(len(bounds) - 1)]
+
+
+def _take(values: np.ndarray, source: np.ndarray) -> np.ndarray:
+    """Значения по старым позициям source (позиции -1 заполняются вызывающим)"""
+    if not len(values):
+        return np.zeros(len(source), dtype=values.dtype)
+    return values[np.maximum(source, 0)]
+
+
+class PackedStrings:
+    """
+    Текстовая колонка в одном буфере UTF-8: строка декодируется только при обращении
+
+    Поддерживает len(), индексацию по позиции и срезы, поэтому может
+    подставляться вместо списка строк (например, SearchEngine.titles)
+    """
+
+    def __init__(self, buffer: np.ndarray, offsets: np.ndarray, nulls: Optional[np.ndarray] = None):
+        self.buffer = buffer
+        self.offsets = offsets
+        # Маска пропусков хранится, только если пропуски есть
+        self.nulls = nulls if nulls is not None and nulls.any() else None
+
+    @classmethod
+    def from_values(cls, values: Iterable[Any]) -> 'PackedStrings':
+        """Упаковка значений колонки (None и NaN сохраняются как пропуски)"""
+        series = pd.Series(list(values), dtype=object)
+        nulls = series.isna().to_numpy()
+        buffer, offsets = pack_strings(series.where(~nulls, '').astype(str).tolist())
+        return cls(buffer, offsets, nulls)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _get(self, position: int) -> Optional[str]:
+        if self.nulls is not None and self.nulls[position]:
+            return None
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        return self.buffer[start:end].tobytes().decode('utf-8')
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self._get(i) for i in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError(key)
+        return self._get(key)
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def apply_changes(self, source: np.ndarray, positions: np.ndarray, values: Sequence[Any]) -> 'PackedStrings':
+        """
+        Колонка новой версии без распаковки: непрерывные участки старых позиций
+        копируются из буфера целиком, кодируются только новые значения
+
+        Args:
+            source: новая позиция -> старая (-1 - значение из values)
+            positions: позиции новых значений по возрастанию
+            values: новые значения в порядке positions
+        """
+        added = PackedStrings.from_values(values)
+        lengths = _take(np.diff(self.offsets), source)
+        lengths[positions] = np.diff(added.offsets)
+        offsets = np.zeros(len(source) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        buffer = np.empty(int(offsets[-1]), dtype=np.uint8)
+
+        # Участок - подряд идущие старые позиции или одно новое значение
+        breaks = (np.flatnonzero((np.diff(source) != 1) | (source[1:] < 0) | (source[:-1] < 0)) + 1).tolist()
+        slots = dict(zip(positions.tolist(), range(len(positions))))
+        for start, end in zip([0, *breaks], [*breaks, len(source)]):
+            if start == end:
+                continue
+            if source[start] < 0:
+                slot = slots[start]
+                chunk = added.buffer[added.offsets[slot]:added.offsets[slot + 1]]
+            else:
+                chunk = self.buffer[self.offsets[source[start]]:self.offsets[source[end - 1] + 1]]
+            buffer[offsets[start]:offsets[end]] = chunk
+
+        nulls = _take(self.nulls, source) if self.nulls is not None else np.zeros(len(source), dtype=bool)
+        nulls[positions] = added.nulls if added.nulls is not None else False
+        return PackedStrings(buffer, offsets, nulls)
+
+    def take(self, positions: Sequence[int]) -> List[Optional[str]]:
+        """Значения по списку позиций"""
+        return [self._get(int(position)) for position in positions]
+
+    def tolist(self) -> List[Optional[str]]:
+        """Распаковка всей колонки"""
+        values: List[Optional[str]] = unpack_strings(self.buffer, self.offsets)
+        if self.nulls is not None:
+            for position in np.flatnonzero(self.nulls).tolist():
+                values[position] = None
+        return values
+
+    @property
+    def nbytes(self) -> int:
+        nulls = self.nulls.nbytes if self.nulls is not None else 0
+        return self.buffer.nbytes + self.offsets.nbytes + nulls
+
+
+def parse_amount(value: Any) -> Tuple[float, float]:
+    """
+    Разбор размера поддержки в рубли
+
+    "до 1,5 млн руб." -> (0, 1 500 000), "от 100 тыс. до 5 млн" -> (100 000, 5 000 000),
+    "индивидуально" -> (nan, nan). Число без единицы берет единицу следующего числа
+    ("от 100 до 500 тыс.")
+
+    Args:
+        value: значение ячейки
+
+    Returns:
+        (минимум, максимум) в рублях; nan - граница не указана
+    """
+    if isinstance(value, (int, float, np.number)) and not pd.isna(value):
+        return float(value), float(value)
+    if not isinstance(value, str):
+        return np.nan, np.nan
+
+    text = value.lower()
+    matches = list(_AMOUNT_NUMBER.finditer(text))
+    if not matches:
+        return np.nan, np.nan
+
+    amounts = []
+    unit = None
+    for match in reversed(matches):
+        unit = match.group(2) or unit
+        number = float(re.sub(r'[\s ]', '', match.group(1)).replace(',', '.'))
+        amounts.append(number * _AMOUNT_MULTIPLIERS.get(unit, 1.0))
+    amounts.reverse()
+
+    if len(amounts) >= 2:
+        return min(amounts[0], amounts[-1]), max(amounts[0], amounts[-1])
+    prefix = text[:matches[0].start()]
+    if 'от' in prefix.split():
+        return amounts[0], np.nan
+    if 'до' in prefix.split():
+        return 0.0, amounts[0]
+    return amounts[0], amounts[0]
+
+
+def parse_deadline(value: Any) -> np.datetime64:
+    """
+    Разбор срока подачи заявки
+
+    "до 31.12.2023" -> 2023-12-31, "круглогодично" -> NaT (срок не ограничен)
+
+    Args:
+        value: значение ячейки (строка или дата из Excel)
+
+    Returns:
+        np.datetime64 с точностью до дня или NaT
+    """
+    if isinstance(value, (datetime, date, pd.Timestamp)) and not pd.isna(value):
+        return np.datetime64(pd.Timestamp(value).date(), 'D')
+    if not isinstance(value, str):
+        return np.datetime64('NaT', 'D')
+
+    match = _DEADLINE_DATE.search(value)
+    if match is None:
+        return np.datetime64('NaT', 'D')
+    if match.group(1):
+        day, month, year = int(match.group(1)), int(match.group(2)), int(match.group(3))
+        if year < 100:
+            year += 2000
+    else:
+        year, month, day = int(match.group(4)), int(match.group(5)), int(match.group(6))
+    try:
+        return np.datetime64(date(year, month, day), 'D')
+    except ValueError:
+        return np.datetime64('NaT', 'D')
+
+
+def _categories_nbytes(categories: pd.Index) -> int:
+    """Размер словаря категорий вместе с объектами строк"""
+    return categories.memory_usage(deep=True)
+
+
+class ColumnStore:
+    """
+    Типизированное колоночное представление датасета
+
+    Числовые колонки хранятся как есть, текстовые - категориальными кодами
+    или упакованными строками. Порядок и типы колонок сохраняются, поэтому
+    to_frame() восстанавливает исходный DataFrame
+    """
+
+    def __init__(self, size: int, columns: List[str]):
+        self.size = size
+        self.columns = columns
+        self.numeric: Dict[str, np.ndarray] = {}
+        self.categorical: Dict[str, pd.Categorical] = {}
+        self.texts: Dict[str, PackedStrings] = {}
+        # Разобранные значения (nan/NaT - не указано)
+        self.amount_min = np.full(size, np.nan)
+        self.amount_max = np.full(size, np.nan)
+        self.deadline = np.full(size, np.datetime64('NaT', 'D'))
+        # Размер исходного DataFrame (deep) для отчета о памяти
+        self.source_bytes = 0
+
+    @classmethod
+    def from_dataframe(cls, dataset: pd.DataFrame, pack_text: bool = True) -> 'ColumnStore':
+        """
+        Построение колоночного хранилища
+
+        Args:
+            dataset: очищенный датасет
+            pack_text: упаковывать ли длинный текст (False - хранятся только
+                категориальные коды и разобранные значения, текст остается в DataFrame)
+
+        Returns:
+            ColumnStore
+        """
+        store = cls(len(dataset), list(dataset.columns))
+        store.source_bytes = int(dataset.memory_usage(index=False, deep=True).sum())
+
+        for column in dataset.columns:
+            series = dataset[column]
+            if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+                store.numeric[column] = series.to_numpy()
+                continue
+            unique_count = series.nunique(dropna=True)
+            if column in CATEGORY_COLUMNS or unique_count <= CATEGORY_MAX_UNIQUE_FRACTION * max(len(series), 1):
+                store.categorical[column] = pd.Categorical(series)
+            elif pack_text:
+                store.texts[column] = PackedStrings.from_values(series.tolist())
+
+        if AMOUNT_COLUMN in dataset.columns:
+            store._parse_amounts(dataset[AMOUNT_COLUMN])
+        if DEADLINE_COLUMN in dataset.columns:
+            store.deadline = np.array([parse_deadline(value) for value in dataset[DEADLINE_COLUMN].tolist()],
+                                      dtype='datetime64[D]')
+        return store
+
+    def apply_changes(self, delta: DatasetDelta, rows: pd.DataFrame) -> 'ColumnStore':
+        """
+        Инкрементальное обновление по раскладке DatasetDelta; текущее хранилище не изменяется
+
+        Колонки сохраняют представление полной сборки (число, категория,
+        упакованный текст); массивы переносятся векторно, а разбираются и
+        кодируются только значения новых строк
+
+        Args:
+            delta: изменения относительно версии, по которой построено хранилище
+            rows: строки новой версии для позиций sorted(delta.new_rows)
+
+        Returns:
+            новый ColumnStore
+        """
+        source = delta.sources()
+        positions = np.asarray(sorted(delta.new_rows), dtype=np.int64)
+        store = ColumnStore(delta.size, self.columns)
+
+        for name, values in self.numeric.items():
+            new_values = rows[name].to_numpy()
+            column = _take(values, source).astype(np.result_type(values.dtype, new_values.dtype), copy=False)
+            column[positions] = new_values
+            store.numeric[name] = column
+
+        for name, values in self.categorical.items():
+            new_values = rows[name]
+            new_codes = values.categories.get_indexer(new_values)
+            if ((new_codes < 0) & new_values.notna().to_numpy()).any():
+                # Новое значение: словарь категорий собирается заново, как при полной сборке
+                column = _take(np.asarray(values, dtype=object), source)
+                column[positions] = new_values.to_numpy(dtype=object)
+                store.categorical[name] = pd.Categorical(column)
+                continue
+            codes = _take(np.asarray(values.codes), source)
+            codes[positions] = new_codes
+            categorical = pd.Categorical.from_codes(codes, dtype=values.dtype)
+            if (np.bincount(codes[codes >= 0], minlength=len(values.categories)) == 0).any():
+                categorical = categorical.remove_unused_categories()
+            store.categorical[name] = categorical
+
+        for name, values in self.texts.items():
+            store.texts[name] = values.apply_changes(source, positions, rows[name].tolist())
+
+        if AMOUNT_COLUMN in rows.columns:
+            bounds = np.array([parse_amount(value) for value in rows[AMOUNT_COLUMN].tolist()],
+                              dtype=np.float64).reshape(-1, 2)
+            store.amount_min, store.amount_max = _take(self.amount_min, source), _take(self.amount_max, source)
+            store.amount_min[positions], store.amount_max[positions] = bounds[:, 0], bounds[:, 1]
+        if DEADLINE_COLUMN in rows.columns:
+            store.deadline = _take(self.deadline, source)
+            store.deadline[positions] = np.array([parse_deadline(value) for value in rows[DEADLINE_COLUMN].tolist()],
+                                                 dtype='datetime64[D]')
+
+        # Размер исходного DataFrame: минус покинувшие версию строки, плюс новые
+        moved_from = set(delta.moved.values())
+        left = [position for position in delta.vacated if position not in moved_from]
+        if self.is_complete:
+            left_bytes = int(self.to_frame(left).memory_usage(index=False, deep=True).sum()) if left else 0
+        else:
+            left_bytes = self.source_bytes // max(self.size, 1) * len(left)
+        store.source_bytes = self.source_bytes - left_bytes + int(rows.memory_usage(index=False, deep=True).sum())
+        return store
+
+    def _parse_amounts(self, series: pd.Series):
+        # Значения повторяются (одинаковые формулировки), поэтому разбираем уникальные
+        categorical = self.categorical.get(series.name)
+        if categorical is None:
+            categorical = pd.Categorical(series)
+        parsed = np.array([parse_amount(value) for value in categorical.categories], dtype=np.float64)
+        parsed = np.vstack([parsed.reshape(-1, 2), [[np.nan, np.nan]]])
+        # Код -1 (пропуск) попадает на последнюю строку с nan
+        bounds = parsed[categorical.codes]
+        self.amount_min = bounds[:, 0].copy()
+        self.amount_max = bounds[:, 1].copy()
+
+    def column(self, name: str) -> Any:
+        """Значения колонки: массив, Categorical или PackedStrings"""
+        if name in self.numeric:
+            return self.numeric[name]
+        if name in self.categorical:
+            return self.categorical[name]
+        return self.texts[name]
+
+    def shared_values(self, name: str) -> Optional[Sequence[str]]:
+        """
+        Текстовая колонка без пропусков в виде последовательности строк, не
+        дублирующей память: упакованные строки или список ссылок на объекты
+        категорий (None - колонки нет или в ней есть пропуски)
+        """
+        if name in self.texts:
+            values = self.texts[name]
+            return values if values.nulls is None else None
+        if name in self.categorical:
+            values = self.categorical[name]
+            if (values.codes < 0).any():
+                return None
+            categories = values.categories.tolist()
+            return [categories[code] for code in values.codes.tolist()]
+        return None
+
+    @property
+    def is_complete(self) -> bool:
+        """Хранятся ли все колонки (можно восстановить DataFrame)"""
+        return len(self.numeric) + len(self.categorical) + len(self.texts) == len(self.columns)
+
+    def to_frame(self, positions: Optional[Sequence[int]] = None) -> pd.DataFrame:
+        """
+        Восстановление DataFrame с исходными типами (object для текста)
+
+        Args:
+            positions: позиции строк (None - все строки)
+        """
+        data = {}
+        for name in self.columns:
+            values = self.column(name)
+            if isinstance(values, PackedStrings):
+                column = values.tolist() if positions is None else values.take(positions)
+                data[name] = pd.Series(column, dtype=object)
+            elif isinstance(values, pd.Categorical):
+                taken = values if positions is None else values.take(np.asarray(positions, dtype=np.int64))
+                data[name] = pd.Series(np.asarray(taken, dtype=object), dtype=object)
+            else:
+                data[name] = values if positions is None else values[np.asarray(positions, dtype=np.int64)]
+        return pd.DataFrame(data, columns=self.columns)
+
+    def memory_report(self) -> Dict[str, Any]:
+        """
+        Отчет о памяти: исходный DataFrame против компактного представления
+
+        Returns:
+            словарь с размерами в байтах по колонкам и экономией
+        """
+        columns: Dict[str, Dict[str, Any]] = {}
+        for name, values in self.numeric.items():
+            columns[name] = {'storage': str(values.dtype), 'bytes': int(values.nbytes)}
+        for name, values in self.categorical.items():
+            columns[name] = {
+                'storage': f'category[{values.codes.dtype}]',
+                'bytes': int(values.codes.nbytes + _categories_nbytes(values.categories)),
+            }
+        for name, values in self.texts.items():
+            columns[name] = {'storage': 'packed_utf8', 'bytes': int(values.nbytes)}
+
+        parsed = int(self.amount_min.nbytes + self.amount_max.nbytes + self.deadline.nbytes)
+        compact = sum(item['bytes'] for item in columns.values()) + parsed
+        report = {
+            'dataframe_bytes': self.source_bytes,
+            'parsed_bytes': parsed,
+            'columns': columns,
+        }
+        if self.is_complete:
+            report['compact_bytes'] = compact
+            report['saved_bytes'] = self.source_bytes - compact
+            report['saved_percent'] = round(100 * (self.source_bytes - compact) / self.source_bytes, 1) \
+                if self.source_bytes else 0.0
+        return report
@@ -0,0 +1,227 @@
+"""
+Инкрементальное обновление датасета: сравнение версий по колонке id
+и ключи индекса id
+"""
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .lazy import lazy_module
+
+pd = lazy_module('pandas')
+
+# Колонка-ключ меры поддержки
+ID_COLUMN = 'id'
+# Строковые id длиннее (в байтах UTF-8) заменяются в callback_data хешем:
+# Telegram ограничивает callback_data 64 байтами, из них 3 - префикс кнопки
+MAX_INLINE_ID_BYTES = 61
+
+
+@dataclass(frozen=True)
+class IdDigest:
+    """Короткий хеш длинного id: ключ индекса id наравне с самим id"""
+
+    value: str
+
+
+def normalize_id(measure_id: Any) -> Any:
+    """Id меры как ключ индекса: целые значения (numpy, 169.0 из колонки с пропусками) -> int"""
+    if isinstance(measure_id, (bool, np.bool_)):
+        return measure_id
+    if isinstance(measure_id, (int, np.integer)):
+        return int(measure_id)
+    if isinstance(measure_id, (float, np.floating)) and float(measure_id).is_integer():
+        return int(measure_id)
+    return measure_id
+
+
+def id_digest(measure_id: Any) -> Optional[IdDigest]:
+    """Хеш id, не помещающегося в callback_data (None - id передается как есть)"""
+    measure_id = normalize_id(measure_id)
+    if isinstance(measure_id, int):
+        return None
+    encoded = str(measure_id).encode('utf-8')
+    if len(encoded) <= MAX_INLINE_ID_BYTES:
+        return None
+    return IdDigest(hashlib.blake2b(encoded, digest_size=8).hexdigest())
+
+
+def id_keys(measure_id: Any) -> List[Any]:
+    """Ключи индекса id для меры: нормализованный id и хеш длинного id"""
+    digest = id_digest(measure_id)
+    measure_id = normalize_id(measure_id)
+    return [measure_id] if digest is None else [measure_id, digest]
+
+
+def row_hashes(dataset: pd.DataFrame) -> np.ndarray:
+    """
+    Хеши содержимого строк (uint64), вычисляются векторно
+
+    Args:
+        dataset: датасет
+
+    Returns:
+        массив хешей, выровненный по позициям строк
+    """
+    return pd.util.hash_pandas_object(dataset, index=False).to_numpy(dtype=np.uint64)
+
+
+@dataclass
+class DatasetDelta:
+    """
+    Результат сравнения двух версий датасета и план раскладки строк
+
+    Позиции "old" относятся к опубликованной версии, "new" - к новой.
+    Удаленные позиции заполняются добавленными строками, а оставшиеся
+    дыры закрываются переносом строк с конца, поэтому затрагивается
+    только O(измененных строк) позиций
+    """
+
+    added: int = 0
+    changed: int = 0
+    removed: int = 0
+    relocated: int = 0
+    # Итоговый размер датасета
+    size: int = 0
+    # Новая позиция -> номер строки во freshly-read датасете (добавленные и измененные)
+    new_rows: Dict[int, int] = field(default_factory=dict)
+    # Новая позиция -> старая позиция (строки, перенесенные без изменений)
+    moved: Dict[int, int] = field(default_factory=dict)
+    # Старые позиции, чьи документы нужно удалить из индексов
+    vacated: List[int] = field(default_factory=list)
+    # Новая позиция -> номер строки во freshly-read датасете (для всех позиций новой версии):
+    # новая версия собирается из прочитанного датасета без DataFrame предыдущей версии
+    order: Optional[np.ndarray] = None
+
+    @property
+    def is_empty(self) -> bool:
+        """Изменений нет"""
+        return not (self.added or self.changed or self.removed)
+
+    @property
+    def touched(self) -> int:
+        """Количество строк, затронутых обновлением"""
+        return self.added + self.changed + self.removed + self.relocated
+
+    def counters(self) -> Dict[str, int]:
+        """Счетчики для логов и статистики"""
+        return {
+            'added': self.added,
+            'changed': self.changed,
+            'removed': self.removed,
+            'relocated': self.relocated,
+            'touched': self.touched,
+        }
+
+    def sources(self) -> np.ndarray:
+        """
+        Откуда берется строка каждой новой позиции
+
+        Returns:
+            массив длины size: старая позиция или -1 (добавленная или измененная строка)
+        """
+        source = np.arange(self.size, dtype=np.int64)
+        if self.moved:
+            source[list(self.moved)] = list(self.moved.values())
+        if self.new_rows:
+            source[list(self.new_rows)] = -1
+        return source
+
+    def take_indexer(self, old_size: int) -> np.ndarray:
+        """
+        Индексы для сборки нового датасета из pd.concat([старый, новый])
+
+        Returns:
+            массив длины size: позиция в старом датасете или old_size + строка нового
+        """
+        indexer = np.arange(self.size, dtype=np.int64)
+        for new_pos, old_pos in self.moved.items():
+            indexer[new_pos] = old_pos
+        for new_pos, row in self.new_rows.items():
+            indexer[new_pos] = old_size + row
+        return indexer
+
+
+def diff_datasets(old_ids: List[Any], old_hashes: np.ndarray, new_ids: List[Any],
+                  new_hashes: np.ndarray) -> Optional[DatasetDelta]:
+    """
+    Классификация строк на добавленные, измененные и удаленные и расчет раскладки
+
+    Args:
+        old_ids: id строк опубликованной версии по позициям
+        old_hashes: хеши строк опубликованной версии
+        new_ids: id строк новой версии
+        new_hashes: хеши строк новой версии
+
+    Returns:
+        DatasetDelta или None, если id не уникальны (нужна полная перестройка)
+    """
+    old_positions = {item: pos for pos, item in enumerate(old_ids)}
+    new_rows = {item: row for row, item in enumerate(new_ids)}
+    if len(old_positions) != len(old_ids) or len(new_rows) != len(new_ids):
+        return None
+
+    delta = DatasetDelta()
+    holes = []
+    # Старая позиция -> строка новой версии с тем же id (-1 - id удален)
+    matched = [-1] * len(old_ids)
+    for item, pos in old_positions.items():
+        row = new_rows.get(item)
+        if row is None:
+            holes.append(pos)
+            continue
+        matched[pos] = row
+        if old_hashes[pos] != new_hashes[row]:
+            delta.new_rows[pos] = row
+            delta.vacated.append(pos)
+    delta.changed = len(delta.new_rows)
+    delta.removed = len(holes)
+    delta.vacated.extend(holes)
+
+    # Добавленные строки занимают освободившиеся позиции, остальные - в конец
+    holes.sort(reverse=True)
+    size = len(old_ids)
+    for item, row in new_rows.items():
+        if item in old_positions:
+            continue
+        delta.added += 1
+        if holes:
+            delta.new_rows[holes.pop()] = row
+        else:
+            delta.new_rows[size] = row
+            size += 1
+
+    # Оставшиеся дыры закрываем строками с конца
+    size -= len(holes)
+    remaining = set(holes)
+    tail = len(old_ids) - 1
+    for hole in sorted(holes):
+        if hole >= size:
+            break
+        while tail in remaining:
+            tail -= 1
+        if tail in delta.new_rows:
+            delta.new_rows[hole] = delta.new_rows.pop(tail)
+        else:
+            delta.moved[hole] = tail
+            delta.vacated.append(tail)
+        remaining.add(tail)
+        tail -= 1
+
+    delta.relocated = len(delta.moved)
+    delta.size = size
+
+    order = np.full(size, -1, dtype=np.int64)
+    common = min(size, len(old_ids))
+    order[:common] = matched[:common]
+    for new_pos, old_pos in delta.moved.items():
+        order[new_pos] = matched[old_pos]
+    for new_pos, row in delta.new_rows.items():
+        order[new_pos] = row
+    delta.order = order
+    return delta
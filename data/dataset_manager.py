@@ -1,226 +1,1224 @@
-import pandas as pd
+from __future__ import annotations
+
+import numpy as np
+import copy
 import logging
 import os
-from typing import Optional, Dict, Any
+from dataclasses import dataclass, field, replace
+from typing import Optional, Dict, Any, List, Sequence, Tuple
 from datetime import datetime
 
+from .search_engine import SearchEngine, SearchIndexBuilder, FIELD_WEIGHTS, dataframe_records
+from .embedding_index import BaseEncoder, EmbeddingIndex, EmbeddingIndexBuilder, HashingEncoder
+from .column_store import ColumnStore
+from .facets import CATEGORY_FACET, FacetFilter, FacetIndex
+from .reranking import rerank_batch
+from .query_cache import QueryCache, normalize_query
+from .streaming import IngestStats, clean_chunk, iter_clean_chunks
+from .index_store import IndexStore, file_fingerprint
+from .dataset_delta import ID_COLUMN, DatasetDelta, diff_datasets, id_keys, row_hashes
+from .sheets_loader import GoogleSheetsLoader
+from .spelling import SpellingIndex
+from .answer_cards import INTENT_FIELDS, AnswerCards
+from .similar_measures import SimilarityGraph
+from .metrics import SLOW_BUCKETS, metrics
+from .lazy import lazy_module
+
+pd = lazy_module('pandas')
+
 logger = logging.getLogger(__name__)
 
+# Инкрементальное обновление выполняется, если затронуто не больше этой доли строк
+INCREMENTAL_MAX_FRACTION = 0.3
+# Допустимый дрейф средней длины документа (BM25 avgdl) до полной перестройки
+AVG_LENGTH_MAX_DRIFT = 0.1
+
+LOAD_PHASE_SECONDS = metrics.histogram(
+    'dataset_load_phase_seconds', 'Время фаз загрузки датасета', ('phase',), buckets=SLOW_BUCKETS
+)
+SEARCH_STAGE_SECONDS = metrics.histogram('search_stage_seconds', 'Время этапов поиска в DatasetManager', ('stage',))
+SEARCH_CACHE = metrics.counter('search_cache_total', 'Обращения к кэшу результатов поиска', ('result',))
+_BM25, _SEMANTIC, _RESULTS = (SEARCH_STAGE_SECONDS.labels(stage) for stage in ('bm25', 'semantic', 'results'))
+_CACHE_HIT, _CACHE_MISS = SEARCH_CACHE.labels('hit'), SEARCH_CACHE.labels('miss')
+
+
+@dataclass(frozen=True)
+class DatasetState:
+    """
+    Неизменяемое состояние загруженного датасета и построенных по нему индексов
+
+    Обработчики берут ссылку на состояние один раз и работают с ней до конца
+    запроса; перезагрузка публикует новый объект, не изменяя старый.
+    В компактном режиме dataset равен None, а данные хранятся в columns
+    """
+
+    dataset: Optional[pd.DataFrame]
+    columns_info: Dict[str, Any]
+    search_engine: SearchEngine
+    embedding_index: EmbeddingIndex
+    last_loaded: datetime
+    version: int = 0
+    source: Dict[str, Any] = field(default_factory=dict)
+    row_hashes: Optional[np.ndarray] = None
+    # Изменения относительно предыдущей версии (None - полная перестройка)
+    delta: Optional[DatasetDelta] = None
+    # Типизированное колоночное представление (коды категорий, суммы, сроки)
+    columns: Optional[ColumnStore] = None
+    # Маски и счетчики фасетов
+    facets: Optional[FacetIndex] = None
+    # Исправление опечаток по словарю поискового индекса
+    spelling: Optional[SpellingIndex] = None
+    # Готовые ответы на уточняющие вопросы по мерам (состояние CONSULT)
+    answer_cards: Optional[AnswerCards] = None
+    # Граф похожих мер (k ближайших соседей по позициям)
+    similar: Optional[SimilarityGraph] = None
+    # id меры (и IdDigest длинного id) -> позиция в индексах (переход от callback_data к мере без сканирования)
+    id_index: Optional[Dict[Any, int]] = None
+
+    @property
+    def size(self) -> int:
+        """Количество записей"""
+        return self.columns.size if self.columns is not None else len(self.dataset)
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """Датасет в виде DataFrame (в компактном режиме восстанавливается из колонок)"""
+        return self.dataset if self.dataset is not None else self.columns.to_frame()
+
 
 class DatasetManager:
     """Менеджер для работы с датасетом мер поддержки"""
-    
-    def __init__(self, data_source: str = "google_sheets"):
+
+    def __init__(
+        self,
+        data_source: str = "google_sheets",
+        encoder: Optional[BaseEncoder] = None,
+        embedding_backend: str = "auto",
+        snapshot_dir: Optional[str] = None,
+        stream_chunk_size: int = 0,
+        compact_storage: bool = False,
+        query_cache: Optional[QueryCache] = None,
+        sheets_loader: Optional[GoogleSheetsLoader] = None,
+        similar_k: int = 8,
+        similar_threads: int = 1,
+    ):
         """
         Инициализация менеджера датасета
-        
+
         Args:
             data_source: источник данных ('google_sheets' или 'local')
+            encoder: энкодер для семантического поиска (по умолчанию HashingEncoder)
+            embedding_backend: backend индекса эмбеддингов ('auto', 'numpy', 'faiss_ivf', 'faiss_hnsw')
+            snapshot_dir: каталог снапшотов индексов (None - снапшоты отключены)
+            stream_chunk_size: размер части при потоковой загрузке файла (0 - файл читается целиком)
+            compact_storage: хранить датасет только в типизированных колонках, без DataFrame
+            query_cache: кэш результатов поиска (по умолчанию QueryCache с настройками по умолчанию)
+            sheets_loader: загрузчик Google Sheets (по умолчанию создается по sheet_id с настройками по умолчанию)
+            similar_k: соседей на меру в графе похожих мер (0 - граф не строится)
+            similar_threads: потоки построения графа похожих мер
         """
         self.data_source = data_source
-        self.dataset: Optional[pd.DataFrame] = None
-        self.last_loaded: Optional[datetime] = None
-        self.columns_info: Dict[str, Any] = {}
-        
+        self.encoder: BaseEncoder = encoder or HashingEncoder()
+        self.embedding_backend = embedding_backend
+        self.snapshot_dir = snapshot_dir
+        self.stream_chunk_size = stream_chunk_size
+        self.compact_storage = compact_storage
+        self.query_cache = query_cache if query_cache is not None else QueryCache()
+        self.sheets_loader = sheets_loader
+        self.similar_k = similar_k
+        self.similar_threads = similar_threads
+        self.last_ingest_stats: Optional[Dict[str, Any]] = None
+        self._state: Optional[DatasetState] = None
+        self.refresh_counters: Dict[str, int] = {
+            'full_rebuilds': 0,
+            'incremental_updates': 0,
+            'unchanged_reloads': 0,
+            'rows_added': 0,
+            'rows_changed': 0,
+            'rows_removed': 0,
+            'rows_relocated': 0,
+        }
+
+    @property
+    def state(self) -> Optional[DatasetState]:
+        """Текущее опубликованное состояние (None - датасет не загружен)"""
+        return self._state
+
+    @property
+    def dataset(self) -> Optional[pd.DataFrame]:
+        """Датасет в виде DataFrame (в компактном режиме создается при каждом обращении)"""
+        return self._state.frame if self._state else None
+
+    @property
+    def last_loaded(self) -> Optional[datetime]:
+        return self._state.last_loaded if self._state else None
+
+    @property
+    def version(self) -> int:
+        """Номер опубликованной версии датасета (0 - не загружен)"""
+        return self._state.version if self._state else 0
+
+    @property
+    def columns_info(self) -> Dict[str, Any]:
+        return self._state.columns_info if self._state else {}
+
+    @property
+    def search_engine(self) -> Optional[SearchEngine]:
+        return self._state.search_engine if self._state else None
+
+    @property
+    def embedding_index(self) -> Optional[EmbeddingIndex]:
+        return self._state.embedding_index if self._state else None
+
+    def _get_sheets_loader(self, sheet_id: str, sheet_name: str) -> GoogleSheetsLoader:
+        """Загрузчик для листа (настроенный, если совпадает лист, иначе новый с настройками по умолчанию)"""
+        loader = self.sheets_loader
+        if loader is None or (loader.sheet_id, loader.sheet_name) != (sheet_id, sheet_name):
+            loader = GoogleSheetsLoader(sheet_id, sheet_name)
+            self.sheets_loader = loader
+        return loader
+
     def load_from_google_sheets(self, sheet_id: str, sheet_name: str) -> pd.DataFrame:
         """
         Загрузка данных из Google Sheets
-        
+
+        Таблица скачивается, только если ее ревизия изменилась; при
+        недоступности API используется последний кэш на диске
+
         Args:
             sheet_id: ID Google Sheets документа
             sheet_name: название листа
-            
+
         Returns:
             pandas DataFrame с данными
         """
         try:
             logger.info(f"Загрузка данных из Google Sheets: {sheet_id}/{sheet_name}")
-            
-            # Для локальной разработки - заглушка
-            # В реальной реализации здесь будет код для работы с gspread
-            
-            # Создаем тестовый датасет для разработки
-            test_data = {
-                'id': [1, 2, 3, 4, 5],
-                'Название': [
-                    'Субсидия на открытие малого бизнеса',
-                    'Грант для ИП в сфере услуг',
-                    'Льготный кредит на оборудование',
-                    'Поддержка сельхозпроизводителей',
-                    'Программа "Стартап-навигатор"'
-                ],
-                'Описание': [
-                    'Финансовая поддержка для начинающих предпринимателей',
-                    'Безвозмездная помощь индивидуальным предпринимателям',
-                    'Кредитование по сниженной ставке для закупки техники',
-                    'Меры поддержки для фермеров и сельхозпредприятий',
-                    'Акселерационная программа для технологических стартапов'
-                ],
-                'Категория': ['Финансы', 'Финансы', 'Финансы', 'Сельское хозяйство', 'Инновации'],
-                'Размер поддержки': ['до 500 000 руб.', 'до 1 000 000 руб.', 'до 5 000 000 руб.', 'индивидуально', 'до 3 000 000 руб.'],
-                'Условия': ['Стаж ИП не менее 6 мес.', 'Оборот менее 10 млн руб.', 'Собственное обеспечение 30%', 'Наличие земельного участка', 'Инновационный продукт'],
-                'Список документов': ['Заявление, паспорт, бизнес-план', 'Заявление, выписка из ЕГРИП', 'Заявление, документы на оборудование', 'Заявление, правоустанавливающие документы', 'Заявление, презентация проекта'],
-                'Контакты': ['support@business.ru', 'grant@ip-center.ru', 'credit@bank-support.ru', 'agro@ministry.ru', 'startup@gov.ru'],
-                'Срок подачи': ['до 31.12.2023', 'круглогодично', 'круглогодично', 'до 15.11.2023', 'до 01.12.2023'],
-                'Ссылка': ['https://example.com/1', 'https://example.com/2', 'https://example.com/3', 'https://example.com/4', 'https://example.com/5']
-            }
-            
-            df = pd.DataFrame(test_data)
+            df = self._get_sheets_loader(sheet_id, sheet_name).load()
             logger.info(f"Загружено {len(df)} записей из Google Sheets")
             return df
-            
+
         except Exception as e:
             logger.error(f"Ошибка при загрузке из Google Sheets: {e}")
-            # Возвращаем пустой датасет для продолжения работы
-            return pd.DataFrame()
-    
+            raise
+
     def load_from_local(self, filepath: str) -> pd.DataFrame:
         """
         Загрузка данных из локального файла
-        
+
         Args:
             filepath: путь к локальному файлу (xlsx, csv)
-            
+
         Returns:
             pandas DataFrame с данными
         """
         try:
             logger.info(f"Загрузка данных из локального файла: {filepath}")
-            
+
             if filepath.endswith('.xlsx'):
                 df = pd.read_excel(filepath)
             elif filepath.endswith('.csv'):
                 df = pd.read_csv(filepath)
             else:
                 raise ValueError(f"Неподдерживаемый формат файла: {filepath}")
-            
+
             logger.info(f"Загружено {len(df)} записей из локального файла")
             return df
-            
+
         except Exception as e:
             logger.error(f"Ошибка при загрузке из локального файла: {e}")
             raise
-    
+
+    def _read_source(self, **kwargs) -> pd.DataFrame:
+        """
+        Чтение сырых данных из настроенного источника
+
+        Returns:
+            pandas DataFrame с данными
+        """
+        if self.data_source == 'google_sheets':
+            sheet_id = kwargs.get('sheet_id')
+            sheet_name = kwargs.get('sheet_name', 'measures_sheet')
+            if not sheet_id:
+                logger.warning("Не указан sheet_id для Google Sheets, используем тестовые данные")
+                return self._create_test_dataset()
+            return self.load_from_google_sheets(sheet_id, sheet_name)
+
+        if self.data_source == 'local':
+            filepath = kwargs.get('filepath')
+            if not filepath:
+                logger.warning("Не указан filepath для локального файла, используем тестовые данные")
+                return self._create_test_dataset()
+            return self.load_from_local(filepath)
+
+        logger.warning(f"Неизвестный источник данных: {self.data_source}, используем тестовые данные")
+        return self._create_test_dataset()
+
+    def build_state(self, **kwargs) -> DatasetState:
+        """
+        Загрузка датасета и построение всех индексов без изменения текущего состояния
+
+        Метод не трогает опубликованное состояние, поэтому его можно выполнять
+        в фоновом потоке, пока обработчики читают предыдущую версию
+
+        Returns:
+            новый DatasetState (еще не опубликованный)
+        """
+        return self._attach_columns(self._assemble_state(**kwargs))
+
+    def _assemble_state(self, **kwargs) -> DatasetState:
+        """Загрузка из снапшота, потоковая, инкрементальная или полная сборка состояния"""
+        filepath = kwargs.get('filepath') if self.data_source == 'local' else None
+        source = file_fingerprint(filepath, with_hash=False) if filepath and os.path.exists(filepath) else {}
+
+        sheets = self.data_source == 'google_sheets' and bool(kwargs.get('sheet_id'))
+        if sheets:
+            state = self._unchanged_sheets_state(kwargs['sheet_id'], kwargs.get('sheet_name', 'measures_sheet'))
+            if state is not None:
+                return state
+
+        # Копия энкодера: обучение на новом корпусе не должно влиять на текущий индекс
+        encoder = copy.copy(self.encoder)
+
+        if filepath:
+            with LOAD_PHASE_SECONDS.labels('snapshot').time():
+                state = self._load_snapshot(filepath, source, encoder)
+            if state is not None:
+                return state
+
+        streaming = bool(filepath and self.stream_chunk_size)
+        if streaming and self._state is None:
+            # Первая загрузка: индексы строятся по мере чтения частей файла
+            with LOAD_PHASE_SECONDS.labels('streaming').time():
+                state = self._build_streaming(filepath, source, encoder)
+            state = self._with_similar(state)
+            self._save_snapshot(filepath, state)
+            return state
+
+        # Проверяем и очищаем данные
+        if streaming:
+            with LOAD_PHASE_SECONDS.labels('read').time():
+                dataset = self._read_streaming(filepath)
+        else:
+            with LOAD_PHASE_SECONDS.labels('read').time():
+                raw = self._read_source(**kwargs)
+            with LOAD_PHASE_SECONDS.labels('clean').time():
+                dataset = self._clean_and_validate(raw)
+        if sheets:
+            source = self._sheets_source()
+
+        # Анализируем колонки
+        with LOAD_PHASE_SECONDS.labels('analyze').time():
+            columns_info = self._analyze_columns(dataset)
+            hashes = row_hashes(dataset)
+
+        # Пробуем обновить индексы только для изменившихся строк
+        with LOAD_PHASE_SECONDS.labels('incremental').time():
+            state = self._build_incremental(self._state, dataset, columns_info, hashes, source)
+        if state is not None:
+            if filepath and not state.delta.is_empty:
+                self._save_snapshot(filepath, state)
+            return state
+
+        # Строим поисковые индексы
+        with LOAD_PHASE_SECONDS.labels('index').time():
+            search_engine = self._build_search_index(dataset, columns_info)
+        with LOAD_PHASE_SECONDS.labels('embeddings').time():
+            embedding_index = self._build_embedding_index(dataset, search_engine, encoder)
+
+        state = DatasetState(
+            dataset=dataset,
+            columns_info=columns_info,
+            search_engine=search_engine,
+            embedding_index=embedding_index,
+            last_loaded=datetime.now(),
+            source=source,
+            row_hashes=hashes,
+        )
+
+        if filepath:
+            # Граф строится до записи снапшота, чтобы перезапуск его не пересчитывал
+            state = self._with_similar(state)
+            self._save_snapshot(filepath, state)
+
+        return state
+
+    def publish(self, state: DatasetState) -> DatasetState:
+        """
+        Атомарная публикация нового состояния (одно присваивание ссылки)
+
+        Args:
+            state: построенное состояние
+
+        Returns:
+            опубликованное состояние с увеличенным номером версии
+        """
+        previous = self._state
+        delta = state.delta
+        if delta is None:
+            self.refresh_counters['full_rebuilds'] += 1
+        elif delta.is_empty:
+            self.refresh_counters['unchanged_reloads'] += 1
+        else:
+            self.refresh_counters['incremental_updates'] += 1
+            for name in ('added', 'changed', 'removed', 'relocated'):
+                self.refresh_counters[f'rows_{name}'] += getattr(delta, name)
+
+        # Без изменений номер версии сохраняется (кэши остаются валидными)
+        unchanged = previous is not None and delta is not None and delta.is_empty
+        state = replace(state, version=previous.version if unchanged else (previous.version + 1 if previous else 1))
+        self._state = state
+        logger.info(f"Опубликована версия датасета {state.version}. Записей: {state.size}")
+        return state
+
     def load_dataset(self, **kwargs) -> bool:
         """
         Основной метод загрузки датасета
-        
+
         Returns:
             True если загрузка успешна, False в противном случае
         """
         try:
-            if self.data_source == 'google_sheets':
-                sheet_id = kwargs.get('sheet_id')
-                sheet_name = kwargs.get('sheet_name', 'measures_sheet')
-                if not sheet_id:
-                    logger.warning("Не указан sheet_id для Google Sheets, используем тестовые данные")
-                    self.dataset = self._create_test_dataset()
-                else:
-                    self.dataset = self.load_from_google_sheets(sheet_id, sheet_name)
-            
-            elif self.data_source == 'local':
-                filepath = kwargs.get('filepath')
-                if not filepath:
-                    logger.warning("Не указан filepath для локального файла, используем тестовые данные")
-                    self.dataset = self._create_test_dataset()
-                else:
-                    self.dataset = self.load_from_local(filepath)
-            
-            else:
-                logger.warning(f"Неизвестный источник данных: {self.data_source}, используем тестовые данные")
-                self.dataset = self._create_test_dataset()
-            
-            # Проверяем и очищаем данные
-            self._clean_and_validate()
-            
-            # Анализируем колонки
-            self._analyze_columns()
-            
-            self.last_loaded = datetime.now()
-            logger.info(f"Датасет успешно загружен. Записей: {len(self.dataset)}, колонок: {len(self.dataset.columns)}")
-            
+            state = self.publish(self.build_state(**kwargs))
+            logger.info(f"Датасет успешно загружен. Записей: {state.size}, колонок: {len(state.columns.columns)}")
             return True
-            
+
         except Exception as e:
             logger.error(f"Ошибка при загрузке датасета: {e}")
             return False
-    
+
+    def _sheets_source(self) -> Dict[str, Any]:
+        """Отпечаток источника Google Sheets: лист и ревизия загруженных данных"""
+        loader = self.sheets_loader
+        revision = loader.revision or {}
+        return {
+            'sheet_id': loader.sheet_id,
+            'sheet_name': loader.sheet_name,
+            'version': revision.get('version'),
+            'modified_time': revision.get('modified_time'),
+        }
+
+    def _unchanged_sheets_state(self, sheet_id: str, sheet_name: str) -> Optional[DatasetState]:
+        """
+        Текущее состояние с пустой дельтой, если ревизия таблицы не изменилась
+
+        Стоит одного запроса к Drive API: данные не читаются и не очищаются,
+        индексы не пересчитываются
+        """
+        previous = self._state
+        if (
+            previous is None
+            or previous.source.get('sheet_id') != sheet_id
+            or previous.source.get('sheet_name') != sheet_name
+            or not previous.source.get('version')
+        ):
+            return None
+        try:
+            revision = self._get_sheets_loader(sheet_id, sheet_name).fetch_revision()
+        except Exception as e:
+            logger.warning(f"Не удалось проверить ревизию Google Sheets: {e}")
+            return None
+        if revision['version'] != previous.source['version']:
+            return None
+        logger.info(f"Google Sheets не изменилась (версия {revision['version']}), перестроение не требуется")
+        return replace(previous, last_loaded=datetime.now(), delta=DatasetDelta(size=previous.size))
+
+    def source_changed(self, **kwargs) -> bool:
+        """
+        Проверка, изменился ли источник с момента последней загрузки
+
+        Для локального файла сравниваются размер и mtime, для Google Sheets -
+        ревизия файла в Drive API; для остальных источников изменения
+        не отслеживаются (обновление по интервалу)
+        """
+        state = self._state
+        if self.data_source == 'google_sheets' and kwargs.get('sheet_id'):
+            if state is None:
+                return True
+            return self._get_sheets_loader(kwargs['sheet_id'], kwargs.get('sheet_name', 'measures_sheet')).changed()
+
+        filepath = kwargs.get('filepath')
+        if self.data_source != 'local' or not filepath or not os.path.exists(filepath):
+            return False
+        if state is None:
+            return True
+
+        current = file_fingerprint(filepath, with_hash=False)
+        return (current['size'], current['mtime_ns']) != (state.source.get('size'), state.source.get('mtime_ns'))
+
+    def _read_streaming(self, filepath: str) -> pd.DataFrame:
+        """Потоковое чтение и очистка файла без построения индексов"""
+        stats = IngestStats()
+        chunks = list(iter_clean_chunks(filepath, self.stream_chunk_size, stats))
+        self._log_ingest_stats(stats)
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+    def _build_streaming(self, filepath: str, source: Dict[str, Any], encoder: BaseEncoder) -> DatasetState:
+        """
+        Потоковая загрузка: каждая часть файла очищается и индексируется сразу
+        после чтения, поэтому сырые данные целиком в памяти не держатся
+
+        Args:
+            filepath: путь к файлу
+            source: отпечаток исходного файла
+            encoder: энкодер для индекса эмбеддингов
+
+        Returns:
+            новый DatasetState
+        """
+        stats = IngestStats()
+        chunks = []
+        search_builder = embedding_builder = None
+        fields: List[str] = []
+
+        for chunk in iter_clean_chunks(filepath, self.stream_chunk_size, stats):
+            if search_builder is None:
+                # Поисковые поля определяем по первой части
+                text_columns = self._analyze_columns(chunk)['text_columns']
+                fields = [col for col in FIELD_WEIGHTS if col in text_columns] or text_columns
+                search_builder = SearchIndexBuilder(fields)
+                embedding_builder = EmbeddingIndexBuilder(encoder, self.embedding_backend)
+
+            search_builder.add_records(dataframe_records(chunk, fields))
+            embedding_builder.add_texts(self._document_texts(chunk, fields))
+            chunks.append(chunk)
+
+        if search_builder is None:
+            raise ValueError(f"Файл не содержит данных: {filepath}")
+
+        dataset = pd.concat(chunks, ignore_index=True)
+        del chunks
+        search_engine = search_builder.finish()
+        embedding_index = embedding_builder.finish()
+        self._log_ingest_stats(stats)
+
+        return DatasetState(
+            dataset=dataset,
+            columns_info=self._analyze_columns(dataset),
+            search_engine=search_engine,
+            embedding_index=embedding_index,
+            last_loaded=datetime.now(),
+            source=source,
+            row_hashes=row_hashes(dataset),
+        )
+
+    def _attach_columns(self, state: DatasetState) -> DatasetState:
+        """
+        Построение типизированных колонок, фасетов, индекса опечаток и индекса id; в компактном
+        режиме DataFrame отбрасывается, а названия и описания в поисковом индексе заменяются
+        упакованными строками. Инкрементальное обновление приходит с уже обновленными колонками
+        """
+        if state.columns is None:
+            state = self._with_similar(state)
+            columns = ColumnStore.from_dataframe(state.dataset, pack_text=self.compact_storage)
+            facets = FacetIndex.from_columns(columns)
+            with LOAD_PHASE_SECONDS.labels('spelling').time():
+                spelling = self._spelling_index(state.search_engine.postings)
+            with LOAD_PHASE_SECONDS.labels('answer_cards').time():
+                answer_cards = self._build_answer_cards(state)
+            with LOAD_PHASE_SECONDS.labels('id_index').time():
+                id_index = {}
+                for position, measure_id in enumerate(state.search_engine.doc_ids):
+                    for key in id_keys(measure_id):
+                        id_index[key] = position
+            state = replace(
+                state, columns=columns, facets=facets, spelling=spelling, answer_cards=answer_cards, id_index=id_index
+            )
+        if not self.compact_storage or state.dataset is None:
+            return state
+
+        engine, columns = state.search_engine, state.columns
+        for attribute, name in (('titles', 'Название'), ('descriptions', 'Описание')):
+            values = columns.shared_values(name)
+            if values is not None and len(values) == engine.size:
+                setattr(engine, attribute, values)
+
+        report = columns.memory_report()
+        logger.info(
+            f"Компактное хранение датасета: {report['dataframe_bytes'] / 2**20:.1f} МБ -> "
+            f"{report['compact_bytes'] / 2**20:.1f} МБ"
+        )
+        return replace(state, dataset=None)
+
+    def _spelling_index(self, postings: Dict[str, Any]) -> SpellingIndex:
+        """Индекс опечаток; индекс текущего состояния переиспользуется, если словарь термов не изменился"""
+        current = self._state.spelling if self._state else None
+        if current is not None and current.term_ids.keys() == postings.keys():
+            return current.apply_changes(postings, postings)
+        return SpellingIndex.from_postings(postings)
+
+    @staticmethod
+    def _rows(state: DatasetState, positions: List[int]) -> pd.DataFrame:
+        """Строки версии по позициям (в компактном режиме восстанавливаются только эти строки)"""
+        if state.dataset is not None:
+            return state.dataset.iloc[positions].reset_index(drop=True)
+        return state.columns.to_frame(positions)
+
+    @staticmethod
+    def _build_answer_cards(state: DatasetState) -> AnswerCards:
+        """Карточки ответов по колонкам INTENT_FIELDS (до того как компактный режим отбросит DataFrame)"""
+        engine = state.search_engine
+        return AnswerCards.build(engine.titles, engine.descriptions, DatasetManager._answer_fields(state.dataset))
+
+    @staticmethod
+    def _answer_fields(dataset: pd.DataFrame) -> Dict[str, Optional[List[Any]]]:
+        """Значения колонок INTENT_FIELDS (None - колонки нет в датасете)"""
+        return {column: dataset[column].tolist() if column in dataset.columns else None for column in INTENT_FIELDS.values()}
+
+    @staticmethod
+    def _category_codes(dataset: pd.DataFrame) -> Optional[np.ndarray]:
+        """Коды категорий мер для графа похожих мер (-1 - категории нет)"""
+        if CATEGORY_FACET not in dataset.columns:
+            return None
+        return pd.factorize(dataset[CATEGORY_FACET])[0]
+
+    def _with_similar(self, state: DatasetState) -> DatasetState:
+        """Состояние с графом похожих мер (граф из снапшота используется, если построен с тем же k)"""
+        similar = state.similar
+        if not self.similar_k:
+            return replace(state, similar=None) if similar is not None else state
+        if similar is not None and similar.k == self.similar_k and similar.size == state.search_engine.size:
+            return state
+        with LOAD_PHASE_SECONDS.labels('similar').time():
+            similar = SimilarityGraph.build(
+                state.embedding_index.matrix, self._category_codes(state.dataset), self.similar_k, self.similar_threads
+            )
+        return replace(state, similar=similar)
+
+    @staticmethod
+    def _memory_report(state: DatasetState) -> Dict[str, Any]:
+        """Отчет о памяти датасета для статистики"""
+        report = state.columns.memory_report()
+        report['mode'] = 'compact' if state.dataset is None else 'dataframe'
+        return report
+
+    def _log_ingest_stats(self, stats: IngestStats):
+        """Сохранение и логирование статистики потоковой загрузки"""
+        self.last_ingest_stats = stats.as_dict()
+        logger.info(
+            f"Потоковая загрузка: {stats.rows} строк, {stats.chunks} частей, "
+            f"{stats.rows_per_second:.0f} строк/с, пик памяти {stats.peak_rss_mb} МБ"
+        )
+
+    def _build_incremental(
+        self,
+        previous: Optional[DatasetState],
+        dataset: pd.DataFrame,
+        columns_info: Dict[str, Any],
+        hashes: np.ndarray,
+        source: Dict[str, Any],
+    ) -> Optional[DatasetState]:
+        """
+        Инкрементальное обновление индексов по изменившимся строкам (ключ - id)
+
+        Returns:
+            новое состояние или None, если нужна полная перестройка
+        """
+        if previous is None or previous.row_hashes is None or previous.columns is None or ID_COLUMN not in dataset.columns:
+            return None
+        if columns_info['column_types'] != previous.columns_info.get('column_types'):
+            return None
+
+        # Сравнение с хешами опубликованной версии: ее DataFrame не восстанавливается
+        old_engine = previous.search_engine
+        delta = diff_datasets(old_engine.doc_ids, previous.row_hashes, dataset[ID_COLUMN].tolist(), hashes)
+        if delta is None or delta.touched > INCREMENTAL_MAX_FRACTION * max(previous.size, 1):
+            return None
+
+        if delta.is_empty:
+            return replace(previous, source=source, last_loaded=datetime.now(), delta=delta)
+
+        # Новая версия в раскладке delta: каждая позиция - строка прочитанного датасета
+        new_dataset = dataset.iloc[delta.order].reset_index(drop=True)
+        new_hashes = hashes[delta.order]
+        changed_positions = sorted(delta.new_rows)
+        changed_rows = new_dataset.iloc[changed_positions]
+
+        # Колонки и фасеты: переносятся массивы, разбираются только новые строки
+        columns = previous.columns.apply_changes(delta, changed_rows)
+        facets = previous.facets.apply_changes(columns, delta)
+
+        fields = [c for c in dict.fromkeys([ID_COLUMN, 'Название', 'Описание', *old_engine.fields]) if c in dataset.columns]
+        vacated = sorted(delta.vacated)
+        removed = dict(zip(vacated, self._rows(previous, vacated)[fields].to_dict('records')))
+        occupied = sorted([*delta.new_rows, *delta.moved])
+        added = dict(zip(occupied, new_dataset.iloc[occupied][fields].to_dict('records')))
+
+        titles = descriptions = None
+        if self.compact_storage:
+            titles, descriptions = columns.shared_values('Название'), columns.shared_values('Описание')
+        search_engine = old_engine.apply_changes(removed, added, delta.size, titles=titles, descriptions=descriptions)
+        if search_engine.size and old_engine.avg_doc_length:
+            drift = abs(sum(search_engine.doc_lengths) / search_engine.size - old_engine.avg_doc_length)
+            if drift > AVG_LENGTH_MAX_DRIFT * old_engine.avg_doc_length:
+                logger.info("Средняя длина документа заметно изменилась, выполняем полную перестройку")
+                return None
+
+        texts = self._document_texts(changed_rows, old_engine.fields)
+        embedding_index = previous.embedding_index.apply_changes(dict(zip(changed_positions, texts)), delta.moved, delta.size)
+
+        # Граф похожих мер: пересчитываются строки затронутых мер и их бывших соседей
+        similar = None
+        if previous.similar is not None and previous.similar.k == self.similar_k:
+            with LOAD_PHASE_SECONDS.labels('similar').time():
+                similar = previous.similar.apply_changes(
+                    delta, embedding_index.matrix, self._category_codes(new_dataset), self.similar_threads
+                )
+
+        # Индекс id: правятся только позиции, покинутые и занятые обновлением
+        id_index = dict(previous.id_index)
+        for position in vacated:
+            for key in id_keys(old_engine.doc_ids[position]):
+                id_index.pop(key, None)
+        for position in occupied:
+            for key in id_keys(search_engine.doc_ids[position]):
+                id_index[key] = position
+
+        state = self._with_similar(
+            DatasetState(
+                dataset=new_dataset,
+                columns_info=columns_info,
+                search_engine=search_engine,
+                embedding_index=embedding_index,
+                last_loaded=datetime.now(),
+                source=source,
+                row_hashes=new_hashes,
+                delta=delta,
+                columns=columns,
+                facets=facets,
+                similar=similar,
+                id_index=id_index,
+            )
+        )
+        # Индекс опечаток правится только по термам, чьи постинги изменились
+        with LOAD_PHASE_SECONDS.labels('spelling').time():
+            spelling = previous.spelling.apply_changes(search_engine.postings, search_engine.changed_terms)
+        # Карточки ответов рендерятся только для добавленных и измененных мер
+        with LOAD_PHASE_SECONDS.labels('answer_cards').time():
+            answer_cards = previous.answer_cards.apply_changes(
+                delta,
+                [search_engine.titles[position] for position in changed_positions],
+                [search_engine.descriptions[position] for position in changed_positions],
+                self._answer_fields(changed_rows),
+            )
+
+        logger.info(f"Инкрементальное обновление датасета: {delta.counters()}")
+        return replace(state, spelling=spelling, answer_cards=answer_cards)
+
+    def _load_snapshot(self, filepath: str, source: Dict[str, Any], encoder: BaseEncoder) -> Optional[DatasetState]:
+        """
+        Загрузка датасета и индексов из снапшота, если исходный файл не менялся
+
+        Args:
+            filepath: путь к исходному файлу
+            source: отпечаток исходного файла (без хеша)
+            encoder: энкодер, в который восстанавливается состояние
+
+        Returns:
+            DatasetState если снапшот актуален и загружен, иначе None
+        """
+        if not self.snapshot_dir or not source:
+            return None
+
+        store = IndexStore(self.snapshot_dir)
+        try:
+            if not store.is_fresh(source, encoder, self.embedding_backend):
+                return None
+            snapshot = store.load(encoder)
+        except Exception as e:
+            logger.warning(f"Не удалось загрузить снапшот индексов: {e}")
+            return None
+
+        logger.info(f"Датасет загружен из снапшота {store.path}. Записей: {len(snapshot.dataset)}")
+        return DatasetState(
+            dataset=snapshot.dataset,
+            columns_info=snapshot.columns_info,
+            search_engine=snapshot.search_engine,
+            embedding_index=snapshot.embedding_index,
+            last_loaded=datetime.now(),
+            source=source,
+            row_hashes=row_hashes(snapshot.dataset),
+            similar=snapshot.similar,
+        )
+
+    def export_snapshot(self, snapshot_dir: str) -> bool:
+        """
+        Запись опубликованного состояния в снапшот независимо от источника данных
+
+        Используется процессом-диспетчером: рабочие процессы поднимают
+        датасет из этого снапшота, а не загружают источник каждый сам
+
+        Args:
+            snapshot_dir: каталог снапшота
+
+        Returns:
+            True если снапшот записан
+        """
+        state = self._state
+        if state is None:
+            return False
+        try:
+            IndexStore(snapshot_dir).save(
+                state.source,
+                state.frame,
+                state.columns_info,
+                state.search_engine,
+                state.embedding_index,
+                state.similar,
+            )
+        except Exception as e:
+            logger.error(f"Не удалось записать снапшот для рабочих процессов: {e}")
+            return False
+        return True
+
+    def build_snapshot_state(self, snapshot_dir: str) -> DatasetState:
+        """
+        Состояние из готового снапшота без обращения к источнику и проверки актуальности
+
+        Массивы индексов отображаются в память, поэтому процессы, загрузившие
+        один снапшот, разделяют страницы page cache. Как и build_state,
+        метод не меняет опубликованное состояние
+
+        Args:
+            snapshot_dir: каталог снапшота
+
+        Returns:
+            новый DatasetState (еще не опубликованный)
+        """
+        store = IndexStore(snapshot_dir)
+        snapshot = store.load(copy.copy(self.encoder))
+        manifest = store.read_manifest() or {}
+        logger.info(f"Датасет загружен из снапшота {store.path}. Записей: {len(snapshot.dataset)}")
+        # Хеши строк не считаются: рабочий процесс не строит инкрементальных обновлений
+        return self._attach_columns(
+            DatasetState(
+                dataset=snapshot.dataset,
+                columns_info=snapshot.columns_info,
+                search_engine=snapshot.search_engine,
+                embedding_index=snapshot.embedding_index,
+                last_loaded=datetime.now(),
+                source=manifest.get('source', {}),
+                similar=snapshot.similar,
+            )
+        )
+
+    def load_snapshot(self, snapshot_dir: str) -> bool:
+        """
+        Загрузка и публикация датасета из снапшота, записанного export_snapshot
+
+        Returns:
+            True если загрузка успешна, False в противном случае
+        """
+        try:
+            self.publish(self.build_snapshot_state(snapshot_dir))
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке снапшота {snapshot_dir}: {e}")
+            return False
+
+    def _save_snapshot(self, filepath: str, state: DatasetState):
+        """Сохранение снапшота после успешной загрузки (ошибки не прерывают работу)"""
+        if not self.snapshot_dir:
+            return
+
+        try:
+            IndexStore(self.snapshot_dir).save(
+                file_fingerprint(filepath),
+                state.frame,
+                state.columns_info,
+                state.search_engine,
+                state.embedding_index,
+                state.similar,
+            )
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить снапшот индексов: {e}")
+
     def _create_test_dataset(self) -> pd.DataFrame:
         """Создание тестового датасета для разработки"""
         logger.info("Создание тестового датасета")
-        
+
         test_data = {
             'id': list(range(1, 11)),
             'Название': [f'Тестовая мера поддержки {i}' for i in range(1, 11)],
             'Описание': [f'Описание тестовой меры поддержки {i} для разработки' for i in range(1, 11)],
-            'Категория': ['Финансы', 'Инновации', 'Экспорт', 'Финансы', 'Инновации', 
-                         'Сельское хозяйство', 'Экспорт', 'Финансы', 'Инновации', 'Образование'],
-            'Размер поддержки': ['до 1 млн руб.', 'до 3 млн руб.', 'до 5 млн руб.', 
-                                'до 2 млн руб.', 'до 4 млн руб.', 'индивидуально',
-                                'до 6 млн руб.', 'до 1.5 млн руб.', 'до 3.5 млн руб.', 'до 800 тыс. руб.'],
-            'Статус': ['Активна', 'Активна', 'Завершена', 'Активна', 'Активна',
-                      'Активна', 'Активна', 'Завершена', 'Активна', 'Активна']
+            'Категория': [
+                'Финансы',
+                'Инновации',
+                'Экспорт',
+                'Финансы',
+                'Инновации',
+                'Сельское хозяйство',
+                'Экспорт',
+                'Финансы',
+                'Инновации',
+                'Образование',
+            ],
+            'Размер поддержки': [
+                'до 1 млн руб.',
+                'до 3 млн руб.',
+                'до 5 млн руб.',
+                'до 2 млн руб.',
+                'до 4 млн руб.',
+                'индивидуально',
+                'до 6 млн руб.',
+                'до 1.5 млн руб.',
+                'до 3.5 млн руб.',
+                'до 800 тыс. руб.',
+            ],
+            'Статус': [
+                'Активна',
+                'Активна',
+                'Завершена',
+                'Активна',
+                'Активна',
+                'Активна',
+                'Активна',
+                'Завершена',
+                'Активна',
+                'Активна',
+            ],
         }
-        
+
         return pd.DataFrame(test_data)
-    
-    def _clean_and_validate(self):
-        """Очистка и валидация данных"""
-        if self.dataset is None or self.dataset.empty:
+
+    def _clean_and_validate(self, dataset: pd.DataFrame) -> pd.DataFrame:
+        """
+        Очистка и валидация данных
+
+        Args:
+            dataset: сырой датасет
+
+        Returns:
+            очищенная копия датасета
+        """
+        if dataset is None or dataset.empty:
             logger.warning("Датасет пустой")
-            return
-        
-        # Удаляем полностью пустые строки
-        initial_count = len(self.dataset)
-        self.dataset = self.dataset.dropna(how='all')
-        
-        # Заполняем пропущенные значения в важных колонках
-        if 'Название' in self.dataset.columns:
-            self.dataset['Название'] = self.dataset['Название'].fillna('Без названия')
-        
-        if 'Описание' in self.dataset.columns:
-            self.dataset['Описание'] = self.dataset['Описание'].fillna('Нет описания')
-        
-        cleaned_count = len(self.dataset)
-        if cleaned_count < initial_count:
-            logger.info(f"Удалено {initial_count - cleaned_count} пустых строк")
-    
-    def _analyze_columns(self):
+            return dataset if dataset is not None else pd.DataFrame()
+
+        # Удаляем полностью пустые строки и заполняем пропуски в важных колонках
+        dataset, dropped_count = clean_chunk(dataset)
+        dataset = dataset.reset_index(drop=True)
+
+        if dropped_count:
+            logger.info(f"Удалено {dropped_count} пустых строк")
+
+        return dataset
+
+    def _analyze_columns(self, dataset: pd.DataFrame) -> Dict[str, Any]:
         """Анализ структуры колонок датасета"""
-        if self.dataset is None:
-            return
-        
-        self.columns_info = {
-            'total_columns': len(self.dataset.columns),
-            'total_rows': len(self.dataset),
-            'column_names': list(self.dataset.columns),
-            'column_types': {col: str(self.dataset[col].dtype) for col in self.dataset.columns},
-            'text_columns': [col for col in self.dataset.columns 
-                           if self.dataset[col].dtype == 'object' and col not in ['id']]
+        columns_info = {
+            'total_columns': len(dataset.columns),
+            'total_rows': len(dataset),
+            'column_names': list(dataset.columns),
+            'column_types': {col: str(dataset[col].dtype) for col in dataset.columns},
+            'text_columns': [col for col in dataset.columns if dataset[col].dtype == 'object' and col not in ['id']],
         }
-        
-        logger.info(f"Колонки датасета: {self.columns_info['column_names']}")
-        logger.info(f"Текстовые колонки для поиска: {self.columns_info['text_columns']}")
-    
+
+        logger.info(f"Колонки датасета: {columns_info['column_names']}")
+        logger.info(f"Текстовые колонки для поиска: {columns_info['text_columns']}")
+        return columns_info
+
+    def _build_search_index(self, dataset: pd.DataFrame, columns_info: Dict[str, Any]) -> SearchEngine:
+        """Построение инвертированного индекса по текстовым колонкам"""
+        text_columns = columns_info.get('text_columns', [])
+        # Индексируем основные поля, а если их нет - все текстовые колонки
+        search_fields = [col for col in FIELD_WEIGHTS if col in text_columns] or text_columns
+        return SearchEngine.from_dataframe(dataset, search_fields)
+
+    @staticmethod
+    def _document_texts(dataset: pd.DataFrame, fields: List[str]) -> List[str]:
+        """Тексты документов для эмбеддингов: поисковые поля через точку"""
+        fields = [col for col in fields if col in dataset.columns]
+        if not fields or dataset.empty:
+            return [''] * len(dataset)
+
+        return dataset[fields].fillna('').astype(str).agg('. '.join, axis=1).tolist()
+
+    def _build_embedding_index(
+        self, dataset: pd.DataFrame, search_engine: SearchEngine, encoder: BaseEncoder
+    ) -> EmbeddingIndex:
+        """Построение матрицы эмбеддингов для семантического поиска"""
+        texts = self._document_texts(dataset, search_engine.fields)
+        return EmbeddingIndex.build(texts, encoder, self.embedding_backend)
+
+    @staticmethod
+    def make_results(state: DatasetState, hits: List[tuple]) -> List[Dict[str, Any]]:
+        """Преобразование (позиция, оценка) в словари результатов для обработчиков"""
+        engine = state.search_engine
+        return [
+            {
+                'id': engine.doc_ids[position],
+                'title': engine.titles[position],
+                'description': engine.descriptions[position],
+                'match_score': score,
+            }
+            for position, score in hits
+        ]
+
+    def results_by_ids(self, items: List[tuple]) -> List[Dict[str, Any]]:
+        """
+        Восстановление результатов поиска по сохраненным (id, оценка): O(1) на меру по индексу id
+
+        Args:
+            items: пары (id меры, оценка)
+
+        Returns:
+            результаты текущей версии датасета; меры, удаленные из датасета, пропускаются
+        """
+        state = self._state
+        if state is None:
+            return []
+        positions = state.id_index
+        return self.make_results(state, [(positions[doc_id], score) for doc_id, score in items if doc_id in positions])
+
+    def answer_card(self, measure_id: Any, intents: Sequence[str] = ()) -> Optional[str]:
+        """
+        Готовый ответ по мере из карточек текущей версии датасета
+
+        Args:
+            measure_id: id меры
+            intents: разделы карточки (route_question); пусто - обзорная карточка
+
+        Returns:
+            текст ответа (Markdown) или None, если меры нет в датасете
+        """
+        state = self._state
+        if state is None or state.answer_cards is None:
+            return None
+        position = state.id_index.get(measure_id)
+        if position is None:
+            return None
+        if not intents:
+            return state.answer_cards.overview(position)
+        return state.answer_cards.answer(position, intents)
+
+    def similar_measures(self, measure_id: Any, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Похожие меры из графа текущей версии датасета (O(k), без поиска по каталогу)
+
+        Args:
+            measure_id: id меры
+            limit: максимум мер (None - все соседи графа)
+
+        Returns:
+            результаты в формате search (match_score - похожесть); пусто, если меры нет или граф не построен
+        """
+        state = self._state
+        if state is None or state.similar is None:
+            return []
+        position = state.id_index.get(measure_id)
+        if position is None:
+            return []
+        return self.make_results(state, state.similar.related(position, limit))
+
+    @staticmethod
+    def filter_mask(state: DatasetState, filters: Optional[FacetFilter]) -> Optional[np.ndarray]:
+        """Маска фасетного фильтра для состояния (None - без фильтра)"""
+        if filters is None or filters.is_empty or state.facets is None:
+            return None
+        return state.facets.mask(filters)
+
+    @staticmethod
+    def _cache_key(kind: str, query: str, top_k: int, filters: Optional[FacetFilter]) -> tuple:
+        """Ключ кэша: вид поиска, нормализованный запрос, top_k и активные фильтры"""
+        return kind, normalize_query(query), top_k, filters if filters is not None and not filters.is_empty else None
+
+    def search(self, query: str, top_k: int = 5, filters: Optional[FacetFilter] = None) -> List[Dict[str, Any]]:
+        """
+        Поиск мер поддержки по текстовому запросу
+
+        Сначала используется BM25 (слова с опечатками заменяются исправлениями
+        из словаря индекса); если совпадений по словам нет, выполняется
+        семантический поиск по эмбеддингам
+
+        Args:
+            query: запрос пользователя
+            top_k: максимальное количество результатов
+            filters: фасетный фильтр (категория, статус, сумма, срок)
+
+        Returns:
+            список результатов с ключами id, title, description, match_score
+        """
+        # Одна ссылка на состояние на весь запрос: перезагрузка не смешает версии
+        state = self._state
+        if state is None:
+            return []
+
+        # Повторяющиеся запросы обслуживаются из кэша текущей версии датасета
+        key = self._cache_key('search', query, top_k, filters)
+        results = self.query_cache.get(state.version, key)
+        if results is not None:
+            _CACHE_HIT.inc()
+            return results
+        _CACHE_MISS.inc()
+
+        hits = self._search_hits(state, query, top_k, filters)
+        with _RESULTS.time():
+            results = self.make_results(state, hits)
+
+        self.query_cache.put(state.version, key, results)
+        return results
+
+    def search_ids(self, query: str, top_k: int = 5, filters: Optional[FacetFilter] = None) -> List[Tuple[Any, float]]:
+        """
+        Поиск как search, но результат - ранжированные пары (id меры, оценка)
+
+        Для постраничного показа: хранится только массив id, а страница
+        восстанавливается через results_by_ids, поэтому длинный список
+        результатов не материализуется целиком
+
+        Returns:
+            пары (id, оценка округленная до 4 знаков) по убыванию оценки
+        """
+        state = self._state
+        if state is None:
+            return []
+
+        key = self._cache_key('ids', query, top_k, filters)
+        ranked = self.query_cache.get(state.version, key)
+        if ranked is not None:
+            _CACHE_HIT.inc()
+            return ranked
+        _CACHE_MISS.inc()
+
+        doc_ids = state.search_engine.doc_ids
+        ranked = [
+            (doc_ids[position], round(float(score), 4)) for position, score in self._search_hits(state, query, top_k, filters)
+        ]
+        self.query_cache.put(state.version, key, ranked)
+        return ranked
+
+    def _search_hits(
+        self, state: DatasetState, query: str, top_k: int, filters: Optional[FacetFilter]
+    ) -> List[Tuple[int, float]]:
+        """BM25 с исправлением опечаток, без совпадений по словам - эмбеддинги; пары (позиция, оценка)"""
+        mask = self.filter_mask(state, filters)
+        if mask is not None and not mask.any():
+            return []
+        with _BM25.time():
+            hits = state.search_engine.search(query, top_k, mask, state.spelling)
+        if not hits:
+            with _SEMANTIC.time():
+                hits = state.embedding_index.search(query, top_k, mask)
+        return hits
+
+    def semantic_search(self, query: str, top_k: int = 5, filters: Optional[FacetFilter] = None) -> List[Dict[str, Any]]:
+        """
+        Семантический поиск мер поддержки по эмбеддингам
+
+        Args:
+            query: запрос пользователя
+            top_k: максимальное количество результатов
+            filters: фасетный фильтр
+
+        Returns:
+            список результатов с ключами id, title, description, match_score
+        """
+        state = self._state
+        if state is None:
+            return []
+
+        key = self._cache_key('semantic', query, top_k, filters)
+        results = self.query_cache.get(state.version, key)
+        if results is not None:
+            _CACHE_HIT.inc()
+            return results
+        _CACHE_MISS.inc()
+
+        mask = self.filter_mask(state, filters)
+        if mask is not None and not mask.any():
+            results = []
+        else:
+            with _SEMANTIC.time():
+                hits = state.embedding_index.search(query, top_k, mask)
+            with _RESULTS.time():
+                results = self.make_results(state, hits)
+
+        self.query_cache.put(state.version, key, results)
+        return results
+
+    def rerank_batch(
+        self, queries: List[str], top_k: int = 5, filters: Optional[FacetFilter] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Гибридный поиск с переранжированием для пачки запросов (BM25 + эмбеддинги)
+
+        Args:
+            queries: запросы
+            top_k: максимальное количество результатов на запрос
+            filters: фасетный фильтр, общий для всей пачки
+
+        Returns:
+            для каждого запроса список результатов с ключами id, title, description, match_score
+        """
+        state = self._state
+        if state is None:
+            return [[] for _ in queries]
+
+        mask = self.filter_mask(state, filters)
+        if mask is not None and not mask.any():
+            return [[] for _ in queries]
+        with SEARCH_STAGE_SECONDS.labels('rerank_batch').time():
+            hits = rerank_batch(state.search_engine, state.embedding_index, queries, top_k, mask=mask, spelling=state.spelling)
+        return [self.make_results(state, query_hits) for query_hits in hits]
+
+    def facet_counts(self, filters: Optional[FacetFilter] = None) -> Dict[str, Any]:
+        """
+        Счетчики фасетов среди мер, проходящих фильтр
+
+        Args:
+            filters: фасетный фильтр (None - весь датасет)
+
+        Returns:
+            словарь счетчиков (см. FacetIndex.facet_counts), пустой если датасет не загружен
+        """
+        state = self._state
+        if state is None or state.facets is None:
+            return {}
+
+        return state.facets.facet_counts(self.filter_mask(state, filters))
+
+    def facet_values(self, facet: str) -> List[str]:
+        """Значения фасета (категории, статусы) в порядке кодов"""
+        state = self._state
+        if state is None or state.facets is None:
+            return []
+        return list(state.facets.values.get(facet, []))
+
     def get_dataset_info(self) -> Dict[str, Any]:
         """Получение информации о загруженном датасете"""
-        if self.dataset is None:
+        state = self._state
+        if state is None:
             return {'status': 'not_loaded', 'message': 'Датасет не загружен'}
-        
+
         return {
             'status': 'loaded',
-            'rows': len(self.dataset),
-            'columns': len(self.dataset.columns),
-            'last_loaded': self.last_loaded.isoformat() if self.last_loaded else None,
-            'columns_info': self.columns_info
+            'rows': state.size,
+            'columns': len(state.columns.columns),
+            'last_loaded': state.last_loaded.isoformat(),
+            'version': state.version,
+            'last_refresh': state.delta.counters() if state.delta else None,
+            'refresh_counters': dict(self.refresh_counters),
+            'ingest': self.last_ingest_stats,
+            'memory': self._memory_report(state),
+            'categories': list(state.facets.values.get(CATEGORY_FACET, [])) if state.facets else [],
+            'facets': state.facets.facet_counts() if state.facets else {},
+            'query_cache': self.query_cache.stats(),
+            'spelling': state.spelling.stats() if state.spelling else {},
+            'answer_cards': state.answer_cards.size if state.answer_cards else 0,
+            'similar': {'k': state.similar.k, 'bytes': state.similar.nbytes} if state.similar else {},
+            'columns_info': state.columns_info,
         }
-    
+
     def get_sample_data(self, n: int = 3) -> list:
         """Получение сэмпла данных"""
-        if self.dataset is None or self.dataset.empty:
+        state = self._state
+        if state is None or not state.size:
             return []
-        
-        return self.dataset.head(n).to_dict('records')
+
+        if state.dataset is None:
+            return state.columns.to_frame(range(min(n, state.size))).to_dict('records')
+        return state.dataset.head(n).to_dict('records')
 
 
 # Глобальный экземпляр менеджера датасета
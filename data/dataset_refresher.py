@@ -0,0 +1,113 @@
+"""
+Фоновое обновление датасета без остановки бота
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .dataset_manager import DatasetManager, DatasetState
+
+logger = logging.getLogger(__name__)
+
+
+class DatasetRefresher:
+    """
+    Фоновая задача на event loop бота: периодически проверяет источник,
+    перестраивает датасет и индексы в пуле потоков и публикует результат
+    атомарной заменой состояния DatasetManager
+    """
+
+    def __init__(
+        self,
+        manager: DatasetManager,
+        load_kwargs: Dict[str, Any],
+        refresh_interval: float = 0,
+        watch_interval: float = 30,
+        on_publish: Optional[Callable[[DatasetState], Awaitable[None]]] = None,
+    ):
+        """
+        Args:
+            manager: менеджер датасета
+            load_kwargs: аргументы load_dataset (filepath или sheet_id/sheet_name)
+            refresh_interval: безусловная перезагрузка каждые N секунд (0 - отключено)
+            watch_interval: период проверки изменения файла-источника в секундах
+            on_publish: корутина, вызываемая после публикации новой версии
+        """
+        self.manager = manager
+        self.load_kwargs = load_kwargs
+        self.refresh_interval = refresh_interval
+        self.watch_interval = watch_interval
+        self.on_publish = on_publish
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dataset-refresh')
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._last_refresh = time.monotonic()
+
+    def start(self):
+        """Запуск фоновой задачи на текущем event loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name='dataset-refresher')
+            logger.info(f"Фоновое обновление датасета запущено (проверка каждые {self.watch_interval} с)")
+
+    async def stop(self):
+        """Остановка фоновой задачи и пула потоков"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _due(self) -> bool:
+        """Пора ли перезагружать датасет"""
+        if self.refresh_interval and time.monotonic() - self._last_refresh >= self.refresh_interval:
+            return True
+        return self.manager.source_changed(**self.load_kwargs)
+
+    async def refresh(self) -> bool:
+        """
+        Перестроение датасета в пуле потоков и публикация нового состояния
+
+        Returns:
+            True если новая версия опубликована
+        """
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            self._last_refresh = time.monotonic()
+            started = time.perf_counter()
+            try:
+                state = await loop.run_in_executor(self._executor, partial(self.manager.build_state, **self.load_kwargs))
+            except Exception as e:
+                # Текущая версия остается опубликованной
+                logger.error(f"Ошибка при обновлении датасета: {e}")
+                return False
+
+            # Публикация выполняется в потоке event loop: обработчики видят
+            # либо старое, либо новое состояние целиком
+            previous_version = self.manager.version
+            state = self.manager.publish(state)
+            logger.info(f"Датасет обновлен до версии {state.version} за {time.perf_counter() - started:.2f} с")
+            if self.on_publish is not None and state.version != previous_version:
+                try:
+                    await self.on_publish(state)
+                except Exception as e:
+                    logger.error(f"Ошибка в обработчике публикации датасета: {e}")
+            return True
+
+    async def _run(self):
+        period = min(self.watch_interval, self.refresh_interval) if self.refresh_interval else self.watch_interval
+        while True:
+            await asyncio.sleep(period)
+            try:
+                due = await asyncio.get_running_loop().run_in_executor(self._executor, self._due)
+            except Exception as e:
+                logger.warning(f"Не удалось проверить источник датасета: {e}")
+                continue
+            if due:
+                await self.refresh()
@@ -0,0 +1,493 @@
+"""
+Семантический поиск мер поддержки: матрица эмбеддингов и подключаемые энкодеры
+"""
+
+import importlib.util
+import logging
+import math
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .text_processing import analyze, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Размер пачки текстов при построении матрицы
+ENCODE_BATCH_SIZE = 256
+
+# Доля "удаленных" векторов в FAISS-индексе, после которой он перестраивается
+FAISS_MAX_TOMBSTONE_FRACTION = 0.25
+
+# Фасетный фильтр с не более чем таким числом строк считается точно по подматрице
+FILTER_EXACT_MAX_ROWS = 20_000
+
+
+class BaseEncoder:
+    """Базовый класс энкодера: текст -> L2-нормированный вектор float32"""
+
+    name: str = 'base'
+    dim: int = 0
+
+    @property
+    def signature(self) -> str:
+        """Идентификатор конфигурации энкодера (для проверки совместимости снапшотов)"""
+        return f'{self.name}:{self.dim}'
+
+    def fit(self, texts: Sequence[str]) -> 'BaseEncoder':
+        """Обучение энкодера на корпусе (по умолчанию не требуется)"""
+        return self
+
+    def encode_partial(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Кодирование пачки текстов при потоковом построении индекса
+
+        Энкодеры, которым нужна статистика всего корпуса, возвращают
+        промежуточные векторы и накапливают статистику; итоговые векторы
+        получаются в finalize()
+        """
+        return self.encode(texts)
+
+    def finalize(self, matrix: np.ndarray):
+        """Завершение потокового кодирования: доводка матрицы на месте"""
+
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """Обученное состояние энкодера в виде массивов для сохранения"""
+        return {}
+
+    def set_state(self, state: Dict[str, np.ndarray]):
+        """Восстановление обученного состояния энкодера"""
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Кодирование пачки текстов
+
+        Args:
+            texts: тексты
+
+        Returns:
+            матрица float32 формы (len(texts), dim) с L2-нормированными строками
+        """
+        raise NotImplementedError
+
+
+class HashingEncoder(BaseEncoder):
+    """
+    Детерминированный локальный энкодер без весов модели:
+    хеширование основ слов и символьных триграмм с весами TF-IDF
+    """
+
+    name = 'hashing'
+
+    def __init__(self, dim: int = 512, ngram: int = 3):
+        """
+        Args:
+            dim: размерность вектора (количество корзин хеширования)
+            ngram: длина символьных n-грамм (0 - только основы слов)
+        """
+        self.dim = dim
+        self.ngram = ngram
+        self.idf: Optional[np.ndarray] = None
+        self._partial_df: Optional[np.ndarray] = None
+        self._partial_docs = 0
+
+    @property
+    def signature(self) -> str:
+        return f'{self.name}:{self.dim}:{self.ngram}'
+
+    def get_state(self) -> Dict[str, np.ndarray]:
+        return {'idf': self.idf} if self.idf is not None else {}
+
+    def set_state(self, state: Dict[str, np.ndarray]):
+        self.idf = state.get('idf')
+
+    def _features(self, text: str) -> List[int]:
+        """Номера корзин признаков текста (crc32 стабилен между процессами)"""
+        features = ['w:' + term for term in analyze(text)]
+        if self.ngram:
+            for token in tokenize(text):
+                padded = f'#{token}#'
+                features.extend('c:' + padded[i:i + self.ngram] for i in range(len(padded) - self.ngram + 1))
+        return [zlib.crc32(feature.encode('utf-8')) % self.dim for feature in features]
+
+    def fit(self, texts: Sequence[str]) -> 'HashingEncoder':
+        """Расчет idf по корзинам признаков"""
+        document_frequency = np.zeros(self.dim, dtype=np.float64)
+        for text in texts:
+            document_frequency[np.unique(self._features(text))] += 1
+        self.idf = np.log((1 + len(texts)) / (1 + document_frequency)).astype(np.float32) + 1
+        return self
+
+    def _counts(self, texts: Sequence[str]) -> np.ndarray:
+        """Сублинейные частоты признаков log(1 + tf) без весов и нормировки"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            buckets = self._features(text)
+            if buckets:
+                matrix[row] = np.bincount(buckets, minlength=self.dim)
+        return np.log1p(matrix, out=matrix)
+
+    def _weight(self, matrix: np.ndarray) -> np.ndarray:
+        """Умножение на idf и L2-нормировка строк на месте"""
+        if self.idf is not None:
+            matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        return self._weight(self._counts(texts))
+
+    def encode_partial(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = self._counts(texts)
+        if self._partial_df is None:
+            self._partial_df, self._partial_docs = np.zeros(self.dim, dtype=np.float64), 0
+        self._partial_df += np.count_nonzero(matrix, axis=0)
+        self._partial_docs += len(texts)
+        return matrix
+
+    def finalize(self, matrix: np.ndarray):
+        if self._partial_df is not None:
+            self.idf = np.log((1 + self._partial_docs) / (1 + self._partial_df)).astype(np.float32) + 1
+            self._partial_df = None
+        self._weight(matrix)
+
+
+class SentenceTransformerEncoder(BaseEncoder):
+    """Энкодер на основе модели sentence-transformers"""
+
+    name = 'sentence_transformers'
+
+    def __init__(self, model_name: str):
+        """
+        Args:
+            model_name: имя или путь к модели sentence-transformers
+        """
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    @property
+    def signature(self) -> str:
+        return f'{self.name}:{self.model_name}:{self.dim}'
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        embeddings = self.model.encode(
+            list(texts),
+            batch_size=ENCODE_BATCH_SIZE,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+
+def resolve_backend(backend: str) -> str:
+    """
+    Фактический backend индекса
+
+    FAISS-индексы приближенные (HNSW и IVF теряют часть точных совпадений),
+    поэтому 'auto' означает точный numpy; FAISS включается только явно и
+    только если пакет установлен
+    """
+    if backend == 'auto' or (backend != 'numpy' and importlib.util.find_spec('faiss') is None):
+        return 'numpy'
+    return backend
+
+
+def create_encoder(model_name: str = 'hashing') -> BaseEncoder:
+    """
+    Создание энкодера по имени модели
+
+    Args:
+        model_name: 'hashing' или имя модели sentence-transformers
+
+    Returns:
+        энкодер; при недоступности модели - HashingEncoder
+    """
+    if not model_name or model_name == HashingEncoder.name:
+        return HashingEncoder()
+
+    try:
+        return SentenceTransformerEncoder(model_name)
+    except Exception as e:
+        logger.warning(f"Модель {model_name} недоступна ({e}), используем локальный HashingEncoder")
+        return HashingEncoder()
+
+
+class EmbeddingIndex:
+    """Индекс эмбеддингов: непрерывная матрица float32 и опциональный FAISS"""
+
+    BACKENDS = ('auto', 'numpy', 'faiss_ivf', 'faiss_hnsw')
+
+    def __init__(self, encoder: BaseEncoder, matrix: np.ndarray, backend: str = 'auto', faiss_index=None,
+                 faiss_positions: Optional[np.ndarray] = None):
+        """
+        Args:
+            encoder: энкодер запросов (тот же, что использовался для матрицы)
+            matrix: матрица эмбеддингов документов (n, dim)
+            backend: 'auto' (= 'numpy'), 'numpy', 'faiss_ivf' или 'faiss_hnsw'
+            faiss_index: готовый FAISS-индекс (например, загруженный из снапшота)
+            faiss_positions: id вектора в FAISS -> позиция документа (-1 - вектор удален)
+        """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Неизвестный backend индекса эмбеддингов: {backend}")
+
+        self.encoder = encoder
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.faiss_index = None
+        self.faiss_positions: Optional[np.ndarray] = None
+        self.faiss_tombstones = 0
+        self.backend = 'numpy'
+
+        if backend == 'auto':
+            backend = 'numpy'
+        if faiss_index is not None:
+            self.faiss_index, self.backend = faiss_index, backend
+            self.faiss_positions = faiss_positions if faiss_positions is not None else np.arange(faiss_index.ntotal)
+            self.faiss_tombstones = int(np.count_nonzero(self.faiss_positions < 0))
+        elif backend != 'numpy':
+            self._build_faiss(backend)
+
+    @property
+    def size(self) -> int:
+        """Количество документов в индексе"""
+        return len(self.matrix)
+
+    @classmethod
+    def build(cls, texts: Sequence[str], encoder: BaseEncoder, backend: str = 'auto') -> 'EmbeddingIndex':
+        """
+        Кодирование корпуса пачками в заранее выделенную матрицу
+
+        Args:
+            texts: тексты документов в порядке позиций датасета
+            encoder: энкодер
+            backend: backend поиска
+
+        Returns:
+            готовый EmbeddingIndex
+        """
+        # Статистика корпуса (idf) накапливается по тем же признакам, что идут
+        # в матрицу: корпус разбирается на признаки один раз, без отдельного fit
+        matrix = np.empty((len(texts), encoder.dim), dtype=np.float32)
+        for start in range(0, len(texts), ENCODE_BATCH_SIZE):
+            batch = texts[start:start + ENCODE_BATCH_SIZE]
+            matrix[start:start + len(batch)] = encoder.encode_partial(batch)
+        encoder.finalize(matrix)
+
+        index = cls(encoder, matrix, backend)
+        logger.info(f"Индекс эмбеддингов построен: {index.size}x{encoder.dim}, "
+                    f"энкодер {encoder.name}, backend {index.backend}")
+        return index
+
+    def apply_changes(self, added: Dict[int, str], moved: Dict[int, int], size: int) -> 'EmbeddingIndex':
+        """
+        Инкрементальное обновление: кодируются только добавленные и измененные тексты
+
+        Текущий индекс не изменяется; обученное состояние энкодера (idf)
+        сохраняется до полной перестройки
+
+        Args:
+            added: новая позиция -> текст документа
+            moved: новая позиция -> старая позиция (вектор переносится без кодирования)
+            size: количество документов после обновления
+
+        Returns:
+            новый EmbeddingIndex
+        """
+        matrix = np.empty((size, self.matrix.shape[1]), dtype=np.float32)
+        common = min(size, self.size)
+        matrix[:common] = self.matrix[:common]
+        for new_position, old_position in moved.items():
+            matrix[new_position] = self.matrix[old_position]
+
+        if added:
+            positions = list(added)
+            texts = [added[position] for position in positions]
+            for start in range(0, len(texts), ENCODE_BATCH_SIZE):
+                batch = positions[start:start + ENCODE_BATCH_SIZE]
+                matrix[batch] = self.encoder.encode(texts[start:start + ENCODE_BATCH_SIZE])
+
+        if self.faiss_index is None:
+            return EmbeddingIndex(self.encoder, matrix, 'numpy')
+        return self._apply_faiss_changes(matrix, sorted(added), moved, size)
+
+    def _apply_faiss_changes(self, matrix: np.ndarray, added: List[int], moved: Dict[int, int],
+                             size: int) -> 'EmbeddingIndex':
+        """
+        Обновление копии FAISS-индекса: новые векторы добавляются в конец,
+        векторы ушедших документов помечаются в faiss_positions как удаленные
+        """
+        import faiss
+
+        # Куда переезжает документ каждой старой позиции (-1 - документ ушел)
+        destination = np.arange(self.size, dtype=np.int64)
+        destination[size:] = -1
+        replaced = [position for position in [*added, *moved] if position < self.size]
+        destination[replaced] = -1
+        for new_position, old_position in moved.items():
+            destination[old_position] = new_position
+
+        alive = self.faiss_positions >= 0
+        positions = np.full(len(self.faiss_positions), -1, dtype=np.int64)
+        positions[alive] = destination[self.faiss_positions[alive]]
+
+        total = len(positions) + len(added)
+        tombstones = int(np.count_nonzero(positions < 0))
+        if tombstones > FAISS_MAX_TOMBSTONE_FRACTION * total:
+            return EmbeddingIndex(self.encoder, matrix, self.backend)
+
+        index = faiss.clone_index(self.faiss_index)
+        if added:
+            index.add(np.ascontiguousarray(matrix[added]))
+            positions = np.concatenate([positions, np.asarray(added, dtype=np.int64)])
+        return EmbeddingIndex(self.encoder, matrix, self.backend, faiss_index=index, faiss_positions=positions)
+
+    def _build_faiss(self, backend: str):
+        """Построение FAISS-индекса (IVF или HNSW) по скалярному произведению"""
+        try:
+            import faiss
+        except ImportError:
+            logger.warning("faiss не установлен, используем numpy backend")
+            return
+
+        dim = self.matrix.shape[1]
+        if backend == 'faiss_hnsw':
+            index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efSearch = 64
+        else:
+            nlist = max(1, int(math.sqrt(self.size)))
+            quantizer = faiss.IndexFlatIP(dim)
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            index.train(self.matrix)
+            index.nprobe = min(nlist, 16)
+
+        index.add(self.matrix)
+        self.faiss_index = index
+        self.faiss_positions = np.arange(self.size, dtype=np.int64)
+        self.faiss_tombstones = 0
+        self.backend = backend
+
+    def search_vectors(self, queries: np.ndarray, top_k: int = 5,
+                       mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Поиск ближайших документов для пачки векторов запросов
+
+        Args:
+            queries: матрица запросов (m, dim)
+            top_k: количество результатов на запрос
+            mask: булев массив допустимых документов (фасетный фильтр, None - все)
+
+        Returns:
+            (позиции документов (m, k), оценки (m, k)); позиция -1 - результата нет
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        k = min(top_k, self.size)
+        if k == 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+
+        if self.faiss_index is not None:
+            if mask is not None:
+                return self._search_faiss_filtered(queries, k, mask)
+            # Запрашиваем с запасом на удаленные векторы и переводим id в позиции
+            fetch = min(k + self.faiss_tombstones, self.faiss_index.ntotal)
+            scores, ids = self.faiss_index.search(queries, fetch)
+            positions = np.where(ids >= 0, self.faiss_positions[ids], -1)
+            order = np.argsort(positions < 0, axis=1, kind='stable')[:, :k]
+            return np.take_along_axis(positions, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+        # Одно матричное произведение на всю пачку и частичный отбор top-k
+        scores = queries @ self.matrix.T
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+        if k < self.size:
+            top = np.argpartition(scores, -k, axis=1)[:, -k:]
+        else:
+            top = np.broadcast_to(np.arange(self.size), scores.shape)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def _search_subset(self, queries: np.ndarray, allowed: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Точный поиск только среди разрешенных позиций"""
+        k = min(k, len(allowed))
+        if k == 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        scores = queries @ self.matrix[allowed].T
+        if k < len(allowed):
+            top = np.argpartition(scores, -k, axis=1)[:, -k:]
+        else:
+            top = np.broadcast_to(np.arange(len(allowed)), scores.shape)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return allowed[np.take_along_axis(top, order, axis=1)], np.take_along_axis(top_scores, order, axis=1)
+
+    def _search_faiss_filtered(self, queries: np.ndarray, k: int, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Поиск в FAISS с фасетным фильтром
+
+        Селективный фильтр (мало разрешенных строк) считается точно по
+        подматрице; иначе из FAISS запрашивается k / доля_разрешенных с запасом,
+        а при нехватке результатов выполняется точный поиск
+        """
+        allowed = np.flatnonzero(mask)
+        if len(allowed) <= FILTER_EXACT_MAX_ROWS:
+            return self._search_subset(queries, allowed, k)
+
+        density = len(allowed) / self.size
+        fetch = min(int(k / density * 2) + self.faiss_tombstones, self.faiss_index.ntotal)
+        scores, ids = self.faiss_index.search(queries, fetch)
+        positions = np.where(ids >= 0, self.faiss_positions[ids], -1)
+        valid = (positions >= 0) & mask[np.maximum(positions, 0)]
+        if (valid.sum(axis=1) < k).any():
+            return self._search_subset(queries, allowed, k)
+        order = np.argsort(~valid, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(positions, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+    def search_batch(self, queries: Sequence[str], top_k: int = 5,
+                     mask: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Семантический поиск для пачки текстовых запросов
+
+        Returns:
+            для каждого запроса список (позиция документа, косинусная близость)
+        """
+        positions, scores = self.search_vectors(self.encoder.encode(queries), top_k, mask)
+        return [
+            [(int(p), float(s)) for p, s in zip(row_positions, row_scores) if p >= 0 and s > 0]
+            for row_positions, row_scores in zip(positions, scores)
+        ]
+
+    def search(self, query: str, top_k: int = 5, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Семантический поиск по одному запросу"""
+        return self.search_batch([query], top_k, mask)[0]
+
+
+class EmbeddingIndexBuilder:
+    """Потоковое построение индекса эмбеддингов пачками текстов"""
+
+    def __init__(self, encoder: BaseEncoder, backend: str = 'auto'):
+        self.encoder = encoder
+        self.backend = backend
+        self._chunks: List[np.ndarray] = []
+
+    def add_texts(self, texts: Sequence[str]):
+        """Кодирование очередной пачки текстов"""
+        for start in range(0, len(texts), ENCODE_BATCH_SIZE):
+            self._chunks.append(self.encoder.encode_partial(texts[start:start + ENCODE_BATCH_SIZE]))
+
+    def finish(self) -> EmbeddingIndex:
+        """Сборка матрицы и завершение кодирования"""
+        dim = self.encoder.dim
+        matrix = np.concatenate(self._chunks) if self._chunks else np.empty((0, dim), dtype=np.float32)
+        self._chunks = []
+        self.encoder.finalize(matrix)
+
+        index = EmbeddingIndex(self.encoder, matrix, self.backend)
+        logger.info(f"Индекс эмбеддингов построен: {index.size}x{dim}, энкодер {self.encoder.name}, backend {index.backend}")
+        return index
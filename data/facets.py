@@ -0,0 +1,303 @@
+"""
+Фасетная фильтрация мер поддержки: категория, статус, размер поддержки, срок подачи
+
+Битовые маски значений категорий и статусов строятся один раз при загрузке
+датасета; комбинированный фильтр - это AND/OR масок NumPy, который
+применяется к оценкам поиска до отбора top-k. Счетчики фасетов считаются
+по кодам категорий (bincount) без обращения к DataFrame
+"""
+
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .column_store import ColumnStore
+from .dataset_delta import DatasetDelta
+
+# Колонки, по которым строятся фасеты
+CATEGORY_FACET = 'Категория'
+STATUS_FACET = 'Статус'
+FACET_COLUMNS = (CATEGORY_FACET, STATUS_FACET)
+
+# Маски строятся для колонок не более чем с таким числом значений,
+# для остальных фильтр считается сравнением кодов
+FACET_MAX_BITMAP_VALUES = 64
+
+# Пороги размера поддержки (руб.) для счетчиков "до N"
+AMOUNT_LIMITS = (1_000_000, 5_000_000, 10_000_000)
+
+# Синонимы значений статуса
+STATUS_ALIASES = {
+    'active': 'Активна',
+    'активные': 'Активна',
+    'действующие': 'Активна',
+    'closed': 'Завершена',
+    'завершенные': 'Завершена',
+}
+
+
+@dataclass(frozen=True)
+class FacetFilter:
+    """
+    Комбинированный фильтр; внутри фасета значения объединяются через OR,
+    между фасетами - через AND
+    """
+
+    categories: Tuple[str, ...] = ()
+    statuses: Tuple[str, ...] = ()
+    # Верхняя граница размера поддержки не больше суммы (руб.)
+    max_amount: Optional[float] = None
+    # Мера позволяет получить не меньше суммы (руб.)
+    min_amount: Optional[float] = None
+    # Прием заявок открыт на эту дату (бессрочные меры проходят фильтр)
+    deadline_after: Optional[date] = None
+
+    @property
+    def is_empty(self) -> bool:
+        """Фильтр не ограничивает выдачу"""
+        return not (self.categories or self.statuses or self.max_amount is not None
+                    or self.min_amount is not None or self.deadline_after is not None)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Представление для user_data (только примитивные типы)"""
+        return {
+            'categories': list(self.categories),
+            'statuses': list(self.statuses),
+            'max_amount': self.max_amount,
+            'min_amount': self.min_amount,
+            'deadline_after': self.deadline_after.isoformat() if self.deadline_after else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> 'FacetFilter':
+        """Восстановление фильтра из as_dict()"""
+        if not data:
+            return cls()
+        deadline = data.get('deadline_after')
+        return cls(
+            categories=tuple(data.get('categories') or ()),
+            statuses=tuple(data.get('statuses') or ()),
+            max_amount=data.get('max_amount'),
+            min_amount=data.get('min_amount'),
+            deadline_after=date.fromisoformat(deadline) if deadline else None,
+        )
+
+    def describe(self) -> str:
+        """Краткое описание фильтра для сообщений пользователю"""
+        parts = [*self.categories, *self.statuses]
+        if self.max_amount is not None:
+            parts.append(f'≤ {format_amount(self.max_amount)}')
+        if self.min_amount is not None:
+            parts.append(f'≥ {format_amount(self.min_amount)}')
+        if self.deadline_after is not None:
+            parts.append(f'прием заявок после {self.deadline_after:%d.%m.%Y}')
+        return ' · '.join(parts)
+
+
+def format_amount(amount: float) -> str:
+    """Сумма в рублях коротко: 1500000 -> '1.5 млн'"""
+    for divider, unit in ((1e9, 'млрд'), (1e6, 'млн'), (1e3, 'тыс.')):
+        if amount >= divider:
+            return f'{amount / divider:g} {unit}'
+    return f'{amount:g} руб.'
+
+
+class FacetIndex:
+    """Предвычисленные маски и счетчики фасетов для одной версии датасета"""
+
+    def __init__(self, size: int):
+        self.size = size
+        # Фасет -> значения (порядок совпадает с кодами)
+        self.values: Dict[str, List[str]] = {}
+        # Фасет -> коды строк (-1 - пусто)
+        self.codes: Dict[str, np.ndarray] = {}
+        # Фасет -> значение -> булева маска строк
+        self.bitmaps: Dict[str, Dict[str, np.ndarray]] = {}
+        # Счетчики без фильтра
+        self.counts: Dict[str, Dict[str, int]] = {}
+        self.amount_max = np.full(size, np.nan)
+        self.amount_min = np.full(size, np.nan)
+        self.deadline = np.full(size, np.datetime64('NaT', 'D'))
+        self.open_ended = np.ones(size, dtype=bool)
+
+    @classmethod
+    def from_columns(cls, columns: ColumnStore) -> 'FacetIndex':
+        """
+        Построение масок и счетчиков по колоночному хранилищу
+
+        Args:
+            columns: типизированные колонки датасета
+
+        Returns:
+            FacetIndex
+        """
+        index = cls(columns.size)
+        for facet in FACET_COLUMNS:
+            categorical = columns.categorical.get(facet)
+            if categorical is None:
+                continue
+            index._add_facet(facet, [str(value) for value in categorical.categories], np.asarray(categorical.codes))
+        index._set_ranges(columns)
+        return index
+
+    def apply_changes(self, columns: ColumnStore, delta: DatasetDelta) -> 'FacetIndex':
+        """
+        Фасеты новой версии по колонкам, обновленным ColumnStore.apply_changes
+
+        Если набор значений фасета не изменился, счетчики правятся по
+        затронутым строкам, а маски значений, не встречающихся в затронутых
+        строках, переносятся без пересчета (при переносе строк с конца маски
+        считаются заново). Текущий индекс не изменяется
+
+        Args:
+            columns: колонки новой версии
+            delta: изменения относительно версии, по которой построен индекс
+
+        Returns:
+            новый FacetIndex
+        """
+        positions = np.asarray(sorted(delta.new_rows), dtype=np.int64)
+        # Старые позиции мер, покинувших версию или измененных (перенос не меняет счетчики)
+        moved_from = set(delta.moved.values())
+        left = np.asarray([position for position in delta.vacated if position not in moved_from], dtype=np.int64)
+        same_layout = columns.size == self.size and not delta.moved
+
+        index = FacetIndex(columns.size)
+        for facet in FACET_COLUMNS:
+            categorical = columns.categorical.get(facet)
+            if categorical is None:
+                continue
+            values = [str(value) for value in categorical.categories]
+            codes = np.asarray(categorical.codes)
+            if values != self.values.get(facet):
+                index._add_facet(facet, values, codes)
+                continue
+            index.values[facet] = values
+            index.codes[facet] = codes
+
+            old_codes, new_codes = self.codes[facet][left], codes[positions]
+            counts = np.asarray([self.counts[facet][value] for value in values], dtype=np.int64)
+            np.subtract.at(counts, old_codes[old_codes >= 0], 1)
+            np.add.at(counts, new_codes[new_codes >= 0], 1)
+            index.counts[facet] = dict(zip(values, counts.tolist()))
+
+            bitmaps = self.bitmaps.get(facet)
+            if bitmaps is None:
+                continue
+            if not same_layout:
+                index.bitmaps[facet] = {value: codes == code for code, value in enumerate(values)}
+                continue
+            bitmaps = dict(bitmaps)
+            for code in set(self.codes[facet][positions].tolist()) | set(new_codes.tolist()):
+                if code < 0:
+                    continue
+                bitmap = bitmaps[values[code]].copy()
+                bitmap[positions] = new_codes == code
+                bitmaps[values[code]] = bitmap
+            index.bitmaps[facet] = bitmaps
+        index._set_ranges(columns)
+        return index
+
+    def _add_facet(self, facet: str, values: List[str], codes: np.ndarray):
+        """Значения, маски и счетчики фасета по кодам строк"""
+        self.values[facet] = values
+        self.codes[facet] = codes
+        if len(values) <= FACET_MAX_BITMAP_VALUES:
+            self.bitmaps[facet] = {value: codes == code for code, value in enumerate(values)}
+        counts = np.bincount(codes[codes >= 0], minlength=len(values))
+        self.counts[facet] = dict(zip(values, counts.tolist()))
+
+    def _set_ranges(self, columns: ColumnStore):
+        """Разобранные размеры поддержки и сроки подачи из колонок"""
+        self.amount_max = columns.amount_max
+        # "до N" - нижней границы нет, для фильтра "не меньше" важна верхняя
+        self.amount_min = np.where(np.isnan(columns.amount_max), columns.amount_min, columns.amount_max)
+        self.deadline = columns.deadline
+        self.open_ended = np.isnat(columns.deadline)
+
+    def resolve(self, facet: str, value: str) -> Optional[str]:
+        """
+        Приведение значения фасета к написанию в датасете
+
+        Сравнение без учета регистра; для статуса учитываются синонимы (active -> Активна)
+
+        Returns:
+            значение из датасета или None, если такого нет
+        """
+        if facet == STATUS_FACET:
+            value = STATUS_ALIASES.get(value.strip().lower(), value)
+        wanted = value.strip().lower()
+        return next((item for item in self.values.get(facet, []) if item.lower() == wanted), None)
+
+    def _value_mask(self, facet: str, selected: Tuple[str, ...]) -> np.ndarray:
+        bitmaps = self.bitmaps.get(facet)
+        if bitmaps is not None:
+            mask = np.zeros(self.size, dtype=bool)
+            for value in selected:
+                bitmap = bitmaps.get(self.resolve(facet, value))
+                if bitmap is not None:
+                    mask |= bitmap
+            return mask
+
+        values = self.values.get(facet, [])
+        resolved = {self.resolve(facet, value) for value in selected}
+        selected_codes = [code for code, value in enumerate(values) if value in resolved]
+        return np.isin(self.codes.get(facet, np.full(self.size, -1)), selected_codes)
+
+    def mask(self, facet_filter: Optional[FacetFilter]) -> Optional[np.ndarray]:
+        """
+        Булева маска строк, проходящих фильтр
+
+        Args:
+            facet_filter: фильтр (None или пустой - без ограничений)
+
+        Returns:
+            маска длины size или None, если фильтр пустой
+        """
+        if facet_filter is None or facet_filter.is_empty:
+            return None
+
+        mask = np.ones(self.size, dtype=bool)
+        if facet_filter.categories:
+            mask &= self._value_mask(CATEGORY_FACET, facet_filter.categories)
+        if facet_filter.statuses:
+            mask &= self._value_mask(STATUS_FACET, facet_filter.statuses)
+        # Сравнения с nan дают False: меры без указанной суммы не проходят фильтр по сумме
+        if facet_filter.max_amount is not None:
+            mask &= self.amount_max <= facet_filter.max_amount
+        if facet_filter.min_amount is not None:
+            mask &= self.amount_min >= facet_filter.min_amount
+        if facet_filter.deadline_after is not None:
+            mask &= self.open_ended | (self.deadline >= np.datetime64(facet_filter.deadline_after, 'D'))
+        return mask
+
+    def facet_counts(self, mask: Optional[np.ndarray] = None, today: Optional[date] = None) -> Dict[str, Any]:
+        """
+        Счетчики значений фасетов среди строк, проходящих фильтр
+
+        Args:
+            mask: маска фильтра (None - весь датасет, используются предвычисленные счетчики)
+            today: дата для счетчика открытого приема заявок (по умолчанию сегодня)
+
+        Returns:
+            {'Категория': {значение: n}, 'Статус': {...}, 'amount': {порог: n}, 'open_deadline': n, 'total': n}
+        """
+        counts: Dict[str, Any] = {}
+        for facet, values in self.values.items():
+            if mask is None:
+                counts[facet] = dict(self.counts[facet])
+                continue
+            codes = self.codes[facet][mask]
+            totals = np.bincount(codes[codes >= 0], minlength=len(values))
+            counts[facet] = dict(zip(values, totals.tolist()))
+
+        amount_max = self.amount_max if mask is None else self.amount_max[mask]
+        counts['amount'] = {limit: int(np.count_nonzero(amount_max <= limit)) for limit in AMOUNT_LIMITS}
+
+        deadline = np.datetime64(today or date.today(), 'D')
+        open_now = self.open_ended | (self.deadline >= deadline)
+        counts['open_deadline'] = int(np.count_nonzero(open_now if mask is None else open_now[mask]))
+        counts['total'] = self.size if mask is None else int(np.count_nonzero(mask))
+        return counts
@@ -0,0 +1,342 @@
+"""
+Версионированные снапшоты датасета и индексов на диске для быстрого старта бота
+
+Структура каталога снапшота (v{SNAPSHOT_VERSION}):
+    manifest.json          - версия, отпечаток источника, схема колонок
+    col{i}.npy             - числовые колонки
+    col{i}.bin/.offsets.npy/.nulls.npy - текстовые колонки: упакованный UTF-8 и смещения
+    vocabulary.bin/.offsets.npy        - словарь термов
+    postings_*.npy         - инвертированный индекс в CSR-формате
+    embeddings.npy         - матрица эмбеддингов float32
+    encoder_*.npy          - обученное состояние энкодера
+    faiss.index, faiss_positions.npy   - FAISS-индекс и отображение его id в позиции
+    similar_*.npy          - граф похожих мер (необязательный)
+
+Все массивы читаются через np.load(mmap_mode='r'), поэтому несколько
+рабочих процессов разделяют одни и те же страницы page cache.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .column_store import pack_strings, unpack_strings
+from .embedding_index import BaseEncoder, EmbeddingIndex, resolve_backend
+from .search_engine import SearchEngine
+from .similar_measures import SimilarityGraph
+from .lazy import lazy_module
+
+pd = lazy_module('pandas')
+
+logger = logging.getLogger(__name__)
+
+# Версия формата: увеличивается при любом несовместимом изменении структуры
+SNAPSHOT_VERSION = 1
+
+_MANIFEST = 'manifest.json'
+
+
+def file_fingerprint(filepath: str, with_hash: bool = True) -> Dict[str, Any]:
+    """
+    Отпечаток исходного файла
+
+    Args:
+        filepath: путь к файлу
+        with_hash: считать ли sha256 содержимого
+
+    Returns:
+        словарь с размером, mtime и (опционально) sha256
+    """
+    stat = os.stat(filepath)
+    fingerprint = {'path': os.path.abspath(filepath), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if with_hash:
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        fingerprint['sha256'] = digest.hexdigest()
+    return fingerprint
+
+
+@dataclass
+class LoadedSnapshot:
+    """Содержимое снапшота, загруженное с диска"""
+
+    dataset: pd.DataFrame
+    columns_info: Dict[str, Any]
+    search_engine: SearchEngine
+    embedding_index: EmbeddingIndex
+    created_at: float
+    similar: Optional[SimilarityGraph] = None
+
+
+class IndexStore:
+    """Сохранение и загрузка снапшотов датасета и индексов"""
+
+    def __init__(self, root_dir: str):
+        """
+        Args:
+            root_dir: каталог для снапшотов
+        """
+        self.root_dir = root_dir
+        self.path = os.path.join(root_dir, f'v{SNAPSHOT_VERSION}')
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.path, _MANIFEST), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, source: Dict[str, Any], encoder: BaseEncoder, backend: str = 'auto') -> bool:
+        """
+        Проверка актуальности снапшота
+
+        Сначала сравниваются размер и mtime файла; при расхождении mtime
+        сравнивается sha256 (файл могли перезаписать тем же содержимым)
+
+        Args:
+            source: отпечаток источника без хеша (см. file_fingerprint)
+            encoder: текущий энкодер
+            backend: настроенный backend индекса эмбеддингов
+
+        Returns:
+            True если снапшот можно использовать
+        """
+        manifest = self._read_manifest()
+        if not manifest or manifest.get('version') != SNAPSHOT_VERSION:
+            return False
+        if manifest.get('encoder') != encoder.signature:
+            return False
+        # Снапшот с FAISS-индексом не подходит для точного поиска и наоборот
+        if manifest.get('embedding_backend', 'numpy') != resolve_backend(backend):
+            return False
+
+        saved = manifest.get('source', {})
+        if saved.get('path') != source.get('path') or saved.get('size') != source.get('size'):
+            return False
+        if saved.get('mtime_ns') == source.get('mtime_ns'):
+            return True
+
+        return saved.get('sha256') == file_fingerprint(source['path'])['sha256']
+
+    def save(
+        self,
+        source: Dict[str, Any],
+        dataset: pd.DataFrame,
+        columns_info: Dict[str, Any],
+        search_engine: SearchEngine,
+        embedding_index: EmbeddingIndex,
+        similar: Optional[SimilarityGraph] = None,
+    ):
+        """
+        Атомарная запись снапшота: запись во временный каталог и переименование
+
+        Args:
+            source: отпечаток источника (с sha256)
+            dataset: очищенный датасет
+            columns_info: результат анализа колонок
+            search_engine: инвертированный индекс
+            embedding_index: индекс эмбеддингов
+            similar: граф похожих мер (None - не сохраняется)
+        """
+        os.makedirs(self.root_dir, exist_ok=True)
+        tmp_path = f'{self.path}.tmp-{os.getpid()}'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        try:
+            columns = []
+            for i, column in enumerate(dataset.columns):
+                series = dataset[column]
+                if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+                    np.save(os.path.join(tmp_path, f'col{i}.npy'), series.to_numpy())
+                    columns.append({'name': column, 'kind': 'numeric'})
+                else:
+                    nulls = series.isna().to_numpy()
+                    buffer, offsets = pack_strings(series.where(~nulls, '').astype(str).tolist())
+                    buffer.tofile(os.path.join(tmp_path, f'col{i}.bin'))
+                    np.save(os.path.join(tmp_path, f'col{i}.offsets.npy'), offsets)
+                    np.save(os.path.join(tmp_path, f'col{i}.nulls.npy'), nulls)
+                    columns.append({'name': column, 'kind': 'text'})
+
+            vocabulary, offsets, docs, impacts = search_engine.to_csr()
+            buffer, vocabulary_offsets = pack_strings(vocabulary)
+            buffer.tofile(os.path.join(tmp_path, 'vocabulary.bin'))
+            np.save(os.path.join(tmp_path, 'vocabulary.offsets.npy'), vocabulary_offsets)
+            np.save(os.path.join(tmp_path, 'postings_offsets.npy'), offsets)
+            np.save(os.path.join(tmp_path, 'postings_docs.npy'), docs)
+            np.save(os.path.join(tmp_path, 'postings_impacts.npy'), impacts)
+            np.save(os.path.join(tmp_path, 'doc_lengths.npy'), np.asarray(search_engine.doc_lengths, dtype=np.float32))
+
+            np.save(os.path.join(tmp_path, 'embeddings.npy'), embedding_index.matrix)
+            encoder_state = embedding_index.encoder.get_state()
+            for name, array in encoder_state.items():
+                np.save(os.path.join(tmp_path, f'encoder_{name}.npy'), array)
+            if embedding_index.faiss_index is not None:
+                import faiss
+                faiss.write_index(embedding_index.faiss_index, os.path.join(tmp_path, 'faiss.index'))
+                np.save(os.path.join(tmp_path, 'faiss_positions.npy'), embedding_index.faiss_positions)
+            if similar is not None:
+                np.save(os.path.join(tmp_path, 'similar_neighbours.npy'), similar.neighbours)
+                np.save(os.path.join(tmp_path, 'similar_scores.npy'), similar.scores)
+
+            manifest = {
+                'version': SNAPSHOT_VERSION,
+                'created_at': time.time(),
+                'source': source,
+                'rows': len(dataset),
+                'columns': columns,
+                'columns_info': columns_info,
+                'search_fields': search_engine.fields,
+                'encoder': embedding_index.encoder.signature,
+                'encoder_state': sorted(encoder_state),
+                'embedding_backend': embedding_index.backend,
+                'similar_k': similar.k if similar is not None else 0,
+            }
+            # Манифест пишется последним: снапшот без манифеста считается неполным
+            with open(os.path.join(tmp_path, _MANIFEST), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, default=str)
+
+            # Старый каталог переименовываем, а не удаляем сразу: другие процессы
+            # могут держать его файлы отображенными в память
+            old_path = f'{self.path}.old-{os.getpid()}'
+            if os.path.exists(self.path):
+                os.replace(self.path, old_path)
+            os.replace(tmp_path, self.path)
+            shutil.rmtree(old_path, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+        logger.info(f"Снапшот индексов сохранен: {self.path} ({len(dataset)} записей)")
+
+    def _load_array(self, name: str) -> np.ndarray:
+        # np.asarray снимает подкласс memmap (его срезы заметно медленнее),
+        # сохраняя отображение файла в память без копирования
+        return np.asarray(np.load(os.path.join(self.path, name), mmap_mode='r'))
+
+    def _load_buffer(self, name: str) -> np.ndarray:
+        path = os.path.join(self.path, name)
+        if os.path.getsize(path) == 0:
+            return np.empty(0, dtype=np.uint8)
+        return np.asarray(np.memmap(path, dtype=np.uint8, mode='r'))
+
+    def _load_search_engine(self, manifest: Dict[str, Any], doc_ids: List[Any], titles: List[str],
+                            descriptions: List[str]) -> SearchEngine:
+        vocabulary = unpack_strings(self._load_buffer('vocabulary.bin'), self._load_array('vocabulary.offsets.npy'))
+        return SearchEngine.from_csr(
+            manifest['search_fields'],
+            vocabulary,
+            self._load_array('postings_offsets.npy'),
+            self._load_array('postings_docs.npy'),
+            self._load_array('postings_impacts.npy'),
+            self._load_array('doc_lengths.npy'),
+            doc_ids=doc_ids,
+            titles=titles,
+            descriptions=descriptions,
+        )
+
+    def _load_embedding_index(self, manifest: Dict[str, Any], encoder: BaseEncoder) -> EmbeddingIndex:
+        encoder.set_state({name: np.asarray(self._load_array(f'encoder_{name}.npy'))
+                           for name in manifest.get('encoder_state', [])})
+
+        faiss_index = faiss_positions = None
+        faiss_path = os.path.join(self.path, 'faiss.index')
+        if os.path.exists(faiss_path):
+            import faiss
+            faiss_index = faiss.read_index(faiss_path)
+            faiss_positions = self._load_array('faiss_positions.npy')
+        return EmbeddingIndex(
+            encoder,
+            self._load_array('embeddings.npy'),
+            backend=manifest.get('embedding_backend', 'numpy'),
+            faiss_index=faiss_index,
+            faiss_positions=faiss_positions,
+        )
+
+    def read_manifest(self) -> Optional[Dict[str, Any]]:
+        """Манифест текущего снапшота (None - снапшота нет или он неполный)"""
+        return self._read_manifest()
+
+    def load_indexes(self, encoder: BaseEncoder) -> Tuple[Dict[str, Any], SearchEngine, EmbeddingIndex]:
+        """
+        Загрузка только поисковых индексов, без колонок датасета
+
+        Используется рабочими процессами, которым нужны позиции и оценки,
+        а не тексты мер: массивы отображаются в память, DataFrame не строится
+
+        Args:
+            encoder: энкодер, в который восстанавливается обученное состояние
+
+        Returns:
+            (манифест, инвертированный индекс, индекс эмбеддингов)
+        """
+        manifest = self._read_manifest()
+        if manifest is None:
+            raise FileNotFoundError(f"Снапшот не найден: {self.path}")
+
+        rows = manifest['rows']
+        search_engine = self._load_search_engine(manifest, doc_ids=list(range(rows)), titles=[''] * rows,
+                                                 descriptions=[''] * rows)
+        return manifest, search_engine, self._load_embedding_index(manifest, encoder)
+
+    def load(self, encoder: BaseEncoder) -> LoadedSnapshot:
+        """
+        Загрузка снапшота с отображением массивов в память
+
+        Args:
+            encoder: энкодер, в который восстанавливается обученное состояние
+
+        Returns:
+            LoadedSnapshot
+        """
+        manifest = self._read_manifest()
+        if manifest is None:
+            raise FileNotFoundError(f"Снапшот не найден: {self.path}")
+
+        data = {}
+        for i, column in enumerate(manifest['columns']):
+            if column['kind'] == 'numeric':
+                data[column['name']] = self._load_array(f'col{i}.npy')
+            else:
+                values = unpack_strings(self._load_buffer(f'col{i}.bin'), self._load_array(f'col{i}.offsets.npy'))
+                series = pd.Series(values, dtype=object)
+                data[column['name']] = series.mask(self._load_array(f'col{i}.nulls.npy'))
+        dataset = pd.DataFrame(data, columns=[column['name'] for column in manifest['columns']])
+
+        def column_values(name: str, default: str = '') -> List[Any]:
+            if name in dataset.columns:
+                return dataset[name].fillna(default).tolist()
+            return [default] * len(dataset)
+
+        doc_ids = dataset['id'].tolist() if 'id' in dataset.columns else list(range(1, len(dataset) + 1))
+        search_engine = self._load_search_engine(
+            manifest,
+            doc_ids=doc_ids,
+            titles=[title or 'Без названия' for title in column_values('Название')],
+            descriptions=column_values('Описание'),
+        )
+        embedding_index = self._load_embedding_index(manifest, encoder)
+        similar = None
+        if manifest.get('similar_k'):
+            similar = SimilarityGraph(self._load_array('similar_neighbours.npy'),
+                                      self._load_array('similar_scores.npy'))
+
+        return LoadedSnapshot(
+            dataset=dataset,
+            columns_info=manifest['columns_info'],
+            search_engine=search_engine,
+            embedding_index=embedding_index,
+            created_at=manifest['created_at'],
+            similar=similar,
+        )
@@ -0,0 +1,45 @@
+"""
+Отложенный импорт тяжелых модулей
+
+pandas нужен только при загрузке и очистке датасета, но импортируется
+почти полсекунды. Модули данных объявляют его через lazy_module, поэтому
+импорт обработчиков и точки входа бота его не загружает; модуль
+импортируется при первом обращении к атрибуту (pd.DataFrame, pd.read_csv).
+Аннотации с такими модулями не вычисляются при импорте
+(from __future__ import annotations).
+"""
+
+import importlib
+from types import ModuleType
+from typing import Optional
+
+
+class LazyModule:
+    """Заместитель модуля: импорт при первом обращении к атрибуту"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            # import_module потокобезопасен: параллельные обращения получат один модуль
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attribute: str):
+        return getattr(self._load(), attribute)
+
+    def __repr__(self) -> str:
+        state = 'загружен' if self._module is not None else 'не загружен'
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def lazy_module(name: str) -> LazyModule:
+    """
+    Модуль, импортируемый при первом использовании
+
+    Args:
+        name: полное имя модуля ('pandas')
+    """
+    return LazyModule(name)
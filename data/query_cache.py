@@ -0,0 +1,165 @@
+"""
+Кэш результатов поиска с вытеснением LRU/TTL и сбросом при смене версии датасета
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from .text_processing import tokenize
+
+
+def normalize_query(query: str) -> str:
+    """
+    Нормализация запроса для ключа кэша: регистр, ё/е, пунктуация и пробелы
+
+    "Гранты для ИП!" и "гранты  для ип" дают один ключ
+    """
+    return ' '.join(tokenize(query))
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Приблизительный размер результата в байтах (списки словарей со строками и числами)
+
+    Args:
+        value: кэшируемое значение
+
+    Returns:
+        размер с учетом вложенных объектов
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+class QueryCache:
+    """
+    Кэш результатов поиска
+
+    Записи ограничены количеством и суммарным размером (LRU) и временем
+    жизни (TTL). Кэш привязан к версии датасета: при публикации новой
+    версии все записи сбрасываются при первом же обращении. Обращения
+    по более старой версии (поиск, начатый до публикации) кэш не трогают
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 2**20, ttl: float = 600):
+        """
+        Args:
+            max_entries: максимальное количество записей (0 - кэш отключен)
+            max_bytes: максимальный суммарный размер записей в байтах
+            ttl: время жизни записи в секундах (0 - без ограничения)
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # Ключ -> (значение, размер, момент истечения)
+        self._entries: 'OrderedDict[Hashable, Tuple[Any, int, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _check_version(self, version: int) -> bool:
+        """Переход на более новую версию датасета; False - версия устарела и кэш не используется"""
+        if self._version is not None and version < self._version:
+            return False
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.bytes = 0
+            self._version = version
+        return True
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def get(self, version: int, key: Hashable) -> Optional[Any]:
+        """
+        Значение из кэша
+
+        Args:
+            version: версия датасета, по которой выполняется поиск
+            key: ключ запроса
+
+        Returns:
+            закэшированное значение или None (в том числе для устаревшей версии)
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key) if self._check_version(version) else None
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[2] and entry[2] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, version: int, key: Hashable, value: Any):
+        """
+        Сохранение значения (запись больше max_bytes или по устаревшей версии не кэшируется)
+
+        Args:
+            version: версия датасета, по которой получено значение
+            key: ключ запроса
+            value: результат поиска (не должен изменяться вызывающим кодом)
+        """
+        if not self.enabled:
+            return
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0.0
+
+        with self._lock:
+            if not self._check_version(version):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self.bytes += size
+
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        """Полная очистка кэша"""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика кэша для get_dataset_info"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        }
@@ -0,0 +1,77 @@
+"""
+Гибридное переранжирование: кандидаты BM25 и эмбеддингов, итоговая оценка - смесь обеих
+
+Функции работают только с позициями и оценками индексов и не обращаются
+к DataFrame; фасетный фильтр применяется к кандидатам обоих индексов
+"""
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .embedding_index import EmbeddingIndex
+from .search_engine import SearchEngine
+from .spelling import SpellingIndex
+
+# Кандидатов от каждого индекса на запрос
+RERANK_CANDIDATES = 50
+# Вес оценки BM25 в итоговой оценке (остальное - косинусная близость)
+RERANK_TEXT_WEIGHT = 0.6
+
+
+def rerank_batch(
+    search_engine: SearchEngine,
+    embedding_index: EmbeddingIndex,
+    queries: Sequence[str],
+    top_k: int = 5,
+    candidates: int = RERANK_CANDIDATES,
+    mask: Optional[np.ndarray] = None,
+    spelling: Optional[SpellingIndex] = None,
+) -> List[List[Tuple[int, float]]]:
+    """
+    Переранжирование пачки запросов
+
+    Кандидаты - объединение top-candidates BM25 и семантического поиска;
+    для каждого считается RERANK_TEXT_WEIGHT * BM25 + (1 - RERANK_TEXT_WEIGHT) * cos
+
+    Args:
+        search_engine: инвертированный индекс
+        embedding_index: индекс эмбеддингов
+        queries: тексты запросов
+        top_k: количество результатов на запрос
+        candidates: количество кандидатов от каждого индекса
+        mask: булев массив допустимых документов (фасетный фильтр, None - все)
+        spelling: индекс опечаток для BM25-кандидатов
+
+    Returns:
+        для каждого запроса список (позиция документа, оценка 0..1) по убыванию оценки
+    """
+    queries = list(queries)
+    if not queries or not embedding_index.size:
+        return [[] for _ in queries]
+
+    # Все запросы кодируются и ищутся по эмбеддингам одной матричной операцией
+    vectors = embedding_index.encoder.encode(queries)
+    semantic_positions, semantic_scores = embedding_index.search_vectors(vectors, candidates, mask)
+
+    results = []
+    for query, vector, row, row_scores in zip(queries, vectors, semantic_positions, semantic_scores):
+        text_scores = dict(search_engine.search(query, candidates, mask, spelling))
+        pool = set(text_scores)
+        # Когда допустимых документов меньше candidates, хвост строки заполнен отфильтрованными позициями с -inf
+        pool.update(
+            int(position) for position, score in zip(row, row_scores)
+            if position >= 0 and np.isfinite(score) and (mask is None or mask[position])
+        )
+        if not pool:
+            results.append([])
+            continue
+
+        positions = np.array(sorted(pool), dtype=np.int64)
+        cosine = np.clip(embedding_index.matrix[positions] @ vector, 0.0, 1.0)
+        text = np.array([text_scores.get(int(position), 0.0) for position in positions], dtype=np.float32)
+        scores = RERANK_TEXT_WEIGHT * text + (1 - RERANK_TEXT_WEIGHT) * cosine
+
+        order = np.argsort(-scores, kind='stable')[:top_k]
+        results.append([(int(positions[i]), float(scores[i])) for i in order if scores[i] > 0])
+    return results
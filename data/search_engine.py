@@ -0,0 +1,394 @@
+"""
+Полнотекстовый поиск мер поддержки: инвертированный индекс с ранжированием BM25
+"""
+
+import logging
+import math
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .spelling import SpellingIndex
+from .text_processing import analyze
+
+logger = logging.getLogger(__name__)
+
+# Веса полей (BM25F): совпадение в названии важнее совпадения в условиях
+FIELD_WEIGHTS: Dict[str, float] = {
+    'Название': 3.0,
+    'Категория': 2.0,
+    'Описание': 1.0,
+    'Условия': 0.8,
+}
+
+# Параметры BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def _field_text(value: Any) -> str:
+    """Приведение значения ячейки к строке (NaN и None -> пустая строка)"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    return str(value)
+
+
+def dataframe_records(df, fields: Sequence[str]) -> List[Dict[str, Any]]:
+    """Записи DataFrame только с колонками, нужными индексу"""
+    columns = [c for c in dict.fromkeys(['id', 'Название', 'Описание', *fields]) if c in df.columns]
+    return df[columns].to_dict('records')
+
+
+def _merge_postings(
+    postings: Dict[str, Tuple[np.ndarray, np.ndarray]],
+    terms: Iterable[str],
+    removals: Dict[str, List[int]],
+    additions: Dict[str, Tuple[List[int], List[float]]],
+) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """Копия постингов, в которой у изменившихся термов удалены и дописаны документы"""
+    postings = dict(postings)
+    for term in terms:
+        docs, impacts = postings.get(term, (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)))
+        if term in removals:
+            keep = ~np.isin(docs, removals[term])
+            docs, impacts = docs[keep], impacts[keep]
+        if term in additions:
+            new_docs, new_impacts = additions[term]
+            docs = np.concatenate([docs, np.asarray(new_docs, dtype=np.int32)])
+            impacts = np.concatenate([impacts, np.asarray(new_impacts, dtype=np.float32)])
+        if len(docs):
+            postings[term] = (docs, impacts)
+        else:
+            postings.pop(term, None)
+    return postings
+
+
+class SearchEngine:
+    """Инвертированный индекс по текстовым колонкам датасета"""
+
+    def __init__(self, fields: Sequence[str], field_weights: Optional[Dict[str, float]] = None):
+        """
+        Инициализация пустого индекса
+
+        Args:
+            fields: колонки, по которым строится индекс
+            field_weights: веса колонок (по умолчанию FIELD_WEIGHTS, иначе 1.0)
+        """
+        weights = field_weights or FIELD_WEIGHTS
+        self.fields: List[str] = list(fields)
+        self.field_weights: Dict[str, float] = {f: weights.get(f, 1.0) for f in self.fields}
+
+        # term -> (позиции документов int32, нормированные частоты без idf float32)
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.doc_ids: List[Any] = []
+        self.titles: List[str] = []
+        self.descriptions: List[str] = []
+        self.doc_lengths: List[float] = []
+        self.avg_doc_length: float = 0.0
+        # Термы, чьи постинги изменил apply_changes (инкрементальное обновление индекса опечаток)
+        self.changed_terms: Tuple[str, ...] = ()
+
+    @property
+    def size(self) -> int:
+        """Количество проиндексированных документов"""
+        return len(self.doc_ids)
+
+    @classmethod
+    def from_records(
+        cls,
+        records: Iterable[Dict[str, Any]],
+        fields: Sequence[str],
+        field_weights: Optional[Dict[str, float]] = None,
+    ) -> 'SearchEngine':
+        """
+        Построение индекса по списку записей
+
+        Args:
+            records: записи датасета (словарь колонка -> значение)
+            fields: колонки для индексации
+            field_weights: веса колонок
+
+        Returns:
+            готовый SearchEngine
+        """
+        builder = SearchIndexBuilder(fields, field_weights)
+        builder.add_records(records)
+        return builder.finish()
+
+    @classmethod
+    def from_dataframe(cls, df, fields: Sequence[str], field_weights: Optional[Dict[str, float]] = None) -> 'SearchEngine':
+        """
+        Построение индекса по DataFrame
+
+        Args:
+            df: pandas DataFrame с мерами поддержки
+            fields: колонки для индексации
+            field_weights: веса колонок
+
+        Returns:
+            готовый SearchEngine
+        """
+        return cls.from_records(dataframe_records(df, fields), fields, field_weights)
+
+    def _analyze_record(self, record: Dict[str, Any]) -> Tuple[Counter, float]:
+        """Взвешенные частоты термов и длина документа по полям индекса"""
+        frequencies: Counter = Counter()
+        length = 0.0
+        for field in self.fields:
+            weight = self.field_weights[field]
+            terms = analyze(_field_text(record.get(field)))
+            length += weight * len(terms)
+            for term in terms:
+                frequencies[term] += weight
+        return frequencies, length
+
+    def apply_changes(
+        self,
+        removed: Dict[int, Dict[str, Any]],
+        added: Dict[int, Dict[str, Any]],
+        size: int,
+        titles: Optional[Sequence[str]] = None,
+        descriptions: Optional[Sequence[str]] = None,
+    ) -> 'SearchEngine':
+        """
+        Инкрементальное обновление без изменения текущего индекса (copy-on-write)
+
+        Пересобираются только постинги термов, встречающихся в затронутых
+        документах; остальные массивы разделяются со старым индексом.
+        Средняя длина документа (avgdl) не пересчитывается до полной перестройки
+
+        Args:
+            removed: старая позиция -> запись документа, покидающего позицию
+            added: новая позиция -> запись документа, занимающего позицию
+            size: количество документов после обновления
+            titles: готовые названия новой версии (компактное хранение: колонка из ColumnStore);
+                None - копируется и правится список текущего индекса
+            descriptions: готовые описания новой версии
+
+        Returns:
+            новый SearchEngine
+        """
+        engine = SearchEngine(self.fields, self.field_weights)
+        engine.avg_doc_length = self.avg_doc_length
+        engine.doc_ids = self.doc_ids[:size] + [None] * max(0, size - self.size)
+        engine.titles = self.titles[:size] + [''] * max(0, size - self.size) if titles is None else titles
+        engine.descriptions = (self.descriptions[:size] + [''] * max(0, size - self.size)
+                               if descriptions is None else descriptions)
+        engine.doc_lengths = self.doc_lengths[:size] + [0.0] * max(0, size - self.size)
+
+        removals = self._term_positions(removed)
+        additions = engine._add_documents(added, titles is None, descriptions is None)
+        engine.changed_terms = tuple(removals.keys() | additions.keys())
+        engine.postings = _merge_postings(self.postings, engine.changed_terms, removals, additions)
+        return engine
+
+    def _term_positions(self, records: Dict[int, Dict[str, Any]]) -> Dict[str, List[int]]:
+        """Терм -> позиции документов, покидающих индекс"""
+        positions: Dict[str, List[int]] = {}
+        for position, record in records.items():
+            for term in self._analyze_record(record)[0]:
+                positions.setdefault(term, []).append(position)
+        return positions
+
+    def _add_documents(self, records: Dict[int, Dict[str, Any]], set_titles: bool,
+                       set_descriptions: bool) -> Dict[str, Tuple[List[int], List[float]]]:
+        """
+        Запись документов на их позиции (id, длина, названия и описания)
+
+        Returns:
+            терм -> (позиции документов, вклады BM25) для дописывания в постинги
+        """
+        additions: Dict[str, Tuple[List[int], List[float]]] = {}
+        for position, record in records.items():
+            frequencies, length = self._analyze_record(record)
+            self.doc_ids[position] = record.get('id', position + 1)
+            if set_titles:
+                self.titles[position] = _field_text(record.get('Название')) or 'Без названия'
+            if set_descriptions:
+                self.descriptions[position] = _field_text(record.get('Описание'))
+            self.doc_lengths[position] = length
+            norm = self._length_norm(position)
+            for term, tf in frequencies.items():
+                docs, impacts = additions.setdefault(term, ([], []))
+                docs.append(position)
+                impacts.append(tf * (BM25_K1 + 1) / (tf + norm))
+        return additions
+
+    def to_csr(self) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Упаковка постингов в CSR-формат для сохранения на диск
+
+        Returns:
+            (словарь термов, смещения int64, позиции документов int32, частоты float32)
+        """
+        vocabulary = list(self.postings)
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        for i, term in enumerate(vocabulary):
+            offsets[i + 1] = offsets[i] + len(self.postings[term][0])
+
+        if vocabulary:
+            docs = np.concatenate([self.postings[term][0] for term in vocabulary])
+            impacts = np.concatenate([self.postings[term][1] for term in vocabulary])
+        else:
+            docs, impacts = np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        return vocabulary, offsets, docs.astype(np.int32, copy=False), impacts.astype(np.float32, copy=False)
+
+    @classmethod
+    def from_csr(
+        cls,
+        fields: Sequence[str],
+        vocabulary: Sequence[str],
+        offsets: np.ndarray,
+        docs: np.ndarray,
+        impacts: np.ndarray,
+        doc_lengths: np.ndarray,
+        doc_ids: List[Any],
+        titles: List[str],
+        descriptions: List[str],
+        field_weights: Optional[Dict[str, float]] = None,
+    ) -> 'SearchEngine':
+        """
+        Восстановление индекса из CSR-массивов без копирования
+
+        Постинги становятся срезами (view) переданных массивов, поэтому
+        при загрузке через np.load(mmap_mode='r') страницы делятся между процессами
+        """
+        engine = cls(fields, field_weights)
+        bounds = offsets.tolist()
+        engine.postings = {
+            term: (docs[bounds[i]:bounds[i + 1]], impacts[bounds[i]:bounds[i + 1]])
+            for i, term in enumerate(vocabulary)
+        }
+        engine.doc_ids = doc_ids
+        engine.titles = titles
+        engine.descriptions = descriptions
+        engine.doc_lengths = [float(length) for length in doc_lengths]
+        engine.avg_doc_length = (sum(engine.doc_lengths) / engine.size) if engine.size else 0.0
+        return engine
+
+    def _length_norm(self, position: int) -> float:
+        """Знаменатель BM25 для документа: k1 * (1 - b + b * dl / avgdl)"""
+        if not self.avg_doc_length:
+            return BM25_K1
+        return BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[position] / self.avg_doc_length)
+
+    def _idf(self, document_frequency: int) -> float:
+        """Обратная документная частота (вариант BM25 без отрицательных значений)"""
+        return math.log(1 + (self.size - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def search(self, query: str, top_k: int = 5, mask: Optional[np.ndarray] = None,
+               spelling: Optional[SpellingIndex] = None) -> List[Tuple[int, float]]:
+        """
+        Поиск документов по запросу
+
+        Args:
+            query: текст запроса
+            top_k: максимальное количество результатов
+            mask: булев массив допустимых документов (фасетный фильтр, None - все)
+            spelling: индекс опечаток: неизвестные слова запроса заменяются исправлениями
+
+        Returns:
+            список (позиция документа, нормированная оценка 0..1) по убыванию оценки
+        """
+        if spelling is not None:
+            variants = spelling.expand(query)
+        else:
+            variants = {term: [(term, 1.0)] for term in analyze(query)}
+        if not variants or not self.size:
+            return []
+
+        # Плотный аккумулятор: одна векторная операция на терм запроса
+        scores = np.zeros(self.size, dtype=np.float32)
+        max_score = 0.0
+        for alternatives in variants.values():
+            # Слово запроса входит в максимум оценки один раз (лучший вариант без штрафа),
+            # поэтому совпадение по исправлению оценивается ниже точного
+            best = 0.0
+            for term, weight in alternatives:
+                posting = self.postings.get(term)
+                if posting is None:
+                    continue
+                docs, impacts = posting
+                idf = self._idf(len(docs))
+                best = max(best, idf)
+                scores[docs] += np.float32(idf * weight) * impacts
+            max_score += best * (BM25_K1 + 1)
+
+        if not max_score:
+            return []
+        if mask is not None:
+            # Фильтр применяется к аккумулятору до отбора top-k
+            np.multiply(scores, mask, out=scores)
+
+        # Частичный отбор top-k за линейное время вместо полной сортировки
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            best = np.argpartition(scores[candidates], -top_k)[-top_k:]
+            candidates = candidates[best]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+
+        return [(int(position), min(float(scores[position]) / max_score, 1.0)) for position in candidates]
+
+
+class SearchIndexBuilder:
+    """
+    Построение индекса по частям: записи добавляются пачками по мере чтения
+
+    Частоты термов копятся в компактных массивах по каждой пачке; итоговые
+    BM25-веса считаются векторно в finish(), когда известна средняя длина документа
+    """
+
+    def __init__(self, fields: Sequence[str], field_weights: Optional[Dict[str, float]] = None):
+        self.engine = SearchEngine(fields, field_weights)
+        self._parts: Dict[str, List[Tuple[np.ndarray, np.ndarray]]] = {}
+
+    def add_records(self, records: Iterable[Dict[str, Any]]):
+        """
+        Добавление пачки записей
+
+        Args:
+            records: записи датасета (словарь колонка -> значение)
+        """
+        engine = self.engine
+        chunk: Dict[str, Tuple[List[int], List[float]]] = {}
+        for record in records:
+            position = engine.size
+            frequencies, length = engine._analyze_record(record)
+            engine.doc_ids.append(record.get('id', position + 1))
+            engine.titles.append(_field_text(record.get('Название')) or 'Без названия')
+            engine.descriptions.append(_field_text(record.get('Описание')))
+            engine.doc_lengths.append(length)
+            for term, tf in frequencies.items():
+                docs, tfs = chunk.setdefault(term, ([], []))
+                docs.append(position)
+                tfs.append(tf)
+
+        for term, (docs, tfs) in chunk.items():
+            self._parts.setdefault(term, []).append(
+                (np.asarray(docs, dtype=np.int32), np.asarray(tfs, dtype=np.float32))
+            )
+
+    def finish(self) -> SearchEngine:
+        """
+        Расчет BM25-весов и сборка постингов
+
+        Returns:
+            готовый SearchEngine
+        """
+        engine = self.engine
+        engine.avg_doc_length = (sum(engine.doc_lengths) / engine.size) if engine.size else 0.0
+        lengths = np.asarray(engine.doc_lengths, dtype=np.float32)
+        if engine.avg_doc_length:
+            norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / engine.avg_doc_length)
+        else:
+            norms = np.full(len(lengths), BM25_K1, dtype=np.float32)
+
+        for term, parts in self._parts.items():
+            docs = parts[0][0] if len(parts) == 1 else np.concatenate([part[0] for part in parts])
+            tfs = parts[0][1] if len(parts) == 1 else np.concatenate([part[1] for part in parts])
+            engine.postings[term] = (docs, (tfs * (BM25_K1 + 1) / (tfs + norms[docs])).astype(np.float32))
+        self._parts = {}
+
+        logger.info(f"Поисковый индекс построен: документов {engine.size}, термов {len(engine.postings)}")
+        return engine
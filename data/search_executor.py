@@ -0,0 +1,182 @@
+"""
+Выполнение поиска вне event loop: пул потоков для запросов пользователей
+
+Обработчики бота вызывают поиск через await, поэтому токенизация, BM25
+и матричные операции не блокируют другие диалоги. Число задач в работе
+ограничено: при насыщении вызов ждет не дольше queue_timeout и получает
+SearchOverloaded, а не растущую очередь. Пакетное сопоставление запросов
+выполняется отдельной командой со своим пулом процессов (batch_match)
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .dataset_manager import DatasetManager, dataset_manager
+from .facets import FacetFilter
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Максимальный размер пула потоков при автоматическом выборе
+DEFAULT_MAX_THREADS = 4
+
+EXECUTOR_SECONDS = metrics.histogram(
+    'search_executor_seconds', 'Время вызова поиска в пуле: ожидание места и выполнение', ('pool',)
+)
+EXECUTOR_CALLS = metrics.counter('search_executor_calls_total', 'Вызовы поиска в пулах по результату', ('pool', 'outcome'))
+
+
+class SearchOverloaded(RuntimeError):
+    """Пул поиска насыщен: задача не принята за queue_timeout"""
+
+
+class SearchTimeout(TimeoutError):
+    """Поиск не уложился в таймаут вызова"""
+
+
+class SearchExecutor:
+    """
+    Асинхронный фасад поиска поверх DatasetManager
+
+    Настройки задаются атрибутами до start(); пул потоков создается
+    при первом вызове, если start() не вызывался
+    """
+
+    def __init__(
+        self,
+        manager: DatasetManager,
+        threads: int = 0,
+        timeout: float = 5.0,
+        max_pending: int = 64,
+        queue_timeout: float = 1.0,
+    ):
+        """
+        Args:
+            manager: менеджер датасета
+            threads: размер пула потоков для поиска (0 - по числу ядер, не больше DEFAULT_MAX_THREADS)
+            timeout: таймаут одного вызова в секундах (0 - без таймаута)
+            max_pending: максимум задач в работе на пул
+            queue_timeout: время ожидания свободного места в пуле до SearchOverloaded
+        """
+        self.manager = manager
+        self.threads = threads
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._thread_count = 0
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._pending: Dict[str, int] = {'threads': 0}
+        # Фоновая загрузка датасета (задача бота) и сколько поиск ее ждет (секунды, 0 - без ограничения)
+        self.loading: Optional[asyncio.Future] = None
+        self.load_wait = 30.0
+        self.counters: Dict[str, int] = {
+            'completed': 0,
+            'timeouts': 0,
+            'rejected': 0,
+        }
+
+    def start(self):
+        """Создание пула по текущим настройкам"""
+        if self._thread_pool is None:
+            # Потоки сверх числа ядер только конкурируют за GIL с event loop
+            self._thread_count = self.threads or min(DEFAULT_MAX_THREADS, os.cpu_count() or 1)
+            self._thread_pool = ThreadPoolExecutor(max_workers=self._thread_count, thread_name_prefix='search')
+
+    async def shutdown(self):
+        """Остановка пула; задачи в работе дорабатывают"""
+        pool, self._thread_pool = self._thread_pool, None
+        self._slots.clear()
+        if pool is not None:
+            await asyncio.get_running_loop().run_in_executor(None, pool.shutdown)
+
+    def pending(self, pool: str) -> int:
+        """Количество задач в работе в пуле ('threads')"""
+        return self._pending.get(pool, 0)
+
+    async def wait_loaded(self) -> bool:
+        """
+        Ожидание фоновой загрузки датасета не дольше load_wait
+
+        Returns:
+            False, если загрузка еще идет
+        """
+        loading = self.loading
+        if loading is None or loading.done():
+            return True
+        done, _ = await asyncio.wait({loading}, timeout=self.load_wait or None)
+        return bool(done)
+
+    async def _run(self, name: str, pool: Executor, fn: Callable, *args) -> Any:
+        """
+        Выполнение функции в пуле с ограничением задач в работе и таймаутом
+
+        Место в пуле освобождается, когда задача действительно завершилась,
+        а не когда истек таймаут вызова: иначе зависшие задачи копились бы
+        в пуле сверх max_pending
+        """
+        started = time.perf_counter()
+        if not await self.wait_loaded():
+            self.counters['rejected'] += 1
+            EXECUTOR_CALLS.labels(name, 'rejected').inc()
+            raise SearchOverloaded(f"Датасет загружается дольше {self.load_wait} с")
+        slots = self._slots.get(name)
+        if slots is None:
+            slots = self._slots[name] = asyncio.Semaphore(max(1, self.max_pending))
+        try:
+            await asyncio.wait_for(slots.acquire(), self.queue_timeout or None)
+        except asyncio.TimeoutError:
+            self.counters['rejected'] += 1
+            EXECUTOR_CALLS.labels(name, 'rejected').inc()
+            raise SearchOverloaded(f"Пул {name} занят: {self.max_pending} задач в работе")
+
+        def release(_):
+            self._pending[name] -= 1
+            slots.release()
+
+        self._pending[name] += 1
+        future = asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        future.add_done_callback(release)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), self.timeout or None)
+        except asyncio.TimeoutError:
+            self.counters['timeouts'] += 1
+            EXECUTOR_CALLS.labels(name, 'timeout').inc()
+            raise SearchTimeout(f"Поиск не уложился в {self.timeout} с")
+        self.counters['completed'] += 1
+        EXECUTOR_CALLS.labels(name, 'completed').inc()
+        EXECUTOR_SECONDS.labels(name).observe(time.perf_counter() - started)
+        return result
+
+    async def _run_in_thread(self, fn: Callable, *args) -> Any:
+        if self._thread_pool is None:
+            self.start()
+        return await self._run('threads', self._thread_pool, fn, *args)
+
+    async def search(self, query: str, top_k: int = 5, filters: Optional[FacetFilter] = None) -> List[Dict[str, Any]]:
+        """Асинхронный DatasetManager.search"""
+        return await self._run_in_thread(self.manager.search, query, top_k, filters)
+
+    async def search_ids(self, query: str, top_k: int = 5, filters: Optional[FacetFilter] = None) -> List[Tuple[Any, float]]:
+        """Асинхронный DatasetManager.search_ids"""
+        return await self._run_in_thread(self.manager.search_ids, query, top_k, filters)
+
+    async def semantic_search(self, query: str, top_k: int = 5, filters: Optional[FacetFilter] = None) -> List[Dict[str, Any]]:
+        """Асинхронный DatasetManager.semantic_search"""
+        return await self._run_in_thread(self.manager.semantic_search, query, top_k, filters)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики и заполненность пула"""
+        return {
+            **self.counters,
+            'threads': self._thread_count,
+            'pending_threads': self.pending('threads'),
+        }
+
+
+# Глобальный исполнитель поиска для обработчиков
+search_executor = SearchExecutor(dataset_manager)
@@ -0,0 +1,293 @@
+"""
+Загрузка датасета из Google Sheets с проверкой ревизии и локальным кэшем
+
+Перед загрузкой запрашивается версия файла в Drive API (files.get,
+поля version и modifiedTime - один легкий запрос). Если версия совпадает
+с сохраненной в кэше, таблица не скачивается. Иначе лист читается
+несколькими диапазонами строк за один вызов values.batchGet, а результат
+атомарно записывается в кэш на диске.
+
+Если API недоступен или отвечает дольше таймаута, используется последний
+успешно загруженный кэш.
+
+Базовые URL API настраиваются, поэтому загрузчик проверяется против
+локального фейкового сервера (benchmarks/fake_sheets.py)
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from .lazy import lazy_module
+
+pd = lazy_module('pandas')
+
+logger = logging.getLogger(__name__)
+
+SHEETS_API_URL = 'https://sheets.googleapis.com/v4'
+DRIVE_API_URL = 'https://www.googleapis.com/drive/v3'
+SCOPES = (
+    'https://www.googleapis.com/auth/spreadsheets.readonly',
+    'https://www.googleapis.com/auth/drive.metadata.readonly',
+)
+
+# Диапазонов в одном batchGet: ограничивает длину URL запроса
+_RANGES_PER_REQUEST = 50
+
+
+class SheetsUnavailable(RuntimeError):
+    """API недоступен, а кэша на диске нет"""
+
+
+class SheetsAuthError(RuntimeError):
+    """Не удалось получить токен сервисного аккаунта (сеть, таймаут или отказ в авторизации)"""
+
+
+# Ошибки обращения к API, при которых используются текущие данные или кэш
+_API_ERRORS = (httpx.HTTPError, ValueError, SheetsAuthError)
+
+
+def column_letter(index: int) -> str:
+    """Буквенное обозначение колонки A1 по номеру с 1 (1 -> A, 27 -> AA)"""
+    letters = ''
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def _quote_sheet(sheet_name: str) -> str:
+    return "'" + sheet_name.replace("'", "''") + "'"
+
+
+class GoogleSheetsLoader:
+    """Загрузчик одного листа таблицы"""
+
+    def __init__(self, sheet_id: str, sheet_name: str, credentials_file: str = '', api_key: str = '',
+                 cache_dir: str = 'data/.sheets_cache', timeout: float = 10.0, batch_rows: int = 5000,
+                 sheets_api_url: str = SHEETS_API_URL, drive_api_url: str = DRIVE_API_URL):
+        """
+        Args:
+            sheet_id: ID документа
+            sheet_name: название листа
+            credentials_file: ключ сервисного аккаунта (пустая строка или нет файла - без OAuth)
+            api_key: ключ API для публичных таблиц
+            cache_dir: каталог кэша (пустая строка - кэш отключен)
+            timeout: таймаут одного HTTP-запроса в секундах
+            batch_rows: строк в одном диапазоне batchGet
+            sheets_api_url: базовый URL Sheets API
+            drive_api_url: базовый URL Drive API
+        """
+        self.sheet_id = sheet_id
+        self.sheet_name = sheet_name
+        self.credentials_file = credentials_file
+        self.api_key = api_key
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.batch_rows = batch_rows
+        self.sheets_api_url = sheets_api_url.rstrip('/')
+        self.drive_api_url = drive_api_url.rstrip('/')
+        self._credentials = None
+        self._client: Optional[httpx.Client] = None
+        # Ревизия последних загруженных данных (из API или кэша)
+        self.revision: Optional[Dict[str, Any]] = None
+        self.counters: Dict[str, int] = {
+            'revision_checks': 0,
+            'downloads': 0,
+            'unchanged': 0,
+            'cache_fallbacks': 0,
+            'requests': 0,
+        }
+
+    @property
+    def cache_path(self) -> str:
+        name = re.sub(r'[^\w.-]+', '_', f'{self.sheet_id}-{self.sheet_name}')
+        return os.path.join(self.cache_dir, f'{name}.json')
+
+    # --- HTTP ---
+
+    def _headers(self) -> Dict[str, str]:
+        if not self.credentials_file or not os.path.exists(self.credentials_file):
+            return {}
+        from google.auth.exceptions import GoogleAuthError
+
+        try:
+            if self._credentials is None:
+                from google.oauth2 import service_account
+                self._credentials = service_account.Credentials.from_service_account_file(
+                    self.credentials_file, scopes=list(SCOPES),
+                )
+            if not self._credentials.valid:
+                from google.auth.transport.requests import Request
+                # Без явного таймаута транспорт google-auth ждет токен до 120 с
+                self._credentials.refresh(functools.partial(Request(), timeout=self.timeout))
+        except GoogleAuthError as e:
+            raise SheetsAuthError(f"Не удалось получить токен Google: {e}") from e
+        return {'Authorization': f'Bearer {self._credentials.token}'}
+
+    def _get(self, url: str, params: List[Tuple[str, Any]]) -> Dict[str, Any]:
+        if self._client is None:
+            # Одно keep-alive соединение на все запросы загрузчика
+            self._client = httpx.Client(timeout=self.timeout)
+        if self.api_key:
+            params = [*params, ('key', self.api_key)]
+        self.counters['requests'] += 1
+        response = self._client.get(url, params=params, headers=self._headers())
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    # --- API ---
+
+    def fetch_revision(self) -> Dict[str, Any]:
+        """
+        Версия файла таблицы по Drive API (без скачивания данных)
+
+        Returns:
+            {'version': ..., 'modified_time': ...}
+        """
+        self.counters['revision_checks'] += 1
+        data = self._get(f'{self.drive_api_url}/files/{self.sheet_id}',
+                         [('fields', 'version,modifiedTime'), ('supportsAllDrives', 'true')])
+        return {'version': str(data.get('version', '')), 'modified_time': data.get('modifiedTime', '')}
+
+    def _grid_size(self) -> Tuple[int, int]:
+        """Количество строк и колонок листа"""
+        data = self._get(
+            f'{self.sheets_api_url}/spreadsheets/{self.sheet_id}',
+            [('fields', 'sheets.properties(title,gridProperties(rowCount,columnCount))')],
+        )
+        for sheet in data.get('sheets', []):
+            properties = sheet.get('properties', {})
+            if properties.get('title') == self.sheet_name:
+                grid = properties.get('gridProperties', {})
+                return grid.get('rowCount', 0), grid.get('columnCount', 0)
+        raise ValueError(f"Лист '{self.sheet_name}' не найден в таблице {self.sheet_id}")
+
+    def _download(self) -> Tuple[List[Any], List[List[Any]]]:
+        """
+        Чтение листа диапазонами по batch_rows строк через values.batchGet
+
+        Returns:
+            (заголовок, строки)
+        """
+        row_count, column_count = self._grid_size()
+        last_column = column_letter(max(1, column_count))
+        sheet = _quote_sheet(self.sheet_name)
+        ranges = [f'{sheet}!A{start}:{last_column}{min(start + self.batch_rows - 1, row_count)}'
+                  for start in range(1, row_count + 1, self.batch_rows)]
+
+        rows: List[List[Any]] = []
+        for i in range(0, len(ranges), _RANGES_PER_REQUEST):
+            data = self._get(
+                f'{self.sheets_api_url}/spreadsheets/{self.sheet_id}/values:batchGet',
+                [
+                    *(('ranges', value_range) for value_range in ranges[i:i + _RANGES_PER_REQUEST]),
+                    ('majorDimension', 'ROWS'),
+                    ('valueRenderOption', 'UNFORMATTED_VALUE'),
+                    ('dateTimeRenderOption', 'FORMATTED_STRING'),
+                ],
+            )
+            for value_range in data.get('valueRanges', []):
+                rows.extend(value_range.get('values', []))
+
+        # Пустые строки в конце листа API не возвращает, внутри диапазона - возвращает как []
+        if not rows:
+            return [], []
+        header = [str(name).strip() for name in rows[0]]
+        width = len(header)
+        body = [row[:width] + [None] * (width - len(row)) for row in rows[1:] if any(v != '' for v in row)]
+        return header, body
+
+    # --- Кэш ---
+
+    def _read_cache(self) -> Optional[Dict[str, Any]]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, revision: Dict[str, Any], header: List[Any], rows: List[List[Any]]):
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f'{self.cache_path}.tmp-{os.getpid()}'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'revision': revision, 'fetched_at': time.time(), 'header': header, 'rows': rows},
+                          f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить кэш Google Sheets: {e}")
+
+    @staticmethod
+    def _frame(header: List[Any], rows: List[List[Any]]) -> pd.DataFrame:
+        return pd.DataFrame(rows, columns=header)
+
+    # --- Загрузка ---
+
+    def changed(self) -> bool:
+        """
+        Изменилась ли таблица с последней загрузки (один запрос к Drive API)
+
+        Ошибки API не считаются изменением: текущие данные остаются в работе
+        """
+        if self.revision is None:
+            return True
+        try:
+            return self.fetch_revision()['version'] != self.revision.get('version')
+        except _API_ERRORS as e:
+            logger.warning(f"Не удалось проверить ревизию Google Sheets: {e}")
+            return False
+
+    def load(self) -> pd.DataFrame:
+        """
+        Загрузка листа: из кэша, если ревизия не изменилась, иначе из API
+
+        Returns:
+            pandas DataFrame с данными листа
+
+        Raises:
+            SheetsUnavailable: API недоступен и кэша нет
+        """
+        cache = self._read_cache()
+        try:
+            revision = self.fetch_revision()
+            if cache is not None and cache.get('revision', {}).get('version') == revision['version']:
+                self.counters['unchanged'] += 1
+                logger.info(f"Google Sheets не изменилась (версия {revision['version']}), данные из кэша")
+                self.revision = revision
+                return self._frame(cache['header'], cache['rows'])
+
+            started = time.perf_counter()
+            header, rows = self._download()
+            self.counters['downloads'] += 1
+            logger.info(f"Загружено {len(rows)} строк из Google Sheets (версия {revision['version']}) "
+                        f"за {time.perf_counter() - started:.2f} с")
+        except _API_ERRORS as e:
+            if cache is None:
+                raise SheetsUnavailable(f"Google Sheets недоступен и кэша нет: {e}") from e
+            self.counters['cache_fallbacks'] += 1
+            age = time.time() - cache.get('fetched_at', 0)
+            logger.warning(f"Google Sheets недоступен ({e}), используется кэш возрастом {age / 60:.0f} мин")
+            self.revision = cache.get('revision')
+            return self._frame(cache['header'], cache['rows'])
+
+        self._write_cache(revision, header, rows)
+        self.revision = revision
+        return self._frame(header, rows)
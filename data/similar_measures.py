@@ -0,0 +1,264 @@
+"""
+Граф похожих мер поддержки: k ближайших соседей каждой меры
+
+Граф строится при загрузке датасета, поэтому кнопки "похожие меры" - это
+чтение строки готового массива (O(k)), а не поиск по всему каталогу.
+Похожесть двух мер:
+    (1 - CATEGORY_WEIGHT) * косинус эмбеддингов текста
+    + CATEGORY_WEIGHT * [одинаковая категория]
+Матрица похожести симметрична, поэтому считается только верхний
+треугольник плиток TILE_SIZE x TILE_SIZE: одна плитка - одно матричное
+произведение, из которого берутся top-k и по строкам (меры блока i), и по
+столбцам (меры блока j). Плитки считаются в пуле потоков (numpy отпускает
+GIL в матричном произведении и argpartition), кандидаты сливаются с
+текущими top-k строк в основном потоке.
+
+Результат - компактные массивы: соседи int32 (n, k) и оценки float16 (n, k);
+позиция -1 - соседа нет (каталог меньше k + 1 мер или похожесть не выше нуля).
+При инкрементальном обновлении датасета пересчитываются только строки
+измененных мер и мер, потерявших соседа; остальные строки дополняются
+кандидатами из измененных мер.
+"""
+
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+import numpy as np
+
+from .dataset_delta import DatasetDelta
+
+logger = logging.getLogger(__name__)
+
+# Вес совпадения категории в оценке похожести
+CATEGORY_WEIGHT = 0.15
+# Сторона плитки матрицы похожести (float32: 2048 x 2048 - 16 МБ на поток)
+TILE_SIZE = 2048
+# Меньшие каталоги строятся в текущем потоке: пул не окупается
+PARALLEL_MIN_SIZE = 2 * TILE_SIZE
+
+_Task = TypeVar('_Task')
+_Result = TypeVar('_Result')
+
+
+def _run_tasks(function: Callable[[_Task], _Result], tasks: Iterable[_Task], threads: int) -> Iterator[_Result]:
+    """Результаты function по задачам в исходном порядке; в работе не больше 2 * threads задач"""
+    if threads <= 1:
+        for task in tasks:
+            yield function(task)
+        return
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='similar') as pool:
+        pending: deque = deque()
+        for task in tasks:
+            pending.append(pool.submit(function, task))
+            if len(pending) >= 2 * threads:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _top_k(scores: np.ndarray, k: int, axis: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    k лучших оценок по строкам (axis=1) или столбцам (axis=0) плитки, без сортировки
+
+    Returns:
+        (локальные индексы, оценки) формы (строки или столбцы плитки, min(k, длина))
+    """
+    if axis == 0:
+        scores = scores.T
+    width = scores.shape[1]
+    if width <= k:
+        indices = np.broadcast_to(np.arange(width), scores.shape)
+    else:
+        indices = np.argpartition(scores, width - k, axis=1)[:, width - k:]
+    return indices, np.take_along_axis(scores, indices, axis=1)
+
+
+class _RunningTopK:
+    """Текущие k лучших соседей для набора строк графа"""
+
+    def __init__(self, rows: int, k: int):
+        self.k = k
+        self.positions = np.full((rows, k), -1, dtype=np.int64)
+        self.scores = np.full((rows, k), -np.inf, dtype=np.float32)
+
+    def push(self, rows: np.ndarray, positions: np.ndarray, scores: np.ndarray):
+        """Слияние кандидатов (rows x c) с текущими top-k этих строк"""
+        positions = np.hstack([self.positions[rows], positions])
+        scores = np.hstack([self.scores[rows], scores])
+        keep = np.argpartition(scores, scores.shape[1] - self.k, axis=1)[:, -self.k:]
+        self.positions[rows] = np.take_along_axis(positions, keep, axis=1)
+        self.scores[rows] = np.take_along_axis(scores, keep, axis=1)
+
+    def finish(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Строки по убыванию оценки (при равенстве - по позиции); соседи с оценкой <= 0 отбрасываются"""
+        order = np.lexsort((self.positions, -self.scores), axis=1)
+        positions = np.take_along_axis(self.positions, order, axis=1)
+        scores = np.take_along_axis(self.scores, order, axis=1)
+        empty = ~(scores > 0)
+        positions[empty] = -1
+        scores[empty] = 0
+        return positions.astype(np.int32), scores.astype(np.float16)
+
+
+class SimilarityGraph:
+    """Граф k ближайших соседей мер по позициям индекса"""
+
+    def __init__(self, neighbours: np.ndarray, scores: np.ndarray):
+        """
+        Args:
+            neighbours: позиции соседей (n, k) int32 по убыванию похожести, -1 - соседа нет
+            scores: оценки похожести (n, k) float16
+        """
+        self.neighbours = neighbours
+        self.scores = scores
+
+    @property
+    def size(self) -> int:
+        return self.neighbours.shape[0]
+
+    @property
+    def k(self) -> int:
+        return self.neighbours.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.neighbours.nbytes + self.scores.nbytes
+
+    def related(self, position: int, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Похожие меры
+
+        Args:
+            position: позиция меры в индексе
+            limit: максимум соседей (None - все k)
+
+        Returns:
+            пары (позиция, оценка) по убыванию похожести
+        """
+        neighbours = self.neighbours[position, :limit].tolist()
+        scores = self.scores[position, :limit].tolist()
+        return [(neighbour, score) for neighbour, score in zip(neighbours, scores) if neighbour >= 0]
+
+    @staticmethod
+    def _scores(matrix: np.ndarray, categories: Optional[np.ndarray], rows, columns) -> np.ndarray:
+        """Плитка матрицы похожести: строки rows x столбцы columns (срезы или массивы позиций)"""
+        scores = matrix[rows] @ matrix[columns].T
+        if categories is not None:
+            row_categories = categories[rows]
+            same = (row_categories[:, None] == categories[columns][None, :]) & (row_categories >= 0)[:, None]
+            scores *= 1 - CATEGORY_WEIGHT
+            scores += CATEGORY_WEIGHT * same
+        return scores
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, categories: Optional[np.ndarray], k: int,
+              threads: int = 1) -> 'SimilarityGraph':
+        """
+        Полное построение графа
+
+        Args:
+            matrix: L2-нормированные эмбеддинги мер (n, dim)
+            categories: коды категорий (n,), -1 - категории нет (None - без учета категорий)
+            k: количество соседей каждой меры
+            threads: потоки для плиток (используются для каталогов от PARALLEL_MIN_SIZE мер)
+        """
+        size = matrix.shape[0]
+        top = _RunningTopK(size, k)
+        starts = range(0, size, TILE_SIZE)
+        tiles = [(i, j) for i in starts for j in starts if j >= i]
+
+        def tile_candidates(tile: Tuple[int, int]):
+            i, j = tile
+            rows, columns = slice(i, i + TILE_SIZE), slice(j, j + TILE_SIZE)
+            scores = cls._scores(matrix, categories, rows, columns)
+            if i == j:
+                np.fill_diagonal(scores, -np.inf)
+            by_row = _top_k(scores, k, axis=1)
+            by_column = _top_k(scores, k, axis=0) if i != j else None
+            return tile, by_row, by_column
+
+        if size > 1 and k:
+            threads = threads if size >= PARALLEL_MIN_SIZE else 1
+            for (i, j), (row_indices, row_scores), by_column in _run_tasks(tile_candidates, tiles, threads):
+                top.push(np.arange(i, i + len(row_indices)), row_indices + j, row_scores)
+                if by_column is not None:
+                    column_indices, column_scores = by_column
+                    top.push(np.arange(j, j + len(column_indices)), column_indices + i, column_scores)
+
+        neighbours, scores = top.finish()
+        graph = cls(neighbours, scores)
+        logger.info(f"Граф похожих мер построен: {size} мер, k={k}, плиток {len(tiles)}, "
+                    f"{graph.nbytes / 2**20:.1f} МБ")
+        return graph
+
+    def apply_changes(self, delta: DatasetDelta, matrix: np.ndarray, categories: Optional[np.ndarray],
+                      threads: int = 1) -> 'SimilarityGraph':
+        """
+        Инкрементальное обновление по раскладке DatasetDelta; текущий граф не изменяется
+
+        Строки добавленных и измененных мер и мер, чей сосед удален или
+        изменен, считаются заново по всему каталогу; остальные строки
+        переносятся (с переводом позиций) и сливаются с оценками против
+        новых строк
+
+        Args:
+            delta: изменения относительно версии, по которой построен граф
+            matrix: эмбеддинги новой версии (delta.size, dim)
+            categories: коды категорий новой версии
+            threads: потоки для блоков строк
+        """
+        size, k = delta.size, self.k
+        # Старая позиция -> новая (-1: документ удален или изменен)
+        remap = np.full(self.size + 1, -1, dtype=np.int64)
+        remap[:self.size] = np.arange(self.size)
+        remap[np.asarray(delta.vacated, dtype=np.int64)] = -1
+        remap[np.fromiter(delta.moved.values(), dtype=np.int64)] = np.fromiter(delta.moved, dtype=np.int64)
+        remap[remap >= size] = -1
+
+        # Новая позиция -> старая для перенесенных без изменений строк (-1 - новая строка)
+        source = np.arange(size, dtype=np.int64)
+        source[source >= self.size] = -1
+        source[np.fromiter(delta.moved, dtype=np.int64)] = np.fromiter(delta.moved.values(), dtype=np.int64)
+        dirty = np.fromiter(delta.new_rows, dtype=np.int64)
+        source[dirty] = -1
+
+        # remap[-1] = -1: пустые места строк остаются пустыми
+        kept = np.flatnonzero(source >= 0)
+        old_neighbours = self.neighbours[source[kept]].astype(np.int64)
+        neighbours = remap[old_neighbours]
+        lost = ((old_neighbours >= 0) & (neighbours < 0)).any(axis=1)
+        recompute = np.union1d(dirty, kept[lost])
+        kept, neighbours = kept[~lost], neighbours[~lost]
+
+        top = _RunningTopK(size, k)
+        top.positions[kept] = neighbours
+        top.scores[kept] = np.where(neighbours >= 0, self.scores[source[kept]].astype(np.float32), -np.inf)
+
+        # Блоки строк так, чтобы матрица оценок блока занимала не больше плитки
+        row_block = max(1, TILE_SIZE * TILE_SIZE // max(size, 1))
+        column_block = max(1, TILE_SIZE * TILE_SIZE // max(len(dirty), 1))
+
+        def full_rows(start: int):
+            rows = recompute[start:start + row_block]
+            scores = self._scores(matrix, categories, rows, slice(None))
+            scores[np.arange(len(rows)), rows] = -np.inf
+            return rows, _top_k(scores, k, axis=1)
+
+        def new_columns(start: int):
+            rows = kept[start:start + column_block]
+            return rows, _top_k(self._scores(matrix, categories, rows, dirty), k, axis=1)
+
+        if size > 1 and k:
+            threads = threads if size >= PARALLEL_MIN_SIZE else 1
+            for rows, (indices, scores) in _run_tasks(full_rows, range(0, len(recompute), row_block), threads):
+                top.push(rows, indices, scores)
+            if len(dirty):
+                for rows, (indices, scores) in _run_tasks(new_columns, range(0, len(kept), column_block), threads):
+                    top.push(rows, dirty[indices], scores)
+
+        neighbours, scores = top.finish()
+        logger.info(f"Граф похожих мер обновлен: пересчитано строк {len(recompute)}, "
+                    f"дополнено {len(kept) if len(dirty) else 0}")
+        return SimilarityGraph(neighbours, scores)
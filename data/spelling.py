@@ -0,0 +1,317 @@
+"""
+Исправление опечаток в запросах по словарю поискового индекса
+
+Словарь - нормализованные термы (основы) текстовых колонок датасета,
+индекс строится один раз при загрузке:
+    - словарь удалений (SymSpell, symmetric delete): для каждого терма все
+      варианты без одной буквы; опечатка на одну правку (пропуск, лишняя
+      или замененная буква, перестановка соседних) находится несколькими
+      обращениями к словарю;
+    - инвертированный индекс символьных триграмм: похожие термы с большим
+      числом правок и дополнения префикса ("сельхоз" -> "сельхозпроизводител").
+Исправление не просматривает строки датасета и занимает микросекунды.
+При инкрементальном обновлении датасета индекс дополняется новыми термами,
+а исчезнувшие помечаются нулевой частотой; структуры текущего индекса
+не изменяются (copy-on-write).
+"""
+
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .metrics import metrics
+from .text_processing import STOP_WORDS, stem, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Термы короче не исправляются: у коротких слов слишком много соседей ("ип", "ооо")
+MIN_CORRECTION_LENGTH = 4
+# Минимальный коэффициент Дайса по триграммам для исправления
+TRIGRAM_MIN_SIMILARITY = 0.5
+# Вес исправлений относительно точного совпадения
+EDIT_WEIGHT = 0.9
+PREFIX_WEIGHT = 0.7
+# Максимум вариантов на одно слово запроса
+MAX_EXPANSIONS = 3
+# Размер кэша исправлений (при переполнении кэш очищается)
+CACHE_SIZE = 10_000
+# Доля удаленных термов, после которой индекс строится заново
+MAX_REMOVED_FRACTION = 0.25
+
+# Граница слова в триграммах
+_PAD = '$'
+
+SPELLING_CORRECTIONS = metrics.counter('spelling_corrections_total',
+                                       'Исправления неизвестных слов запроса', ('kind',))
+_CORRECTED = {kind: SPELLING_CORRECTIONS.labels(kind) for kind in ('edit', 'trigram', 'prefix', 'none')}
+
+
+def _deletes(term: str) -> Iterable[str]:
+    """Варианты терма без одной буквы"""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _trigrams(term: str, closed: bool = True) -> List[str]:
+    """
+    Уникальные триграммы терма с границами слова
+
+    Args:
+        closed: учитывать конец слова (False - для поиска дополнений префикса)
+    """
+    padded = _PAD + term + (_PAD if closed else '')
+    return list(dict.fromkeys(padded[i:i + 3] for i in range(len(padded) - 2)))
+
+
+def within_one_edit(a: str, b: str) -> bool:
+    """Расстояние Дамерау-Левенштейна не больше 1 (с перестановкой соседних букв)"""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la > lb:
+        a, b, la, lb = b, a, lb, la
+
+    prefix = 0
+    while prefix < la and a[prefix] == b[prefix]:
+        prefix += 1
+    if la < lb:
+        return a[prefix:] == b[prefix + 1:]
+    if a[prefix + 1:] == b[prefix + 1:]:
+        return True
+    return (prefix + 1 < la and a[prefix] == b[prefix + 1] and a[prefix + 1] == b[prefix]
+            and a[prefix + 2:] == b[prefix + 2:])
+
+
+class SpellingIndex:
+    """Словарь удалений и триграммный индекс по словарю термов"""
+
+    def __init__(self, vocabulary: Sequence[str], frequencies: Optional[Sequence[int]] = None):
+        """
+        Построение индекса
+
+        Args:
+            vocabulary: нормализованные термы (ключи постингов SearchEngine)
+            frequencies: документная частота каждого терма (выбор среди равных исправлений)
+        """
+        self.terms: List[str] = list(vocabulary)
+        self.term_ids: Dict[str, int] = {term: i for i, term in enumerate(self.terms)}
+        self.frequencies = np.asarray(frequencies if frequencies is not None else [1] * len(self.terms),
+                                      dtype=np.int32)
+
+        deletes: Dict[str, List[int]] = {}
+        trigrams: Dict[str, List[int]] = {}
+        trigram_counts = np.zeros(len(self.terms), dtype=np.int16)
+        for term_id, term in enumerate(self.terms):
+            # Числа (номера программ, суммы) не исправляются
+            if len(term) < MIN_CORRECTION_LENGTH - 1 or not term.isalpha():
+                continue
+            for variant in _deletes(term):
+                deletes.setdefault(variant, []).append(term_id)
+            grams = _trigrams(term)
+            trigram_counts[term_id] = len(grams)
+            for gram in grams:
+                trigrams.setdefault(gram, []).append(term_id)
+
+        self.deletes = deletes
+        self.trigrams: Dict[str, np.ndarray] = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in trigrams.items()}
+        self.trigram_counts = trigram_counts
+        # Удаленные из словаря термы (частота 0): остаются в словарях удалений и триграмм
+        self.removed = 0
+        self._cache: Dict[str, List[Tuple[str, float]]] = {}
+
+    @classmethod
+    def from_postings(cls, postings: Dict[str, Tuple[np.ndarray, np.ndarray]]) -> 'SpellingIndex':
+        """Индекс по словарю постингов SearchEngine (частота - длина списка документов)"""
+        index = cls(list(postings), [len(docs) for docs, _ in postings.values()])
+        logger.info(f"Индекс исправления опечаток построен: термов {len(index.terms)}, "
+                    f"удалений {len(index.deletes)}, триграмм {len(index.trigrams)}")
+        return index
+
+    def apply_changes(self, postings: Dict[str, Tuple[np.ndarray, np.ndarray]],
+                      terms: Iterable[str]) -> 'SpellingIndex':
+        """
+        Индекс после изменения постингов (SearchEngine.apply_changes); текущий не изменяется
+
+        Новые термы добавляются в словари удалений и триграмм (изменяемые
+        списки и массивы копируются), у исчезнувших частота становится нулевой,
+        у остальных обновляется. Если словарь не изменился, словари удалений и
+        триграмм разделяются с текущим индексом
+
+        Args:
+            postings: постинги обновленного индекса
+            terms: термы, чьи постинги изменились
+
+        Returns:
+            новый SpellingIndex
+        """
+        added, removed, updated = self._classify(postings, terms)
+        if self.removed + len(removed) > MAX_REMOVED_FRACTION * (len(self.terms) + len(added)):
+            return SpellingIndex.from_postings(postings)
+
+        index = SpellingIndex.__new__(SpellingIndex)
+        index.terms, index.term_ids = self.terms, self.term_ids
+        index.deletes, index.trigrams, index.trigram_counts = self.deletes, self.trigrams, self.trigram_counts
+        index.removed = self.removed + len(removed)
+        index._cache = {}
+        index.frequencies = self.frequencies.copy()
+        for term in updated:
+            index.frequencies[self.term_ids[term]] = len(postings[term][0])
+        if not added and not removed:
+            return index
+
+        index.term_ids = dict(self.term_ids)
+        for term in removed:
+            index.frequencies[index.term_ids.pop(term)] = 0
+        index.frequencies = np.concatenate([index.frequencies,
+                                            np.asarray([len(postings[term][0]) for term in added], dtype=np.int32)])
+        index._append_terms(added)
+        return index
+
+    def _classify(self, postings: Dict[str, Tuple[np.ndarray, np.ndarray]],
+                  terms: Iterable[str]) -> Tuple[List[str], List[str], List[str]]:
+        """Изменившиеся термы: (новые, исчезнувшие, оставшиеся в словаре)"""
+        added, removed, updated = [], [], []
+        for term in terms:
+            present = term in postings
+            if term in self.term_ids:
+                (updated if present else removed).append(term)
+            elif present:
+                added.append(term)
+        return added, removed, updated
+
+    def _append_terms(self, added: List[str]):
+        """
+        Дописывание новых термов в словари удалений и триграмм
+
+        Словари и затронутые списки копируются: их разделяет индекс, из которого получен этот
+        """
+        first_id = len(self.terms)
+        self.terms = self.terms + added
+        deletes, trigrams = dict(self.deletes), dict(self.trigrams)
+        new_trigrams: Dict[str, List[int]] = {}
+        trigram_counts = np.zeros(len(added), dtype=np.int16)
+        for offset, term in enumerate(added):
+            term_id = first_id + offset
+            self.term_ids[term] = term_id
+            if len(term) < MIN_CORRECTION_LENGTH - 1 or not term.isalpha():
+                continue
+            for variant in _deletes(term):
+                deletes[variant] = [*deletes.get(variant, ()), term_id]
+            grams = _trigrams(term)
+            trigram_counts[offset] = len(grams)
+            for gram in grams:
+                new_trigrams.setdefault(gram, []).append(term_id)
+        for gram, ids in new_trigrams.items():
+            current = trigrams.get(gram)
+            ids = np.asarray(ids, dtype=np.int32)
+            trigrams[gram] = ids if current is None else np.concatenate([current, ids])
+        self.deletes, self.trigrams = deletes, trigrams
+        self.trigram_counts = np.concatenate([self.trigram_counts, trigram_counts])
+
+    def _best(self, candidates: Iterable[int], weight: float) -> List[Tuple[str, float]]:
+        """Самые частые кандидаты с одинаковым весом"""
+        ordered = sorted(set(candidates), key=lambda term_id: (-self.frequencies[term_id], self.terms[term_id]))
+        return [(self.terms[term_id], weight) for term_id in ordered[:MAX_EXPANSIONS]]
+
+    def _edit_candidates(self, term: str) -> List[int]:
+        """Термы на расстоянии одной правки (пропуск, вставка, замена, перестановка)"""
+        found = list(self.deletes.get(term, ()))
+        for variant in _deletes(term):
+            if variant in self.term_ids:
+                found.append(self.term_ids[variant])
+            found.extend(self.deletes.get(variant, ()))
+        return [term_id for term_id in set(found)
+                if self.frequencies[term_id] and within_one_edit(term, self.terms[term_id])]
+
+    def _trigram_candidates(self, term: str) -> List[Tuple[str, float]]:
+        """Похожие термы и дополнения префикса по общим триграммам"""
+        grams = _trigrams(term)
+        arrays = [self.trigrams[gram] for gram in grams if gram in self.trigrams]
+        if not arrays:
+            return []
+        term_ids, common = np.unique(np.concatenate(arrays), return_counts=True)
+        if self.removed:
+            alive = self.frequencies[term_ids] > 0
+            term_ids, common = term_ids[alive], common[alive]
+
+        # Дополнение префикса: все триграммы без конца слова есть у терма
+        open_grams = len(_trigrams(term, closed=False))
+        prefix = [int(term_id) for term_id in term_ids[common >= open_grams]
+                  if self.terms[term_id].startswith(term)]
+        if prefix:
+            _CORRECTED['prefix'].inc()
+            return self._best(prefix, PREFIX_WEIGHT)
+
+        similarity = 2.0 * common / (len(grams) + self.trigram_counts[term_ids])
+        best = np.flatnonzero(similarity >= TRIGRAM_MIN_SIMILARITY)
+        if not len(best):
+            return []
+        best = best[np.lexsort((-self.frequencies[term_ids[best]], -similarity[best]))][:MAX_EXPANSIONS]
+        _CORRECTED['trigram'].inc()
+        return [(self.terms[term_ids[i]], float(similarity[i])) for i in best]
+
+    def correct(self, term: str) -> List[Tuple[str, float]]:
+        """
+        Варианты написания нормализованного терма
+
+        Args:
+            term: терм запроса после analyze()
+
+        Returns:
+            список (терм словаря, вес 0..1); известный терм - [(term, 1.0)],
+            пустой список, если исправить не удалось
+        """
+        if term in self.term_ids:
+            return [(term, 1.0)]
+        if len(term) < MIN_CORRECTION_LENGTH or not term.isalpha():
+            return []
+
+        cached = self._cache.get(term)
+        if cached is not None:
+            return cached
+
+        edits = self._edit_candidates(term)
+        if edits:
+            _CORRECTED['edit'].inc()
+            variants = self._best(edits, EDIT_WEIGHT)
+        else:
+            variants = self._trigram_candidates(term)
+            if not variants:
+                _CORRECTED['none'].inc()
+
+        if len(self._cache) >= CACHE_SIZE:
+            self._cache.clear()
+        self._cache[term] = variants
+        return variants
+
+    def expand(self, query: str) -> Dict[str, List[Tuple[str, float]]]:
+        """
+        Термы запроса с вариантами написания
+
+        Если основа слова не исправляется (опечатка в окончании укоротила ее:
+        "грнат" -> "грн"), исправляется само слово - его соседями по словарю
+        основ оказываются основы правильного написания
+
+        Args:
+            query: текст запроса
+
+        Returns:
+            терм запроса -> список (терм словаря, вес); порядок термов как в analyze()
+        """
+        variants: Dict[str, List[Tuple[str, float]]] = {}
+        for token in tokenize(query):
+            if token in STOP_WORDS:
+                continue
+            term = stem(token)
+            if term in variants:
+                continue
+            corrections = self.correct(term)
+            if not corrections and token != term:
+                corrections = self.correct(token)
+            variants[term] = corrections
+        return variants
+
+    def stats(self) -> Dict[str, int]:
+        return {'terms': len(self.terms), 'deletes': len(self.deletes), 'trigrams': len(self.trigrams)}
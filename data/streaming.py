@@ -0,0 +1,157 @@
+"""
+Потоковая загрузка датасета частями (chunk) с ограниченным потреблением памяти
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Iterator, Optional, Tuple
+
+from .lazy import lazy_module
+
+pd = lazy_module('pandas')
+
+logger = logging.getLogger(__name__)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def clean_chunk(chunk: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
+    """
+    Очистка части датасета: удаление пустых строк и заполнение важных колонок
+
+    Args:
+        chunk: часть датасета
+
+    Returns:
+        (очищенная часть, количество удаленных строк)
+    """
+    initial_count = len(chunk)
+    chunk = chunk.dropna(how='all')
+
+    # Заполняем пропущенные значения в важных колонках
+    if 'Название' in chunk.columns:
+        chunk = chunk.assign(**{'Название': chunk['Название'].fillna('Без названия')})
+
+    if 'Описание' in chunk.columns:
+        chunk = chunk.assign(**{'Описание': chunk['Описание'].fillna('Нет описания')})
+
+    return chunk, initial_count - len(chunk)
+
+
+def iter_csv_chunks(filepath: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Чтение CSV частями через pd.read_csv(chunksize=...)"""
+    with pd.read_csv(filepath, chunksize=chunk_size) as reader:
+        yield from reader
+
+
+def iter_xlsx_chunks(filepath: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Чтение первого листа xlsx частями в режиме openpyxl read_only
+
+    В отличие от pd.read_excel, ячейки не материализуются целиком:
+    в памяти одновременно находится не больше chunk_size строк
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(name) if name is not None else f'Unnamed: {i}' for i, name in enumerate(header)]
+
+        batch = []
+        for row in rows:
+            batch.append(row[:len(columns)])
+            if len(batch) >= chunk_size:
+                yield pd.DataFrame.from_records(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame.from_records(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+def iter_file_chunks(filepath: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Потоковое чтение локального файла (xlsx, csv)
+
+    Args:
+        filepath: путь к файлу
+        chunk_size: количество строк в части
+
+    Returns:
+        итератор по частям датасета
+    """
+    if filepath.endswith('.xlsx'):
+        return iter_xlsx_chunks(filepath, chunk_size)
+    if filepath.endswith('.csv'):
+        return iter_csv_chunks(filepath, chunk_size)
+    raise ValueError(f"Неподдерживаемый формат файла: {filepath}")
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Пиковый резидентный объем памяти процесса в МБ (None - недоступно)"""
+    if resource is None:
+        return None
+    # На Linux ru_maxrss в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@dataclass
+class IngestStats:
+    """Статистика потоковой загрузки"""
+
+    rows: int = 0
+    chunks: int = 0
+    dropped_rows: int = 0
+    seconds: float = 0.0
+    peak_rss_mb: Optional[float] = None
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            'rows': self.rows,
+            'chunks': self.chunks,
+            'dropped_rows': self.dropped_rows,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'peak_rss_mb': round(self.peak_rss_mb, 1) if self.peak_rss_mb is not None else None,
+        }
+
+
+def iter_clean_chunks(filepath: str, chunk_size: int, stats: IngestStats) -> Iterator[pd.DataFrame]:
+    """
+    Конвейер чтения и очистки: части очищаются по мере поступления
+
+    Args:
+        filepath: путь к файлу
+        chunk_size: количество строк в части
+        stats: статистика, заполняемая по ходу чтения
+    """
+    started = time.perf_counter()
+    offset = 0
+    for chunk in iter_file_chunks(filepath, chunk_size):
+        chunk, dropped = clean_chunk(chunk)
+        # Сквозная нумерация строк, как у датасета, прочитанного целиком
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+
+        stats.chunks += 1
+        stats.rows += len(chunk)
+        stats.dropped_rows += dropped
+        yield chunk
+        stats.seconds = time.perf_counter() - started
+
+    stats.seconds = time.perf_counter() - started
+    stats.peak_rss_mb = peak_rss_mb()
@@ -0,0 +1,100 @@
+"""
+Токенизация и нормализация русскоязычного текста для поиска
+"""
+
+import re
+from functools import lru_cache
+from typing import List
+
+# Слова, разделенные дефисом ("сельско-хозяйственный"), разбиваем на части
+TOKEN_PATTERN = re.compile(r"[0-9a-zа-я]+")
+
+# Служебные слова, не влияющие на релевантность
+STOP_WORDS = frozenset({
+    'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как', 'а', 'то', 'все',
+    'она', 'так', 'его', 'но', 'да', 'ты', 'к', 'у', 'же', 'вы', 'за', 'бы', 'по',
+    'только', 'ее', 'мне', 'было', 'вот', 'от', 'меня', 'еще', 'нет', 'о', 'из', 'ему',
+    'теперь', 'когда', 'даже', 'ну', 'ли', 'если', 'уже', 'или', 'ни', 'быть', 'был',
+    'него', 'до', 'вас', 'нибудь', 'уж', 'вам', 'ведь', 'там', 'потом', 'себя',
+    'ничего', 'ей', 'может', 'они', 'тут', 'где', 'есть', 'надо', 'ней', 'для', 'мы',
+    'тебя', 'их', 'чем', 'была', 'сам', 'чтоб', 'без', 'будто', 'чего', 'раз', 'тоже',
+    'себе', 'под', 'будет', 'ж', 'тогда', 'кто', 'этот', 'того', 'потому', 'этого',
+    'какой', 'какие', 'какая', 'какое', 'ним', 'здесь', 'этом', 'один', 'почти', 'мой',
+    'тем', 'чтобы', 'нее', 'были', 'куда', 'зачем', 'всех', 'никогда', 'можно', 'при',
+    'об', 'другой', 'хоть', 'после', 'над', 'больше', 'тот', 'через', 'эти', 'нас',
+    'про', 'всего', 'них', 'много', 'разве', 'три', 'эту', 'моя', 'впрочем', 'хорошо',
+    'свою', 'этой', 'перед', 'иногда', 'лучше', 'чуть', 'том', 'нельзя', 'такой', 'им',
+    'более', 'всегда', 'конечно', 'всю', 'между', 'хочу', 'ищу', 'нужна',
+    'нужен', 'нужно', 'мою', 'моего', 'моей',
+})
+
+# Окончания в порядке убывания длины: отрезается самое длинное подходящее
+_SUFFIXES = tuple(sorted({
+    # прилагательные и причастия
+    'ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое', 'ей', 'ий',
+    'ый', 'ой', 'ем', 'им', 'ым', 'ом', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+    # существительные
+    'иями', 'ями', 'ами', 'иях', 'ях', 'ах', 'ией', 'ии', 'ия', 'ью', 'ье', 'ья',
+    'ев', 'ов', 'ам', 'ям', 'а', 'я', 'о', 'е', 'и', 'ы', 'у', 'ю', 'ь', 'й',
+    # глаголы
+    'ить', 'ать', 'ять', 'еть', 'уть', 'ешь', 'ете', 'ите', 'ишь', 'ет', 'ит',
+    'ут', 'ют', 'ат', 'ят', 'ал', 'ял', 'ил', 'ла', 'ли', 'ть',
+}, key=len, reverse=True))
+
+# Минимальная длина основы после отсечения окончания
+MIN_STEM_LENGTH = 3
+
+
+@lru_cache(maxsize=100_000)
+def stem(token: str) -> str:
+    """
+    Облегченный стеммер: отсечение самого длинного русского окончания
+
+    Args:
+        token: токен в нижнем регистре
+
+    Returns:
+        основа слова
+    """
+    if len(token) <= MIN_STEM_LENGTH or not ('а' <= token[0] <= 'я'):
+        return token
+
+    # Возвратные формы: сначала отсекаем -ся/-сь, затем основное окончание
+    for suffix in ('ся', 'сь'):
+        if token.endswith(suffix) and len(token) - len(suffix) > MIN_STEM_LENGTH:
+            token = token[:-len(suffix)]
+            break
+
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM_LENGTH:
+            return token[:-len(suffix)]
+
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Разбиение текста на токены в нижнем регистре (ё приводится к е)
+
+    Args:
+        text: исходный текст
+
+    Returns:
+        список токенов
+    """
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(str(text).lower().replace('ё', 'е'))
+
+
+def analyze(text: str) -> List[str]:
+    """
+    Полный конвейер нормализации: токенизация, стоп-слова, стемминг
+
+    Args:
+        text: исходный текст
+
+    Returns:
+        список нормализованных термов
+    """
+    return [stem(token) for token in tokenize(text) if token not in STOP_WORDS]
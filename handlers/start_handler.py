@@ -1,2 +1,2 @@
 # Удаляем этот файл, так как он больше не используется
-# Вместо него используется bot/conversation/handlers.py
+# Вместо него используется conversation/handlers.py
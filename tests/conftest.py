@@ -0,0 +1,89 @@
+"""
+Общие фикстуры тестов: небольшой синтетический каталог мер, его правки
+и инкрементально обновленное состояние вместе с эталоном, построенным с нуля
+"""
+
+from typing import List, NamedTuple
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_dataframe
+from data.dataset_manager import DatasetManager, DatasetState
+
+CATALOGUE_SIZE = 120
+
+
+@pytest.fixture
+def catalogue() -> pd.DataFrame:
+    """Синтетический каталог мер (id 1..CATALOGUE_SIZE)"""
+    return make_dataframe(CATALOGUE_SIZE)
+
+
+def edit_catalogue(df: pd.DataFrame, seed: int = 1, removed: int = 6, changed: int = 8,
+                   added: int = 4) -> pd.DataFrame:
+    """
+    Новая версия каталога: удаленные, измененные и добавленные меры
+
+    Измененные меры получают новое слово в описании, часть из них - новую категорию
+
+    Args:
+        df: текущая версия
+        seed: зерно генератора
+        removed: сколько мер удалить
+        changed: сколько мер изменить
+        added: сколько мер добавить в конец
+
+    Returns:
+        новая версия каталога (индекс сброшен)
+    """
+    rng = np.random.default_rng(seed)
+    df = df.drop(index=rng.choice(df.index, removed, replace=False))
+    edit = rng.choice(df.index, changed, replace=False)
+    df.loc[edit, 'Описание'] = df.loc[edit, 'Описание'] + ' агролизингодатель'
+    df.loc[edit[:2], 'Категория'] = 'Новая категория'
+    new = make_dataframe(added, seed=100 + seed)
+    new['id'] = df['id'].max() + 1 + np.arange(added)
+    return pd.concat([df, new], ignore_index=True)
+
+
+def load_manager(path, compact: bool = False) -> DatasetManager:
+    """Менеджер с датасетом из локального файла"""
+    manager = DatasetManager(data_source='local', compact_storage=compact, similar_k=4)
+    assert manager.load_dataset(filepath=str(path))
+    return manager
+
+
+class Refresh(NamedTuple):
+    """Результат инкрементального обновления и эталон полной перестройки той же версии"""
+
+    manager: DatasetManager
+    previous: DatasetState
+    state: DatasetState
+    reference: DatasetState
+
+    @property
+    def positions(self) -> List[int]:
+        """Позиция той же меры в эталоне для каждой позиции обновленного состояния"""
+        reference = {measure_id: position for position, measure_id in enumerate(self.reference.search_engine.doc_ids)}
+        return [reference[measure_id] for measure_id in self.state.search_engine.doc_ids]
+
+
+@pytest.fixture(params=[False, True], ids=['dataframe', 'compact'])
+def compact(request) -> bool:
+    """Режим хранения: DataFrame или компактные колонки"""
+    return request.param
+
+
+@pytest.fixture
+def refreshed(catalogue, tmp_path, compact) -> Refresh:
+    """Каталог загружен, затем обновлен по edit_catalogue инкрементально"""
+    path = tmp_path / 'measures.csv'
+    catalogue.to_csv(path, index=False)
+    manager = load_manager(path, compact)
+    previous = manager.state
+
+    edit_catalogue(catalogue).to_csv(path, index=False)
+    state = manager.publish(manager.build_state(filepath=str(path)))
+    return Refresh(manager, previous, state, load_manager(path, compact).state)
@@ -0,0 +1,115 @@
+"""
+Отложенная запись аналитики: пачки, интервал сброса и политики переполнения очереди
+"""
+
+import asyncio
+import sqlite3
+import threading
+
+from telegram import User
+
+from bot.analytics import OVERFLOW_BLOCK, OVERFLOW_DROP, AnalyticsSink
+
+USER = User(42, 'Тест', is_bot=False, username='test')
+RESULTS = [{'id': 1, 'match_score': 0.9}, {'id': 2, 'match_score': 1.7}, {'id': 3}]
+
+
+def count(path, table: str) -> int:
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_events_are_written_in_batches(tmp_path):
+    path = str(tmp_path / 'analytics.sqlite3')
+
+    async def run():
+        sink = AnalyticsSink(path, batch_size=3, flush_interval=60)
+        sink.start()
+        await sink.record_user(USER)
+        await sink.record_query(USER.id, 'лизинг', RESULTS, conversation_id='c1')
+        await sink.record_feedback(USER.id, 5, conversation_id='c1')
+        await asyncio.sleep(0.1)
+        # Полные пачки записаны сразу, последнее событие ждет flush_interval
+        written = dict(sink.counters)
+        await sink.stop()
+        return written, sink.counters
+
+    written, counters = asyncio.run(run())
+    assert (written['batches'], written['written']) == (2, 6)
+    assert (counters['batches'], counters['written'], counters['enqueued']) == (3, 7, 7)
+    assert count(path, 'users') == 1
+    assert count(path, 'search_results') == 3
+    assert count(path, 'conversation_messages') == 1
+    assert count(path, 'feedback') == 1
+
+
+def test_partial_batch_is_flushed_after_interval(tmp_path):
+    path = str(tmp_path / 'analytics.sqlite3')
+
+    async def run():
+        sink = AnalyticsSink(path, batch_size=100, flush_interval=0.05)
+        sink.start()
+        await sink.record_user(USER)
+        await sink.record_message('c1', 'Какие документы нужны?', intent='documents')
+        await asyncio.sleep(0.3)
+        counters = dict(sink.counters)
+        await sink.stop()
+        return counters
+
+    counters = asyncio.run(run())
+    assert (counters['batches'], counters['written']) == (1, 2)
+    assert count(path, 'conversation_messages') == 1
+
+
+def test_drop_policy_drops_query_with_its_results(tmp_path):
+    async def run():
+        sink = AnalyticsSink(str(tmp_path / 'analytics.sqlite3'), queue_size=3, overflow=OVERFLOW_DROP)
+        sink.start()
+        # Запрос и три результата не помещаются в очередь целиком
+        await sink.record_query(USER.id, 'лизинг', RESULTS)
+        await sink.record_user(USER)
+        await sink.stop()
+        return sink.counters
+
+    counters = asyncio.run(run())
+    assert (counters['enqueued'], counters['dropped'], counters['written']) == (1, 4, 1)
+
+
+def test_block_policy_waits_for_writer(tmp_path):
+    path = str(tmp_path / 'analytics.sqlite3')
+    release = threading.Event()
+
+    async def run():
+        sink = AnalyticsSink(path, queue_size=2, batch_size=1, overflow=OVERFLOW_BLOCK, block_timeout=0.05)
+        write_batch = sink._write_batch
+
+        def slow_write(batch):
+            release.wait(5)
+            write_batch(batch)
+
+        sink._write_batch = slow_write
+        sink.start()
+        await sink.record_query(USER.id, 'лизинг', RESULTS)
+        # Запись зависла: очередь заполнена, лишние события отброшены после block_timeout
+        stalled = dict(sink.counters)
+        release.set()
+        await sink.stop()
+        return stalled, sink.counters
+
+    stalled, counters = asyncio.run(run())
+    assert (stalled['enqueued'], stalled['dropped']) == (3, 1)
+    assert counters['written'] == 3
+    assert count(path, 'user_queries') == 1
+
+
+def test_events_before_start_are_ignored():
+    async def run():
+        sink = AnalyticsSink('')
+        sink.start()
+        await sink.record_user(USER)
+        return sink.running, sink.counters['enqueued']
+
+    assert asyncio.run(run()) == (False, 0)
@@ -0,0 +1,55 @@
+"""
+Карточки ответов: маршрутизация вопросов, рендер разделов и обновление по diff
+"""
+
+import pytest
+
+from data.answer_cards import INTENT_FIELDS, AnswerCards, route_question
+
+
+@pytest.mark.parametrize('question, intents', [
+    ('Какие документы нужны?', ('documents',)),
+    ('Какой телефон у фонда?', ('contacts',)),
+    ('До какого числа принимают заявки?', ('deadline',)),
+    ('Какие условия и размер поддержки?', ('conditions', 'amount')),
+    ('Сколько документов нужно собрать?', ('documents',)),
+    ('Сколько дают?', ('amount',)),
+    ('Когда?', ('deadline',)),
+    ('Расскажите подробнее', ()),
+])
+def test_route_question(question, intents):
+    assert route_question(question) == intents
+
+
+def test_build_renders_sections_and_overviews():
+    fields = {
+        'Условия': ['Оборот менее 10 млн руб.', 'Оборот менее 10 млн руб.'],
+        'Размер поддержки': ['до 5 000 000 руб.', None],
+    }
+    cards = AnswerCards.build(['Грант *старт*', 'Заем'], ['Описание гранта', ''], fields)
+    assert cards.size == 2
+
+    overview = cards.overview(0)
+    assert overview.startswith('✅ *Грант старт*')
+    assert 'Описание гранта' in overview
+    assert '💰 Размер поддержки:* до 5 000 000 руб.' in overview
+    assert 'Размер поддержки' not in cards.overview(1)
+
+    # Одинаковые значения поля - один объект строки
+    assert cards.sections['conditions'][0] is cards.sections['conditions'][1]
+    assert 'В базе нет этих сведений' in cards.answer(1, ('amount',))
+    assert 'В базе нет этих сведений' in cards.answer(0, ('documents',))
+    answer = cards.answer(0, ('amount', 'conditions'))
+    assert answer == cards.sections['amount'][0] + '\n\n' + cards.sections['conditions'][0]
+
+
+def test_refresh_patches_answer_cards(refreshed):
+    state, reference = refreshed.state, refreshed.reference
+    positions = refreshed.positions
+    assert state.answer_cards.size == state.size
+    for position, source in enumerate(positions):
+        assert state.answer_cards.overview(position) == reference.answer_cards.overview(source)
+        for intent in INTENT_FIELDS:
+            assert state.answer_cards.sections[intent][position] == reference.answer_cards.sections[intent][source]
+    # Карточки опубликованной версии не изменились
+    assert refreshed.previous.answer_cards.size == refreshed.previous.size
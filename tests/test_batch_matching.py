@@ -0,0 +1,86 @@
+"""
+Пакетное сопоставление запросов: совпадение с поиском по одному запросу и потоковый прогон файла
+"""
+
+import csv
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import QUERIES
+from bot import batch_match
+from data.batch_matching import BatchMatcher
+from tests.conftest import load_manager
+
+# Слова без совпадений в словаре индекса и запросы с опечатками
+EXTRA_QUERIES = ['агролизингодатель', 'субсидя на обученее', 'qwerty', '', 'лизинг лизинг оборудования']
+
+
+@pytest.fixture
+def manager(catalogue, tmp_path):
+    path = tmp_path / 'measures.csv'
+    catalogue.to_csv(path, index=False)
+    return load_manager(path)
+
+
+def single_query_scores(manager, query: str) -> dict:
+    """Оценки всех найденных мер по одному запросу: позиции внутри равных оценок могут меняться местами"""
+    state = manager.state
+    return dict(manager._search_hits(state, query, state.size, None))
+
+
+@pytest.mark.parametrize('score_cells', [2**20, 300])
+def test_batch_matches_single_query_search(manager, score_cells):
+    state = manager.state
+    matcher = BatchMatcher(state.search_engine, state.embedding_index, state.spelling, score_cells=score_cells)
+    queries = list(QUERIES) + EXTRA_QUERIES
+    positions, scores = matcher.match(queries, top_k=5)
+    assert positions.shape == scores.shape == (len(queries), 5)
+
+    for query, row_positions, row_scores in zip(queries, positions, scores):
+        expected = single_query_scores(manager, query)
+        found = [(int(p), float(s)) for p, s in zip(row_positions, row_scores) if p >= 0]
+        top = sorted(expected.values(), reverse=True)[:5]
+        np.testing.assert_allclose([s for _, s in found], top, rtol=1e-5, atol=1e-6, err_msg=query)
+        np.testing.assert_allclose([s for _, s in found], [expected[p] for p, _ in found], rtol=1e-5, atol=1e-6,
+                                   err_msg=query)
+
+
+def test_empty_batch_and_top_k_larger_than_dataset(manager):
+    state = manager.state
+    matcher = BatchMatcher(state.search_engine, state.embedding_index, state.spelling)
+    positions, scores = matcher.match([], top_k=5)
+    assert positions.shape == (0, 5)
+    # Без совпадений по словам срабатывает семантический поиск, пустой запрос ничего не находит
+    positions, _ = matcher.match(['qwerty', ''], top_k=3)
+    assert (positions[0] >= 0).all() and (positions[1] == -1).all()
+    positions, _ = matcher.match(['лизинг'], top_k=state.size + 10)
+    assert positions.shape == (1, state.size)
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_run_streams_matches_in_input_order(manager, tmp_path, monkeypatch, processes):
+    snapshot = str(tmp_path / 'snapshot')
+    assert manager.export_snapshot(snapshot)
+    monkeypatch.setattr(batch_match.settings, 'DATA_SOURCE', 'local')
+
+    queries = ['лизинг', 'грант на экспорт', 'лизинг', 'qwerty', 'субсидия']
+    source = tmp_path / 'queries.csv'
+    with open(source, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['query'])
+        writer.writerows([query] for query in queries)
+
+    output = tmp_path / 'matches.jsonl'
+    total = batch_match.run(str(source), str(output), 'query', 3, batch_size=2, processes=processes,
+                            snapshot_dir=snapshot)
+    assert total == len(queries)
+
+    records = [json.loads(line) for line in output.read_text(encoding='utf-8').splitlines()]
+    assert [record['query'] for record in records] == queries
+    assert records[0] == records[2]
+    for record in records:
+        expected = dict(manager.search_ids(record['query'], manager.state.size))
+        assert [match['score'] for match in record['matches']] == sorted(expected.values(), reverse=True)[:3]
+        assert all(expected[match['id']] == match['score'] for match in record['matches'])
@@ -0,0 +1,54 @@
+"""
+Кодировка callback_data кнопок результатов
+"""
+
+import numpy as np
+import pytest
+
+from conversation.callbacks import (
+    CALLBACK_DATA_LIMIT, decode_id, encode_id, page_data, parse_page, parse_select, select_data,
+)
+from data.dataset_delta import IdDigest, id_keys
+
+
+@pytest.mark.parametrize('measure_id', [0, 7, 169, 10 ** 12, -5, 'М-12', 'abc', "'quoted", '#hash-like'])
+@pytest.mark.parametrize('similar', [False, True])
+def test_select_round_trip(measure_id, similar):
+    data = select_data(measure_id, similar=similar)
+    assert len(data.encode('utf-8')) <= CALLBACK_DATA_LIMIT
+    assert parse_select(data) == measure_id
+
+
+def test_integer_ids_use_base36():
+    assert encode_id(169) == '4p'
+    assert decode_id('4p') == 169
+
+
+@pytest.mark.parametrize('measure_id', [169.0, np.int64(169), np.float64(169.0)])
+def test_integer_valued_ids_are_encoded_as_int(measure_id):
+    assert encode_id(measure_id) == encode_id(169)
+    assert parse_select(select_data(measure_id)) == 169
+
+
+def test_long_id_is_encoded_as_index_digest():
+    measure_id = 'Субсидия на возмещение части затрат сельхозпроизводителей № 12'
+    assert len(measure_id.encode('utf-8')) > CALLBACK_DATA_LIMIT
+
+    data = select_data(measure_id, similar=True)
+    assert len(data.encode('utf-8')) <= CALLBACK_DATA_LIMIT
+    digest = parse_select(data)
+    assert isinstance(digest, IdDigest)
+    # Хеш - ключ индекса id наравне с самим id
+    assert digest in id_keys(measure_id)
+
+
+def test_legacy_and_foreign_callback_data():
+    assert parse_select('select_result_12') == 12
+    assert parse_select('s:не-base36') is None
+    assert parse_select('new_search') is None
+
+
+def test_page_round_trip():
+    assert parse_page(page_data(3)) == 3
+    assert parse_page('p:x') is None
+    assert parse_page('s:1') is None
@@ -0,0 +1,56 @@
+"""
+Компактные колонки и фасеты: упаковка строк и обновление по diff без перестройки
+"""
+
+import numpy as np
+import pandas as pd
+
+from data.column_store import ColumnStore, PackedStrings
+from data.facets import FacetFilter
+
+
+def test_packed_strings_round_trip():
+    values = ['субсидия', None, '', 'грант на развитие', 'Ёлка']
+    packed = PackedStrings.from_values(values)
+    assert len(packed) == len(values)
+    assert packed.tolist() == values
+    assert packed.take([3, 1]) == ['грант на развитие', None]
+
+
+def test_packed_strings_apply_changes():
+    packed = PackedStrings.from_values(['a', 'bb', 'ccc', 'dddd'])
+    # Позиция 0 берет строку 3, позиция 2 - новое значение, последняя позиция удалена
+    source = np.array([3, 1, -1])
+    patched = packed.apply_changes(source, np.array([2]), ['новое'])
+    assert patched.tolist() == ['dddd', 'bb', 'новое']
+    assert packed.tolist() == ['a', 'bb', 'ccc', 'dddd']
+
+
+def test_from_dataframe_restores_frame(catalogue):
+    columns = ColumnStore.from_dataframe(catalogue)
+    assert columns.size == len(catalogue)
+    pd.testing.assert_frame_equal(columns.to_frame(), catalogue, check_dtype=False)
+    pd.testing.assert_frame_equal(columns.to_frame([5, 2]), catalogue.iloc[[5, 2]].reset_index(drop=True),
+                                  check_dtype=False)
+    assert np.isfinite(columns.amount_max).all()
+
+
+def test_refresh_patches_columns(refreshed):
+    state, reference = refreshed.state, refreshed.reference
+    positions = refreshed.positions
+    assert state.columns.size == state.size
+    np.testing.assert_array_equal(state.columns.amount_min, reference.columns.amount_min[positions])
+    np.testing.assert_array_equal(state.columns.amount_max, reference.columns.amount_max[positions])
+    np.testing.assert_array_equal(state.columns.deadline, reference.columns.deadline[positions])
+    # Массивы опубликованной версии не изменились
+    assert refreshed.previous.columns.size == refreshed.previous.size
+
+
+def test_refresh_patches_facets(refreshed):
+    state, reference = refreshed.state, refreshed.reference
+    positions = refreshed.positions
+    assert state.facets.facet_counts() == reference.facets.facet_counts()
+    for filters in (FacetFilter(categories=('Новая категория',)), FacetFilter(statuses=('Активна',)),
+                    FacetFilter(categories=('Экспорт', 'Финансы'), statuses=('Завершена',))):
+        np.testing.assert_array_equal(state.facets.mask(filters), reference.facets.mask(filters)[positions])
+    assert 'Новая категория' not in refreshed.previous.facets.values['Категория']
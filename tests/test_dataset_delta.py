@@ -0,0 +1,101 @@
+"""
+Сравнение версий датасета по id: классификация строк и раскладка позиций
+"""
+
+import numpy as np
+import pytest
+
+from data.dataset_delta import diff_datasets
+
+
+def hashes(*values: int) -> np.ndarray:
+    return np.asarray(values, dtype=np.uint64)
+
+
+def assemble(delta, old_ids, new_ids):
+    """Id новой версии по позициям: перенос из старой раскладки и новые строки"""
+    ids = list(old_ids[:delta.size]) + [None] * max(0, delta.size - len(old_ids))
+    for position, source in delta.moved.items():
+        ids[position] = old_ids[source]
+    for position, row in delta.new_rows.items():
+        ids[position] = new_ids[row]
+    return ids
+
+
+def test_unchanged_dataset_gives_empty_delta():
+    delta = diff_datasets([1, 2, 3], hashes(10, 20, 30), [3, 1, 2], hashes(30, 10, 20))
+    assert delta.is_empty
+    assert delta.touched == 0
+    assert delta.size == 3
+    # Перестановка строк в источнике не меняет позиции индексов
+    assert delta.order.tolist() == [1, 2, 0]
+
+
+def test_changed_row_keeps_its_position():
+    delta = diff_datasets([1, 2, 3], hashes(10, 20, 30), [1, 2, 3], hashes(10, 21, 30))
+    assert delta.counters() == {'added': 0, 'changed': 1, 'removed': 0, 'relocated': 0, 'touched': 1}
+    assert delta.new_rows == {1: 1}
+    assert delta.vacated == [1]
+    assert delta.sources().tolist() == [0, -1, 2]
+
+
+def test_added_row_fills_hole_of_removed_row():
+    delta = diff_datasets([1, 2, 3], hashes(10, 20, 30), [1, 3, 4], hashes(10, 30, 40))
+    assert (delta.added, delta.removed, delta.relocated) == (1, 1, 0)
+    assert delta.new_rows == {1: 2}
+    assert delta.size == 3
+    assert assemble(delta, [1, 2, 3], [1, 3, 4]) == [1, 4, 3]
+
+
+def test_added_rows_without_holes_go_to_the_end():
+    delta = diff_datasets([1, 2], hashes(10, 20), [1, 2, 3, 4], hashes(10, 20, 30, 40))
+    assert delta.new_rows == {2: 2, 3: 3}
+    assert delta.size == 4
+    assert delta.order.tolist() == [0, 1, 2, 3]
+
+
+def test_removed_rows_are_closed_by_rows_from_the_end():
+    old_ids = [1, 2, 3, 4, 5]
+    new_ids = [1, 3, 5]
+    delta = diff_datasets(old_ids, hashes(10, 20, 30, 40, 50), new_ids, hashes(10, 30, 50))
+    assert (delta.removed, delta.relocated, delta.size) == (2, 1, 3)
+    assert delta.moved == {1: 4}
+    assert sorted(delta.vacated) == [1, 3, 4]
+    ids = assemble(delta, old_ids, new_ids)
+    assert sorted(ids) == new_ids
+    assert [new_ids[row] for row in delta.order] == ids
+
+
+def test_changed_row_from_the_end_is_relocated_as_new_row():
+    old_ids = [1, 2, 3]
+    new_ids = [2, 3]
+    delta = diff_datasets(old_ids, hashes(10, 20, 30), new_ids, hashes(20, 31))
+    assert delta.size == 2
+    assert not delta.moved
+    assert assemble(delta, old_ids, new_ids) == [3, 2]
+    assert delta.sources().tolist() == [-1, 1]
+
+
+@pytest.mark.parametrize('old_ids, new_ids', [([1, 1, 2], [1, 2]), ([1, 2], [2, 2])])
+def test_duplicate_ids_require_full_rebuild(old_ids, new_ids):
+    old_hashes = np.arange(len(old_ids), dtype=np.uint64)
+    new_hashes = np.arange(len(new_ids), dtype=np.uint64)
+    assert diff_datasets(old_ids, old_hashes, new_ids, new_hashes) is None
+
+
+def test_order_assembles_new_version_from_fresh_rows():
+    rng = np.random.default_rng(7)
+    old_ids = list(range(1, 41))
+    kept = [i for i in old_ids if rng.random() > 0.2]
+    new_ids = list(rng.permutation(kept + [100, 101, 102]))
+    old_hashes = np.asarray(old_ids, dtype=np.uint64)
+    new_hashes = np.asarray([i + (1000 if i % 7 == 0 else 0) for i in new_ids], dtype=np.uint64)
+
+    delta = diff_datasets(old_ids, old_hashes, new_ids, new_hashes)
+    ids = assemble(delta, old_ids, new_ids)
+    assert sorted(ids) == sorted(new_ids)
+    assert [new_ids[row] for row in delta.order] == ids
+    # Позиции, не попавшие в new_rows и moved, сохраняют свою меру
+    untouched = set(range(delta.size)) - set(delta.new_rows) - set(delta.moved)
+    assert all(ids[position] == old_ids[position] for position in untouched)
+
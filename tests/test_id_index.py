@@ -0,0 +1,49 @@
+"""
+Индекс id мер: нормализация ключей, хеши длинных id и обновление вместе с датасетом
+"""
+
+import numpy as np
+
+from data.dataset_delta import IdDigest, id_keys, normalize_id
+from tests.conftest import load_manager
+
+
+def test_numeric_ids_are_normalized():
+    assert normalize_id(169.0) == 169 and type(normalize_id(169.0)) is int
+    assert type(normalize_id(np.int64(169))) is int
+    assert normalize_id(1.5) == 1.5
+    assert normalize_id('169') == '169'
+
+
+def test_long_ids_get_digest_key():
+    assert id_keys('М-12') == ['М-12']
+    measure_id = 'Субсидия на возмещение части затрат сельхозпроизводителей № 12'
+    keys = id_keys(measure_id)
+    assert keys[0] == measure_id
+    assert len(keys) == 2 and isinstance(keys[1], IdDigest)
+    assert id_keys(169.0) == [169]
+
+
+def test_id_index_follows_refresh(refreshed):
+    state = refreshed.state
+    assert state.id_index == {measure_id: position for position, measure_id in enumerate(state.search_engine.doc_ids)}
+    removed = sorted(set(refreshed.previous.search_engine.doc_ids) - set(state.search_engine.doc_ids))
+    assert removed and all(measure_id in refreshed.previous.id_index for measure_id in removed)
+
+    manager = refreshed.manager
+    assert manager.results_by_ids([(measure_id, 0.0) for measure_id in removed]) == []
+    assert manager.answer_card(removed[0]) is None
+    kept = state.search_engine.doc_ids[0]
+    assert [result['id'] for result in manager.results_by_ids([(removed[0], 0.9), (kept, 0.5)])] == [kept]
+
+
+def test_long_string_ids_are_found_by_digest(catalogue, tmp_path):
+    catalogue['id'] = [f'Мера поддержки регионального фонда развития предпринимательства № {i}' for i in catalogue['id']]
+    path = tmp_path / 'measures.csv'
+    catalogue.to_csv(path, index=False)
+    manager = load_manager(path)
+
+    measure_id = catalogue['id'].iloc[3]
+    digest = id_keys(measure_id)[1]
+    assert manager.state.id_index[digest] == manager.state.id_index[measure_id]
+    assert manager.answer_card(digest) == manager.answer_card(measure_id) is not None
@@ -0,0 +1,51 @@
+"""
+Инкрементальное обновление DatasetManager против полной перестройки
+"""
+
+import pandas as pd
+
+from tests.conftest import load_manager
+
+
+def by_id(frame: pd.DataFrame) -> pd.DataFrame:
+    return frame.set_index('id').sort_index()
+
+
+def test_refresh_matches_full_build(refreshed):
+    state, reference = refreshed.state, refreshed.reference
+    assert state.delta is not None and not state.delta.is_empty
+    assert state.version == refreshed.previous.version + 1
+    assert state.size == reference.size
+    pd.testing.assert_frame_equal(by_id(state.frame), by_id(reference.frame))
+
+
+def test_refresh_keeps_published_state(refreshed, catalogue):
+    previous = refreshed.previous
+    assert previous.size == len(catalogue)
+    assert previous.search_engine.doc_ids == catalogue['id'].tolist()
+    pd.testing.assert_frame_equal(by_id(previous.frame), by_id(catalogue))
+
+
+def test_unchanged_source_gives_empty_delta(catalogue, tmp_path, compact):
+    path = tmp_path / 'measures.csv'
+    catalogue.to_csv(path, index=False)
+    manager = load_manager(path, compact)
+    previous = manager.state
+
+    catalogue.sample(frac=1, random_state=3).to_csv(path, index=False)
+    state = manager.build_state(filepath=str(path))
+    assert state.delta is not None and state.delta.is_empty
+    assert state.search_engine is previous.search_engine
+
+
+def test_refresh_with_removed_rows_only(catalogue, tmp_path, compact):
+    path = tmp_path / 'measures.csv'
+    catalogue.to_csv(path, index=False)
+    manager = load_manager(path, compact)
+
+    catalogue.drop(index=[0, 5, 6]).to_csv(path, index=False)
+    state = manager.publish(manager.build_state(filepath=str(path)))
+    assert state.delta is not None
+    assert (state.delta.removed, state.delta.added, state.delta.changed) == (3, 0, 0)
+    assert sorted(state.search_engine.doc_ids) == sorted(set(catalogue['id']) - {1, 6, 7})
+    assert state.embedding_index.size == state.size
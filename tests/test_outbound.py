@@ -0,0 +1,151 @@
+"""
+Исходящие вызовы: token bucket, повторы после 429 и отложенная заглушка ответа
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import RetryAfter
+
+from bot.outbound import ChatRateLimiter, ReplyCoalescer, TokenBucket
+from conversation import handlers
+
+
+class FakeMessage:
+    """Сообщение Telegram: отправленные и отредактированные тексты записываются в общий журнал"""
+
+    message_id = 1
+
+    def __init__(self, log: list, text: str = ''):
+        self.log = log
+        self.text = text
+        self.date = None
+
+    async def reply_text(self, text: str, **kwargs):
+        self.log.append(('reply', text))
+        return FakeMessage(self.log, text)
+
+    async def edit_text(self, text: str, **kwargs):
+        self.log.append(('edit', text))
+        return FakeMessage(self.log, text)
+
+
+def test_token_bucket_allows_burst_then_waits():
+    async def run():
+        bucket = TokenBucket(rate=20, capacity=2)
+        waits = [await bucket.acquire() for _ in range(3)]
+        bucket.pause(0.05)
+        assert not bucket.idle
+        started = time.monotonic()
+        await bucket.acquire()
+        return waits, time.monotonic() - started
+
+    waits, paused = asyncio.run(run())
+    assert waits[:2] == [0.0, 0.0]
+    assert 0.03 <= waits[2] <= 0.2
+    assert paused >= 0.05
+
+
+def test_rate_limiter_retries_after_429():
+    calls = []
+
+    async def callback(fail_times: int):
+        calls.append(fail_times)
+        if len(calls) <= fail_times:
+            raise RetryAfter(0)
+        return True
+
+    async def run():
+        limiter = ChatRateLimiter(overall_rate=1000, chat_rate=1000, chat_burst=10, max_retries=2)
+        await limiter.initialize()
+        assert await limiter.process_request(callback, (1,), {}, 'sendMessage', {'chat_id': 5}, None)
+        calls.clear()
+        with pytest.raises(RetryAfter):
+            await limiter.process_request(callback, (5,), {}, 'sendMessage', {'chat_id': 5}, None)
+        attempts = len(calls)
+        # Вызовы без chat_id не ограничиваются и не считаются
+        await limiter.process_request(callback, (0,), {}, 'getMe', {}, None)
+        return attempts, limiter.stats()
+
+    attempts, stats = asyncio.run(run())
+    assert attempts == 3
+    assert stats['requests'] == 2
+    assert stats['retry_after'] == 4
+
+
+def test_fast_reply_replaces_placeholder():
+    log = []
+
+    async def run():
+        coalescer = ReplyCoalescer(delay=0.05)
+        deferred = coalescer.defer(FakeMessage(log), 'Обрабатываю запрос...')
+        await deferred.resolve('Результаты')
+        await asyncio.sleep(0.1)
+        return coalescer.counters
+
+    counters = asyncio.run(run())
+    assert log == [('reply', 'Результаты')]
+    assert counters == {'placeholders': 0, 'coalesced': 1, 'edited': 0}
+
+
+def test_slow_reply_edits_placeholder():
+    log = []
+
+    async def run():
+        coalescer = ReplyCoalescer(delay=0.01)
+        deferred = coalescer.defer(FakeMessage(log), 'Обрабатываю запрос...')
+        await asyncio.sleep(0.05)
+        await deferred.resolve('Результаты')
+        return coalescer.counters
+
+    counters = asyncio.run(run())
+    assert log == [('reply', 'Обрабатываю запрос...'), ('edit', 'Результаты')]
+    assert counters == {'placeholders': 1, 'coalesced': 0, 'edited': 1}
+
+
+def test_zero_delay_sends_placeholder_immediately():
+    log = []
+
+    async def run():
+        deferred = ReplyCoalescer(delay=0).defer(FakeMessage(log), 'Обрабатываю запрос...')
+        await deferred.resolve('Результаты')
+
+    asyncio.run(run())
+    assert log == [('reply', 'Обрабатываю запрос...'), ('edit', 'Результаты')]
+
+
+def test_fail_only_replaces_unresolved_placeholder():
+    log = []
+
+    async def run():
+        coalescer = ReplyCoalescer(delay=0.01)
+        deferred = coalescer.defer(FakeMessage(log), 'Обрабатываю запрос...')
+        await deferred.resolve('Результаты')
+        await deferred.fail('Ошибка')
+
+        deferred = coalescer.defer(FakeMessage(log), 'Обрабатываю запрос...')
+        await asyncio.sleep(0.05)
+        await deferred.fail('Ошибка')
+
+    asyncio.run(run())
+    assert log == [('reply', 'Результаты'), ('reply', 'Обрабатываю запрос...'), ('edit', 'Ошибка')]
+
+
+def test_search_error_does_not_leave_placeholder(monkeypatch):
+    log = []
+
+    async def broken_search(query):
+        await asyncio.sleep(0.05)
+        raise RuntimeError('индекс недоступен')
+
+    monkeypatch.setattr(handlers, 'find_measures', broken_search)
+    monkeypatch.setattr(handlers.reply_coalescer, 'delay', 0.01)
+    update = SimpleNamespace(message=FakeMessage(log, 'гранты для ИП'), effective_user=SimpleNamespace(id=1, username='u'))
+    context = SimpleNamespace(user_data={})
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(handlers.handle_user_query(update, context))
+    assert log[0][0] == 'reply' and 'Обрабатываю запрос' in log[0][1]
+    assert log[1:] == [('edit', handlers.ERROR_TEXT)]
@@ -0,0 +1,105 @@
+"""
+Сохранение диалогов в SQLite: кодировка user_data, ленивая загрузка и пакетная запись
+"""
+
+import asyncio
+import json
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from bot.persistence import SQLitePersistence, decode_user_data, encode_user_data
+from tests.conftest import load_manager
+
+
+@pytest.fixture
+def manager(catalogue, tmp_path):
+    path = tmp_path / 'measures.csv'
+    catalogue.to_csv(path, index=False)
+    return load_manager(path)
+
+
+def test_user_data_encoding(manager):
+    selected = manager.results_by_ids([(5, 0.87654)])[0]
+    started = datetime(2026, 3, 1, 12, 30)
+    data = {'selected_result': selected, 'started': started, 'query': 'лизинг', 'result_ids': [[5, 0.9]],
+            'handler': object()}
+
+    payload = encode_user_data(data)
+    record = json.loads(payload)
+    assert record['selected_result'] == {'$result': [5, 0.8765]}
+    assert record['started'] == {'$datetime': '2026-03-01T12:30:00'}
+    assert 'handler' not in record
+
+    decoded = decode_user_data(payload, manager)
+    assert decoded['selected_result']['id'] == 5
+    assert decoded['started'] == started
+    assert decoded['query'] == 'лизинг'
+    assert decoded['result_ids'] == [[5, 0.9]]
+    assert encode_user_data({'handler': object()}) is None
+
+
+def test_removed_measure_is_skipped_on_decode(manager):
+    payload = json.dumps({'selected_result': {'$result': [10 ** 6, 0.5]}, 'query': 'грант'})
+    assert decode_user_data(payload, manager) == {'query': 'грант'}
+
+
+def test_round_trip_between_restarts(manager, tmp_path):
+    path = str(tmp_path / 'state' / 'bot.sqlite3')
+    selected = manager.results_by_ids([(7, 0.5)])[0]
+
+    async def first_run():
+        persistence = SQLitePersistence(path, manager=manager)
+        user_data = {}
+        await persistence.refresh_user_data(42, user_data)
+        user_data.update(selected_result=selected, query='экспорт')
+        await asyncio.gather(
+            persistence.update_user_data(42, user_data),
+            persistence.update_user_data(43, {'query': 'не загружался'}),
+            persistence.update_conversation('main', (42, 42), 3),
+            persistence.update_conversation('main', (44, 44), 1),
+        )
+        await persistence._write_task
+        # Апдейты одного цикла записаны одной транзакцией
+        assert persistence.counters['batches'] == 1
+        await persistence.update_conversation('main', (44, 44), None)
+        await persistence.flush()
+        return persistence.counters
+
+    async def second_run():
+        persistence = SQLitePersistence(path, manager=manager)
+        conversations = await persistence.get_conversations('main')
+        user_data = {'query': 'новый запрос'}
+        await persistence.refresh_user_data(42, user_data)
+        await persistence.flush()
+        return conversations, user_data
+
+    counters = asyncio.run(first_run())
+    assert counters['batches'] == 2
+    assert counters['write_errors'] == 0
+
+    conversations, user_data = asyncio.run(second_run())
+    assert conversations == {(42, 42): 3}
+    assert user_data['selected_result']['id'] == 7
+    # Данные текущего апдейта не затираются сохраненными
+    assert user_data['query'] == 'новый запрос'
+
+    connection = sqlite3.connect(path)
+    assert [row[0] for row in connection.execute("SELECT user_id FROM user_data")] == [42]
+    connection.close()
+
+
+def test_changes_between_cycles_are_written_in_separate_batches(manager, tmp_path):
+    async def run():
+        persistence = SQLitePersistence(str(tmp_path / 'bot.sqlite3'), manager=manager)
+        for state in (1, 2, 3):
+            await persistence.update_conversation('main', (1, 1), state)
+            await persistence._write_task
+        await persistence.drop_user_data(1)
+        await persistence.flush()
+        return persistence.counters
+
+    counters = asyncio.run(run())
+    assert counters['batches'] == 4
+    assert counters['conversations_written'] == 3
@@ -0,0 +1,80 @@
+"""
+Кэш результатов поиска: вытеснение LRU, TTL и версии датасета
+"""
+
+from data import query_cache
+from data.query_cache import QueryCache, estimate_size, normalize_query
+
+
+def test_normalize_query():
+    assert normalize_query('Гранты для ИП!') == normalize_query('гранты  для ип')
+    assert normalize_query('Ёлка') == normalize_query('елка')
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryCache(max_entries=2)
+    cache.put(1, 'a', [1])
+    cache.put(1, 'b', [2])
+    assert cache.get(1, 'a') == [1]
+    cache.put(1, 'c', [3])
+
+    assert cache.get(1, 'b') is None
+    assert cache.get(1, 'a') == [1] and cache.get(1, 'c') == [3]
+    assert cache.evictions == 1
+    assert cache.stats()['entries'] == 2
+
+
+def test_eviction_by_size():
+    value = [{'id': i, 'title': 'субсидия'} for i in range(10)]
+    size = estimate_size(value)
+    cache = QueryCache(max_entries=100, max_bytes=2 * size)
+    for key in ('a', 'b', 'c'):
+        cache.put(1, key, value)
+    assert cache.bytes == 2 * size
+    assert cache.get(1, 'a') is None
+
+    # Запись больше лимита не кэшируется и не вытесняет остальные
+    cache.put(1, 'big', value * 3)
+    assert cache.get(1, 'big') is None
+    assert cache.get(1, 'b') is value
+
+
+def test_expired_entry_is_removed(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(query_cache.time, 'monotonic', lambda: now[0])
+    cache = QueryCache(ttl=10)
+    cache.put(1, 'a', [1])
+    now[0] += 9
+    assert cache.get(1, 'a') == [1]
+    now[0] += 2
+    assert cache.get(1, 'a') is None
+    assert cache.expirations == 1
+    assert cache.bytes == 0
+
+
+def test_new_version_invalidates_entries():
+    cache = QueryCache()
+    cache.put(1, 'a', [1])
+    assert cache.get(2, 'a') is None
+    assert cache.invalidations == 1
+    cache.put(2, 'a', [2])
+    assert cache.get(2, 'a') == [2]
+
+
+def test_stale_version_does_not_touch_cache():
+    cache = QueryCache()
+    cache.put(2, 'a', [2])
+    # Поиск, начатый до публикации версии 2, не сбрасывает кэш и не пишет в него
+    assert cache.get(1, 'a') is None
+    cache.put(1, 'a', [1])
+    cache.put(1, 'b', [1])
+    assert cache.get(2, 'a') == [2]
+    assert cache.get(2, 'b') is None
+    assert cache.invalidations == 0
+
+
+def test_disabled_cache():
+    cache = QueryCache(max_entries=0)
+    cache.put(1, 'a', [1])
+    assert cache.get(1, 'a') is None
+    assert cache.stats()['entries'] == 0
@@ -0,0 +1,63 @@
+"""
+Кэш подготовленных сообщений: повторное использование, вытеснение LRU и сброс по версии датасета
+"""
+
+import pytest
+
+from conversation import rendering
+from conversation.rendering import MessageRenderer
+from data.facets import FacetFilter
+from tests.conftest import edit_catalogue, load_manager
+
+
+@pytest.fixture
+def manager(catalogue, tmp_path):
+    path = tmp_path / 'measures.csv'
+    catalogue.to_csv(path, index=False)
+    return load_manager(path)
+
+
+def render(renderer, manager, query):
+    return renderer.search_results(query, manager.search(query, top_k=3), FacetFilter())
+
+
+def test_repeated_message_is_reused(manager):
+    renderer = MessageRenderer(manager)
+    text, markup = render(renderer, manager, 'лизинг')
+    assert 'лизинг' in text
+    assert render(renderer, manager, 'лизинг')[1] is markup
+
+
+def test_least_recently_used_message_is_evicted(manager, monkeypatch):
+    monkeypatch.setattr(rendering, 'MESSAGE_CACHE_SIZE', 2)
+    renderer = MessageRenderer(manager)
+    first = render(renderer, manager, 'лизинг')
+    render(renderer, manager, 'грант')
+    # Повторный показ делает сообщение недавно использованным
+    assert render(renderer, manager, 'лизинг')[1] is first[1]
+    render(renderer, manager, 'экспорт')
+
+    assert len(renderer._messages) == 2
+    assert [key[0] for key in renderer._messages] == ['лизинг', 'экспорт']
+    assert render(renderer, manager, 'лизинг')[1] is first[1]
+
+
+def test_consult_markups_are_bounded(manager, monkeypatch):
+    monkeypatch.setattr(rendering, 'MESSAGE_CACHE_SIZE', 2)
+    renderer = MessageRenderer(manager)
+    first = renderer._consult_markup(1)
+    renderer._consult_markup(2)
+    assert renderer._consult_markup(1) is first
+    renderer._consult_markup(3)
+    assert list(renderer._consult_markups) == [1, 3]
+
+
+def test_new_dataset_version_resets_messages(manager, catalogue, tmp_path):
+    renderer = MessageRenderer(manager)
+    _, markup = render(renderer, manager, 'лизинг')
+
+    path = tmp_path / 'measures.csv'
+    edit_catalogue(catalogue).to_csv(path, index=False)
+    manager.publish(manager.build_state(filepath=str(path)))
+    assert render(renderer, manager, 'лизинг')[1] is not markup
+    assert len(renderer._messages) == 1
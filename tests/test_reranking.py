@@ -0,0 +1,50 @@
+"""
+Гибридное переранжирование: смесь BM25 и эмбеддингов с фасетным фильтром
+"""
+
+import numpy as np
+import pytest
+
+from data.facets import FacetFilter
+from data.reranking import rerank_batch
+from tests.conftest import load_manager
+
+QUERIES = ['лизинг оборудования', 'грант на экспорт', 'субсидия сельскому хозяйству', 'обучение персонала']
+
+
+@pytest.fixture
+def manager(catalogue, tmp_path, compact):
+    path = tmp_path / 'measures.csv'
+    catalogue.to_csv(path, index=False)
+    return load_manager(path, compact)
+
+
+def test_rerank_returns_sorted_scores(manager):
+    state = manager.state
+    hits = rerank_batch(state.search_engine, state.embedding_index, QUERIES, top_k=5, spelling=state.spelling)
+    assert len(hits) == len(QUERIES)
+    for query_hits in hits:
+        assert 0 < len(query_hits) <= 5
+        scores = [score for _, score in query_hits]
+        assert scores == sorted(scores, reverse=True)
+        assert all(0 < score <= 1 for score in scores)
+
+
+def test_rerank_respects_filter_mask(manager):
+    state = manager.state
+    mask = np.zeros(state.size, dtype=bool)
+    mask[[3, 10]] = True
+    # Допустимых документов меньше, чем кандидатов: хвост семантического поиска - отфильтрованные позиции
+    hits = rerank_batch(state.search_engine, state.embedding_index, QUERIES, top_k=5, mask=mask, spelling=state.spelling)
+    for query_hits in hits:
+        assert {position for position, _ in query_hits} <= {3, 10}
+
+
+def test_filtered_rerank_returns_only_matching_measures(manager, catalogue):
+    filters = FacetFilter(categories=('Образование',))
+    allowed = set(catalogue.loc[catalogue['Категория'] == 'Образование', 'id'])
+    for results in manager.rerank_batch(QUERIES, top_k=5, filters=filters):
+        assert results
+        assert {result['id'] for result in results} <= allowed
+
+    assert manager.rerank_batch(QUERIES[:1], filters=FacetFilter(categories=('Нет такой',))) == [[]]
@@ -0,0 +1,59 @@
+"""
+Инкрементальное обновление поискового индекса
+"""
+
+import pandas as pd
+
+from data.dataset_delta import diff_datasets, row_hashes
+from data.search_engine import FIELD_WEIGHTS, SearchEngine, dataframe_records
+from data.text_processing import stem
+from tests.conftest import edit_catalogue
+
+FIELDS = list(FIELD_WEIGHTS)
+# Основа слова, которое edit_catalogue добавляет в описания
+NEW_TERM = stem('агролизингодатель')
+
+
+def patched_engine(old: pd.DataFrame, new: pd.DataFrame):
+    """Индекс старой версии, обновленный по diff, и новая версия в его раскладке"""
+    engine = SearchEngine.from_dataframe(old, FIELDS)
+    delta = diff_datasets(engine.doc_ids, row_hashes(old), new['id'].tolist(), row_hashes(new))
+    new = new.iloc[delta.order].reset_index(drop=True)
+    old_records = dataframe_records(old, FIELDS)
+    new_records = dataframe_records(new, FIELDS)
+    removed = {position: old_records[position] for position in delta.vacated}
+    added = {position: new_records[position] for position in [*delta.new_rows, *delta.moved]}
+    return engine, engine.apply_changes(removed, added, delta.size), new
+
+
+def postings_by_id(engine: SearchEngine):
+    return {term: {engine.doc_ids[position] for position in docs} for term, (docs, _) in engine.postings.items()}
+
+
+def test_apply_changes_matches_full_build(catalogue):
+    new = edit_catalogue(catalogue)
+    old_engine, engine, new = patched_engine(catalogue, new)
+    full = SearchEngine.from_dataframe(new, FIELDS)
+
+    assert engine.size == len(new)
+    assert engine.doc_ids == new['id'].tolist()
+    assert engine.titles == full.titles
+    assert engine.descriptions == full.descriptions
+    assert postings_by_id(engine) == postings_by_id(full)
+    # Текущий индекс не изменяется (copy-on-write)
+    assert old_engine.doc_ids == catalogue['id'].tolist()
+    assert NEW_TERM not in old_engine.postings
+
+
+def test_apply_changes_finds_new_terms_and_drops_removed_documents(catalogue):
+    new = edit_catalogue(catalogue)
+    _, engine, new = patched_engine(catalogue, new)
+
+    edited = set(new.loc[new['Описание'].str.contains('агролизингодатель'), 'id'])
+    found = {engine.doc_ids[position] for position, _ in engine.search('агролизингодатель', top_k=50)}
+    assert found == edited
+
+    removed = set(catalogue['id']) - set(new['id'])
+    for docs, _ in engine.postings.values():
+        assert not removed & {engine.doc_ids[position] for position in docs}
+
@@ -0,0 +1,58 @@
+"""
+Поиск в пуле потоков: результаты, таймаут вызова и отказ при насыщении
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from data.search_executor import SearchExecutor, SearchOverloaded, SearchTimeout
+from tests.conftest import load_manager
+
+
+@pytest.fixture
+def manager(catalogue, tmp_path):
+    path = tmp_path / 'measures.csv'
+    catalogue.to_csv(path, index=False)
+    return load_manager(path)
+
+
+def test_search_matches_manager(manager):
+    async def run():
+        executor = SearchExecutor(manager, threads=2)
+        try:
+            return await executor.search_ids('лизинг'), executor.stats()
+        finally:
+            await executor.shutdown()
+
+    ids, stats = asyncio.run(run())
+    assert ids == manager.search_ids('лизинг')
+    assert stats['completed'] == 1 and stats['pending_threads'] == 0
+
+
+def test_timeout_and_overload(manager):
+    release = threading.Event()
+
+    def slow_search(*args):
+        release.wait(5)
+        return []
+
+    manager.search_ids = slow_search
+
+    async def run():
+        executor = SearchExecutor(manager, threads=1, timeout=0.05, max_pending=1, queue_timeout=0.01)
+        try:
+            with pytest.raises(SearchTimeout):
+                await executor.search_ids('лизинг')
+            # Зависшая задача держит место в пуле после таймаута вызова
+            assert executor.pending('threads') == 1
+            with pytest.raises(SearchOverloaded):
+                await executor.search_ids('грант')
+        finally:
+            release.set()
+            await executor.shutdown()
+        return executor.counters
+
+    counters = asyncio.run(run())
+    assert (counters['timeouts'], counters['rejected']) == (1, 1)
@@ -0,0 +1,96 @@
+"""
+Загрузчик Google Sheets против фейкового API (benchmarks/fake_sheets.py)
+"""
+
+import pytest
+
+from benchmarks.fake_sheets import FakeSheetsServer
+from data.sheets_loader import GoogleSheetsLoader, SheetsUnavailable
+
+SHEET_ID = 'test-sheet'
+SHEET_NAME = 'Меры поддержки'
+
+
+@pytest.fixture
+def server(catalogue):
+    server = FakeSheetsServer(SHEET_ID, SHEET_NAME, catalogue)
+    server.start_in_thread()
+    yield server
+    server.stop_thread()
+
+
+@pytest.fixture
+def loader(server, tmp_path):
+    loader = GoogleSheetsLoader(SHEET_ID, SHEET_NAME, cache_dir=str(tmp_path / 'cache'), timeout=5.0,
+                                batch_rows=50, sheets_api_url=server.sheets_api_url,
+                                drive_api_url=server.drive_api_url)
+    yield loader
+    loader.close()
+
+
+def test_load_downloads_sheet_in_batches(server, loader, catalogue):
+    df = loader.load()
+    assert list(df.columns) == list(catalogue.columns)
+    assert len(df) == len(catalogue)
+    assert df['Название'].tolist() == catalogue['Название'].tolist()
+    assert loader.counters['downloads'] == 1
+    assert server.calls['batch_get'] == 1
+
+
+def test_unchanged_revision_is_served_from_cache(server, loader, catalogue):
+    loader.load()
+    assert not loader.changed()
+
+    server.calls.clear()
+    df = loader.load()
+    assert len(df) == len(catalogue)
+    assert loader.counters['unchanged'] == 1
+    assert server.calls['batch_get'] == 0
+
+
+def test_changed_sheet_is_downloaded_again(server, loader, catalogue):
+    loader.load()
+    server.set_frame(catalogue.head(10))
+    assert loader.changed()
+    assert len(loader.load()) == 10
+    assert loader.counters['downloads'] == 2
+
+
+def test_api_failure_falls_back_to_cache(server, loader, catalogue):
+    loader.load()
+    server.failing = True
+    assert not loader.changed()
+    df = loader.load()
+    assert len(df) == len(catalogue)
+    assert loader.counters['cache_fallbacks'] == 1
+
+
+def test_api_failure_without_cache_raises(server, loader):
+    server.failing = True
+    with pytest.raises(SheetsUnavailable):
+        loader.load()
+
+
+def test_token_refresh_failure_falls_back_to_cache(server, loader, catalogue, tmp_path, monkeypatch):
+    pytest.importorskip('google.auth')
+    from google.auth.exceptions import RefreshError
+    from google.oauth2 import service_account
+
+    loader.load()
+
+    class Credentials:
+        valid = False
+        token = None
+
+        def refresh(self, request):
+            raise RefreshError('invalid_grant')
+
+    credentials_file = tmp_path / 'service_account.json'
+    credentials_file.write_text('{}')
+    monkeypatch.setattr(service_account.Credentials, 'from_service_account_file',
+                        lambda *args, **kwargs: Credentials())
+    loader.credentials_file = str(credentials_file)
+
+    assert not loader.changed()
+    assert len(loader.load()) == len(catalogue)
+    assert loader.counters['cache_fallbacks'] == 1
@@ -0,0 +1,96 @@
+"""
+Граф похожих мер: полное построение, инкрементальное обновление и перенос через снапшот
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data import similar_measures
+from data.dataset_manager import DatasetManager
+from data.facets import CATEGORY_FACET
+from data.similar_measures import CATEGORY_WEIGHT, SimilarityGraph
+from tests.conftest import load_manager
+
+
+def random_catalogue(size: int, dim: int = 16, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    matrix = rng.normal(size=(size, dim)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    categories = rng.integers(-1, 4, size)
+    return matrix, categories
+
+
+def brute_force(matrix: np.ndarray, categories: np.ndarray) -> np.ndarray:
+    """Полная матрица похожести без диагонали"""
+    scores = (matrix @ matrix.T) * (1 - CATEGORY_WEIGHT)
+    scores += CATEGORY_WEIGHT * ((categories[:, None] == categories[None, :]) & (categories >= 0)[:, None])
+    np.fill_diagonal(scores, -np.inf)
+    return scores
+
+
+def assert_graph_matches(graph: SimilarityGraph, scores: np.ndarray):
+    """Оценки строк - k лучших положительных, оценка каждого соседа совпадает с матрицей"""
+    for position in range(graph.size):
+        related = graph.related(position)
+        row = np.sort(scores[position])[::-1]
+        expected = row[(row > 0)][:graph.k]
+        np.testing.assert_allclose([score for _, score in related], expected, atol=2e-3)
+        np.testing.assert_allclose([score for _, score in related], scores[position, [p for p, _ in related]],
+                                   atol=2e-3)
+
+
+@pytest.mark.parametrize('threads', [1, 3])
+def test_tiled_build_matches_brute_force(monkeypatch, threads):
+    # Мелкие плитки: несколько блоков, включая неполный последний, и кандидаты по столбцам
+    monkeypatch.setattr(similar_measures, 'TILE_SIZE', 16)
+    monkeypatch.setattr(similar_measures, 'PARALLEL_MIN_SIZE', 32)
+    matrix, categories = random_catalogue(70)
+
+    graph = SimilarityGraph.build(matrix, categories, k=5, threads=threads)
+    assert (graph.neighbours.shape, graph.neighbours.dtype, graph.scores.dtype) == ((70, 5), np.int32, np.float16)
+    assert not (graph.neighbours == np.arange(70)[:, None]).any()
+    assert_graph_matches(graph, brute_force(matrix, categories))
+
+
+def test_small_catalogue_pads_missing_neighbours():
+    matrix = np.array([[1, 0], [1, 0], [-1, 0]], dtype=np.float32)
+    graph = SimilarityGraph.build(matrix, None, k=4)
+    # Противоположные векторы не похожи: соседей с оценкой <= 0 нет
+    assert graph.related(0) == [(1, 1.0)]
+    assert graph.related(2) == []
+    assert graph.neighbours[0].tolist() == [1, -1, -1, -1]
+    assert SimilarityGraph.build(matrix[:1], None, k=4).related(0) == []
+
+
+def test_apply_changes_matches_full_build(refreshed):
+    state = refreshed.state
+    assert state.similar is not None and state.similar is not refreshed.previous.similar
+    # Эталон - полное построение по тем же эмбеддингам и категориям обновленной версии
+    categories = pd.factorize(pd.Series(list(state.columns.column(CATEGORY_FACET))))[0]
+    assert state.similar.k == 4
+    assert_graph_matches(state.similar, brute_force(state.embedding_index.matrix, categories))
+
+
+def test_snapshot_keeps_graph(catalogue, tmp_path):
+    path = tmp_path / 'measures.csv'
+    catalogue.to_csv(path, index=False)
+    manager = load_manager(path)
+    snapshot = str(tmp_path / 'snapshot')
+    assert manager.export_snapshot(snapshot)
+    measure_id = manager.state.search_engine.doc_ids[0]
+
+    restored = DatasetManager(data_source='local', similar_k=4)
+    assert restored.load_snapshot(snapshot)
+    np.testing.assert_array_equal(restored.state.similar.neighbours, manager.state.similar.neighbours)
+    np.testing.assert_array_equal(restored.state.similar.scores, manager.state.similar.scores)
+    assert restored.similar_measures(measure_id, 2) == manager.similar_measures(measure_id, 2)
+
+    # Другой similar_k: граф строится заново, similar_k=0 - граф не нужен
+    wider = DatasetManager(data_source='local', similar_k=6)
+    assert wider.load_snapshot(snapshot)
+    assert wider.state.similar.k == 6
+    disabled = DatasetManager(data_source='local', similar_k=0)
+    assert disabled.load_snapshot(snapshot)
+    assert disabled.state.similar is None
+    assert disabled.similar_measures(measure_id) == []
@@ -0,0 +1,81 @@
+"""
+Исправление опечаток: словарь удалений, триграммы и обновление по изменившимся термам
+"""
+
+import numpy as np
+
+from data.search_engine import SearchEngine
+from data.spelling import SpellingIndex, within_one_edit
+from tests.conftest import edit_catalogue
+from tests.test_search_engine import FIELDS, NEW_TERM, patched_engine
+
+
+def postings(*terms):
+    return {term: (np.arange(2, dtype=np.int32), np.ones(2, dtype=np.float32)) for term in terms}
+
+
+def test_within_one_edit():
+    assert within_one_edit('субсидия', 'субсидия')
+    assert within_one_edit('субсидия', 'субсидя')
+    assert within_one_edit('субсидия', 'субсидиия')
+    assert within_one_edit('субсидия', 'субсдиия')
+    assert not within_one_edit('субсидия', 'субсдия и')
+
+
+def test_correct_known_misspelled_and_prefix_terms():
+    spelling = SpellingIndex.from_postings(postings('субсидия', 'лизинг', 'сельхозпроизводител'))
+    assert spelling.correct('лизинг') == [('лизинг', 1.0)]
+    assert spelling.correct('субсидя') == [('субсидия', 0.9)]
+    assert [term for term, _ in spelling.correct('сельхоз')] == ['сельхозпроизводител']
+    assert spelling.correct('123') == []
+
+
+def test_apply_changes_reports_changed_terms(catalogue):
+    _, engine, _ = patched_engine(catalogue, edit_catalogue(catalogue))
+    assert NEW_TERM in engine.changed_terms
+    before = SearchEngine.from_dataframe(catalogue, FIELDS).postings
+    assert set(engine.changed_terms) <= set(engine.postings) | set(before)
+
+
+def test_spelling_index_follows_changed_terms(catalogue):
+    old_engine, engine, new = patched_engine(catalogue, edit_catalogue(catalogue))
+    previous = SpellingIndex.from_postings(old_engine.postings)
+    spelling = previous.apply_changes(engine.postings, engine.changed_terms)
+    full = SpellingIndex.from_postings(SearchEngine.from_dataframe(new, FIELDS).postings)
+
+    assert spelling.term_ids.keys() == full.term_ids.keys()
+    for term, term_id in full.term_ids.items():
+        assert spelling.frequencies[spelling.term_ids[term]] == full.frequencies[term_id]
+    for query in ('агролизингодатль', 'агролизинг', 'субсидя', 'экспотр'):
+        assert spelling.correct(query) == full.correct(query)
+    assert NEW_TERM in spelling.term_ids and NEW_TERM not in previous.term_ids
+
+
+def test_spelling_index_forgets_removed_terms():
+    previous = SpellingIndex.from_postings(postings('субсидия', 'лизинг', 'экспорт', 'кредит', 'грант'))
+    spelling = previous.apply_changes(postings('субсидия', 'экспорт', 'кредит', 'грант'), ['лизинг'])
+    assert 'лизинг' not in spelling.term_ids
+    assert spelling.removed == 1
+    assert spelling.correct('лизинк') == []
+    assert previous.correct('лизинк') == [('лизинг', 0.9)]
+
+
+def test_unchanged_vocabulary_shares_dictionaries():
+    previous = SpellingIndex.from_postings(postings('субсидия', 'лизинг'))
+    spelling = previous.apply_changes(postings('субсидия', 'лизинг'), ['лизинг'])
+    assert spelling.deletes is previous.deletes
+    assert spelling.trigrams is previous.trigrams
+
+
+def test_many_removed_terms_rebuild_index():
+    previous = SpellingIndex.from_postings(postings('субсидия', 'лизинг', 'экспорт', 'кредит'))
+    spelling = previous.apply_changes(postings('субсидия', 'лизинг'), ['экспорт', 'кредит'])
+    assert spelling.removed == 0
+    assert spelling.terms == ['субсидия', 'лизинг']
+
+
+def test_refresh_updates_spelling_index(refreshed):
+    state, reference = refreshed.state, refreshed.reference
+    assert state.spelling.term_ids.keys() == reference.spelling.term_ids.keys()
+    assert state.spelling.correct('агролизингодатль') == reference.spelling.correct('агролизингодатль')
+    assert NEW_TERM not in refreshed.previous.spelling.term_ids
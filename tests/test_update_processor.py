@@ -0,0 +1,98 @@
+"""
+Параллельная обработка апдейтов: порядок внутри диалога, семафор и drain
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+from telegram import Chat, Message, Update, User
+
+from bot.update_processor import ConversationUpdateProcessor, conversation_key
+
+
+def make_update(update_id: int, user_id: int) -> Update:
+    user = User(user_id, 'Тест', is_bot=False)
+    chat = Chat(user_id, Chat.PRIVATE)
+    message = Message(update_id, datetime.now(timezone.utc), chat, from_user=user, text='лизинг')
+    return Update(update_id, message=message)
+
+
+def test_conversation_key():
+    assert conversation_key(make_update(1, 42)) == (42, 42)
+    assert conversation_key(object()) is None
+
+
+def test_conversation_updates_keep_order():
+    events = []
+
+    async def handle(name: str, delay: float):
+        events.append(('start', name))
+        await asyncio.sleep(delay)
+        events.append(('end', name))
+
+    async def run():
+        processor = ConversationUpdateProcessor(8)
+        updates = [(make_update(1, 1), 'a1', 0.03), (make_update(2, 1), 'a2', 0.0), (make_update(3, 2), 'b1', 0.01),
+                   (make_update(4, 1), 'a3', 0.0)]
+        await asyncio.gather(*(processor.process_update(update, handle(name, delay)) for update, name, delay in updates))
+        return processor
+
+    processor = asyncio.run(run())
+    conversation = [event for event in events if event[1].startswith('a')]
+    assert conversation == [('start', 'a1'), ('end', 'a1'), ('start', 'a2'), ('end', 'a2'), ('start', 'a3'), ('end', 'a3')]
+    # Другой диалог не ждет первого
+    assert events.index(('end', 'b1')) < events.index(('end', 'a1'))
+    assert processor.processed == 4
+    assert not processor._locks
+
+
+def test_waiting_updates_do_not_hold_semaphore():
+    events = []
+
+    async def handle(name: str, delay: float):
+        events.append(('start', name))
+        await asyncio.sleep(delay)
+        events.append(('end', name))
+
+    async def run():
+        processor = ConversationUpdateProcessor(2)
+        # a2 и a3 ждут a1 и не должны занимать второе место семафора
+        updates = [(make_update(1, 1), 'a1', 0.05), (make_update(2, 1), 'a2', 0.0), (make_update(3, 1), 'a3', 0.0),
+                   (make_update(4, 2), 'b1', 0.0)]
+        await asyncio.gather(*(processor.process_update(update, handle(name, delay)) for update, name, delay in updates))
+
+    asyncio.run(run())
+    assert events.index(('end', 'b1')) < events.index(('end', 'a1'))
+
+
+def test_drain_waits_for_active_updates():
+    async def run():
+        processor = ConversationUpdateProcessor(4)
+        finished = asyncio.Event()
+
+        async def handle():
+            await asyncio.sleep(0.02)
+            finished.set()
+
+        task = asyncio.ensure_future(processor.process_update(make_update(1, 1), handle()))
+        await asyncio.sleep(0)
+        assert processor.active == 1
+        left = await processor.drain(1.0)
+        await task
+        return left, finished.is_set(), processor.active
+
+    assert asyncio.run(run()) == (0, True, 0)
+
+
+def test_drain_timeout_reports_unfinished_updates():
+    async def run():
+        processor = ConversationUpdateProcessor(4)
+        release = asyncio.Event()
+        tasks = [asyncio.ensure_future(processor.process_update(make_update(i, i), release.wait())) for i in (1, 2)]
+        await asyncio.sleep(0)
+        left = await processor.drain(0.01)
+        release.set()
+        await asyncio.gather(*tasks)
+        return left, await processor.drain(0.01)
+
+    assert asyncio.run(run()) == (2, 0)
@@ -0,0 +1,120 @@
+"""
+Многопроцессный режим: распределение апдейтов, подтверждение обработки и повторная передача
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from bot.update_processor import ConversationUpdateProcessor
+from bot.workers import WorkerProcess, WorkerServer, WorkerSupervisor, shard_for, shard_key
+
+
+def make_update(update_id: int, user_id: int = 42) -> dict:
+    user = {'id': user_id, 'is_bot': False, 'first_name': 'Тест'}
+    return {
+        'update_id': update_id,
+        'message': {'message_id': update_id, 'date': 0, 'chat': {'id': user_id, 'type': 'private'}, 'from': user,
+                    'text': 'лизинг'},
+    }
+
+
+class FakeApplication:
+    """Часть Application, которую использует WorkerServer"""
+
+    def __init__(self):
+        self.bot = None
+        self.update_queue = asyncio.Queue()
+        self.update_processor = ConversationUpdateProcessor(4)
+
+    async def process_next(self) -> int:
+        update = await asyncio.wait_for(self.update_queue.get(), 1)
+        await self.update_processor.process_update(update, asyncio.sleep(0))
+        return update.update_id
+
+
+def test_shard_key():
+    assert shard_key(make_update(1, user_id=7)) == 7
+    assert shard_key({'update_id': 5, 'callback_query': {'from': {'id': 9}, 'message': {'chat': {'id': -3}}}}) == 9
+    assert shard_key({'update_id': 5, 'channel_post': {'chat': {'id': -100}}}) == -100
+    assert shard_key({'update_id': 5}) == 5
+    assert shard_for({'update_id': 5, 'channel_post': {'chat': {'id': -101}}}, 4) == 3
+
+
+async def wait_until(condition, timeout: float = 1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+def test_unconfirmed_updates_are_replayed_after_restart(tmp_path):
+    socket_path = str(tmp_path / 'worker.sock')
+
+    async def run():
+        application = FakeApplication()
+        server = WorkerServer(application, socket_path, manager=None)
+        await server.start()
+        worker = WorkerProcess(0, socket_path, {})
+        await worker.connect(1)
+        for update_id in (1, 2):
+            await worker.send_update(json.dumps(make_update(update_id)).encode())
+
+        # Подтверждается только обработанный апдейт
+        assert await application.process_next() == 1
+        await application.update_queue.get()
+        await wait_until(lambda: list(worker.unconfirmed) == [2])
+
+        # Процесс "упал", не обработав апдейт 2
+        await server.stop(0.05)
+        await worker.close()
+        application = FakeApplication()
+        server = WorkerServer(application, socket_path, manager=None)
+        await server.start()
+        await worker.connect(1)
+        await worker.send_update(json.dumps(make_update(3)).encode())
+
+        processed = [await application.process_next(), await application.process_next()]
+        await wait_until(lambda: not worker.unconfirmed)
+        await worker.close()
+        await server.stop(0.05)
+        return processed, worker.replayed
+
+    assert asyncio.run(run()) == ([2, 3], 1)
+
+
+def test_dispatch_rejects_unavailable_or_lagging_worker(tmp_path):
+    async def run():
+        supervisor = WorkerSupervisor(1, str(tmp_path), str(tmp_path), env={}, dispatch_timeout=0.01, max_unconfirmed=2)
+        worker = supervisor.workers[0]
+        # Процесс еще не запущен
+        assert not await supervisor.dispatch(make_update(1), b'{}')
+
+        worker.ready.set()
+        worker.unconfirmed.update({1: b'', 2: b''})
+        assert not await supervisor.dispatch(make_update(2), b'{}')
+        return supervisor.stats()
+
+    stats = asyncio.run(run())
+    assert stats['rejected'] == 2
+    assert stats['unconfirmed'] == [2]
+
+
+@pytest.mark.parametrize('payload', [b'not json', json.dumps({'message': 'bad'}).encode()])
+def test_malformed_update_is_acknowledged(tmp_path, payload):
+    socket_path = str(tmp_path / 'worker.sock')
+
+    async def run():
+        application = FakeApplication()
+        server = WorkerServer(application, socket_path, manager=None)
+        await server.start()
+        worker = WorkerProcess(0, socket_path, {})
+        await worker.connect(1)
+        await worker.send_update(payload)
+        await wait_until(lambda: not worker.unconfirmed)
+        await worker.close()
+        await server.stop(0.05)
+        return application.update_queue.qsize()
+
+    assert asyncio.run(run()) == 0